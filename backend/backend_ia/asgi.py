@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_ia.settings')
 
 application = get_asgi_application()
+
+# Charger le modèle d'embeddings et la collection en arrière-plan: le serveur
+# répond immédiatement et /api/health/ indique quand le système RAG est prêt.
+# Les commandes de gestion (migrate, shell...) n'importent pas ce module.
+from communication.systeme_rag import prechauffer  # noqa: E402
+
+prechauffer()
@@ -0,0 +1,297 @@
+"""
+Contrôle d'admission devant l'étape de génération
+File d'attente bornée, délai d'attente maximal et partage des générations identiques en cours
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class RefusAdmission(Exception):
+    """Requête refusée par le contrôle d'admission (à renvoyer avec Retry-After)"""
+
+    statut_http = 503
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class FileSaturee(RefusAdmission):
+    """La file d'attente est pleine: la requête est refusée immédiatement"""
+
+    statut_http = 429
+
+
+class AttenteDepassee(RefusAdmission):
+    """La requête a attendu dans la file plus longtemps que le délai maximal"""
+
+    statut_http = 503
+
+
+class _Attente:
+    """Requête en file: réveillée par un Event (thread) ou un Future (boucle asyncio)"""
+
+    __slots__ = ('evenement', 'boucle', 'futur', 'accordee', 'abandonnee')
+
+    def __init__(self, boucle: Optional[asyncio.AbstractEventLoop] = None):
+        self.boucle = boucle
+        self.futur = boucle.create_future() if boucle is not None else None
+        self.evenement = threading.Event() if boucle is None else None
+        self.accordee = False
+        self.abandonnee = False
+
+    def accorder(self):
+        self.accordee = True
+        if self.evenement is not None:
+            self.evenement.set()
+        else:
+            self.boucle.call_soon_threadsafe(
+                lambda: self.futur.done() or self.futur.set_result(True)
+            )
+
+
+class ControleAdmission:
+    """
+    Limite le nombre de générations simultanées et borne la file d'attente
+
+    Les places sont attribuées dans l'ordre d'arrivée. Une requête qui
+    arrive quand la file est pleine est refusée tout de suite (FileSaturee,
+    429); une requête restée en file plus de `attente_max` secondes est
+    abandonnée (AttenteDepassee, 503). Les deux portent un Retry-After estimé
+    à partir de la durée moyenne d'une génération.
+
+    Utilisable depuis des threads (admettre) et depuis une boucle asyncio
+    (aadmettre), qui partagent les mêmes places.
+    """
+
+    def __init__(self, capacite: int = 2, taille_file: int = 32, attente_max: float = 20):
+        """
+        Args:
+            capacite: Générations simultanées
+            taille_file: Requêtes en attente au-delà desquelles on refuse
+            attente_max: Attente maximale dans la file (s)
+        """
+        self.capacite = max(1, capacite)
+        self.taille_file = taille_file
+        self.attente_max = attente_max
+
+        self._verrou = threading.Lock()
+        self._en_cours = 0
+        self._file: "deque[_Attente]" = deque()
+        self._duree_moyenne: Optional[float] = None
+        self._compteurs = {'admises': 0, 'refusees': 0, 'expirees': 0}
+        self._attente_totale = 0.0
+        self._attente_max_observee = 0.0
+
+    def _retry_after(self) -> int:
+        """Secondes estimées avant qu'une place se libère pour une nouvelle requête"""
+        if self._duree_moyenne is None:
+            return max(1, math.ceil(self.attente_max))
+        return max(1, math.ceil(self._duree_moyenne * (len(self._file) + 1) / self.capacite))
+
+    def _file_pleine(self) -> FileSaturee:
+        return FileSaturee(
+            f"File de génération pleine ({len(self._file)} requêtes en attente)",
+            self._retry_after()
+        )
+
+    def refuser_si_saturee(self):
+        """
+        Lève FileSaturee si une nouvelle requête serait refusée, sans réserver
+        de place (pour refuser avant d'ouvrir un flux)
+        """
+        with self._verrou:
+            if self._en_cours >= self.capacite and len(self._file) >= self.taille_file:
+                self._compteurs['refusees'] += 1
+                raise self._file_pleine()
+
+    def _reserver(self, boucle: Optional[asyncio.AbstractEventLoop] = None) -> Optional[_Attente]:
+        """Prend une place libre (None) ou entre dans la file (attente à surveiller)"""
+        with self._verrou:
+            if self._en_cours < self.capacite and not self._file:
+                self._en_cours += 1
+                return None
+            if len(self._file) >= self.taille_file:
+                self._compteurs['refusees'] += 1
+                raise self._file_pleine()
+            attente = _Attente(boucle)
+            self._file.append(attente)
+            return attente
+
+    def _abandonner(self, attente: _Attente) -> bool:
+        """
+        Délai dépassé: retire la requête de la file
+
+        Returns:
+            True si une place a été accordée entre-temps (la requête continue)
+        """
+        with self._verrou:
+            if attente.accordee:
+                return True
+            attente.abandonnee = True
+            self._file.remove(attente)
+            self._compteurs['expirees'] += 1
+            retry_after = self._retry_after()
+        raise AttenteDepassee(
+            f"Aucune place de génération libérée après {self.attente_max:.0f}s d'attente",
+            retry_after
+        )
+
+    def _admise(self, duree_attente: float):
+        with self._verrou:
+            self._compteurs['admises'] += 1
+            self._attente_totale += duree_attente
+            self._attente_max_observee = max(self._attente_max_observee, duree_attente)
+
+    def _liberer(self, duree: Optional[float]):
+        """Fin d'une génération: la place passe à la première requête en file"""
+        with self._verrou:
+            if duree is not None:
+                self._duree_moyenne = duree if self._duree_moyenne is None else \
+                    0.8 * self._duree_moyenne + 0.2 * duree
+            while self._file:
+                suivante = self._file.popleft()
+                if not suivante.abandonnee:
+                    suivante.accorder()
+                    return
+            self._en_cours -= 1
+
+    @contextmanager
+    def admettre(self):
+        """
+        Bloque jusqu'à obtenir une place de génération
+
+        Yields:
+            Temps passé dans la file (s)
+
+        Raises:
+            FileSaturee, AttenteDepassee
+        """
+        debut = time.monotonic()
+        attente = self._reserver()
+        if attente is not None and not attente.evenement.wait(self.attente_max):
+            self._abandonner(attente)
+
+        duree_attente = time.monotonic() - debut
+        self._admise(duree_attente)
+        debut_generation = time.monotonic()
+        try:
+            yield duree_attente
+        finally:
+            self._liberer(time.monotonic() - debut_generation)
+
+    @asynccontextmanager
+    async def aadmettre(self):
+        """Version asynchrone de admettre(): l'attente ne bloque pas la boucle"""
+        debut = time.monotonic()
+        attente = self._reserver(asyncio.get_running_loop())
+        if attente is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(attente.futur), self.attente_max)
+            except asyncio.TimeoutError:
+                self._abandonner(attente)
+            except asyncio.CancelledError:
+                # Requête annulée (client parti): rendre la place si elle
+                # vient d'être accordée, sinon quitter la file
+                with self._verrou:
+                    accordee = attente.accordee
+                    if not accordee:
+                        attente.abandonnee = True
+                        self._file.remove(attente)
+                if accordee:
+                    self._liberer(None)
+                raise
+
+        duree_attente = time.monotonic() - debut
+        self._admise(duree_attente)
+        debut_generation = time.monotonic()
+        try:
+            yield duree_attente
+        finally:
+            self._liberer(time.monotonic() - debut_generation)
+
+    def stats(self) -> Dict:
+        """Places occupées, file, compteurs et temps d'attente"""
+        with self._verrou:
+            admises = self._compteurs['admises']
+            return {
+                **self._compteurs,
+                'capacite': self.capacite,
+                'en_cours': self._en_cours,
+                'en_file': len(self._file),
+                'taille_file': self.taille_file,
+                'attente_moyenne_s': self._attente_totale / admises if admises else 0.0,
+                'attente_max_s': self._attente_max_observee,
+                'duree_generation_moyenne_s': self._duree_moyenne,
+            }
+
+
+class GenerationsPartagees:
+    """
+    Regroupe les requêtes identiques arrivées pendant qu'une génération est
+    en cours: seule la première génère, les suivantes reçoivent son résultat
+    """
+
+    def __init__(self):
+        self._en_vol: Dict[Hashable, Future] = {}
+        self._verrou = threading.Lock()
+        self.partagees = 0
+
+    def _rejoindre(self, cle: Hashable) -> Tuple[Future, bool]:
+        """Future de la génération en cours pour cette clé, et True si on la mène"""
+        with self._verrou:
+            futur = self._en_vol.get(cle)
+            if futur is not None:
+                self.partagees += 1
+                return futur, False
+            futur = Future()
+            self._en_vol[cle] = futur
+            return futur, True
+
+    def _terminer(self, cle: Hashable):
+        with self._verrou:
+            self._en_vol.pop(cle, None)
+
+    def executer(self, cle: Hashable, fonction: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Exécute fonction() sauf si une exécution de même clé est en cours
+
+        Returns:
+            Tuple (résultat, True si le résultat vient d'une autre requête)
+        """
+        futur, meneur = self._rejoindre(cle)
+        if not meneur:
+            return futur.result(), True
+        try:
+            resultat = fonction()
+        except BaseException as e:
+            futur.set_exception(e)
+            raise
+        else:
+            futur.set_result(resultat)
+            return resultat, False
+        finally:
+            self._terminer(cle)
+
+    async def aexecuter(self, cle: Hashable, fonction: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """Version asynchrone de executer(): fonction() retourne un awaitable"""
+        futur, meneur = self._rejoindre(cle)
+        if not meneur:
+            return await asyncio.wrap_future(futur), True
+        try:
+            resultat = await fonction()
+        except BaseException as e:
+            futur.set_exception(e)
+            raise
+        else:
+            futur.set_result(resultat)
+            return resultat, False
+        finally:
+            self._terminer(cle)
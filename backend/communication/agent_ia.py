@@ -1,30 +1,126 @@
 """
 Système RAG pour Documents Administratifs
 Création d'embeddings et recherche sémantique
-FIX: Force l'utilisation du CPU pour les embeddings
+Backend d'embeddings configurable: PyTorch, ONNX Runtime ou ONNX int8
 """
 
 # Installation requise (à exécuter une fois):
 # pip install sentence-transformers chromadb pypdf langchain-text-splitters requests beautifulsoup4 ollama
 
 import os
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
-import PyPDF2
+import sys
+import logging
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterator, Tuple, Callable, Optional
 import json
-import requests
-from bs4 import BeautifulSoup
-from urllib.robotparser import RobotFileParser
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 import time
-import ollama
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+
+try:
+    from .cache_semantique import CacheSemantique
+    from .contexte import TOKENIZER_DEFAUT, CompteurTokens, emballer_contexte
+    from .suivi_ollama import SuiviOllama
+    from .routeur_llm import RouteurLLM, ServeursIndisponibles
+    from .admission import ControleAdmission, GenerationsPartagees, RefusAdmission
+    from .batch_embeddings import BatcheurEmbeddings
+    from .embeddings import charger_modele_embeddings
+    from .crawler import CrawlerWeb
+    from .index_bm25 import IndexBM25, fusion_rrf
+    from .index_memoire import FORMAT_EXPORT, IndexMemoire, completer_quantifications, exporter_collection
+    from .reranking import MODELE_RERANKING_DEFAUT, ReordonnanceurPassages
+    from .decoupage import DecoupeurTexte
+    from .manifeste import ManifesteIngestion, empreinte_fichier, empreinte_texte, prefixe_ids
+    from .metriques import registre as registre_metriques
+    from . import ingestion, metadonnees
+except ImportError:
+    # Exécution directe du script (python agent_ia.py)
+    from cache_semantique import CacheSemantique
+    from contexte import TOKENIZER_DEFAUT, CompteurTokens, emballer_contexte
+    from suivi_ollama import SuiviOllama
+    from routeur_llm import RouteurLLM, ServeursIndisponibles
+    from admission import ControleAdmission, GenerationsPartagees, RefusAdmission
+    from batch_embeddings import BatcheurEmbeddings
+    from embeddings import charger_modele_embeddings
+    from crawler import CrawlerWeb
+    from index_bm25 import IndexBM25, fusion_rrf
+    from index_memoire import FORMAT_EXPORT, IndexMemoire, completer_quantifications, exporter_collection
+    from reranking import MODELE_RERANKING_DEFAUT, ReordonnanceurPassages
+    from decoupage import DecoupeurTexte
+    from manifeste import ManifesteIngestion, empreinte_fichier, empreinte_texte, prefixe_ids
+    from metriques import registre as registre_metriques
+    import ingestion
+    import metadonnees
+
+logger = logging.getLogger(__name__)
 
 class RAGDocumentProcessor:
+    # Paramètres de génération Ollama communs à tous les modes
+    OPTIONS_GENERATION = {
+        'temperature': 0.3,  # Réponses plus précises
+        'top_p': 0.9,
+        'num_predict': 500,  # Limiter la longueur de la réponse
+    }
+    
+    # Instructions fixes, envoyées en tête de chaque requête: Ollama garde ce
+    # préfixe dans son cache KV et ne le réévalue pas à chaque question
+    INSTRUCTIONS_SYSTEME = """Tu es un assistant spécialisé dans les procédures administratives. Réponds à la question en te basant UNIQUEMENT sur les informations du contexte documentaire fourni.
+
+INSTRUCTIONS:
+- Réponds en français de manière claire et structurée
+- Base-toi UNIQUEMENT sur les informations du contexte fourni
+- Si l'information n'est pas dans le contexte, dis-le clairement
+- Cite les sources entre crochets [Source: nom_document]
+- Sois précis et concis"""
+    
+    # Chevauchement entre chunks consécutifs (tokens du modèle d'embeddings,
+    # en phrases entières); enregistré dans le manifeste d'ingestion
+    OVERLAP_TOKENS_CHUNK = 24
+    
+    # Chunks embeddés et ajoutés à ChromaDB en un appel par traiter_dossier
+    TAILLE_LOT_INGESTION = 256
+    
+    # Tentatives d'une génération du lot refusée par le contrôle d'admission
+    TENTATIVES_LOT = 3
+    
+    # Candidats BM25 lus par candidat gardé quand des filtres en écartent une partie
+    FACTEUR_BM25_FILTRES = 4
+    
     def __init__(self, model_name="sentence-transformers/paraphrase-multilingual-mpnet-base-v2", db_path=None, 
-                 llm_model="mistral:latest", ollama_host=os.getenv("OLLAMA_HOST")):
+                 llm_model="mistral:latest", ollama_host=os.getenv("OLLAMA_HOST"),
+                 ollama_hosts=os.getenv("OLLAMA_HOSTS"),
+                 ollama_timeout=float(os.getenv("OLLAMA_TIMEOUT", "120")),
+                 llm_concurrence=int(os.getenv("RAG_LLM_CONCURRENCE", "2")),
+                 llm_file=int(os.getenv("RAG_LLM_FILE", "32")),
+                 llm_attente_max=float(os.getenv("RAG_LLM_ATTENTE_MAX", "20")),
+                 dedoublonnage=os.getenv("RAG_DEDOUBLONNAGE", "1") == "1",
+                 max_workers=int(os.getenv("RAG_MAX_WORKERS", "4")),
+                 cache_seuil=float(os.getenv("RAG_CACHE_SEUIL", "0.95")),
+                 cache_taille=int(os.getenv("RAG_CACHE_TAILLE", "1000")),
+                 cache_ttl=float(os.getenv("RAG_CACHE_TTL", "3600")),
+                 batch_attente_ms=float(os.getenv("RAG_BATCH_ATTENTE_MS", "2")),
+                 batch_taille_max=int(os.getenv("RAG_BATCH_TAILLE_MAX", "32")),
+                 embedding_backend=os.getenv("RAG_EMBEDDINGS_BACKEND", "torch"),
+                 embedding_device=os.getenv("RAG_EMBEDDINGS_DEVICE"),
+                 chunk_max_tokens=int(os.getenv("RAG_CHUNK_MAX_TOKENS", "0")),
+                 recherche_hybride=os.getenv("RAG_RECHERCHE_HYBRIDE", "1") == "1",
+                 reranking=os.getenv("RAG_RERANKING", "0") == "1",
+                 moteur_recherche=os.getenv("RAG_MOTEUR_RECHERCHE", "chroma"),
+                 index_ivf_listes=int(os.getenv("RAG_INDEX_IVF_LISTES", "0")),
+                 index_ivf_sondes=int(os.getenv("RAG_INDEX_IVF_SONDES", "8")),
+                 index_quantification=os.getenv("RAG_INDEX_QUANTIFICATION", "float32"),
+                 index_rescoring=os.getenv("RAG_INDEX_RESCORING", "float32"),
+                 index_facteur_rescoring=int(os.getenv("RAG_INDEX_FACTEUR_RESCORING", "10")),
+                 reranking_modele=os.getenv("RAG_RERANKING_MODELE", MODELE_RERANKING_DEFAUT),
+                 reranking_candidats=int(os.getenv("RAG_RERANKING_CANDIDATS", "30")),
+                 reranking_budget_ms=float(os.getenv("RAG_RERANKING_BUDGET_MS", "300")),
+                 budget_tokens_prompt=int(os.getenv("RAG_BUDGET_TOKENS_PROMPT", "1500")),
+                 tokenizer=os.getenv("RAG_TOKENIZER", TOKENIZER_DEFAUT),
+                 mode_generation=os.getenv("RAG_MODE_GENERATION", "chat"),
+                 keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+                 suivi: Optional[Callable[[str], None]] = None):
         """
         Initialise le système RAG avec un modèle d'embeddings multilingue
         
@@ -33,13 +129,79 @@ class RAGDocumentProcessor:
             db_path: Chemin vers la base de données ChromaDB (défaut: ./chroma_db)
             llm_model: Modèle Ollama pour la génération (défaut: mistral:latest)
             ollama_host: URL du serveur Ollama (défaut: local)
+            ollama_hosts: URLs de plusieurs serveurs Ollama séparées par des
+                          virgules (remplace ollama_host): les générations
+                          sont réparties entre eux
+            ollama_timeout: Timeout d'une requête Ollama avant bascule (s)
+            llm_concurrence: Générations simultanées par serveur Ollama
+            llm_file: Requêtes en attente de génération au-delà desquelles
+                      les nouvelles sont refusées (429)
+            llm_attente_max: Attente maximale dans la file de génération (s)
+            dedoublonnage: Partager une génération en cours entre les
+                           requêtes identiques
+            max_workers: Nombre de threads pour l'embedding et ChromaDB
+                         dans le chemin asynchrone
+            cache_seuil: Similarité cosinus minimale pour réutiliser une réponse
+            cache_taille: Nombre maximal de réponses en cache (0 = désactivé)
+            cache_ttl: Durée de vie d'une réponse en cache (secondes)
+            batch_attente_ms: Attente max pour regrouper les embeddings de questions
+            batch_taille_max: Questions max par lot d'embeddings (1 = pas de batching)
+            embedding_backend: 'torch' (fp32), 'onnx' ou 'onnx-int8' (voir embeddings.py)
+            embedding_device: Périphérique des embeddings ('cpu', 'cuda'...)
+            chunk_max_tokens: Tokens maximum par chunk (0 = longueur maximale
+                              du modèle d'embeddings)
+            recherche_hybride: Fusionner les résultats vectoriels et BM25 (RRF)
+            reranking: Ré-ordonner les candidats avec un cross-encoder
+            moteur_recherche: 'chroma' (requête ChromaDB) ou 'memoire' (index
+                              numpy projeté en mémoire, voir index_memoire.py)
+            index_ivf_listes: Listes IVF de l'index en mémoire (0 = recherche exacte)
+            index_ivf_sondes: Listes IVF parcourues par requête
+            index_quantification: Stockage des vecteurs de l'index en mémoire:
+                                  'float32', 'float16', 'int8' ou 'binaire'
+            index_rescoring: Représentation du re-scoring des candidats binaires
+            index_facteur_rescoring: Candidats binaires re-scorés par résultat
+            reranking_modele: Modèle CrossEncoder du ré-ordonnancement
+            reranking_candidats: Candidats récupérés avant ré-ordonnancement
+            reranking_budget_ms: Budget de latence du ré-ordonnancement (ms)
+            budget_tokens_prompt: Taille maximale du prompt (tokens du modèle de génération)
+            tokenizer: Fichier tokenizer.json ou dépôt Hugging Face du
+                       tokenizer du modèle de génération (défaut: aucun,
+                       estimation par caractères)
+            mode_generation: 'chat' (instructions en message système) ou
+                             'generate' (prompt unique)
+            keep_alive: Durée pendant laquelle Ollama garde le modèle chargé
+                        après une requête ("30m", "-1" = toujours)
+            suivi: Fonction appelée avec 'modele' puis 'collection' au fil du
+                   chargement (suivi de disponibilité)
         """
-        print(f"📥 Chargement du modèle d'embeddings: {model_name}")
+        # Import différé: chromadb est lent à importer, le module doit rester
+        # léger pour les commandes Django qui n'utilisent pas le système RAG
+        import chromadb
+        
+        print(f"📥 Chargement du modèle d'embeddings: {model_name} (backend: {embedding_backend})")
         
-        # ⚠️ FIX CRITIQUE: Forcer l'utilisation du CPU
-        print("🔧 Configuration: Embeddings sur CPU (GPU incompatible)")
-       # self.embedding_model = SentenceTransformer(model_name, device='cpu')
-        self.embedding_model = SentenceTransformer(model_name)
+        # ⚠️ Sur une machine dont le GPU est incompatible, forcer le CPU
+        # avec RAG_EMBEDDINGS_DEVICE=cpu
+        self.embedding_model = charger_modele_embeddings(
+            model_name,
+            backend=embedding_backend,
+            device=embedding_device
+        )
+        self.model_name = model_name
+        self.embedding_backend = embedding_backend
+        
+        # Chunks dimensionnés avec le tokenizer du modèle d'embeddings: au-delà
+        # de sa longueur maximale, la fin d'un chunk serait tronquée
+        if not chunk_max_tokens:
+            longueur_max = getattr(self.embedding_model, 'max_seq_length', None) or 128
+            chunk_max_tokens = longueur_max - 2  # tokens spéciaux de début et de fin
+        self.decoupeur = DecoupeurTexte(
+            getattr(self.embedding_model, 'tokenizer', None),
+            max_tokens=chunk_max_tokens,
+            overlap_tokens=self.OVERLAP_TOKENS_CHUNK
+        )
+        if suivi:
+            suivi('modele')
         
         # Base de données vectorielle locale
         # Si db_path n'est pas fourni, utiliser le chemin relatif
@@ -48,6 +210,7 @@ class RAGDocumentProcessor:
         
         print(f"📂 Chemin de la base de données: {db_path}")
         print(f"📂 Type de chemin: {type(db_path)}")
+        self.db_path = db_path
         self.chroma_client = chromadb.PersistentClient(path=db_path)
         self.collection = self.chroma_client.get_or_create_collection(
             name="documents_administratifs",
@@ -57,72 +220,273 @@ class RAGDocumentProcessor:
         # Afficher le nombre de documents dans la base
         count = self.collection.count()
         print(f"📊 {count} chunks dans la base de données")
+        if suivi:
+            suivi('collection')
+        
+        # Manifeste d'ingestion: empreinte et chunks de chaque document indexé
+        self.manifeste = ManifesteIngestion(db_path)
+        
+        # Index lexical BM25 sur les mêmes chunks, sauvegardé à côté de ChromaDB
+        self.recherche_hybride = recherche_hybride
+        self.index_bm25 = IndexBM25.charger(db_path)
+        if recherche_hybride and len(self.index_bm25) != count:
+            self.reconstruire_index_bm25()
+        
+        # Index vectoriel en mémoire, exporté depuis ChromaDB et partagé
+        # entre les workers par le cache de pages du système
+        if moteur_recherche not in ('chroma', 'memoire'):
+            raise ValueError(f"Moteur de recherche inconnu: {moteur_recherche} (attendu: chroma, memoire)")
+        self.index_memoire = None
+        self.index_ivf_listes = index_ivf_listes
+        self.index_ivf_sondes = index_ivf_sondes
+        self.index_quantification = index_quantification
+        self.index_rescoring = index_rescoring
+        self.index_facteur_rescoring = index_facteur_rescoring
+        if moteur_recherche == 'memoire':
+            self.charger_index_memoire()
+        
+        # Ré-ordonnancement optionnel des candidats par un cross-encoder
+        self.reordonnanceur = None
+        self.reranking_candidats = reranking_candidats
+        if reranking:
+            print(f"📥 Chargement du cross-encoder: {reranking_modele}")
+            self.reordonnanceur = ReordonnanceurPassages(
+                reranking_modele,
+                device=embedding_device,
+                budget_ms=reranking_budget_ms
+            )
         
         # Configuration Ollama pour la génération de réponses
         self.llm_model = llm_model
-        self.ollama_host = ollama_host
+        self.budget_tokens_prompt = budget_tokens_prompt
+        self.compteur_tokens = CompteurTokens(tokenizer or None)
+        if mode_generation not in ('chat', 'generate'):
+            raise ValueError(f"Mode de génération inconnu: {mode_generation} (attendu: chat, generate)")
+        self.mode_generation = mode_generation
+        self.keep_alive = keep_alive
+        self.suivi_ollama = SuiviOllama()
         
-        if ollama_host:
-            print(f"🌐 Connexion au serveur Ollama distant: {ollama_host}")
-            self.ollama_client = ollama.Client(host=ollama_host)
-        else:
-            print(f"💻 Utilisation du serveur Ollama local")
-            self.ollama_client = ollama.Client()
+        # Histogrammes de latence par étape (exportés sur /api/metrics/)
+        self.metriques = registre_metriques
+        
+        # Routeur: serveur le moins chargé, bascule sur un autre en cas d'erreur
+        hotes = RouteurLLM.hotes_depuis_env(ollama_hosts, defaut=ollama_host)
+        for hote in hotes:
+            if hote:
+                print(f"🌐 Connexion au serveur Ollama distant: {hote}")
+            else:
+                print(f"💻 Utilisation du serveur Ollama local")
+        self.routeur_llm = RouteurLLM(hotes, timeout=ollama_timeout, concurrence=llm_concurrence,
+                                      attente_place=llm_attente_max)
+        self.ollama_host = hotes[0]
+        self.ollama_client = self.routeur_llm.serveurs[0].client
+        
+        # Contrôle d'admission: file bornée commune, refus rapide avec
+        # Retry-After au-delà; ses llm_concurrence places par serveur
+        # alimentent celles du routeur, qui limite chaque serveur à
+        # llm_concurrence générations simultanées
+        self.controle_admission = ControleAdmission(
+            capacite=llm_concurrence * len(hotes),
+            taille_file=llm_file,
+            attente_max=llm_attente_max
+        )
+        self.generations_partagees = GenerationsPartagees() if dedoublonnage else None
+        
+        # Chemin asynchrone: embedding et ChromaDB sont bloquants, ils passent
+        # par un pool de threads borné
+        self._executeur = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag")
+        
+        # Micro-batching des embeddings de questions concurrentes
+        self.batcheur_embeddings = None
+        if batch_taille_max > 1:
+            self.batcheur_embeddings = BatcheurEmbeddings(
+                self.embedding_model,
+                attente_max_ms=batch_attente_ms,
+                taille_max_batch=batch_taille_max
+            )
+        
+        # Crawler web (sessions keep-alive, robots.txt et politesse par hôte)
+        self.crawler = CrawlerWeb(
+            delai_par_hote=float(os.getenv("RAG_CRAWLER_DELAI", "1")),
+            max_hotes_simultanes=int(os.getenv("RAG_CRAWLER_HOTES", "8"))
+        )
+        
+        # Cache sémantique des réponses (invalidé à chaque ajout de documents)
+        self.cache_reponses = CacheSemantique(
+            seuil_similarite=cache_seuil,
+            taille_max=cache_taille,
+            ttl=cache_ttl
+        )
         
         print(f"🤖 Modèle de génération: {llm_model}")
         print("✅ Système initialisé")
     
     def lire_pdf(self, chemin_pdf: str) -> str:
         """Extrait le texte d'un fichier PDF"""
-        texte = ""
-        with open(chemin_pdf, 'rb') as fichier:
-            lecteur = PyPDF2.PdfReader(fichier)
-            for page in lecteur.pages:
-                texte += page.extract_text() + "\n"
-        return texte
+        return ingestion.lire_pdf(chemin_pdf)
     
     def lire_txt(self, chemin_txt: str) -> str:
         """Lit un fichier texte"""
-        with open(chemin_txt, 'r', encoding='utf-8') as f:
-            return f.read()
+        return ingestion.lire_txt(chemin_txt)
     
     def decouper_texte(self, texte: str, taille_chunk=500, overlap=50) -> List[str]:
         """
-        Découpe le texte en chunks (morceaux) pour de meilleurs embeddings
+        Découpe le texte en chunks de taille fixe en caractères (découpage
+        historique, conservé pour comparaison: l'ingestion utilise self.decoupeur)
         
         Args:
             texte: Texte à découper
             taille_chunk: Nombre de caractères par chunk
             overlap: Chevauchement entre chunks
         """
-        chunks = []
-        debut = 0
+        return ingestion.decouper_texte(texte, taille_chunk, overlap)
+    
+    @property
+    def parametres_indexation(self) -> Dict:
+        """Paramètres dont dépendent les chunks indexés (un changement force la réindexation)"""
+        return {
+            'modele': self.model_name,
+            'backend': self.embedding_backend,
+            **self.decoupeur.parametres(),
+            'extraction_pdf': ingestion.backend_pdf(),
+            'metadonnees': metadonnees.VERSION_METADONNEES,
+        }
+    
+    @staticmethod
+    def _prefixe_cles_dossier(dossier: Path) -> str:
+        """Préfixe des clés du manifeste pour les fichiers d'un dossier"""
+        return f"fichier:{dossier.resolve().name}/"
+    
+    @staticmethod
+    def _categorie_dossier(dossier: Path, fichier: Path) -> Optional[str]:
+        """Catégorie imposée par le sous-dossier d'un document (None à la racine du dossier)"""
+        parties = fichier.relative_to(dossier).parts
+        return parties[0] if len(parties) > 1 else None
+    
+    def _supprimer_chunks_document(self, cle: str, source: str):
+        """
+        Supprime de la collection les chunks indexés pour un document
         
-        while debut < len(texte):
-            fin = debut + taille_chunk
-            chunk = texte[debut:fin]
-            
-            # Essayer de couper à la fin d'une phrase
-            if fin < len(texte):
-                dernier_point = chunk.rfind('.')
-                if dernier_point > taille_chunk * 0.5:
-                    chunk = chunk[:dernier_point + 1]
-                    fin = debut + dernier_point + 1
-            
-            chunks.append(chunk.strip())
-            debut = fin - overlap
+        Args:
+            cle: Clé du document dans le manifeste
+            source: Valeur de la métadonnée "source" (bases créées avant le manifeste)
+        """
+        ids = self.manifeste.ids(cle)
+        if not ids:
+            # Base créée avant le manifeste: retrouver les chunks par leur source
+            ids = self.collection.get(where={"source": source}, include=[])['ids']
+        if ids:
+            self.collection.delete(ids=ids)
+            self.index_bm25.supprimer(ids)
+    
+    def _indexer_chunks(self, chunks, prefixe: str, source: str, extension: str,
+                        categorie: Optional[str] = None) -> int:
+        """
+        Calcule les embeddings et indexe les chunks d'un document par lots
+        de TAILLE_LOT_INGESTION, au fur et à mesure de leur production
+        
+        Si la lecture échoue en cours de route, les chunks déjà indexés pour
+        ce document sont retirés avant de propager l'erreur.
         
-        return chunks
+        Les durées d'extraction et découpage (document entier), d'embedding
+        et d'écriture (par lot) alimentent rag_ingestion_duree_secondes.
+        
+        Args:
+            chunks: Itérable de (chunk, page ou None), par exemple ingestion.iterer_chunks
+            prefixe: Préfixe des ids des chunks
+            source: Valeur de la métadonnée "source"
+            extension: Valeur de la métadonnée "type"
+            categorie: Catégorie imposée (défaut: déduite du nom et du premier chunk)
+        
+        Returns:
+            int: Nombre de chunks indexés
+        """
+        ids_ajoutes = []
+        lot_textes, lot_metadatas = [], []
+        attributs = None
+        
+        duree_extraction = 0.0
+        
+        def vider_lot():
+            ids = [f"{prefixe}_{i}" for i in range(len(ids_ajoutes), len(ids_ajoutes) + len(lot_textes))]
+            with self.metriques.chronometrer('rag_ingestion_duree_secondes', etape='embedding'):
+                embeddings = self.embedding_model.encode(lot_textes, show_progress_bar=False)
+            with self.metriques.chronometrer('rag_ingestion_duree_secondes', etape='ecriture'):
+                self.collection.add(
+                    embeddings=embeddings.tolist(),
+                    documents=lot_textes,
+                    metadatas=lot_metadatas,
+                    ids=ids
+                )
+                self.index_bm25.ajouter(ids, lot_textes)
+            self.metriques.incrementer('rag_ingestion_chunks_total', len(ids))
+            ids_ajoutes.extend(ids)
+            lot_textes.clear()
+            lot_metadatas.clear()
+        
+        try:
+            # Le temps passé à attendre le chunk suivant est celui de
+            # l'extraction et du découpage
+            iterateur = iter(chunks)
+            while True:
+                instant = time.perf_counter()
+                suivant = next(iterateur, None)
+                duree_extraction += time.perf_counter() - instant
+                if suivant is None:
+                    break
+                chunk, page = suivant
+                chunk_id = len(ids_ajoutes) + len(lot_textes)
+                if attributs is None:
+                    attributs = metadonnees.attributs_document(source, chunk, categorie=categorie)
+                lot_textes.append(chunk)
+                lot_metadatas.append(ingestion.metadonnees_chunk(source, chunk_id, extension, page, attributs))
+                if len(lot_textes) >= self.TAILLE_LOT_INGESTION:
+                    vider_lot()
+            if lot_textes:
+                vider_lot()
+            self.metriques.observer('rag_ingestion_duree_secondes', duree_extraction, etape='extraction_decoupage')
+        except Exception:
+            if ids_ajoutes:
+                self.collection.delete(ids=ids_ajoutes)
+                self.index_bm25.supprimer(ids_ajoutes)
+            raise
+        return len(ids_ajoutes)
+    
+    def _supprimer_orphelins(self, prefixe_cles: str, cles_vues: set) -> int:
+        """
+        Supprime les chunks des documents du manifeste qui n'existent plus
+        
+        Returns:
+            int: Nombre de documents supprimés
+        """
+        orphelins = self.manifeste.cles(prefixe_cles) - cles_vues
+        for cle in orphelins:
+            print(f"  🗑️  Document supprimé: {cle}")
+            ids = self.manifeste.ids(cle)
+            if ids:
+                self.collection.delete(ids=ids)
+                self.index_bm25.supprimer(ids)
+            self.manifeste.supprimer(cle)
+        return len(orphelins)
     
     def traiter_dossier(self, chemin_dossier: str):
         """
         Traite tous les documents d'un dossier et crée les embeddings
         
+        La réindexation est incrémentale: les documents inchangés depuis le
+        dernier passage (même contenu, même modèle, même découpage) sont
+        ignorés, les documents modifiés remplacent leurs anciens chunks et
+        ceux qui ont disparu du dossier sont retirés de la base.
+        
         Args:
             chemin_dossier: Chemin vers le dossier contenant les documents
         """
         dossier = Path(chemin_dossier)
+        prefixe_cles = self._prefixe_cles_dossier(dossier)
+        parametres = self.parametres_indexation
+        cles_vues = set()
         documents_traites = 0
+        documents_inchanges = 0
         
         print(f"\n📂 Traitement du dossier: {chemin_dossier}")
         
@@ -130,167 +494,1136 @@ class RAGDocumentProcessor:
             if not fichier.is_file():
                 continue
             
+            suffixe = fichier.suffix.lower()
+            if suffixe not in ingestion.EXTENSIONS_PDF + ingestion.EXTENSIONS_TEXTE:
+                continue
+            
+            cle = prefixe_cles + fichier.relative_to(dossier).as_posix()
+            cles_vues.add(cle)
+            
             try:
-                # Lire selon le type de fichier
-                if fichier.suffix.lower() == '.pdf':
-                    print(f"  📄 Traitement PDF: {fichier.name}")
-                    texte = self.lire_pdf(str(fichier))
-                elif fichier.suffix.lower() in ['.txt', '.md']:
-                    print(f"  📝 Traitement TXT: {fichier.name}")
-                    texte = self.lire_txt(str(fichier))
-                else:
+                # Ignorer les documents inchangés
+                empreinte = empreinte_fichier(fichier)
+                if self.manifeste.est_a_jour(cle, empreinte, parametres):
+                    documents_inchanges += 1
                     continue
                 
-                # Découper en chunks
-                chunks = self.decouper_texte(texte)
-                print(f"    ✂️  {len(chunks)} chunks créés")
-                
-                # Créer les embeddings
-                print(f"    🧮 Création des embeddings ...")
-                embeddings = self.embedding_model.encode(chunks, show_progress_bar=False)
+                if suffixe in ingestion.EXTENSIONS_PDF:
+                    print(f"  📄 Traitement PDF: {fichier.name}")
+                else:
+                    print(f"  📝 Traitement TXT: {fichier.name}")
                 
-                # Ajouter à la base vectorielle
-                ids = [f"{fichier.stem}_{i}" for i in range(len(chunks))]
-                metadatas = [
-                    {
-                        "source": fichier.name,
-                        "chunk_id": i,
-                        "type": fichier.suffix
-                    } for i in range(len(chunks))
-                ]
+                # Remplacer les anciens chunks du document
+                self._supprimer_chunks_document(cle, fichier.name)
                 
-                self.collection.add(
-                    embeddings=embeddings.tolist(),
-                    documents=chunks,
-                    metadatas=metadatas,
-                    ids=ids
+                # Découper au fil de la lecture et indexer par lots: seuls
+                # quelques pages et un lot de chunks sont en mémoire
+                prefixe = prefixe_ids(fichier.stem, cle)
+                nb_chunks = self._indexer_chunks(
+                    ingestion.iterer_chunks(str(fichier), decoupeur=self.decoupeur,
+                                            n_workers=os.cpu_count() or 1),
+                    prefixe, fichier.name, fichier.suffix, self._categorie_dossier(dossier, fichier)
                 )
+                print(f"    ✂️  {nb_chunks} chunks créés et indexés")
+                
+                self.manifeste.enregistrer(cle, empreinte, prefixe, nb_chunks, parametres)
+                self.manifeste.sauvegarder()
                 
                 documents_traites += 1
+                self.cache_reponses.invalider()
                 print(f"    ✅ Document traité et indexé")
                 
             except Exception as e:
                 print(f"    ❌ Erreur: {e}")
         
-        print(f"\n🎉 Traitement terminé: {documents_traites} documents traités")
+        documents_supprimes = self._supprimer_orphelins(prefixe_cles, cles_vues)
+        if documents_supprimes:
+            self.manifeste.sauvegarder()
+            self.cache_reponses.invalider()
+        self.index_bm25.sauvegarder(self.db_path)
+        self._actualiser_index_memoire()
+        
+        print(f"\n🎉 Traitement terminé: {documents_traites} documents traités, "
+              f"{documents_inchanges} inchangés, {documents_supprimes} supprimés")
+        print(f"📊 Total d'éléments dans la base: {self.collection.count()}")
+    
+    def traiter_dossier_pipeline(self, chemin_dossier: str, n_workers=None, taille_batch=256) -> Dict:
+        """
+        Variante parallèle de traiter_dossier pour les gros volumes
+        
+        Un pool de processus extrait et découpe les fichiers, les chunks de
+        plusieurs fichiers sont regroupés en lots de taille fixe pour les
+        embeddings, et un thread d'écriture ajoute les lots à ChromaDB.
+        Comme traiter_dossier, seuls les documents nouveaux ou modifiés sont
+        traités.
+        
+        Args:
+            chemin_dossier: Chemin vers le dossier contenant les documents
+            n_workers: Processus d'extraction (défaut: nombre de coeurs)
+            taille_batch: Nombre de chunks par lot d'embeddings
+        
+        Returns:
+            Dict: statistiques (fichiers, chunks, durée, fichiers/s, chunks/s)
+        """
+        dossier = Path(chemin_dossier)
+        prefixe_cles = self._prefixe_cles_dossier(dossier)
+        parametres = self.parametres_indexation
+        extensions = ingestion.EXTENSIONS_PDF + ingestion.EXTENSIONS_TEXTE
+        
+        # Sélectionner les documents nouveaux ou modifiés
+        a_traiter = {}
+        cles_vues = set()
+        for fichier in dossier.rglob('*'):
+            if not fichier.is_file() or fichier.suffix.lower() not in extensions:
+                continue
+            cle = prefixe_cles + fichier.relative_to(dossier).as_posix()
+            cles_vues.add(cle)
+            empreinte = empreinte_fichier(fichier)
+            if not self.manifeste.est_a_jour(cle, empreinte, parametres):
+                a_traiter[str(fichier)] = (cle, empreinte, prefixe_ids(fichier.stem, cle))
+        
+        pipeline = ingestion.PipelineIngestion(
+            self.embedding_model,
+            self.collection,
+            n_workers=n_workers,
+            taille_batch=taille_batch,
+            index_bm25=self.index_bm25,
+            decoupeur=self.decoupeur
+        )
+        print(f"\n📂 Traitement parallèle du dossier: {chemin_dossier}")
+        print(f"⚙️  {pipeline.n_workers} processus d'extraction, lots de {taille_batch} chunks")
+        print(f"📋 {len(a_traiter)} documents à indexer, {len(cles_vues) - len(a_traiter)} inchangés")
+        
+        # Retirer les anciens chunks des documents modifiés
+        for chemin, (cle, _, _) in a_traiter.items():
+            self._supprimer_chunks_document(cle, Path(chemin).name)
+        
+        stats = pipeline.traiter(
+            [Path(chemin) for chemin in a_traiter],
+            prefixes_ids={chemin: prefixe for chemin, (_, _, prefixe) in a_traiter.items()},
+            categories={chemin: self._categorie_dossier(dossier, Path(chemin)) for chemin in a_traiter}
+        )
+        
+        for chemin, nb_chunks in stats['chunks_par_fichier'].items():
+            cle, empreinte, prefixe = a_traiter[chemin]
+            self.manifeste.enregistrer(cle, empreinte, prefixe, nb_chunks, parametres)
+        stats['supprimes'] = self._supprimer_orphelins(prefixe_cles, cles_vues)
+        self.manifeste.sauvegarder()
+        self.index_bm25.sauvegarder(self.db_path)
+        self._actualiser_index_memoire()
+        self.cache_reponses.invalider()
+        
+        print(f"\n🎉 Traitement terminé: {stats['fichiers']} documents, {stats['chunks']} chunks "
+              f"en {stats['duree']:.1f}s ({stats['supprimes']} supprimés)")
+        print(f"🚀 Débit: {stats['fichiers_par_s']:.2f} fichiers/s, {stats['chunks_par_s']:.1f} chunks/s")
         print(f"📊 Total d'éléments dans la base: {self.collection.count()}")
+        return stats
+    
+    def reconstruire_index_bm25(self, taille_page=5000):
+        """
+        Reconstruit l'index BM25 à partir des chunks de ChromaDB
+        (base créée avant l'index, ou index désynchronisé)
+        """
+        print(f"🔤 Reconstruction de l'index BM25...")
+        self.index_bm25.vider()
+        offset = 0
+        while True:
+            page = self.collection.get(include=['documents'], limit=taille_page, offset=offset)
+            if not page['ids']:
+                break
+            self.index_bm25.ajouter(page['ids'], page['documents'])
+            offset += len(page['ids'])
+        self.index_bm25.sauvegarder(self.db_path)
+        print(f"🔤 Index BM25: {len(self.index_bm25)} chunks")
+    
+    def _version_index_memoire(self) -> Dict:
+        """Ce qui doit correspondre entre l'index en mémoire et la base pour le réutiliser"""
+        return {
+            'format': FORMAT_EXPORT,
+            'nb_chunks': self.collection.count(),
+            'manifeste': empreinte_texte(json.dumps(self.manifeste.documents, sort_keys=True)),
+            'listes_ivf': self.index_ivf_listes,
+        }
     
-    def rechercher(self, question: str, n_resultats=3) -> List[Dict]:
+    def charger_index_memoire(self):
+        """
+        Charge l'index vectoriel en mémoire, après l'avoir (ré)exporté depuis
+        ChromaDB s'il manque ou ne correspond plus à la base
+        """
+        dossier = IndexMemoire.dossier_de(self.db_path)
+        version = self._version_index_memoire()
+        try:
+            with open(dossier / "index.json", encoding="utf-8") as f:
+                a_jour = json.load(f).get('parametres') == version
+        except (OSError, ValueError):
+            a_jour = False
+        if not a_jour:
+            print(f"🧮 Export de l'index vectoriel en mémoire...")
+            debut = time.perf_counter()
+            exporter_collection(self.collection, dossier, n_listes=self.index_ivf_listes, parametres=version)
+            print(f"🧮 Index exporté en {time.perf_counter() - debut:.1f}s")
+        quantifications = [self.index_quantification]
+        if self.index_quantification == 'binaire':
+            quantifications.append(self.index_rescoring)
+        if completer_quantifications(dossier, quantifications):
+            print(f"🧮 Représentations ajoutées: {', '.join(quantifications)}")
+        self.index_memoire = IndexMemoire(
+            dossier,
+            n_sondes=self.index_ivf_sondes,
+            quantification=self.index_quantification,
+            rescoring=self.index_rescoring,
+            facteur_rescoring=self.index_facteur_rescoring
+        )
+        mode = f"IVF {self.index_ivf_listes} listes, {self.index_memoire.n_sondes} sondées" \
+            if self.index_memoire.n_sondes else "exact"
+        mode += f", {self.index_quantification}"
+        if self.index_quantification == 'binaire':
+            mode += f" re-scoré en {self.index_rescoring}"
+        print(f"🧮 Index en mémoire: {len(self.index_memoire)} chunks ({mode})")
+    
+    def _actualiser_index_memoire(self):
+        """Ré-exporte l'index en mémoire après une ingestion (moteur 'memoire' uniquement)"""
+        if self.index_memoire is not None:
+            self.charger_index_memoire()
+    
+    def encoder_question(self, question: str) -> np.ndarray:
+        """
+        Calcule l'embedding d'une question, regroupé avec les questions
+        concurrentes quand le micro-batching est actif
+        """
+        if self.batcheur_embeddings is not None:
+            return self.batcheur_embeddings.encoder(question)
+        return self.embedding_model.encode([question])[0]
+    
+    def _mesurer(self, etape: str, debut: float, fin: Optional[float] = None) -> float:
+        """
+        Enregistre la durée d'une étape dans l'histogramme rag_etape_duree_secondes
+        
+        Args:
+            etape: Nom de l'étape (étiquette "etape")
+            debut: Instant de début (time.perf_counter)
+            fin: Instant de fin (défaut: maintenant)
+        
+        Returns:
+            float: Durée en ms
+        """
+        duree = (time.perf_counter() if fin is None else fin) - debut
+        self.metriques.observer('rag_etape_duree_secondes', duree, etape=etape)
+        return duree * 1000
+    
+    def rechercher(self, question: str, n_resultats=3, timings: Optional[Dict] = None,
+                   filtres: Optional[Dict] = None) -> List[Dict]:
         """
         Recherche les passages les plus pertinents pour une question
         
         Args:
             question: Question de l'utilisateur
             n_resultats: Nombre de résultats à retourner
+            timings: Dict complété avec la durée de chaque étape (ms), voir
+                     rechercher_avec_embedding
+            filtres: Restriction aux chunks dont les métadonnées correspondent,
+                     voir rechercher_avec_embedding
+        """
+        return self.rechercher_avec_embedding(question, n_resultats, timings, filtres)[1]
+    
+    def rechercher_avec_embedding(self, question: str, n_resultats=3, timings: Optional[Dict] = None,
+                                  filtres: Optional[Dict] = None) -> Tuple[np.ndarray, List[Dict]]:
         """
+        Comme rechercher(), mais retourne aussi l'embedding de la question
+        (réutilisé comme clé du cache sémantique)
+        
+        Args:
+            question: Question de l'utilisateur
+            n_resultats: Nombre de résultats à retourner
+            timings: Dict complété avec la durée de chaque étape en ms
+                     (embedding_ms, recherche_vectorielle_ms, bm25_ms,
+                     reranking_ms, total_ms); les étapes désactivées valent 0
+            filtres: {champ: valeur ou liste de valeurs} sur source,
+                     categorie, type_document, langue, origine ou page
+                     (voir metadonnees.normaliser_filtres): appliqués dans
+                     la recherche vectorielle (clause "where" de ChromaDB
+                     ou partitions de l'index en mémoire) et aux résultats BM25
+        
+        Returns:
+            Tuple (embedding de la question, passages)
+        
+        Raises:
+            ValueError: filtres invalides
+        """
+        filtres = metadonnees.normaliser_filtres(filtres)
+        debut = time.perf_counter()
+        etapes = {'embedding_ms': 0.0, 'recherche_vectorielle_ms': 0.0, 'bm25_ms': 0.0, 'reranking_ms': 0.0}
+        
         # Créer l'embedding de la question
-        question_embedding = self.embedding_model.encode([question])[0]
+        question_embedding = self.encoder_question(question)
+        instant = time.perf_counter()
+        etapes['embedding_ms'] = self._mesurer('embedding', debut, instant)
+        
+        n_premiere_etape, n_candidats = self._nombre_candidats(n_resultats)
+        passages = self._recherche_vectorielle([question_embedding], n_candidats, filtres)[0]
+        etapes['recherche_vectorielle_ms'] = self._mesurer('recherche_vectorielle', instant)
+        
+        passages = self._affiner_passages(question, question_embedding, passages,
+                                          n_resultats, n_premiere_etape, etapes, filtres)
+        
+        if timings is not None:
+            timings.update(etapes)
+            timings['total_ms'] = (time.perf_counter() - debut) * 1000
+        
+        return question_embedding, passages
+    
+    def rechercher_lot(self, questions: List[str], n_resultats=3, timings: Optional[Dict] = None,
+                       filtres: Optional[Dict] = None) -> Tuple[np.ndarray, List[List[Dict]]]:
+        """
+        Recherche pour plusieurs questions: un seul appel d'embedding et une
+        seule requête vectorielle multi-questions, puis fusion BM25 et
+        ré-ordonnancement question par question
+        
+        Args:
+            questions: Questions de l'utilisateur
+            n_resultats: Nombre de résultats par question
+            timings: Dict complété avec la durée de chaque étape pour tout
+                     le lot (ms, mêmes clés que rechercher_avec_embedding)
+            filtres: Filtres communs à toutes les questions (voir
+                     rechercher_avec_embedding)
         
-        # Rechercher dans la base vectorielle
+        Returns:
+            Tuple (embeddings des questions, passages de chaque question)
+        
+        Raises:
+            ValueError: filtres invalides
+        """
+        filtres = metadonnees.normaliser_filtres(filtres)
+        debut = time.perf_counter()
+        etapes = {'embedding_ms': 0.0, 'recherche_vectorielle_ms': 0.0, 'bm25_ms': 0.0, 'reranking_ms': 0.0}
+        if not questions:
+            return np.zeros((0, 0), dtype=np.float32), []
+        
+        # Le lot est déjà groupé: pas de micro-batching
+        embeddings = np.asarray(self.embedding_model.encode(questions))
+        instant = time.perf_counter()
+        etapes['embedding_ms'] = self._mesurer('embedding', debut, instant)
+        
+        n_premiere_etape, n_candidats = self._nombre_candidats(n_resultats)
+        passages_par_question = self._recherche_vectorielle(embeddings, n_candidats, filtres)
+        etapes['recherche_vectorielle_ms'] = self._mesurer('recherche_vectorielle', instant)
+        
+        passages_par_question = [
+            self._affiner_passages(question, embedding, passages, n_resultats, n_premiere_etape, etapes, filtres)
+            for question, embedding, passages in zip(questions, embeddings, passages_par_question)
+        ]
+        
+        if timings is not None:
+            timings.update(etapes)
+            timings['total_ms'] = (time.perf_counter() - debut) * 1000
+        
+        return embeddings, passages_par_question
+    
+    def _nombre_candidats(self, n_resultats: int) -> Tuple[int, int]:
+        """
+        Candidats de la première étape et de la recherche vectorielle
+        
+        Returns:
+            Tuple (candidats avant ré-ordonnancement, candidats vectoriels)
+        """
+        # Le ré-ordonnancement part d'un ensemble de candidats plus large
+        n_premiere_etape = n_resultats
+        if self.reordonnanceur is not None:
+            n_premiere_etape = max(n_resultats, self.reranking_candidats)
+        
+        # En mode hybride, élargir les candidats de chaque méthode avant fusion
+        if self.recherche_hybride and len(self.index_bm25) > 0:
+            return n_premiere_etape, max(n_premiere_etape * 4, 20)
+        return n_premiere_etape, n_premiere_etape
+    
+    def _recherche_vectorielle(self, embeddings, n_candidats: int,
+                               filtres: Optional[Dict] = None) -> List[List[Dict]]:
+        """Les n_candidats passages les plus proches de chaque embedding (parmi ceux des filtres)"""
+        if self.index_memoire is not None:
+            # Index numpy projeté en mémoire (mêmes distances que ChromaDB)
+            return [self.index_memoire.passages(embedding, n_candidats, filtres) for embedding in embeddings]
+        
+        # Rechercher dans la base vectorielle, restreinte par les métadonnées
         resultats = self.collection.query(
-            query_embeddings=[question_embedding.tolist()],
-            n_results=n_resultats
+            query_embeddings=[np.asarray(embedding).tolist() for embedding in embeddings],
+            n_results=n_candidats,
+            where=metadonnees.clause_where(filtres)
         )
         
         # Formater les résultats
-        passages = []
-        for i in range(len(resultats['documents'][0])):
-            passages.append({
-                'texte': resultats['documents'][0][i],
-                'source': resultats['metadatas'][0][i]['source'],
-                'distance': resultats['distances'][0][i]
-            })
+        passages_par_question = []
+        for q in range(len(resultats['ids'])):
+            passages = []
+            for i in range(len(resultats['documents'][q])):
+                passages.append({
+                    'id': resultats['ids'][q][i],
+                    'texte': resultats['documents'][q][i],
+                    'source': resultats['metadatas'][q][i]['source'],
+                    'chunk_id': resultats['metadatas'][q][i].get('chunk_id'),
+                    'distance': resultats['distances'][q][i]
+                })
+            passages_par_question.append(passages)
+        return passages_par_question
+    
+    def _affiner_passages(self, question: str, question_embedding: np.ndarray, passages: List[Dict],
+                          n_resultats: int, n_premiere_etape: int, etapes: Dict,
+                          filtres: Optional[Dict] = None) -> List[Dict]:
+        """Fusion BM25 puis ré-ordonnancement (durées ajoutées à etapes)"""
+        if self.recherche_hybride and len(self.index_bm25) > 0:
+            instant = time.perf_counter()
+            passages = self._fusionner_bm25(question, question_embedding, passages, n_premiere_etape, filtres)
+            etapes['bm25_ms'] += self._mesurer('bm25', instant)
+        
+        if self.reordonnanceur is not None:
+            instant = time.perf_counter()
+            passages, _ = self.reordonnanceur.reordonner(question, passages, n_resultats)
+            etapes['reranking_ms'] += self._mesurer('reranking', instant)
         
         return passages
     
-    def generer_reponse(self, question: str, n_contextes=3) -> Dict:
+    def _fusionner_bm25(self, question: str, question_embedding: np.ndarray,
+                        passages: List[Dict], n_resultats: int, filtres: Optional[Dict] = None) -> List[Dict]:
         """
-        Génère une réponse complète avec Ollama en utilisant les passages pertinents
+        Fusionne les passages vectoriels et les meilleurs chunks BM25
+        (Reciprocal Rank Fusion) et retourne les n_resultats premiers
+        """
+        if filtres:
+            # L'index BM25 couvre toute la base: élargir puis écarter les
+            # chunks hors des filtres
+            lexicaux = [identifiant for identifiant, _ in
+                        self.index_bm25.rechercher(question, len(passages) * self.FACTEUR_BM25_FILTRES)]
+            lexicaux = self._filtrer_ids(lexicaux, filtres)[:len(passages)]
+        else:
+            lexicaux = [identifiant for identifiant, _ in self.index_bm25.rechercher(question, len(passages))]
+        fusion = fusion_rrf([[p['id'] for p in passages], lexicaux])[:n_resultats]
         
-        Args:
-            question: Question de l'utilisateur
-            n_contextes: Nombre de passages à utiliser comme contexte
+        # Compléter les chunks trouvés uniquement par BM25 (texte, source, distance)
+        par_id = {p['id']: p for p in passages}
+        manquants = [identifiant for identifiant, _ in fusion if identifiant not in par_id]
+        if manquants and self.index_memoire is not None:
+            for passage in self.index_memoire.passages_par_ids(manquants, question_embedding):
+                par_id[passage['id']] = passage
+        elif manquants:
+            complements = self.collection.get(ids=manquants, include=['documents', 'metadatas', 'embeddings'])
+            for identifiant, texte, metadata, embedding in zip(
+                complements['ids'], complements['documents'],
+                complements['metadatas'], complements['embeddings']
+            ):
+                par_id[identifiant] = {
+                    'id': identifiant,
+                    'texte': texte,
+                    'source': metadata['source'],
+                    'chunk_id': metadata.get('chunk_id'),
+                    # Même métrique que ChromaDB (L2 au carré)
+                    'distance': float(np.sum((question_embedding - np.asarray(embedding)) ** 2))
+                }
         
-        Returns:
-            Dict avec la réponse générée, les sources et les contextes utilisés
+        return [par_id[identifiant] for identifiant, _ in fusion if identifiant in par_id]
+    
+    def _filtrer_ids(self, ids: List[str], filtres: Dict) -> List[str]:
+        """Ids dont les métadonnées correspondent aux filtres, dans le même ordre"""
+        if not ids:
+            return []
+        if self.index_memoire is not None:
+            return self.index_memoire.filtrer_ids(ids, filtres)
+        gardes = set(self.collection.get(ids=list(ids), where=metadonnees.clause_where(filtres), include=[])['ids'])
+        return [identifiant for identifiant in ids if identifiant in gardes]
+    
+    def obtenir_chunks(self, ids: List[str]) -> List[Dict]:
         """
-        print(f"\n🔎 Recherche de contexte pour: {question}")
+        Texte et métadonnées de chunks par id (lecture paresseuse du texte
+        des passages par les clients qui n'ont demandé que les ids)
         
-        # 1. Rechercher les passages pertinents
-        contextes = self.rechercher(question, n_resultats=n_contextes)
+        Returns:
+            List[Dict]: chunks trouvés (id, texte, source, chunk_id, page,
+            categorie, type_document, langue, origine), dans l'ordre des
+            ids demandés
+        """
+        if self.index_memoire is not None:
+            return self.index_memoire.chunks_par_ids(ids)
         
-        if not contextes:
-            return {
-                'reponse': "Désolé, je n'ai pas trouvé d'information pertinente dans les documents.",
-                'sources': [],
-                'contextes_utilises': []
+        trouves = self.collection.get(ids=list(ids), include=['documents', 'metadatas'])
+        par_id = {
+            identifiant: {
+                'id': identifiant,
+                'texte': texte,
+                'source': metadata['source'],
+                'chunk_id': metadata.get('chunk_id'),
+                'page': metadata.get('page'),
+                **{champ: metadata.get(champ) for champ in metadonnees.CHAMPS_DOCUMENT}
             }
+            for identifiant, texte, metadata in zip(trouves['ids'], trouves['documents'], trouves['metadatas'])
+        }
+        return [par_id[identifiant] for identifiant in ids if identifiant in par_id]
+    
+    def construire_message(self, question: str, contextes: List[Dict]) -> str:
+        """
+        Partie variable du prompt: contexte documentaire et question
         
-        # 2. Construire le contexte pour le LLM
+        Args:
+            question: Question de l'utilisateur
+            contextes: Passages retournés par rechercher()
+        """
         contexte_texte = "\n\n".join([
             f"[Source: {c['source']}]\n{c['texte']}" 
             for c in contextes
         ])
         
-        # 3. Créer le prompt
-        prompt = f"""Tu es un assistant spécialisé dans les procédures administratives. Réponds à la question en te basant UNIQUEMENT sur les informations fournies ci-dessous.
-
-CONTEXTE DOCUMENTAIRE:
+        return f"""CONTEXTE DOCUMENTAIRE:
 {contexte_texte}
 
-QUESTION: {question}
+QUESTION: {question}"""
+    
+    def construire_prompt(self, question: str, contextes: List[Dict]) -> str:
+        """
+        Construit le prompt complet (mode generate): les instructions fixes
+        en tête, pour qu'Ollama réutilise ce préfixe d'une requête à l'autre
+        
+        Args:
+            question: Question de l'utilisateur
+            contextes: Passages retournés par rechercher()
+        """
+        return f"""{self.INSTRUCTIONS_SYSTEME}
 
-INSTRUCTIONS:
-- Réponds en français de manière claire et structurée
-- Base-toi UNIQUEMENT sur les informations du contexte fourni
-- Si l'information n'est pas dans le contexte, dis-le clairement
-- Cite les sources entre crochets [Source: nom_document]
-- Sois précis et concis
+{self.construire_message(question, contextes)}
 
 RÉPONSE:"""
-
-        print(f"🤖 Génération de la réponse avec {self.llm_model}...")
+    
+    def construire_messages(self, question: str, contextes: List[Dict]) -> List[Dict]:
+        """Messages du mode chat: instructions en message système, puis contexte et question"""
+        return [
+            {'role': 'system', 'content': self.INSTRUCTIONS_SYSTEME},
+            {'role': 'user', 'content': self.construire_message(question, contextes)},
+        ]
+    
+    def preparer_prompt(self, question: str, passages: List[Dict]) -> Tuple[str, List[Dict], Dict]:
+        """
+        Assemble le prompt dans le budget de tokens (budget_tokens_prompt)
+        
+        Les passages dupliqués sont retirés, les chunks adjacents d'une même
+        source fusionnés, puis les blocs ajoutés par pertinence tant qu'ils
+        tiennent dans le budget laissé par les instructions.
+        
+        Returns:
+            Tuple (prompt, blocs retenus, statistiques dont tokens_prompt
+            et duree_ms); chaque bloc porte le texte fusionné et les ids de
+            ses passages ('ids')
+        """
+        debut = time.perf_counter()
+        tokens_instructions = self.compteur_tokens.compter(self.construire_prompt(question, []))
+        blocs, stats = emballer_contexte(
+            passages,
+            max(0, self.budget_tokens_prompt - tokens_instructions),
+            self.compteur_tokens,
+            overlap=self.decoupeur.chevauchement_max
+        )
+        prompt = self.construire_prompt(question, blocs)
+        stats['tokens_prompt'] = tokens_instructions + stats['tokens_contexte']
+        stats['duree_ms'] = self._mesurer('construction_prompt', debut)
+        
+        logger.info("📝 Prompt: %d tokens%s - %d blocs pour %d passages (%d doublons)",
+                    stats['tokens_prompt'], '' if self.compteur_tokens.exact else ' (estimés)',
+                    stats['retenus'], stats['passages'], stats['doublons'])
+        return prompt, blocs, stats
+    
+    @staticmethod
+    def _passages_du_prompt(passages: List[Dict], blocs: List[List[str]]) -> List[Dict]:
+        """
+        Passages retrouvés qui figurent dans le prompt, dans leur ordre de
+        pertinence (contextes_utilises)
+        
+        Args:
+            passages: Passages retournés par la recherche
+            blocs: Ids des passages de chaque bloc du prompt
+        """
+        dans_le_prompt = {identifiant for ids in blocs for identifiant in ids}
+        return [p for p in passages if p['id'] in dans_le_prompt]
+    
+    def _appeler_llm(self, client, question: str, contextes: List[Dict], prompt: str,
+                     stream=False, options: Optional[Dict] = None):
+        """
+        Envoie la requête de génération (client synchrone ou asynchrone)
+        selon le mode configuré, avec le keep_alive du modèle
+        """
+        options = self.OPTIONS_GENERATION if options is None else options
+        if self.mode_generation == 'chat':
+            return client.chat(
+                model=self.llm_model,
+                messages=self.construire_messages(question, contextes),
+                options=options,
+                keep_alive=self.keep_alive,
+                stream=stream
+            )
+        return client.generate(
+            model=self.llm_model,
+            prompt=prompt,
+            options=options,
+            keep_alive=self.keep_alive,
+            stream=stream
+        )
+    
+    def _texte_reponse(self, reponse) -> str:
+        """Texte d'une réponse (ou d'un morceau de flux) selon le mode"""
+        if self.mode_generation == 'chat':
+            return reponse['message']['content']
+        return reponse['response']
+    
+    def _noter_metriques_ollama(self, prompt: str, reponse, etapes: Optional[Dict] = None) -> Dict:
+        """
+        Relève les durées et comptes de tokens renvoyés par Ollama
+        
+        Args:
+            prompt: Prompt envoyé (calibrage du compteur de tokens)
+            reponse: Réponse Ollama ou dernier morceau du flux
+            etapes: Dict complété avec llm_evaluation_prompt_ms et llm_generation_ms
+        """
+        metriques = self.suivi_ollama.enregistrer(reponse)
+        for etape, cle in (('llm_chargement', 'chargement_ms'), ('llm_evaluation_prompt', 'evaluation_prompt_ms'),
+                           ('llm_generation', 'generation_ms')):
+            if metriques[cle]:
+                self.metriques.observer('rag_etape_duree_secondes', metriques[cle] / 1000, etape=etape)
+                if etapes is not None:
+                    etapes[f'{etape}_ms'] = metriques[cle]
+        logger.debug("📈 Ollama: prompt %d tokens évalués en %.2fs, %d tokens générés (%.1f tok/s)%s",
+                     metriques['tokens_prompt_evalues'], metriques['evaluation_prompt_ms'] / 1000,
+                     metriques['tokens_generes'], metriques['tokens_par_s'],
+                     f", chargement du modèle {metriques['chargement_ms'] / 1000:.1f}s"
+                     if metriques['chargement_a_froid'] else "")
+        # Après un chargement, le cache KV est vide: tout le prompt est évalué
+        if metriques['chargement_a_froid']:
+            self.compteur_tokens.calibrer(prompt, metriques['tokens_prompt_evalues'])
+        return metriques
+    
+    def prechauffer_llm(self) -> Dict:
+        """
+        Charge le modèle de génération sur chaque serveur Ollama et évalue les
+        instructions fixes, pour que la première question n'attende ni le
+        chargement ni l'évaluation du préfixe
+        
+        Returns:
+            Dict {serveur: métriques Ollama du préchauffage}
+        
+        Raises:
+            La dernière erreur si aucun serveur n'a pu être préchauffé
+        """
+        resultats = {}
+        derniere_erreur = None
+        for serveur in self.routeur_llm.serveurs:
+            print(f"🔥 Préchauffage de {self.llm_model} sur {serveur.nom} (keep_alive: {self.keep_alive})...")
+            try:
+                reponse = self._appeler_llm(
+                    serveur.client, "", [], self.construire_prompt("", []),
+                    options={**self.OPTIONS_GENERATION, 'num_predict': 1}
+                )
+            except Exception as e:
+                print(f"⚠️  Préchauffage impossible sur {serveur.nom}: {e}")
+                derniere_erreur = e
+                continue
+            metriques = self.suivi_ollama.enregistrer(reponse)
+            print(f"✅ Modèle prêt sur {serveur.nom} (chargement {metriques['chargement_ms'] / 1000:.1f}s, "
+                  f"préfixe {metriques['tokens_prompt_evalues']} tokens)")
+            resultats[serveur.nom] = metriques
+        
+        if not resultats and derniere_erreur is not None:
+            raise derniere_erreur
+        return resultats
+    
+    def generer_reponse(self, question: str, n_contextes=3, timings: Optional[Dict] = None,
+                        filtres: Optional[Dict] = None) -> Dict:
+        """
+        Génère une réponse complète avec Ollama en utilisant les passages pertinents
+        
+        Args:
+            question: Question de l'utilisateur
+            n_contextes: Nombre de passages à utiliser comme contexte
+            timings: Dict complété avec la durée des étapes parcourues en ms:
+                     celles de rechercher_avec_embedding (recherche_ms pour
+                     la recherche complète), construction_prompt_ms,
+                     attente_file_ms, llm_ms (appel complet), durées
+                     rapportées par Ollama (llm_evaluation_prompt_ms,
+                     llm_generation_ms, llm_chargement_ms) et total_ms
+            filtres: Restriction des passages par métadonnées (voir
+                     rechercher_avec_embedding)
+        
+        Returns:
+            Dict avec la réponse générée, les sources, les passages retrouvés
+            qui figurent dans le prompt (contextes_utilises, avec ou sans
+            cache) et les ids des passages de chaque bloc du prompt (blocs)
+        
+        Raises:
+            RefusAdmission si la file de génération est pleine (FileSaturee)
+            ou si l'attente d'une place dépasse le délai (AttenteDepassee)
+            ServeursIndisponibles si aucun serveur Ollama n'a pu répondre
+            ValueError: filtres invalides
+        """
+        logger.debug("🔎 Recherche de contexte pour: %s", question)
+        debut = time.perf_counter()
+        etapes = {} if timings is None else timings
         
         try:
-            # 4. Générer avec Ollama
-            start_time = time.time()
-            print(f"⏳ Envoi de la requête au serveur Ollama...")
+            # 1. Rechercher les passages pertinents
+            question_embedding, contextes = self.rechercher_avec_embedding(
+                question, n_resultats=n_contextes, timings=etapes, filtres=filtres
+            )
+            etapes['recherche_ms'] = etapes.pop('total_ms')
             
-            response = self.ollama_client.generate(
-                model=self.llm_model,
-                prompt=prompt,
-                options={
-                    'temperature': 0.3,  # Réponses plus précises
-                    'top_p': 0.9,
-                    'num_predict': 500,  # Limiter la longueur de la réponse
-                }
+            # 2. Cache, génération partagée ou appel à Ollama
+            return self._repondre(question, question_embedding, contextes, etapes)
+        finally:
+            etapes['total_ms'] = (time.perf_counter() - debut) * 1000
+    
+    def _repondre(self, question: str, question_embedding: np.ndarray,
+                  contextes: List[Dict], etapes: Dict) -> Dict:
+        """
+        Fin de generer_reponse() une fois les passages retrouvés: réponse en
+        cache, génération identique en cours ou nouvelle génération
+        
+        Raises:
+            RefusAdmission si la file de génération est pleine ou l'attente trop longue
+            ServeursIndisponibles si aucun serveur Ollama n'a pu répondre
+        """
+        if not contextes:
+            return {
+                'reponse': "Désolé, je n'ai pas trouvé d'information pertinente dans les documents.",
+                'sources': [],
+                'contextes_utilises': [],
+                'blocs': []
+            }
+        
+        # Question quasi identique déjà traitée avec le même contexte
+        ids_contextes = [c['id'] for c in contextes]
+        en_cache = self.cache_reponses.rechercher(question_embedding, ids_contextes)
+        if en_cache is not None:
+            logger.debug("⚡ Réponse servie depuis le cache sémantique")
+            return {**en_cache, 'contextes_utilises': self._passages_du_prompt(contextes, en_cache['blocs']),
+                    'depuis_cache': True}
+        
+        # Une seule génération pour des questions identiques simultanées
+        if self.generations_partagees is None:
+            return self._generer_avec_llm(question, question_embedding, contextes, ids_contextes, etapes)
+        
+        resultat, partage = self.generations_partagees.executer(
+            self._cle_generation(question, ids_contextes),
+            lambda: self._generer_avec_llm(question, question_embedding, contextes, ids_contextes, etapes)
+        )
+        if partage:
+            logger.debug("🔗 Réponse partagée avec une génération identique en cours")
+            return {**resultat, 'generation_partagee': True}
+        return resultat
+    
+    def generer_reponses_lot(self, questions: List[str], n_contextes=3, parallelisme: Optional[int] = None,
+                             filtres: Optional[Dict] = None) -> Iterator[Dict]:
+        """
+        Répond à un lot de questions (outils internes, traitements hors ligne)
+        
+        Les questions en double ne sont traitées qu'une fois. La recherche
+        est faite pour tout le lot (rechercher_lot), puis au plus
+        `parallelisme` générations tournent en même temps; chacune passe par
+        le cache, le partage des générations identiques et le contrôle
+        d'admission comme une question isolée. Une génération refusée parce
+        que la file est pleine est retentée après le Retry-After.
+        
+        Les passages communs à plusieurs questions ne sont transmis qu'une
+        fois: chaque résultat donne les ids et distances de ses passages, et
+        le texte des passages pas encore envoyés dans `nouveaux_contextes`.
+        
+        Args:
+            questions: Questions à traiter
+            n_contextes: Nombre de passages par question
+            parallelisme: Générations simultanées (défaut et plafond: capacité
+                          du contrôle d'admission)
+            filtres: Filtres communs à toutes les questions (voir
+                     rechercher_avec_embedding)
+        
+        Yields:
+            Dict d'événements, dans l'ordre:
+            - {'type': 'debut', 'questions': N, 'questions_uniques': M, 'recherche_ms': ...}
+            - {'type': 'resultat', 'index': i, 'question': ..., 'success': True,
+               'reponse': ..., 'sources': [...], 'contextes': [{'id', 'distance'}], 'blocs': [[ids]],
+               'nouveaux_contextes': [{'id', 'texte', 'source', 'chunk_id'}], ...}
+              dans l'ordre de fin des générations (success False et message
+              en cas d'erreur)
+            - {'type': 'fin', 'duree': secondes, 'reponses': N, 'erreurs': E, 'depuis_cache': C}
+        """
+        debut = time.perf_counter()
+        capacite = self.controle_admission.capacite
+        parallelisme = min(parallelisme or capacite, capacite)
+        
+        # Une seule recherche et une seule génération par question distincte
+        indices_par_question: Dict[str, List[int]] = {}
+        for index, question in enumerate(questions):
+            indices_par_question.setdefault(" ".join(question.lower().split()), []).append(index)
+        groupes = list(indices_par_question.values())
+        uniques = [questions[indices[0]] for indices in groupes]
+        
+        recherche = {}
+        embeddings, passages_par_question = self.rechercher_lot(uniques, n_resultats=n_contextes,
+                                                                timings=recherche, filtres=filtres)
+        yield {
+            'type': 'debut',
+            'questions': len(questions),
+            'questions_uniques': len(uniques),
+            'recherche_ms': recherche.get('total_ms', 0.0)
+        }
+        
+        def repondre(u: int) -> Dict:
+            for tentative in range(self.TENTATIVES_LOT):
+                try:
+                    return self._repondre(uniques[u], embeddings[u], passages_par_question[u], {})
+                except RefusAdmission as refus:
+                    if tentative == self.TENTATIVES_LOT - 1:
+                        raise
+                    time.sleep(refus.retry_after)
+        
+        contextes_envoyes = set()
+        compteurs = {'reponses': 0, 'erreurs': 0, 'depuis_cache': 0}
+        executeur = ThreadPoolExecutor(max_workers=parallelisme, thread_name_prefix="rag-lot")
+        try:
+            futures = {executeur.submit(repondre, u): u for u in range(len(uniques))}
+            for future in as_completed(futures):
+                u = futures[future]
+                try:
+                    resultat = future.result()
+                except Exception as e:
+                    logger.error("❌ Erreur sur une question du lot: %s", e)
+                    resultat = None
+                    message = str(e)
+                
+                for index in groupes[u]:
+                    if resultat is None:
+                        compteurs['erreurs'] += 1
+                        yield {'type': 'resultat', 'index': index, 'question': questions[index],
+                               'success': False, 'message': message}
+                        continue
+                    
+                    contextes = resultat.get('contextes_utilises', [])
+                    nouveaux = [c for c in contextes if c['id'] not in contextes_envoyes]
+                    contextes_envoyes.update(c['id'] for c in nouveaux)
+                    compteurs['reponses'] += 1
+                    compteurs['depuis_cache'] += bool(resultat.get('depuis_cache'))
+                    yield {
+                        'type': 'resultat',
+                        'index': index,
+                        'question': questions[index],
+                        'success': True,
+                        'reponse': resultat['reponse'],
+                        'sources': resultat['sources'],
+                        'contextes': [{'id': c['id'], 'distance': c['distance']} for c in contextes],
+                        'blocs': resultat.get('blocs', []),
+                        'nouveaux_contextes': [
+                            {'id': c['id'], 'texte': c['texte'], 'source': c['source'], 'chunk_id': c.get('chunk_id')}
+                            for c in nouveaux
+                        ],
+                        'depuis_cache': resultat.get('depuis_cache', False),
+                        'tokens_prompt': resultat.get('tokens_prompt'),
+                        'generation_partagee': resultat.get('generation_partagee', False)
+                    }
+        finally:
+            # Client déconnecté: ne pas lancer les générations restantes
+            executeur.shutdown(wait=False, cancel_futures=True)
+        
+        yield {'type': 'fin', 'duree': time.perf_counter() - debut, **compteurs}
+    
+    @staticmethod
+    def _cle_generation(question: str, ids_contextes: List[str]) -> Tuple:
+        """Clé de regroupement: question normalisée et passages retrouvés"""
+        return " ".join(question.lower().split()), tuple(ids_contextes)
+    
+    def _generer_avec_llm(self, question: str, question_embedding: np.ndarray,
+                          contextes: List[Dict], ids_contextes: List[str],
+                          etapes: Optional[Dict] = None) -> Dict:
+        """
+        Fin de generer_reponse(): prompt, attente d'une place de génération
+        puis appel à Ollama
+        
+        Args:
+            etapes: Dict complété avec la durée des étapes (voir generer_reponse)
+        
+        Raises:
+            RefusAdmission si la file de génération est pleine ou l'attente trop longue
+            ServeursIndisponibles si aucun serveur Ollama n'a pu répondre
+        """
+        etapes = {} if etapes is None else etapes
+        
+        # Construire le prompt pour le LLM dans le budget de tokens
+        prompt, blocs, stats_prompt = self.preparer_prompt(question, contextes)
+        etapes['construction_prompt_ms'] = stats_prompt['duree_ms']
+        ids_blocs = [bloc['ids'] for bloc in blocs]
+        contextes = self._passages_du_prompt(contextes, ids_blocs)
+        
+        with self.controle_admission.admettre() as attente_file:
+            etapes['attente_file_ms'] = self._noter_attente_file(attente_file)
+            logger.debug("🤖 Génération de la réponse avec %s...", self.llm_model)
+            
+            # Générer avec Ollama
+            debut_llm = time.perf_counter()
+            response = self.routeur_llm.executer(
+                lambda client: self._appeler_llm(client, question, blocs, prompt)
             )
             
-            elapsed = time.time() - start_time
-            print(f"✅ Réponse reçue en {elapsed:.1f}s")
+            etapes['llm_ms'] = self._mesurer('llm', debut_llm)
+            logger.debug("✅ Réponse reçue en %.1fs", etapes['llm_ms'] / 1000)
+            metriques = self._noter_metriques_ollama(prompt, response, etapes)
             
-            reponse_texte = response['response']
+            reponse_texte = self._texte_reponse(response)
             
-            # 5. Extraire les sources utilisées
+            # Extraire les sources utilisées
             sources = list(set([c['source'] for c in contextes]))
             
+            self.cache_reponses.ajouter(question_embedding, ids_contextes, {
+                'reponse': reponse_texte,
+                'sources': sources,
+                'blocs': ids_blocs
+            })
+            
             return {
                 'reponse': reponse_texte,
                 'sources': sources,
-                'contextes_utilises': contextes
+                'contextes_utilises': contextes,
+                'blocs': ids_blocs,
+                'tokens_prompt': stats_prompt['tokens_prompt'],
+                'metriques_ollama': metriques,
+                'attente_file': attente_file
+            }
+    
+    def _noter_attente_file(self, attente_file: float) -> float:
+        """Enregistre le temps passé dans la file de génération et le retourne en ms"""
+        self.metriques.observer('rag_etape_duree_secondes', attente_file, etape='attente_file')
+        if attente_file >= 0.01:
+            logger.debug("⏱️  %.2fs d'attente dans la file de génération", attente_file)
+        return attente_file * 1000
+    
+    def generer_reponse_stream(self, question: str, n_contextes=3, timings: Optional[Dict] = None,
+                               filtres: Optional[Dict] = None) -> Iterator[Dict]:
+        """
+        Génère une réponse en streaming: les sources d'abord, puis les tokens
+        au fur et à mesure qu'Ollama les produit
+        
+        Args:
+            question: Question de l'utilisateur
+            n_contextes: Nombre de passages à utiliser comme contexte
+            timings: Dict complété avec la durée des étapes en ms (voir
+                     generer_reponse, plus premier_token_ms) et joint à
+                     l'événement "fin"
+            filtres: Restriction des passages par métadonnées (voir
+                     rechercher_avec_embedding)
+        
+        Yields:
+            Dict d'événements, dans l'ordre:
+            - {'type': 'sources', 'sources': [...], 'contextes_utilises': [...], 'blocs': [[ids]]}
+            - {'type': 'token', 'contenu': "..."} (zéro ou plusieurs fois)
+            - {'type': 'fin', 'duree': secondes} ou {'type': 'erreur', 'message': "..."}
+        """
+        start_time = time.time()
+        debut = time.perf_counter()
+        etapes = {} if timings is None else timings
+        
+        def fin(evenement: Dict) -> Dict:
+            etapes['total_ms'] = (time.perf_counter() - debut) * 1000
+            if timings is not None:
+                evenement['timings'] = etapes
+            return evenement
+        
+        # 1. Rechercher les passages pertinents
+        question_embedding, contextes = self.rechercher_avec_embedding(
+            question, n_resultats=n_contextes, timings=etapes, filtres=filtres
+        )
+        etapes['recherche_ms'] = etapes.pop('total_ms')
+        
+        if not contextes:
+            yield {'type': 'sources', 'sources': [], 'contextes_utilises': [], 'blocs': []}
+            yield {
+                'type': 'token',
+                'contenu': "Désolé, je n'ai pas trouvé d'information pertinente dans les documents."
             }
+            yield fin({'type': 'fin', 'duree': time.time() - start_time})
+            return
+        
+        # 2. Réponse en cache: un seul token avec la réponse complète
+        ids_contextes = [c['id'] for c in contextes]
+        en_cache = self.cache_reponses.rechercher(question_embedding, ids_contextes)
+        if en_cache is not None:
+            yield {'type': 'sources', 'sources': en_cache['sources'],
+                   'contextes_utilises': self._passages_du_prompt(contextes, en_cache['blocs']),
+                   'blocs': en_cache['blocs']}
+            yield {'type': 'token', 'contenu': en_cache['reponse']}
+            yield fin({'type': 'fin', 'duree': time.time() - start_time, 'premier_token': None, 'depuis_cache': True})
+            return
+        
+        # 3. Assembler le prompt puis envoyer les sources avant la génération
+        prompt, blocs, stats_prompt = self.preparer_prompt(question, contextes)
+        etapes['construction_prompt_ms'] = stats_prompt['duree_ms']
+        ids_blocs = [bloc['ids'] for bloc in blocs]
+        contextes = self._passages_du_prompt(contextes, ids_blocs)
+        sources = list(set([c['source'] for c in contextes]))
+        yield {'type': 'sources', 'sources': sources, 'contextes_utilises': contextes, 'blocs': ids_blocs}
+        
+        # 4. Attendre une place de génération, puis générer avec Ollama en streaming
+        try:
+            with self.controle_admission.admettre() as attente_file:
+                etapes['attente_file_ms'] = self._noter_attente_file(attente_file)
+                try:
+                    debut_llm = time.perf_counter()
+                    flux = self.routeur_llm.executer_flux(
+                        lambda client: self._appeler_llm(client, question, blocs, prompt, stream=True)
+                    )
+                    
+                    premier_token = None
+                    metriques = None
+                    morceaux = []
+                    for morceau in flux:
+                        if morceau.get('done'):
+                            metriques = self._noter_metriques_ollama(prompt, morceau, etapes)
+                        texte = self._texte_reponse(morceau)
+                        if not texte:
+                            continue
+                        if premier_token is None:
+                            premier_token = time.time() - start_time
+                            etapes['premier_token_ms'] = self._mesurer('premier_token', debut)
+                            logger.debug("⚡ Premier token après %.2fs", premier_token)
+                        morceaux.append(texte)
+                        yield {'type': 'token', 'contenu': texte}
+                    etapes['llm_ms'] = self._mesurer('llm', debut_llm)
+                    
+                    self.cache_reponses.ajouter(question_embedding, ids_contextes, {
+                        'reponse': "".join(morceaux),
+                        'sources': sources,
+                        'blocs': ids_blocs
+                    })
+                    
+                    yield fin({
+                        'type': 'fin',
+                        'duree': time.time() - start_time,
+                        'premier_token': premier_token,
+                        'tokens_prompt': stats_prompt['tokens_prompt'],
+                        'metriques_ollama': metriques,
+                        'attente_file': attente_file
+                    })
+                    
+                except ServeursIndisponibles as e:
+                    logger.error("❌ Erreur lors de la génération: %s", e)
+                    yield {'type': 'erreur', 'message': str(e), 'retry_after': e.retry_after}
+                except Exception as e:
+                    logger.error("❌ Erreur lors de la génération: %s", e)
+                    yield {
+                        'type': 'erreur',
+                        'message': f"Erreur lors de la génération de la réponse: {str(e)}"
+                    }
+        
+        except RefusAdmission as e:
+            logger.info("🚦 Génération refusée: %s", e)
+            yield {'type': 'erreur', 'message': str(e), 'retry_after': e.retry_after}
+    
+    async def arechercher(self, question: str, n_resultats=3, timings: Optional[Dict] = None,
+                          filtres: Optional[Dict] = None) -> List[Dict]:
+        """
+        Version asynchrone de rechercher(): l'embedding et la requête ChromaDB
+        s'exécutent dans le pool de threads borné sans bloquer la boucle
+        """
+        boucle = asyncio.get_running_loop()
+        return await boucle.run_in_executor(self._executeur, self.rechercher, question, n_resultats, timings, filtres)
+    
+    async def agenerer_reponse(self, question: str, n_contextes=3, timings: Optional[Dict] = None,
+                               filtres: Optional[Dict] = None) -> Dict:
+        """
+        Version asynchrone de generer_reponse()
+        
+        L'attente de la génération Ollama ne mobilise aucun thread, ce qui
+        permet à un seul processus de garder des centaines de requêtes en vol.
+        
+        Args:
+            question: Question de l'utilisateur
+            n_contextes: Nombre de passages à utiliser comme contexte
+            timings: Dict complété avec la durée des étapes (voir generer_reponse)
+            filtres: Restriction des passages par métadonnées (voir
+                     rechercher_avec_embedding)
+        
+        Returns:
+            Dict avec la réponse générée, les sources et les contextes utilisés
+        
+        Raises:
+            RefusAdmission, ServeursIndisponibles (voir generer_reponse)
+            ValueError: filtres invalides
+        """
+        debut = time.perf_counter()
+        etapes = {} if timings is None else timings
+        boucle = asyncio.get_running_loop()
+        
+        try:
+            question_embedding, contextes = await boucle.run_in_executor(
+                self._executeur, self.rechercher_avec_embedding, question, n_contextes, etapes, filtres
+            )
+            etapes['recherche_ms'] = etapes.pop('total_ms')
+            
+            if not contextes:
+                return {
+                    'reponse': "Désolé, je n'ai pas trouvé d'information pertinente dans les documents.",
+                    'sources': [],
+                    'contextes_utilises': [],
+                    'blocs': []
+                }
+            
+            ids_contextes = [c['id'] for c in contextes]
+            en_cache = self.cache_reponses.rechercher(question_embedding, ids_contextes)
+            if en_cache is not None:
+                return {**en_cache, 'contextes_utilises': self._passages_du_prompt(contextes, en_cache['blocs']),
+                        'depuis_cache': True}
+            
+            if self.generations_partagees is None:
+                return await self._agenerer_avec_llm(question, question_embedding, contextes, ids_contextes, etapes)
+            
+            resultat, partage = await self.generations_partagees.aexecuter(
+                self._cle_generation(question, ids_contextes),
+                lambda: self._agenerer_avec_llm(question, question_embedding, contextes, ids_contextes, etapes)
+            )
+            if partage:
+                return {**resultat, 'generation_partagee': True}
+            return resultat
+        finally:
+            etapes['total_ms'] = (time.perf_counter() - debut) * 1000
+    
+    async def _agenerer_avec_llm(self, question: str, question_embedding: np.ndarray,
+                                 contextes: List[Dict], ids_contextes: List[str],
+                                 etapes: Optional[Dict] = None) -> Dict:
+        """Version asynchrone de _generer_avec_llm()"""
+        etapes = {} if etapes is None else etapes
+        prompt, blocs, stats_prompt = self.preparer_prompt(question, contextes)
+        etapes['construction_prompt_ms'] = stats_prompt['duree_ms']
+        ids_blocs = [bloc['ids'] for bloc in blocs]
+        contextes = self._passages_du_prompt(contextes, ids_blocs)
+        
+        async with self.controle_admission.aadmettre() as attente_file:
+            etapes['attente_file_ms'] = self._noter_attente_file(attente_file)
+            debut_llm = time.perf_counter()
+            response = await self.routeur_llm.aexecuter(
+                lambda client: self._appeler_llm(client, question, blocs, prompt)
+            )
+            etapes['llm_ms'] = self._mesurer('llm', debut_llm)
+            logger.debug("✅ Réponse reçue en %.1fs", etapes['llm_ms'] / 1000)
+            metriques = self._noter_metriques_ollama(prompt, response, etapes)
+            reponse_texte = self._texte_reponse(response)
+            
+            sources = list(set([c['source'] for c in contextes]))
+            self.cache_reponses.ajouter(question_embedding, ids_contextes, {
+                'reponse': reponse_texte,
+                'sources': sources,
+                'blocs': ids_blocs
+            })
             
-        except Exception as e:
-            print(f"❌ Erreur lors de la génération: {e}")
             return {
-                'reponse': f"Erreur lors de la génération de la réponse: {str(e)}",
-                'sources': [],
-                'contextes_utilises': contextes
+                'reponse': reponse_texte,
+                'sources': sources,
+                'contextes_utilises': contextes,
+                'blocs': ids_blocs,
+                'tokens_prompt': stats_prompt['tokens_prompt'],
+                'metriques_ollama': metriques,
+                'attente_file': attente_file
             }
     
     def verifier_robots_txt(self, url: str) -> bool:
         """
         Vérifie si le scraping est autorisé selon robots.txt
+        (mis en cache par hôte dans le crawler)
         
         Args:
             url: URL à vérifier
@@ -298,29 +1631,7 @@ RÉPONSE:"""
         Returns:
             True si le scraping est autorisé, False sinon
         """
-        try:
-            parsed_url = urlparse(url)
-            base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
-            robots_url = urljoin(base_url, "/robots.txt")
-            
-            rp = RobotFileParser()
-            rp.set_url(robots_url)
-            rp.read()
-            
-            # Vérifier si l'accès est autorisé pour tous les user-agents
-            can_fetch = rp.can_fetch("*", url)
-            
-            if can_fetch:
-                print(f"  ✅ robots.txt: Scraping autorisé")
-            else:
-                print(f"  ⚠️  robots.txt: Scraping interdit")
-            
-            return can_fetch
-            
-        except Exception as e:
-            print(f"  ⚠️  Impossible de vérifier robots.txt: {e}")
-            # Par défaut, on autorise si on ne peut pas vérifier
-            return True
+        return self.crawler.autorise(url)
     
     def scraper_url(self, url: str) -> str:
         """
@@ -332,46 +1643,16 @@ RÉPONSE:"""
         Returns:
             Texte extrait de la page
         """
-        try:
-            # Vérifier robots.txt
-            if not self.verifier_robots_txt(url):
-                print(f"  ❌ Scraping refusé par robots.txt")
-                return ""
-            
-            # Récupérer la page
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            # Parser le HTML
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Supprimer les scripts et styles
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            # Extraire le texte
-            texte = soup.get_text(separator='\n', strip=True)
-            
-            # Nettoyer les espaces excessifs
-            texte = '\n'.join([ligne.strip() for ligne in texte.split('\n') if ligne.strip()])
-            
-            return texte
-            
-        except requests.exceptions.RequestException as e:
-            print(f"  ❌ Erreur lors du scraping: {e}")
-            return ""
-        except Exception as e:
-            print(f"  ❌ Erreur inattendue: {e}")
-            return ""
+        return self.crawler.telecharger(url)
     
     def traiter_fichier_urls(self, chemin_fichier: str):
         """
         Traite un fichier texte contenant des URLs (une par ligne)
         Scrape chaque URL et ajoute le contenu à la base de données
         
+        Les hôtes différents sont téléchargés en parallèle; les URLs d'un
+        même hôte sont espacées du délai de politesse (RAG_CRAWLER_DELAI).
+        
         Args:
             chemin_fichier: Chemin vers le fichier .txt contenant les URLs
         """
@@ -388,32 +1669,41 @@ RÉPONSE:"""
         
         print(f"\n🌐 Scraping de {len(urls)} URL(s)...")
         urls_traitees = 0
+        urls_inchangees = 0
+        parametres = self.parametres_indexation
         
-        for i, url in enumerate(urls, 1):
-            print(f"\n  [{i}/{len(urls)}] Scraping: {url}")
-            
-            # Scraper le contenu
-            texte = self.scraper_url(url)
+        for i, (url, texte) in enumerate(self.crawler.crawler(urls), 1):
+            print(f"\n  [{i}/{len(urls)}] Scrapé: {url}")
             
             if not texte:
                 print(f"    ⚠️  Aucun contenu extrait")
                 continue
             
+            # Ignorer les pages dont le contenu n'a pas changé
+            cle = f"url:{url}"
+            empreinte = empreinte_texte(texte)
+            if self.manifeste.est_a_jour(cle, empreinte, parametres):
+                print(f"    ⏭️  Contenu inchangé")
+                urls_inchangees += 1
+                continue
+            
             # Découper en chunks
-            chunks = self.decouper_texte(texte)
+            chunks = self.decoupeur.decouper(texte)
             print(f"    ✂️  {len(chunks)} chunks créés")
             
             # Créer les embeddings
             embeddings = self.embedding_model.encode(chunks, show_progress_bar=False)
             
+            # Remplacer les anciens chunks de la page
+            self._supprimer_chunks_document(cle, url)
+            
             # Ajouter à la base vectorielle
-            ids = [f"web_{urlparse(url).netloc}_{i}" for i in range(len(chunks))]
+            prefixe = prefixe_ids(f"web_{urlparse(url).netloc}", cle)
+            ids = [f"{prefixe}_{i}" for i in range(len(chunks))]
+            attributs = metadonnees.attributs_document(url, texte, origine='web')
             metadatas = [
-                {
-                    "source": url,
-                    "chunk_id": i,
-                    "type": "web"
-                } for i in range(len(chunks))
+                ingestion.metadonnees_chunk(url, i, "web", attributs=attributs)
+                for i in range(len(chunks))
             ]
             
             self.collection.add(
@@ -422,14 +1712,23 @@ RÉPONSE:"""
                 metadatas=metadatas,
                 ids=ids
             )
+            self.index_bm25.ajouter(ids, chunks)
+            
+            self.manifeste.enregistrer(cle, empreinte, prefixe, len(chunks), parametres)
+            self.manifeste.sauvegarder()
             
             urls_traitees += 1
+            self.cache_reponses.invalider()
             print(f"    ✅ Embeddings créés et sauvegardés")
-            
-            # Délai pour respecter le serveur
-            time.sleep(1)
         
-        print(f"\n🎉 Scraping terminé: {urls_traitees}/{len(urls)} URLs traitées")
+        # Retirer les pages qui ne figurent plus dans le fichier
+        if self._supprimer_orphelins("url:", {f"url:{url}" for url in urls}):
+            self.manifeste.sauvegarder()
+            self.cache_reponses.invalider()
+        self.index_bm25.sauvegarder(self.db_path)
+        self._actualiser_index_memoire()
+        
+        print(f"\n🎉 Scraping terminé: {urls_traitees}/{len(urls)} URLs traitées, {urls_inchangees} inchangées")
         print(f"📊 Total d'éléments dans la base: {self.collection.count()}")
 
 
@@ -440,10 +1739,14 @@ if __name__ == "__main__":
     rag = RAGDocumentProcessor()
     
     # 2. Traiter les documents PDF
+    # (python agent_ia.py --pipeline pour l'ingestion parallèle)
     print("\n" + "="*60)
     print("📄 ÉTAPE 1: TRAITEMENT DES PDF")
     print("="*60)
-    rag.traiter_dossier("../../pdf")
+    if "--pipeline" in sys.argv:
+        rag.traiter_dossier_pipeline("../../pdf")
+    else:
+        rag.traiter_dossier("../../pdf")
     
     # 3. Traiter les URLs depuis un fichier texte
     print("\n" + "="*60)
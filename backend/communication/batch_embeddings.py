@@ -0,0 +1,98 @@
+"""
+Micro-batching des embeddings de questions
+Regroupe les questions arrivant en même temps en un seul appel à encode
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+class BatcheurEmbeddings:
+    """
+    Collecte les questions concurrentes pendant quelques millisecondes et
+    calcule leurs embeddings en un seul passage du modèle
+
+    Sous charge, un lot de 16 questions coûte à peine plus qu'une seule
+    (le modèle vectorise le calcul), au lieu de 16 petits passages qui se
+    disputent le CPU. Chaque appelant reçoit son propre vecteur.
+    """
+
+    def __init__(self, embedding_model, attente_max_ms: float = 2.0, taille_max_batch: int = 32):
+        """
+        Args:
+            embedding_model: Modèle SentenceTransformer (ou compatible encode)
+            attente_max_ms: Attente maximale après la première question d'un lot
+            taille_max_batch: Nombre maximal de questions par appel à encode
+        """
+        self.embedding_model = embedding_model
+        self.attente_max = attente_max_ms / 1000
+        self.taille_max_batch = taille_max_batch
+
+        self._file: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._verrou_stats = threading.Lock()
+        self.nb_lots = 0
+        self.nb_questions = 0
+
+        self._thread = threading.Thread(target=self._boucle, name="batch-embeddings", daemon=True)
+        self._thread.start()
+
+    def encoder(self, texte: str) -> np.ndarray:
+        """
+        Retourne l'embedding d'une question (bloque jusqu'au calcul du lot)
+
+        Args:
+            texte: Question à encoder
+        """
+        future: Future = Future()
+        self._file.put((texte, future))
+        return future.result()
+
+    def _collecter_lot(self) -> List[Tuple[str, Future]]:
+        """Attend une question puis complète le lot jusqu'à la taille ou au délai max"""
+        lot = [self._file.get()]
+        limite = time.monotonic() + self.attente_max
+        while len(lot) < self.taille_max_batch:
+            reste = limite - time.monotonic()
+            try:
+                if reste > 0:
+                    lot.append(self._file.get(timeout=reste))
+                else:
+                    # Délai écoulé: prendre ce qui est déjà en file sans attendre
+                    lot.append(self._file.get_nowait())
+            except queue.Empty:
+                break
+        return lot
+
+    def _boucle(self):
+        while True:
+            lot = self._collecter_lot()
+            textes = [texte for texte, _ in lot]
+            try:
+                vecteurs = self.embedding_model.encode(
+                    textes, batch_size=len(textes), show_progress_bar=False
+                )
+            except Exception as e:
+                for _, future in lot:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), vecteur in zip(lot, vecteurs):
+                future.set_result(vecteur)
+
+            with self._verrou_stats:
+                self.nb_lots += 1
+                self.nb_questions += len(lot)
+
+    def stats(self) -> Dict:
+        """Nombre de lots, de questions et taille moyenne des lots"""
+        with self._verrou_stats:
+            return {
+                'lots': self.nb_lots,
+                'questions': self.nb_questions,
+                'taille_moyenne_lot': self.nb_questions / self.nb_lots if self.nb_lots else 0.0,
+            }
@@ -0,0 +1,131 @@
+"""
+Cache sémantique des réponses générées
+Évite une génération Ollama complète pour des questions quasi identiques
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class CacheSemantique:
+    """
+    Cache LRU/TTL de réponses indexé par l'embedding de la question
+
+    Une entrée est réutilisée si la nouvelle question est à une similarité
+    cosinus >= seuil_similarite d'une question déjà traitée ET que la
+    recherche a retourné exactement les mêmes chunks (même contexte, donc
+    même prompt au LLM à la formulation près).
+    """
+
+    def __init__(self, seuil_similarite: float = 0.95, taille_max: int = 1000, ttl: float = 3600):
+        """
+        Args:
+            seuil_similarite: Similarité cosinus minimale pour un hit (0 à 1)
+            taille_max: Nombre maximal d'entrées (éviction LRU au-delà)
+            ttl: Durée de vie d'une entrée en secondes
+        """
+        self.seuil_similarite = seuil_similarite
+        self.taille_max = taille_max
+        self.ttl = ttl
+
+        # cle -> (embedding normalisé, ids des chunks, réponse, date d'ajout)
+        self._entrees: "OrderedDict[int, Tuple[np.ndarray, Tuple[str, ...], Dict, float]]" = OrderedDict()
+        # ids des chunks -> clés des entrées ayant ce contexte
+        self._par_contexte: Dict[Tuple[str, ...], List[int]] = {}
+        self._prochaine_cle = 0
+        self._verrou = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normaliser(embedding) -> np.ndarray:
+        vecteur = np.asarray(embedding, dtype=np.float32)
+        norme = np.linalg.norm(vecteur)
+        return vecteur / norme if norme else vecteur
+
+    def _supprimer(self, cle: int):
+        _, ids, _, _ = self._entrees.pop(cle)
+        cles = self._par_contexte.get(ids)
+        if cles is not None:
+            cles.remove(cle)
+            if not cles:
+                del self._par_contexte[ids]
+
+    def rechercher(self, embedding, ids_chunks: List[str]) -> Optional[Dict]:
+        """
+        Retourne la réponse en cache pour cette question, ou None
+
+        Args:
+            embedding: Embedding de la question (calculé par rechercher)
+            ids_chunks: Ids des chunks retournés par la recherche, dans l'ordre
+        """
+        ids = tuple(ids_chunks)
+        vecteur = self._normaliser(embedding)
+        maintenant = time.time()
+
+        with self._verrou:
+            meilleure_cle, meilleure_similarite = None, self.seuil_similarite
+            for cle in list(self._par_contexte.get(ids, [])):
+                embedding_entree, _, _, date_ajout = self._entrees[cle]
+                if maintenant - date_ajout > self.ttl:
+                    self._supprimer(cle)
+                    continue
+                similarite = float(np.dot(vecteur, embedding_entree))
+                if similarite >= meilleure_similarite:
+                    meilleure_cle, meilleure_similarite = cle, similarite
+
+            if meilleure_cle is None:
+                self.misses += 1
+                return None
+
+            self._entrees.move_to_end(meilleure_cle)
+            self.hits += 1
+            return dict(self._entrees[meilleure_cle][2])
+
+    def ajouter(self, embedding, ids_chunks: List[str], reponse: Dict):
+        """
+        Enregistre la réponse générée pour cette question et ce contexte
+
+        Args:
+            embedding: Embedding de la question
+            ids_chunks: Ids des chunks utilisés comme contexte
+            reponse: Réponse à restituer lors d'un hit
+        """
+        if self.taille_max <= 0:
+            return
+
+        ids = tuple(ids_chunks)
+        with self._verrou:
+            cle = self._prochaine_cle
+            self._prochaine_cle += 1
+            self._entrees[cle] = (self._normaliser(embedding), ids, dict(reponse), time.time())
+            self._par_contexte.setdefault(ids, []).append(cle)
+
+            while len(self._entrees) > self.taille_max:
+                self._supprimer(next(iter(self._entrees)))
+
+    def invalider(self):
+        """Vide le cache (à appeler quand la collection change)"""
+        with self._verrou:
+            self._entrees.clear()
+            self._par_contexte.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        """Compteurs du cache: hits, misses, taux de hit, taille, invalidations"""
+        with self._verrou:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'taux_hit': self.hits / total if total else 0.0,
+                'taille': len(self._entrees),
+                'taille_max': self.taille_max,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,195 @@
+"""
+Assemblage du contexte envoyé au LLM dans un budget de tokens
+Dédoublonnage, fusion des chunks adjacents et comptage avec le tokenizer du modèle
+"""
+
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Pas de tokenizer par défaut: celui de mistral:latest (Mistral 7B v0.3) est
+# dans un dépôt Hugging Face à accès restreint, et le télécharger à chaque
+# démarrage coûterait un aller-retour réseau. Sans RAG_TOKENIZER, les tokens
+# sont estimés (ratio recalé sur les comptes d'Ollama).
+TOKENIZER_DEFAUT = None
+
+# Longueur minimale d'un chevauchement reconnu entre deux chunks consécutifs
+_CHEVAUCHEMENT_MIN = 10
+
+_ESPACES = re.compile(r"\s+")
+
+
+class CompteurTokens:
+    """
+    Compte les tokens d'un texte avec le tokenizer du modèle de génération
+
+    Sans tokenizer, ou s'il ne peut pas être chargé (bibliothèque
+    `tokenizers` absente, dépôt inaccessible ou à accès restreint sans
+    HF_TOKEN), le nombre de tokens est estimé à partir du nombre de
+    caractères; le ratio est recalé sur les comptes réels renvoyés par
+    Ollama (prompt_eval_count) via calibrer().
+    """
+
+    def __init__(self, nom_tokenizer: Optional[str] = TOKENIZER_DEFAUT, caracteres_par_token: float = 3.5):
+        """
+        Args:
+            nom_tokenizer: Fichier tokenizer.json ou dépôt Hugging Face du
+                           tokenizer (None = estimation)
+            caracteres_par_token: Ratio initial de l'estimation
+        """
+        self.caracteres_par_token = caracteres_par_token
+        self.tokenizer = None
+        self._verrou = threading.Lock()
+
+        if not nom_tokenizer:
+            print("🔢 Tokens du prompt estimés par caractères (RAG_TOKENIZER pour un compte exact)")
+            return
+        try:
+            from tokenizers import Tokenizer
+            if os.path.isfile(nom_tokenizer):
+                # Fichier local: pas d'accès réseau au démarrage
+                self.tokenizer = Tokenizer.from_file(nom_tokenizer)
+            else:
+                self.tokenizer = Tokenizer.from_pretrained(nom_tokenizer)
+            print(f"🔢 Tokenizer chargé: {nom_tokenizer}")
+        except Exception as e:
+            print(f"⚠️  Tokenizer {nom_tokenizer} indisponible ({e}), estimation par caractères")
+
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer is not None
+
+    def compter(self, texte: str) -> int:
+        """Nombre de tokens du texte"""
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(texte, add_special_tokens=False).ids)
+        return int(len(texte) / self.caracteres_par_token) + 1
+
+    def calibrer(self, texte: str, nb_tokens_reels: Optional[int]):
+        """Recale l'estimation sur le nombre de tokens mesuré par le serveur"""
+        if self.tokenizer is not None or not nb_tokens_reels or not texte:
+            return
+        with self._verrou:
+            ratio = len(texte) / nb_tokens_reels
+            self.caracteres_par_token = 0.9 * self.caracteres_par_token + 0.1 * ratio
+
+
+def _normaliser(texte: str) -> str:
+    return _ESPACES.sub(" ", texte).strip().lower()
+
+
+def _raccorder(premier: str, second: str, overlap: int) -> str:
+    """Concatène deux chunks consécutifs en retirant leur texte commun"""
+    for longueur in range(min(len(premier), len(second), overlap), _CHEVAUCHEMENT_MIN - 1, -1):
+        if premier.endswith(second[:longueur]):
+            return premier + second[longueur:]
+    return premier + "\n" + second
+
+
+def _fusionner_adjacents(passages: List[Dict], overlap: int) -> List[Dict]:
+    """
+    Regroupe les chunks consécutifs d'une même source en un seul bloc
+
+    Un bloc prend le rang de son passage le plus pertinent; son texte suit
+    l'ordre du document.
+    """
+    blocs: List[Dict] = []
+    par_position: Dict[Tuple[str, int], Dict] = {}
+
+    for rang, passage in enumerate(passages):
+        membre = (rang, passage)
+        chunk_id = passage.get('chunk_id')
+        if chunk_id is None:
+            blocs.append({'rang': rang, 'membres': [membre]})
+            continue
+
+        voisins = []
+        for position in ((passage['source'], chunk_id - 1), (passage['source'], chunk_id + 1)):
+            voisin = par_position.get(position)
+            if voisin is not None and all(voisin is not v for v in voisins):
+                voisins.append(voisin)
+
+        if not voisins:
+            bloc = {'rang': rang, 'membres': []}
+            blocs.append(bloc)
+        else:
+            # Un chunk placé entre deux blocs les réunit
+            bloc = voisins[0]
+            for autre in voisins[1:]:
+                bloc['membres'].extend(autre['membres'])
+                bloc['rang'] = min(bloc['rang'], autre['rang'])
+                for _, p in autre['membres']:
+                    par_position[(p['source'], p['chunk_id'])] = bloc
+                blocs.remove(autre)
+        bloc['membres'].append(membre)
+        par_position[(passage['source'], chunk_id)] = bloc
+
+    resultat = []
+    for bloc in sorted(blocs, key=lambda b: b['rang']):
+        membres = [p for _, p in sorted(bloc['membres'], key=lambda m: m[1].get('chunk_id') or 0)]
+        texte = membres[0]['texte']
+        for membre in membres[1:]:
+            texte = _raccorder(texte, membre['texte'], overlap)
+        tete = min(bloc['membres'], key=lambda m: m[0])[1]
+        resultat.append({
+            **tete,
+            'texte': texte,
+            'ids': [p['id'] for p in membres],
+        })
+    return resultat
+
+
+def emballer_contexte(passages: List[Dict], budget_tokens: int, compteur: CompteurTokens,
+                      overlap: int = 50) -> Tuple[List[Dict], Dict]:
+    """
+    Sélectionne et assemble les passages qui tiennent dans le budget
+
+    1. supprime les passages dont le texte est identique ou contenu dans un
+       passage plus pertinent
+    2. fusionne les chunks adjacents d'une même source (sans répéter leur
+       chevauchement)
+    3. ajoute les blocs par pertinence tant que le budget le permet; le bloc
+       le plus pertinent est tronqué s'il dépasse seul le budget
+
+    Args:
+        passages: Passages triés par pertinence (sortie de rechercher())
+        budget_tokens: Tokens disponibles pour le contexte
+        compteur: Compteur de tokens du modèle de génération
+        overlap: Longueur maximale (caractères) du texte commun à deux chunks
+                 consécutifs (DecoupeurTexte.chevauchement_max)
+
+    Returns:
+        Tuple (blocs de contexte, statistiques)
+    """
+    uniques: List[Dict] = []
+    normalises: List[str] = []
+    for passage in passages:
+        texte = _normaliser(passage['texte'])
+        if any(texte in deja for deja in normalises):
+            continue
+        uniques.append(passage)
+        normalises.append(texte)
+
+    blocs = _fusionner_adjacents(uniques, overlap)
+
+    retenus: List[Dict] = []
+    tokens_utilises = 0
+    for bloc in blocs:
+        # Chaque bloc est précédé de sa ligne [Source: ...] dans le prompt
+        tokens = compteur.compter(f"[Source: {bloc['source']}]\n{bloc['texte']}\n\n")
+        if tokens_utilises + tokens <= budget_tokens:
+            retenus.append(bloc)
+            tokens_utilises += tokens
+        elif not retenus and budget_tokens > 0:
+            longueur = int(len(bloc['texte']) * budget_tokens / tokens)
+            retenus.append({**bloc, 'texte': bloc['texte'][:longueur], 'tronque': True})
+            tokens_utilises = budget_tokens
+
+    return retenus, {
+        'passages': len(passages),
+        'doublons': len(passages) - len(uniques),
+        'blocs': len(blocs),
+        'retenus': len(retenus),
+        'tokens_contexte': tokens_utilises,
+    }
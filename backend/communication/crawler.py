@@ -0,0 +1,212 @@
+"""
+Crawler web pour l'ingestion des URLs
+Sessions keep-alive par hôte, cache robots.txt, politesse par hôte et
+téléchargement concurrent entre hôtes différents
+"""
+
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def extraire_texte_html(contenu: bytes) -> str:
+    """Extrait le texte lisible d'une page HTML (sans scripts ni styles)"""
+    soup = BeautifulSoup(contenu, 'html.parser')
+
+    # Supprimer les scripts et styles
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    # Extraire le texte et nettoyer les espaces excessifs
+    texte = soup.get_text(separator='\n', strip=True)
+    return '\n'.join([ligne.strip() for ligne in texte.split('\n') if ligne.strip()])
+
+
+class CrawlerWeb:
+    """
+    Télécharge des pages en respectant robots.txt et une politesse par hôte
+
+    - une requests.Session par hôte (connexions keep-alive réutilisées)
+    - robots.txt lu une seule fois par hôte
+    - un délai minimal entre deux requêtes vers le même hôte (ou le
+      Crawl-delay de robots.txt s'il est plus long), au lieu d'une pause
+      globale entre toutes les URLs
+    - les hôtes différents sont traités en parallèle
+    """
+
+    USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+    def __init__(self, delai_par_hote: float = 1.0, max_hotes_simultanes: int = 8,
+                 timeout: float = 10, taille_pool: int = 4):
+        """
+        Args:
+            delai_par_hote: Délai minimal (s) entre deux requêtes vers un même hôte
+            max_hotes_simultanes: Nombre d'hôtes téléchargés en parallèle
+            timeout: Timeout des requêtes HTTP (s)
+            taille_pool: Connexions keep-alive conservées par hôte
+        """
+        self.delai_par_hote = delai_par_hote
+        self.max_hotes_simultanes = max_hotes_simultanes
+        self.timeout = timeout
+        self.taille_pool = taille_pool
+
+        self._sessions: Dict[str, requests.Session] = {}
+        self._robots: Dict[str, RobotFileParser] = {}
+        self._dernier_acces: Dict[str, float] = {}
+        self._verrous_hotes: Dict[str, threading.Lock] = {}
+        self._verrou = threading.Lock()
+
+    @staticmethod
+    def _hote(url: str) -> str:
+        parsed_url = urlparse(url)
+        return f"{parsed_url.scheme}://{parsed_url.netloc}"
+
+    def _verrou_hote(self, hote: str) -> threading.Lock:
+        with self._verrou:
+            return self._verrous_hotes.setdefault(hote, threading.Lock())
+
+    def _session(self, hote: str) -> requests.Session:
+        """Session keep-alive de l'hôte (créée au premier accès)"""
+        with self._verrou:
+            session = self._sessions.get(hote)
+            if session is None:
+                session = requests.Session()
+                session.headers['User-Agent'] = self.USER_AGENT
+                reessais = Retry(total=2, backoff_factor=0.5,
+                                 status_forcelist=[429, 502, 503, 504],
+                                 respect_retry_after_header=True)
+                adaptateur = HTTPAdapter(pool_connections=1, pool_maxsize=self.taille_pool,
+                                         max_retries=reessais)
+                session.mount('http://', adaptateur)
+                session.mount('https://', adaptateur)
+                self._sessions[hote] = session
+            return session
+
+    def _attendre_politesse(self, hote: str):
+        """Attend le délai de politesse depuis la dernière requête vers l'hôte"""
+        delai = self.delai_par_hote
+        robots = self._robots.get(hote)
+        if robots is not None:
+            crawl_delay = robots.crawl_delay("*")
+            if crawl_delay:
+                delai = max(delai, float(crawl_delay))
+
+        dernier = self._dernier_acces.get(hote)
+        if dernier is not None:
+            attente = dernier + delai - time.monotonic()
+            if attente > 0:
+                time.sleep(attente)
+        self._dernier_acces[hote] = time.monotonic()
+
+    def _robots_hote(self, hote: str) -> Optional[RobotFileParser]:
+        """robots.txt de l'hôte, téléchargé une seule fois (None si illisible)"""
+        if hote in self._robots:
+            return self._robots[hote]
+
+        robots = RobotFileParser()
+        robots.set_url(f"{hote}/robots.txt")
+        try:
+            self._attendre_politesse(hote)
+            response = self._session(hote).get(f"{hote}/robots.txt", timeout=self.timeout)
+            if response.status_code in (401, 403):
+                robots.disallow_all = True
+            elif response.status_code >= 400:
+                robots.allow_all = True
+            else:
+                robots.parse(response.text.splitlines())
+        except requests.exceptions.RequestException as e:
+            print(f"  ⚠️  Impossible de vérifier robots.txt ({hote}): {e}")
+            robots = None
+
+        self._robots[hote] = robots
+        return robots
+
+    def autorise(self, url: str) -> bool:
+        """
+        Vérifie si le scraping est autorisé selon robots.txt
+
+        Returns:
+            True si le scraping est autorisé (ou si robots.txt est illisible)
+        """
+        hote = self._hote(url)
+        with self._verrou_hote(hote):
+            robots = self._robots_hote(hote)
+        # Par défaut, on autorise si on ne peut pas vérifier
+        return robots is None or robots.can_fetch("*", url)
+
+    def telecharger(self, url: str) -> str:
+        """
+        Télécharge une page et retourne son texte ("" si refusée ou en erreur)
+
+        Args:
+            url: URL à scraper
+        """
+        hote = self._hote(url)
+        with self._verrou_hote(hote):
+            robots = self._robots_hote(hote)
+            if robots is not None and not robots.can_fetch("*", url):
+                print(f"  ❌ Scraping refusé par robots.txt: {url}")
+                return ""
+
+            try:
+                self._attendre_politesse(hote)
+                response = self._session(hote).get(url, timeout=self.timeout)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                print(f"  ❌ Erreur lors du scraping de {url}: {e}")
+                return ""
+
+        try:
+            return extraire_texte_html(response.content)
+        except Exception as e:
+            print(f"  ❌ Erreur inattendue ({url}): {e}")
+            return ""
+
+    def crawler(self, urls: List[str]) -> Iterator[Tuple[str, str]]:
+        """
+        Télécharge toutes les URLs, en parallèle entre hôtes différents
+
+        Les URLs d'un même hôte sont traitées dans l'ordre, espacées du délai
+        de politesse.
+
+        Yields:
+            Tuple (url, texte) dans l'ordre de fin de téléchargement
+        """
+        par_hote: "OrderedDict[str, List[str]]" = OrderedDict()
+        for url in urls:
+            par_hote.setdefault(self._hote(url), []).append(url)
+
+        resultats: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+
+        def traiter_hote(urls_hote: List[str]):
+            for url in urls_hote:
+                try:
+                    texte = self.telecharger(url)
+                except Exception as e:
+                    print(f"  ❌ Erreur inattendue ({url}): {e}")
+                    texte = ""
+                resultats.put((url, texte))
+
+        n_threads = max(1, min(self.max_hotes_simultanes, len(par_hote)))
+        with ThreadPoolExecutor(max_workers=n_threads, thread_name_prefix="crawler") as pool:
+            for urls_hote in par_hote.values():
+                pool.submit(traiter_hote, urls_hote)
+            for _ in range(len(urls)):
+                yield resultats.get()
+
+    def fermer(self):
+        """Ferme les sessions HTTP"""
+        with self._verrou:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
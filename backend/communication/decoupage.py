@@ -0,0 +1,335 @@
+"""
+Découpage des documents en chunks dimensionnés en tokens du modèle d'embeddings
+Respecte les titres, les limites d'articles ("Article N") et les phrases
+"""
+
+import copy
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# Début d'une section: titre markdown, division d'un texte juridique
+# (LIVRE, TITRE, CHAPITRE, SECTION...), article ou rubrique numérotée courte
+_DEBUT_SECTION = re.compile(
+    r"^[ \t]*(?:"
+    r"#{1,6}[ \t]+\S"
+    r"|\**(?:LIVRE|Livre|TITRE|Titre|CHAPITRE|Chapitre|SECTION|Section|SOUS-SECTION|Sous-section"
+    r"|PARAGRAPHE|Paragraphe|PARTIE|Partie|ANNEXE|Annexe)\b[ \t]*(?:[IVXLC]+\b|\d|PREMIER|premier|PRELIMINAIRE"
+    r"|PRÉLIMINAIRE|préliminaire|UNIQUE|unique|:)"
+    r"|\**(?:Article|ARTICLE|Art\.)[ \t]*(?:\d|premier|PREMIER|unique|UNIQUE|[LRDA]\.?[ \t]*\d)"
+    r"|\d{1,2}\.[ \t]+[A-ZÀ-ÖØ-Þ][^\n.]{0,80}$"
+    r")",
+    re.MULTILINE
+)
+
+# Fin de phrase: ponctuation forte suivie d'une majuscule, d'un chiffre ou
+# d'une ouverture (hors abréviations courantes), fin de paragraphe ou début
+# d'un élément de liste
+_FIN_PHRASE = re.compile(
+    r"(?<=[.!?…])(?<!\bArt\.)(?<!\bart\.)(?<!\bal\.)(?<!\bcf\.)(?<!\bMme\.)(?<!\bMM\.)(?<!\bp\.)"
+    r"(?<!\bex\.)(?<!\b[A-Z]\.)(?<!\bM\.)(?:[ \t]+\n?|\n)[ \t]*(?=[«\"“(\[A-ZÀ-ÖØ-Þ0-9])"
+    r"|\n[ \t]*\n\s*"
+    r"|\n(?=[ \t]*(?:[-•*–]\s|\d+°|\d+[.)]\s|[a-z]\)\s))"
+)
+
+_ESPACES = re.compile(r"\s+")
+
+# Au-delà, une ligne de début de section n'est pas un titre mais du texte
+_LONGUEUR_TITRE_MAX = 200
+
+# Marge du chevauchement maximal en caractères sur le ratio moyen
+# caracteres_par_token: les phrases reprises (au plus overlap_tokens tokens)
+# peuvent compter des tokens plus longs que la moyenne (mots entiers du
+# vocabulaire, nombres, espaces)
+MARGE_CHEVAUCHEMENT = 2
+
+# Texte lu au-delà duquel decouper_pages découpe sans attendre de fin de section
+_TAMPON_MAX_CARACTERES = 50_000
+
+
+def charger_tokenizer(nom_modele: str):
+    """
+    Tokenizer d'un modèle Hugging Face (sans charger le modèle), ou None
+    s'il est indisponible (le découpage estime alors les tokens)
+    """
+    try:
+        from tokenizers import Tokenizer
+        return Tokenizer.from_pretrained(nom_modele)
+    except Exception as e:
+        print(f"⚠️  Tokenizer {nom_modele} indisponible ({e}), estimation par caractères")
+        return None
+
+
+class DecoupeurTexte:
+    """
+    Découpe un texte en chunks d'au plus `max_tokens` tokens du modèle
+    d'embeddings (au-delà, le modèle tronque le texte et la fin du chunk
+    n'est pas représentée dans son embedding)
+
+    1. le texte est partagé en sections aux titres et aux articles
+    2. chaque section est partagée en phrases (titre de section à part)
+    3. les sections entières sont regroupées tant qu'elles tiennent dans un
+       chunk; une section trop longue est découpée entre deux phrases, le
+       chunk suivant reprenant les dernières phrases (au plus
+       `overlap_tokens` tokens)
+    4. une phrase plus longue qu'un chunk est coupée avec
+       langchain-text-splitters (aux points-virgules, virgules puis espaces)
+
+    Les tokens de toutes les phrases d'un texte sont comptés en un seul
+    appel au tokenizer (encode_batch); sans tokenizer, ils sont estimés à
+    partir du nombre de caractères.
+    """
+
+    def __init__(self, tokenizer=None, max_tokens: int = 126, overlap_tokens: int = 24,
+                 caracteres_par_token: float = 4.0):
+        """
+        Args:
+            tokenizer: Tokenizer du modèle d'embeddings (`tokenizers.Tokenizer`
+                       ou tokenizer Hugging Face rapide, ex: SentenceTransformer.tokenizer);
+                       None = estimation par caractères
+            max_tokens: Tokens maximum par chunk (hors tokens spéciaux)
+            overlap_tokens: Tokens maximum repris du chunk précédent
+            caracteres_par_token: Ratio de l'estimation sans tokenizer
+        """
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.caracteres_par_token = caracteres_par_token
+        self.tokenizer = None
+
+        tokenizer = getattr(tokenizer, 'backend_tokenizer', tokenizer)
+        if tokenizer is not None and hasattr(tokenizer, 'encode_batch'):
+            # Copie sans troncature ni padding: le modèle d'embeddings règle
+            # ceux de son propre tokenizer à chaque appel
+            self.tokenizer = copy.deepcopy(tokenizer)
+            self.tokenizer.no_truncation()
+            self.tokenizer.no_padding()
+
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer is not None
+
+    @property
+    def chevauchement_max(self) -> int:
+        """
+        Longueur maximale (caractères) du texte commun à deux chunks
+        consécutifs: les phrases reprises tiennent en overlap_tokens tokens,
+        convertis avec caracteres_par_token et MARGE_CHEVAUCHEMENT
+        """
+        return int(self.overlap_tokens * self.caracteres_par_token * MARGE_CHEVAUCHEMENT)
+
+    def parametres(self) -> Dict:
+        """Paramètres dont dépendent les chunks produits (pour le manifeste)"""
+        return {
+            'decoupage': 'structure',
+            'max_tokens': self.max_tokens,
+            'overlap_tokens': self.overlap_tokens,
+            'tokenizer_exact': self.exact,
+        }
+
+    def compter(self, textes: List[str]) -> List[int]:
+        """Nombre de tokens de chaque texte (un seul appel au tokenizer)"""
+        if not textes:
+            return []
+        if self.tokenizer is not None:
+            return [len(encodage.ids) for encodage in self.tokenizer.encode_batch(textes, add_special_tokens=False)]
+        return [int(len(texte) / self.caracteres_par_token) + 1 for texte in textes]
+
+    def _couper_phrase(self, phrase: str) -> List[str]:
+        """Coupe une phrase plus longue qu'un chunk en morceaux qui tiennent"""
+        try:
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+            decoupeur = RecursiveCharacterTextSplitter(
+                chunk_size=self.max_tokens,
+                chunk_overlap=0,
+                length_function=lambda texte: self.compter([texte])[0],
+                separators=["; ", ", ", " ", ""],
+                keep_separator="end",
+            )
+            return [morceau.strip() for morceau in decoupeur.split_text(phrase) if morceau.strip()]
+        except ImportError:
+            pass
+
+        # Sans langchain-text-splitters: regrouper les mots
+        morceaux, courant = [], []
+        for mot, tokens in zip(phrase.split(" "), self.compter(phrase.split(" "))):
+            if courant and sum(t for _, t in courant) + tokens > self.max_tokens:
+                morceaux.append(" ".join(m for m, _ in courant))
+                courant = []
+            courant.append((mot, tokens))
+        if courant:
+            morceaux.append(" ".join(m for m, _ in courant))
+        return morceaux
+
+    def _sections(self, texte: str) -> List[List[Tuple[str, int, bool]]]:
+        """
+        Sections du texte, chacune en unités (texte normalisé, position dans
+        le texte, True pour un titre)
+        """
+        debuts = [m.start() for m in _DEBUT_SECTION.finditer(texte)]
+        if not debuts or debuts[0] != 0:
+            debuts.insert(0, 0)
+        debuts.append(len(texte))
+
+        sections = []
+        for debut, fin in zip(debuts, debuts[1:]):
+            unites = []
+            corps = debut
+            if debut != 0 or _DEBUT_SECTION.match(texte):
+                fin_titre = texte.find("\n", debut, fin)
+                fin_titre = fin if fin_titre < 0 else fin_titre
+                if fin_titre - debut <= _LONGUEUR_TITRE_MAX:
+                    titre = _ESPACES.sub(" ", texte[debut:fin_titre]).strip()
+                    if titre:
+                        unites.append((titre, debut, True))
+                    corps = fin_titre
+
+            position = corps
+            for separateur in _FIN_PHRASE.finditer(texte, corps, fin):
+                phrase = _ESPACES.sub(" ", texte[position:separateur.start()]).strip()
+                if phrase:
+                    unites.append((phrase, position, False))
+                position = separateur.end()
+            phrase = _ESPACES.sub(" ", texte[position:fin]).strip()
+            if phrase:
+                unites.append((phrase, position, False))
+
+            if unites:
+                sections.append(unites)
+        return sections
+
+    def decouper_positions(self, texte: str) -> List[Tuple[str, int]]:
+        """
+        Découpe un texte
+
+        Returns:
+            Liste de (chunk, position de son début dans le texte)
+        """
+        sections = self._sections(texte)
+        tokens = iter(self.compter([u[0] for section in sections for u in section]))
+
+        # Unités (texte, tokens, position, titre) par section, phrases trop
+        # longues coupées
+        sections_comptees = []
+        for section in sections:
+            unites = []
+            for (texte_unite, position, titre), nb_tokens in zip(section, tokens):
+                if nb_tokens <= self.max_tokens:
+                    unites.append((texte_unite, nb_tokens, position, titre))
+                    continue
+                morceaux = self._couper_phrase(texte_unite)
+                for morceau, nb in zip(morceaux, self.compter(morceaux)):
+                    unites.append((morceau, nb, position, False))
+            sections_comptees.append(unites)
+
+        # Chaque unité compte un token de plus pour son séparateur dans le
+        # chunk assemblé, deux pour un titre (saut de ligne avant et après)
+        budget = self.max_tokens + 1
+
+        def poids(unite) -> int:
+            return unite[1] + (2 if unite[3] else 1)
+        chunks: List[Tuple[str, int]] = []
+        courant: List[Tuple[str, int, int, bool]] = []
+        tokens_courant = 0
+
+        def vider():
+            if courant:
+                morceaux = [courant[0][0]]
+                for precedente, unite in zip(courant, courant[1:]):
+                    # Un titre reste sur sa propre ligne
+                    morceaux.append("\n" if precedente[3] or unite[3] else " ")
+                    morceaux.append(unite[0])
+                chunks.append(("".join(morceaux), courant[0][2]))
+
+        for unites in sections_comptees:
+            tokens_section = sum(poids(u) for u in unites)
+
+            # Section entière: avec les précédentes si elle tient, sinon seule
+            if tokens_courant + tokens_section <= budget:
+                courant.extend(unites)
+                tokens_courant += tokens_section
+                continue
+            # Des titres seuls restent avec le contenu qui les suit, une fin
+            # de section très courte avec le début d'une section à découper
+            garder = courant and (
+                all(u[3] for u in courant)
+                or (tokens_section > budget and tokens_courant < self.max_tokens // 4)
+            )
+            if not garder:
+                vider()
+                courant, tokens_courant = [], 0
+                if tokens_section <= budget:
+                    courant, tokens_courant = list(unites), tokens_section
+                    continue
+
+            # Section trop longue: découpe entre deux phrases, le chunk
+            # suivant reprenant les dernières phrases du précédent
+            for unite in unites:
+                if courant and tokens_courant + poids(unite) > budget:
+                    vider()
+                    reprise: List[Tuple[str, int, int, bool]] = []
+                    tokens_reprise = 0
+                    for precedente in reversed(courant):
+                        if precedente[3] or tokens_reprise + poids(precedente) > self.overlap_tokens:
+                            break
+                        reprise.insert(0, precedente)
+                        tokens_reprise += poids(precedente)
+                    if tokens_reprise + poids(unite) > budget:
+                        reprise, tokens_reprise = [], 0
+                    courant, tokens_courant = reprise, tokens_reprise
+                courant.append(unite)
+                tokens_courant += poids(unite)
+        vider()
+        return chunks
+
+    def decouper(self, texte: str) -> List[str]:
+        """Découpe un texte en chunks"""
+        return [chunk for chunk, _ in self.decouper_positions(texte)]
+
+    def decouper_pages(self, pages: Iterable[Tuple[int, str]]) -> Iterator[Tuple[str, int]]:
+        """
+        Découpe un document au fil de ses pages
+
+        Le texte lu est découpé dès qu'il dépasse la taille de quelques chunks,
+        jusqu'au dernier début de section (ou à défaut de paragraphe): seule la
+        fin de la lecture reste en mémoire.
+
+        Args:
+            pages: (numéro de page, texte), par exemple ingestion.iterer_pages_pdf(...)
+
+        Yields:
+            Tuple (chunk, numéro de la page où il commence)
+        """
+        seuil = int(self.max_tokens * self.caracteres_par_token * 8)
+        tampon = ""
+        reperes: List[Tuple[int, int]] = []  # (position dans le tampon, numéro de page)
+
+        def page_de(position: int) -> int:
+            numero = reperes[0][1]
+            for debut, page in reperes:
+                if debut > position:
+                    break
+                numero = page
+            return numero
+
+        for numero, texte in pages:
+            reperes.append((len(tampon), numero))
+            tampon += texte + "\n"
+            if len(tampon) < seuil:
+                continue
+
+            coupure = 0
+            for m in _DEBUT_SECTION.finditer(tampon, seuil // 2):
+                coupure = m.start()
+            if not coupure and len(tampon) > _TAMPON_MAX_CARACTERES:
+                coupure = tampon.rfind("\n\n") + 1 or len(tampon)
+            if not coupure:
+                continue
+
+            for chunk, position in self.decouper_positions(tampon[:coupure]):
+                yield chunk, page_de(position)
+            tampon = tampon[coupure:]
+            reperes = [(0, page_de(coupure))] + [(debut - coupure, page) for debut, page in reperes
+                                                 if debut > coupure]
+
+        if tampon.strip():
+            for chunk, position in self.decouper_positions(tampon):
+                yield chunk, page_de(position)
@@ -0,0 +1,71 @@
+"""
+Backends du modèle d'embeddings
+PyTorch (fp32), ONNX Runtime, et ONNX quantifié int8 pour le CPU
+"""
+
+from pathlib import Path
+from typing import Optional
+
+# Backends disponibles (variable RAG_EMBEDDINGS_BACKEND)
+BACKENDS_EMBEDDINGS = ('torch', 'onnx', 'onnx-int8')
+
+# Dossier où sont conservés les modèles exportés/quantifiés
+DOSSIER_MODELES_DEFAUT = Path(__file__).resolve().parent.parent / "modeles_embeddings"
+
+
+def _dossier_modele(model_name: str, dossier_modeles: Optional[str]) -> Path:
+    nom = model_name.replace('/', '__')
+    return Path(dossier_modeles or DOSSIER_MODELES_DEFAUT) / nom
+
+
+def charger_modele_embeddings(model_name: str, backend: str = 'torch', device: Optional[str] = None,
+                              quantification: str = 'avx2', dossier_modeles: Optional[str] = None):
+    """
+    Charge le modèle d'embeddings avec le backend demandé
+
+    Les trois backends exposent la même méthode encode() (SentenceTransformer).
+    Les backends ONNX nécessitent `sentence-transformers[onnx]` (optimum et
+    onnxruntime, voir requirements-optionnel.txt).
+
+    Args:
+        model_name: Nom ou chemin du modèle SentenceTransformer
+        backend: 'torch' (fp32, défaut), 'onnx' (ONNX Runtime fp32) ou
+                 'onnx-int8' (ONNX Runtime, quantification dynamique int8)
+        device: Périphérique ('cpu', 'cuda'...), défaut: choix automatique
+        quantification: Jeu d'instructions ciblé par la quantification int8
+                        ('arm64', 'avx2', 'avx512', 'avx512_vnni')
+        dossier_modeles: Dossier de conservation du modèle quantifié
+
+    Returns:
+        SentenceTransformer prêt à l'emploi
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in BACKENDS_EMBEDDINGS:
+        raise ValueError(f"Backend d'embeddings inconnu: {backend} (attendu: {', '.join(BACKENDS_EMBEDDINGS)})")
+
+    if backend == 'torch':
+        return SentenceTransformer(model_name, device=device)
+
+    if backend == 'onnx':
+        # Exporte le modèle en ONNX à la volée s'il n'en fournit pas
+        return SentenceTransformer(model_name, backend='onnx', device=device)
+
+    # onnx-int8: export + quantification une seule fois, puis réutilisation
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    dossier = _dossier_modele(model_name, dossier_modeles)
+    fichier_onnx = f"onnx/model_qint8_{quantification}.onnx"
+    if not (dossier / fichier_onnx).exists():
+        print(f"⚙️  Quantification int8 ({quantification}) de {model_name} dans {dossier}")
+        modele_onnx = SentenceTransformer(model_name, backend='onnx', device=device)
+        modele_onnx.save(str(dossier))
+        export_dynamic_quantized_onnx_model(modele_onnx, quantification, str(dossier))
+
+    return SentenceTransformer(
+        str(dossier),
+        backend='onnx',
+        device=device,
+        model_kwargs={'file_name': fichier_onnx}
+    )
+
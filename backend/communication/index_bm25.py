@@ -0,0 +1,162 @@
+"""
+Index lexical BM25 persistant sur les chunks de la base vectorielle
+Retrouve les termes exacts (numéros d'articles, sigles) que les embeddings manquent
+"""
+
+import heapq
+import math
+import os
+import pickle
+import re
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Mots vides français ignorés par l'index (les chiffres sont conservés)
+MOTS_VIDES = frozenset("""
+a au aux avec ce ces dans de des du elle en et eux il ils je la le les leur lui ma mais me meme mes moi
+mon ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos
+votre vous c d j l m n s t y est sont etre ete comment quel quelle quels quelles
+""".split())
+
+_MOT = re.compile(r"\w+")
+
+
+def tokeniser(texte: str) -> List[str]:
+    """Minuscules, sans accents, découpage sur les caractères de mot, sans mots vides"""
+    texte = unicodedata.normalize('NFKD', texte.lower())
+    texte = ''.join(c for c in texte if not unicodedata.combining(c))
+    return [mot for mot in _MOT.findall(texte) if mot not in MOTS_VIDES]
+
+
+def fusion_rrf(classements: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Reciprocal Rank Fusion de plusieurs classements d'ids
+
+    Returns:
+        Liste (id, score) triée par score décroissant
+    """
+    scores: Dict[str, float] = {}
+    for classement in classements:
+        for rang, identifiant in enumerate(classement):
+            scores[identifiant] = scores.get(identifiant, 0.0) + 1.0 / (k + rang + 1)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+
+class IndexBM25:
+    """
+    Index inversé BM25 (Okapi) en mémoire, sauvegardé à côté de ChromaDB
+
+    Les listes de postings sont des dict {document: fréquence}; une requête
+    ne parcourt que les postings de ses termes, ce qui reste de l'ordre de la
+    milliseconde pour quelques dizaines de milliers de chunks.
+    """
+
+    NOM_FICHIER = "index_bm25.pkl"
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.longueurs: Dict[str, int] = {}
+        self.termes: Dict[str, Tuple[str, ...]] = {}
+        self.longueur_totale = 0
+        self._verrou = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.longueurs)
+
+    def ajouter(self, ids: List[str], textes: List[str]):
+        """Indexe des chunks (un id déjà présent est remplacé)"""
+        with self._verrou:
+            for identifiant, texte in zip(ids, textes):
+                if identifiant in self.longueurs:
+                    self._retirer(identifiant)
+                frequences = Counter(tokeniser(texte))
+                for terme, frequence in frequences.items():
+                    self.postings.setdefault(terme, {})[identifiant] = frequence
+                longueur = sum(frequences.values())
+                self.longueurs[identifiant] = longueur
+                self.termes[identifiant] = tuple(frequences)
+                self.longueur_totale += longueur
+
+    def _retirer(self, identifiant: str):
+        for terme in self.termes.pop(identifiant, ()):
+            postings = self.postings.get(terme)
+            if postings is not None:
+                postings.pop(identifiant, None)
+                if not postings:
+                    del self.postings[terme]
+        self.longueur_totale -= self.longueurs.pop(identifiant, 0)
+
+    def supprimer(self, ids: List[str]):
+        """Retire des chunks de l'index"""
+        with self._verrou:
+            for identifiant in ids:
+                self._retirer(identifiant)
+
+    def vider(self):
+        with self._verrou:
+            self.postings.clear()
+            self.longueurs.clear()
+            self.termes.clear()
+            self.longueur_totale = 0
+
+    def rechercher(self, question: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Retourne les k chunks de meilleur score BM25
+
+        Returns:
+            Liste (id, score) triée par score décroissant
+        """
+        with self._verrou:
+            n_documents = len(self.longueurs)
+            if not n_documents:
+                return []
+            longueur_moyenne = self.longueur_totale / n_documents
+
+            scores: Dict[str, float] = {}
+            for terme in set(tokeniser(question)):
+                postings = self.postings.get(terme)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                for identifiant, frequence in postings.items():
+                    normalisation = self.k1 * (1 - self.b + self.b * self.longueurs[identifiant] / longueur_moyenne)
+                    scores[identifiant] = scores.get(identifiant, 0.0) + \
+                        idf * frequence * (self.k1 + 1) / (frequence + normalisation)
+
+        return heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+
+    @classmethod
+    def charger(cls, dossier: str) -> "IndexBM25":
+        """Charge l'index sauvegardé dans le dossier (index vide s'il n'existe pas)"""
+        chemin = Path(dossier) / cls.NOM_FICHIER
+        if not chemin.exists():
+            return cls()
+        with open(chemin, 'rb') as f:
+            etat = pickle.load(f)
+        index = cls(k1=etat['k1'], b=etat['b'])
+        index.postings = etat['postings']
+        index.longueurs = etat['longueurs']
+        index.termes = etat['termes']
+        index.longueur_totale = sum(index.longueurs.values())
+        return index
+
+    def sauvegarder(self, dossier: str):
+        """Écrit l'index dans le dossier (écriture atomique)"""
+        chemin = Path(dossier) / self.NOM_FICHIER
+        chemin.parent.mkdir(parents=True, exist_ok=True)
+        temporaire = chemin.with_suffix('.tmp')
+        with self._verrou:
+            with open(temporaire, 'wb') as f:
+                pickle.dump({
+                    'k1': self.k1,
+                    'b': self.b,
+                    'postings': self.postings,
+                    'longueurs': self.longueurs,
+                    'termes': self.termes,
+                }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporaire, chemin)
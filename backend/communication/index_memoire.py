@@ -0,0 +1,642 @@
+"""
+Index vectoriel en mémoire sur une matrice d'embeddings projetée (mmap)
+Recherche exacte par un produit matriciel, ou approchée par listes inversées (IVF)
+Stockage float32, float16, int8 (échelle par dimension) ou binaire (signes,
+premier passage en distance de Hamming puis re-scoring en plus haute précision)
+Partitions par source, catégorie, type, langue et origine pour les recherches filtrées
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .metadonnees import CHAMPS_DOCUMENT, normaliser_filtres
+except ImportError:
+    # Exécution directe (python agent_ia.py, benchmarks)
+    from metadonnees import CHAMPS_DOCUMENT, normaliser_filtres
+
+# Version du format des exports (un export plus ancien est refait)
+FORMAT_EXPORT = 2
+
+# Champs partitionnés: les lignes de chaque valeur forment une liste triée
+CHAMPS_PARTITIONS = ('source',) + CHAMPS_DOCUMENT
+
+# Chunks lus par appel à collection.get pendant l'export
+TAILLE_PAGE_EXPORT = 5000
+
+# Itérations et échantillon de l'apprentissage des centroïdes IVF
+ITERATIONS_KMEANS = 20
+ECHANTILLON_KMEANS = 50_000
+
+# Lignes converties en float32 à la fois (matrices float16 et int8):
+# un bloc tient dans le cache du processeur
+TAILLE_BLOC = 2048
+
+# Longueur moyenne à partir de laquelle des suites de lignes consécutives
+# (chunks d'un même document, listes IVF) sont lues comme des tranches de la
+# matrice plutôt que ligne par ligne (copie par indexation)
+LONGUEUR_TRANCHE_MIN = 64
+
+# Représentations des embeddings: fichiers (matrice, normes, échelles ou
+# centre des codes binaires)
+QUANTIFICATIONS = {
+    'float32': ("embeddings.npy", "normes.npy", None),
+    'float16': ("embeddings_float16.npy", "normes_float16.npy", None),
+    'int8': ("embeddings_int8.npy", "normes_int8.npy", "echelles_int8.npy"),
+    'binaire': ("embeddings_binaire.npy", None, "centre_binaire.npy"),
+}
+
+# Nombre de bits à 1 de chaque octet (numpy < 2.0 n'a pas bitwise_count)
+_BITS_PAR_OCTET = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+
+def _compter_bits(mots: np.ndarray) -> np.ndarray:
+    """Bits à 1 de chaque ligne d'une matrice de mots uint64"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(mots).sum(axis=1, dtype=np.int32)
+    return _BITS_PAR_OCTET[mots.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+
+def _signes(vecteurs: np.ndarray, n_octets: int) -> np.ndarray:
+    """Codes binaires (bit = composante positive), complétés à n_octets par ligne"""
+    codes = np.packbits(np.atleast_2d(vecteurs) > 0, axis=1)
+    if codes.shape[1] < n_octets:
+        codes = np.pad(codes, ((0, 0), (0, n_octets - codes.shape[1])))
+    return codes
+
+
+def _tranches(lignes: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Bornes (dans lignes) des suites de lignes consécutives, None si elles
+    sont en moyenne plus courtes que LONGUEUR_TRANCHE_MIN
+    """
+    coupures = np.flatnonzero(np.diff(lignes) != 1) + 1
+    if len(lignes) < LONGUEUR_TRANCHE_MIN * (len(coupures) + 1):
+        return None
+    return np.concatenate([[0], coupures, [len(lignes)]])
+
+
+def octets_par_chunk(quantification: str, dimension: int) -> int:
+    """Taille en mémoire d'un chunk (vecteur et norme) dans une représentation"""
+    if quantification == 'binaire':
+        return -(-dimension // 64) * 8
+    return dimension * {'float32': 4, 'float16': 2, 'int8': 1}[quantification] + 4
+
+
+def _kmeans(vecteurs: np.ndarray, n_listes: int, graine: int = 0) -> np.ndarray:
+    """Centroïdes des n_listes groupes (k-means de Lloyd, distance L2)"""
+    hasard = np.random.default_rng(graine)
+    if len(vecteurs) > ECHANTILLON_KMEANS:
+        vecteurs = vecteurs[np.sort(hasard.choice(len(vecteurs), ECHANTILLON_KMEANS, replace=False))]
+    vecteurs = np.ascontiguousarray(vecteurs, dtype=np.float32)
+    centroides = vecteurs[hasard.choice(len(vecteurs), n_listes, replace=False)].copy()
+    for _ in range(ITERATIONS_KMEANS):
+        groupes = _plus_proches_centroides(vecteurs, centroides)
+        for g in range(n_listes):
+            membres = vecteurs[groupes == g]
+            if len(membres):
+                centroides[g] = membres.mean(axis=0)
+            else:
+                # Groupe vide: repartir d'un point tiré au hasard
+                centroides[g] = vecteurs[hasard.integers(len(vecteurs))]
+    return centroides
+
+
+def _plus_proches_centroides(vecteurs: np.ndarray, centroides: np.ndarray, taille_bloc: int = 8192) -> np.ndarray:
+    """Indice du centroïde le plus proche de chaque vecteur (par blocs pour borner la mémoire)"""
+    normes = np.einsum('ij,ij->i', centroides, centroides)
+    groupes = np.empty(len(vecteurs), dtype=np.int32)
+    for debut in range(0, len(vecteurs), taille_bloc):
+        bloc = np.asarray(vecteurs[debut:debut + taille_bloc], dtype=np.float32)
+        groupes[debut:debut + taille_bloc] = np.argmin(normes - 2 * bloc @ centroides.T, axis=1)
+    return groupes
+
+
+def exporter_collection(collection, dossier: str, n_listes: int = 0,
+                        parametres: Optional[Dict] = None) -> Dict:
+    """
+    Exporte une collection ChromaDB en fichiers .npy projetables en mémoire
+
+    Le dossier contient la matrice des embeddings (float32), le carré de
+    leur norme, les ids, sources, chunk_id, pages et métadonnées des
+    documents (codes des valeurs de index.json) en tableaux compacts, et les
+    textes concaténés (UTF-8) avec leurs positions. Avec n_listes > 0,
+    les lignes sont regroupées par liste IVF (centroïdes appris par k-means)
+    pour que chaque liste soit une tranche contiguë de la matrice.
+    
+    Pour chaque champ de CHAMPS_PARTITIONS, partition_<champ>.npy range les
+    lignes par valeur (tranches délimitées par partition_<champ>_bornes.npy):
+    les lignes d'un filtre se lisent sans parcourir les métadonnées.
+
+    L'export est écrit à côté puis substitué au précédent: un processus qui
+    projette encore l'ancien index le garde jusqu'à son rechargement.
+
+    Args:
+        collection: Collection ChromaDB à exporter
+        dossier: Dossier de l'index
+        n_listes: Nombre de listes IVF (0 = recherche exacte uniquement)
+        parametres: Paramètres d'indexation enregistrés avec l'index
+
+    Returns:
+        Dict: description de l'index (index.json)
+    """
+    dossier = Path(dossier)
+    temporaire = dossier.with_name(dossier.name + ".tmp")
+    shutil.rmtree(temporaire, ignore_errors=True)
+    temporaire.mkdir(parents=True)
+
+    total = collection.count()
+    ids: List[str] = []
+    sources: Dict[str, int] = {}
+    indices_sources = np.empty(total, dtype=np.int32)
+    valeurs: Dict[str, Dict[str, int]] = {champ: {} for champ in CHAMPS_DOCUMENT}
+    codes = {champ: np.zeros(total, dtype=np.int32) for champ in CHAMPS_DOCUMENT}
+    chunk_ids = np.full(total, -1, dtype=np.int32)
+    pages = np.full(total, -1, dtype=np.int32)
+    positions = np.zeros(total + 1, dtype=np.int64)
+    embeddings = None
+
+    n = 0
+    with open(temporaire / "textes.bin", "wb") as textes:
+        while n < total:
+            page = collection.get(include=['embeddings', 'documents', 'metadatas'],
+                                  limit=TAILLE_PAGE_EXPORT, offset=n)
+            if not page['ids']:
+                break
+            lot = np.asarray(page['embeddings'], dtype=np.float32)
+            if embeddings is None:
+                embeddings = np.lib.format.open_memmap(
+                    temporaire / "embeddings.npy", mode='w+', dtype=np.float32, shape=(total, lot.shape[1])
+                )
+            embeddings[n:n + len(lot)] = lot
+            for i, (identifiant, texte, metadata) in enumerate(
+                zip(page['ids'], page['documents'], page['metadatas']), start=n
+            ):
+                ids.append(identifiant)
+                indices_sources[i] = sources.setdefault(metadata['source'], len(sources))
+                for champ in CHAMPS_DOCUMENT:
+                    codes[champ][i] = valeurs[champ].setdefault(metadata.get(champ, ""), len(valeurs[champ]))
+                if metadata.get('chunk_id') is not None:
+                    chunk_ids[i] = metadata['chunk_id']
+                if metadata.get('page') is not None:
+                    pages[i] = metadata['page']
+                octets = texte.encode('utf-8')
+                textes.write(octets)
+                positions[i + 1] = positions[i] + len(octets)
+            n += len(page['ids'])
+
+    if embeddings is None:
+        embeddings = np.lib.format.open_memmap(temporaire / "embeddings.npy", mode='w+',
+                                               dtype=np.float32, shape=(0, 0))
+    n_listes = min(n_listes, n)
+
+    ordre = None
+    if n_listes:
+        # Regrouper les lignes par liste IVF
+        centroides = _kmeans(embeddings[:n], n_listes)
+        groupes = _plus_proches_centroides(embeddings[:n], centroides)
+        ordre = np.argsort(groupes, kind='stable')
+        np.save(temporaire / "centroides.npy", centroides)
+        np.save(temporaire / "listes.npy",
+                np.concatenate([[0], np.cumsum(np.bincount(groupes, minlength=n_listes))]).astype(np.int64))
+
+        embeddings_ordonnes = np.lib.format.open_memmap(
+            temporaire / "embeddings_ivf.npy", mode='w+', dtype=np.float32, shape=(n, embeddings.shape[1])
+        )
+        for debut in range(0, n, TAILLE_PAGE_EXPORT):
+            embeddings_ordonnes[debut:debut + TAILLE_PAGE_EXPORT] = embeddings[ordre[debut:debut + TAILLE_PAGE_EXPORT]]
+        embeddings_ordonnes.flush()
+        del embeddings_ordonnes, embeddings
+        os.replace(temporaire / "embeddings_ivf.npy", temporaire / "embeddings.npy")
+        embeddings = np.load(temporaire / "embeddings.npy", mmap_mode='r')
+    else:
+        embeddings.flush()
+
+    ids = np.array(ids, dtype=str)
+    if ordre is not None:
+        # Les textes restent dans l'ordre d'export: chaque ligne garde sa position
+        ids, indices_sources, chunk_ids, pages = ids[ordre], indices_sources[:n][ordre], \
+            chunk_ids[:n][ordre], pages[:n][ordre]
+        codes = {champ: codes[champ][:n][ordre] for champ in CHAMPS_DOCUMENT}
+        debuts, fins = positions[:-1][ordre], positions[1:][ordre]
+    else:
+        indices_sources, chunk_ids, pages = indices_sources[:n], chunk_ids[:n], pages[:n]
+        codes = {champ: codes[champ][:n] for champ in CHAMPS_DOCUMENT}
+        debuts, fins = positions[:n], positions[1:n + 1]
+
+    normes = np.empty(n, dtype=np.float32)
+    for debut in range(0, n, TAILLE_PAGE_EXPORT):
+        bloc = np.asarray(embeddings[debut:debut + TAILLE_PAGE_EXPORT])
+        normes[debut:debut + TAILLE_PAGE_EXPORT] = np.einsum('ij,ij->i', bloc, bloc)
+    del embeddings
+
+    np.save(temporaire / "normes.npy", normes)
+    np.save(temporaire / "ids.npy", ids)
+    np.save(temporaire / "sources.npy", indices_sources)
+    np.save(temporaire / "chunk_ids.npy", chunk_ids)
+    np.save(temporaire / "pages.npy", pages)
+    np.save(temporaire / "positions.npy", np.stack([debuts, fins], axis=1))
+    for champ in CHAMPS_DOCUMENT:
+        np.save(temporaire / f"{champ}.npy", codes[champ])
+
+    # Partitions: lignes triées par valeur (tri stable, donc croissantes dans chaque tranche)
+    codes['source'] = indices_sources
+    for champ, n_valeurs in zip(CHAMPS_PARTITIONS, [len(sources)] + [len(valeurs[c]) for c in CHAMPS_DOCUMENT]):
+        np.save(temporaire / f"partition_{champ}.npy", np.argsort(codes[champ], kind='stable'))
+        np.save(temporaire / f"partition_{champ}_bornes.npy",
+                np.concatenate([[0], np.cumsum(np.bincount(codes[champ], minlength=n_valeurs))]).astype(np.int64))
+
+    description = {
+        'format': FORMAT_EXPORT,
+        'nb_chunks': int(n),
+        'dimension': int(np.load(temporaire / "embeddings.npy", mmap_mode='r').shape[1]) if n else 0,
+        'listes_ivf': int(n_listes),
+        'sources': list(sources),
+        'valeurs': {champ: list(valeurs[champ]) for champ in CHAMPS_DOCUMENT},
+        'parametres': parametres or {},
+        'date': datetime.now().isoformat(),
+    }
+    with open(temporaire / "index.json", "w", encoding="utf-8") as f:
+        json.dump(description, f, ensure_ascii=False, indent=2)
+
+    ancien = dossier.with_name(dossier.name + ".old")
+    shutil.rmtree(ancien, ignore_errors=True)
+    if dossier.exists():
+        os.replace(dossier, ancien)
+    os.replace(temporaire, dossier)
+    shutil.rmtree(ancien, ignore_errors=True)
+    return description
+
+
+def completer_quantifications(dossier: str, quantifications) -> List[str]:
+    """
+    Ajoute à un export les représentations quantifiées qui lui manquent
+
+    Calculées par blocs depuis la matrice float32 (même ordre de lignes,
+    listes IVF comprises):
+    - float16: conversion directe
+    - int8: échelle par dimension (max |x| / 127), codes arrondis
+    - binaire: signe de chaque composante après soustraction de la
+      moyenne (sinon les dimensions décentrées ont le même bit pour tous
+      les chunks), 8 octets par 64 dimensions
+
+    Chaque fichier est écrit à côté puis renommé: un autre processus ne
+    voit jamais de représentation incomplète.
+
+    Args:
+        dossier: Dossier créé par exporter_collection
+        quantifications: Représentations voulues (clés de QUANTIFICATIONS)
+
+    Returns:
+        List[str]: représentations ajoutées
+    """
+    dossier = Path(dossier)
+    with open(dossier / "index.json", encoding="utf-8") as f:
+        n = json.load(f)['nb_chunks']
+    embeddings = np.load(dossier / "embeddings.npy", mmap_mode='r')[:n]
+    dimension = embeddings.shape[1] if n else 0
+
+    def ecrire(nom: str, tableau: np.ndarray):
+        np.save(dossier / f"{nom}.tmp.npy", tableau)
+        os.replace(dossier / f"{nom}.tmp.npy", dossier / nom)
+
+    ajoutees = []
+    for quantification in quantifications:
+        if quantification not in QUANTIFICATIONS:
+            raise ValueError(f"Quantification inconnue: {quantification} (attendu: {', '.join(QUANTIFICATIONS)})")
+        fichier_matrice, fichier_normes, fichier_echelles = QUANTIFICATIONS[quantification]
+        if (dossier / fichier_matrice).exists():
+            continue
+
+        echelles = None
+        if quantification == 'int8':
+            maximums = np.zeros(dimension, dtype=np.float32)
+            for debut in range(0, n, TAILLE_BLOC):
+                np.maximum(maximums, np.abs(embeddings[debut:debut + TAILLE_BLOC]).max(axis=0), out=maximums)
+            echelles = np.where(maximums > 0, maximums / 127, 1).astype(np.float32)
+            ecrire(fichier_echelles, echelles)
+        elif quantification == 'binaire':
+            centre = np.zeros(dimension, dtype=np.float64)
+            for debut in range(0, n, TAILLE_BLOC):
+                centre += np.asarray(embeddings[debut:debut + TAILLE_BLOC]).sum(axis=0, dtype=np.float64)
+            centre = (centre / max(n, 1)).astype(np.float32)
+            ecrire(fichier_echelles, centre)
+
+        if quantification == 'binaire':
+            forme, dtype = (n, octets_par_chunk('binaire', dimension)), np.uint8
+        else:
+            forme, dtype = (n, dimension), {'float16': np.float16, 'int8': np.int8}[quantification]
+        temporaire = dossier / f"{fichier_matrice}.tmp.npy"
+        matrice = np.lib.format.open_memmap(temporaire, mode='w+', dtype=dtype, shape=forme)
+        normes = np.empty(n, dtype=np.float32)
+        for debut in range(0, n, TAILLE_BLOC):
+            bloc = np.asarray(embeddings[debut:debut + TAILLE_BLOC])
+            if quantification == 'binaire':
+                matrice[debut:debut + len(bloc)] = _signes(bloc - centre, forme[1])
+                continue
+            if quantification == 'int8':
+                codes = np.clip(np.rint(bloc / echelles), -127, 127).astype(np.int8)
+                reconstruit = codes.astype(np.float32) * echelles
+            else:
+                codes = bloc.astype(np.float16)
+                reconstruit = codes.astype(np.float32)
+            matrice[debut:debut + len(bloc)] = codes
+            # Normes des vecteurs reconstruits: distances cohérentes entre elles
+            normes[debut:debut + len(bloc)] = np.einsum('ij,ij->i', reconstruit, reconstruit)
+        matrice.flush()
+        del matrice
+        if fichier_normes:
+            ecrire(fichier_normes, normes)
+        os.replace(temporaire, dossier / fichier_matrice)
+        ajoutees.append(quantification)
+    return ajoutees
+
+
+class IndexMemoire:
+    """
+    Recherche des plus proches voisins sur l'export d'une collection
+
+    Les fichiers sont ouverts en lecture seule avec np.load(mmap_mode='r'):
+    plusieurs processus (workers gunicorn/uvicorn) qui chargent le même
+    index partagent ses pages via le cache du système au lieu d'en garder
+    chacun une copie.
+
+    Les distances sont des L2 au carré, comme celles de ChromaDB:
+    ||q - x||² = ||q||² + ||x||² - 2 q·x, soit un produit matrice-vecteur
+    puis argpartition pour les k premiers. En mode IVF, seules les
+    n_sondes listes dont le centroïde est le plus proche sont parcourues.
+
+    Les vecteurs peuvent être lus en float16 ou en int8 (distances
+    approchées, 2 ou 4 fois moins de mémoire), ou en codes binaires:
+    les k × facteur_rescoring plus proches en distance de Hamming sont
+    re-scorés avec une représentation plus précise (32 fois moins de
+    mémoire pour le premier passage, seules les lignes re-scorées de la
+    matrice précise sont lues).
+    
+    Une recherche filtrée ne parcourt que les lignes des partitions
+    demandées. En mode IVF, une partition plus petite que les listes
+    sondées est parcourue entière (résultat exact), une plus grande est
+    croisée avec les listes sondées.
+    """
+
+    NOM_DOSSIER = "index_memoire"
+
+    def __init__(self, dossier: str, n_sondes: int = 0, quantification: str = 'float32',
+                 rescoring: str = 'float32', facteur_rescoring: int = 10):
+        """
+        Args:
+            dossier: Dossier créé par exporter_collection (et completer_quantifications)
+            n_sondes: Listes IVF parcourues par requête (0 = recherche exacte)
+            quantification: Représentation parcourue: 'float32', 'float16',
+                            'int8' ou 'binaire'
+            rescoring: Représentation du re-scoring en mode binaire
+            facteur_rescoring: Candidats re-scorés par résultat en mode binaire
+        """
+        if quantification not in QUANTIFICATIONS:
+            raise ValueError(f"Quantification inconnue: {quantification} (attendu: {', '.join(QUANTIFICATIONS)})")
+        if rescoring not in QUANTIFICATIONS or rescoring == 'binaire':
+            raise ValueError(f"Re-scoring inconnu: {rescoring} (attendu: float32, float16, int8)")
+        self.dossier = Path(dossier)
+        with open(self.dossier / "index.json", encoding="utf-8") as f:
+            self.description = json.load(f)
+        self.embeddings = np.load(self.dossier / "embeddings.npy", mmap_mode='r')[:self.description['nb_chunks']]
+        self.normes = np.load(self.dossier / "normes.npy", mmap_mode='r')
+        self.ids = np.load(self.dossier / "ids.npy", mmap_mode='r')
+        self.indices_sources = np.load(self.dossier / "sources.npy", mmap_mode='r')
+        self.chunk_ids = np.load(self.dossier / "chunk_ids.npy", mmap_mode='r')
+        self.pages = np.load(self.dossier / "pages.npy", mmap_mode='r')
+        self.positions = np.load(self.dossier / "positions.npy", mmap_mode='r')
+        self.textes = np.memmap(self.dossier / "textes.bin", dtype=np.uint8, mode='r') \
+            if os.path.getsize(self.dossier / "textes.bin") else np.zeros(0, dtype=np.uint8)
+        self.sources = self.description['sources']
+        self.valeurs = {'source': self.sources, **self.description['valeurs']}
+        self.codes = {champ: np.load(self.dossier / f"{champ}.npy", mmap_mode='r') for champ in CHAMPS_DOCUMENT}
+        self.partitions = {
+            champ: (np.load(self.dossier / f"partition_{champ}.npy", mmap_mode='r'),
+                    np.load(self.dossier / f"partition_{champ}_bornes.npy"))
+            for champ in CHAMPS_PARTITIONS
+        }
+        self._code_de = {champ: {valeur: code for code, valeur in enumerate(liste)}
+                         for champ, liste in self.valeurs.items()}
+
+        self.centroides = None
+        self.listes = None
+        if self.description['listes_ivf']:
+            self.centroides = np.load(self.dossier / "centroides.npy")
+            self.listes = np.load(self.dossier / "listes.npy")
+        self.n_sondes = min(n_sondes, self.description['listes_ivf'])
+
+        self.quantification = quantification
+        self.rescoring = rescoring
+        self.facteur_rescoring = max(1, facteur_rescoring)
+        self._representations: Dict[str, Tuple] = {}
+        for nom in {quantification, rescoring} if quantification == 'binaire' else {quantification}:
+            fichier_matrice, fichier_normes, fichier_echelles = QUANTIFICATIONS[nom]
+            self._representations[nom] = (
+                np.load(self.dossier / fichier_matrice, mmap_mode='r')[:len(self)],
+                np.load(self.dossier / fichier_normes, mmap_mode='r') if fichier_normes else None,
+                np.load(self.dossier / fichier_echelles) if fichier_echelles else None,
+            )
+
+        # Position de chaque id (compléments BM25), construite au premier besoin
+        self._rangs: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return self.description['nb_chunks']
+
+    @classmethod
+    def dossier_de(cls, db_path: str) -> Path:
+        """Dossier de l'index à côté de la base ChromaDB"""
+        return Path(db_path) / cls.NOM_DOSSIER
+
+    def _lignes_candidates(self, question_embedding: np.ndarray) -> Optional[np.ndarray]:
+        """Lignes des n_sondes listes IVF les plus proches (None = toute la matrice)"""
+        if not self.n_sondes:
+            return None
+        distances = np.einsum('ij,ij->i', self.centroides, self.centroides) - 2 * self.centroides @ question_embedding
+        listes = np.argpartition(distances, self.n_sondes - 1)[:self.n_sondes]
+        return np.concatenate([np.arange(self.listes[l], self.listes[l + 1]) for l in listes])
+
+    def lignes_filtrees(self, filtres: Optional[Dict]) -> Optional[np.ndarray]:
+        """
+        Lignes croissantes des chunks qui correspondent aux filtres (voir
+        metadonnees.normaliser_filtres), None sans filtre
+        """
+        lignes = None
+        for champ, valeurs in normaliser_filtres(filtres).items():
+            if champ == 'page':
+                # Pas de partition: les pages sont un tableau int32 compact
+                pages = np.asarray(self.pages)
+                if isinstance(valeurs, dict):
+                    selection = np.flatnonzero((pages >= valeurs.get('min', 0))
+                                               & (pages <= valeurs.get('max', np.iinfo(np.int32).max)))
+                else:
+                    selection = np.flatnonzero(np.isin(pages, valeurs))
+            else:
+                partition, bornes = self.partitions[champ]
+                tranches = [np.asarray(partition[bornes[code]:bornes[code + 1]])
+                            for code in (self._code_de[champ].get(valeur) for valeur in valeurs) if code is not None]
+                if not tranches:
+                    selection = np.zeros(0, dtype=np.int64)
+                else:
+                    selection = tranches[0] if len(tranches) == 1 else np.sort(np.concatenate(tranches))
+            lignes = selection if lignes is None else np.intersect1d(lignes, selection, assume_unique=True)
+        return lignes
+
+    def rechercher(self, question_embedding: np.ndarray, k: int,
+                   filtres: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Les k chunks les plus proches (parmi ceux qui correspondent aux filtres)
+
+        Returns:
+            Tuple (lignes, distances L2 au carré), par distance croissante
+        """
+        q = np.asarray(question_embedding, dtype=np.float32)
+        selection = self.lignes_filtrees(filtres)
+        if selection is not None and len(selection) == len(self):
+            selection = None
+        if selection is None:
+            lignes = self._lignes_candidates(q)
+        elif self.n_sondes and len(selection) * self.description['listes_ivf'] > len(self) * self.n_sondes:
+            lignes = np.intersect1d(self._lignes_candidates(q), selection, assume_unique=True)
+        else:
+            lignes = selection
+        if self.quantification == 'binaire':
+            # Premier passage en distance de Hamming, re-scoring des meilleurs
+            hamming = self._hamming(q, lignes)
+            n_candidats = min(k * self.facteur_rescoring, len(hamming))
+            if n_candidats:
+                candidats = np.argpartition(hamming, n_candidats - 1)[:n_candidats]
+                lignes = np.sort(candidats if lignes is None else lignes[candidats])
+            else:
+                lignes = np.zeros(0, dtype=np.int64)
+            distances = self._distances(self.rescoring, q, lignes)
+        else:
+            distances = self._distances(self.quantification, q, lignes)
+        k = min(k, len(distances))
+        if not k:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        meilleurs = np.argpartition(distances, k - 1)[:k]
+        meilleurs = meilleurs[np.argsort(distances[meilleurs])]
+        distances = distances[meilleurs] + float(q @ q)
+        if lignes is not None:
+            meilleurs = lignes[meilleurs]
+        return meilleurs, np.maximum(distances, 0.0)
+
+    def _distances(self, quantification: str, q: np.ndarray, lignes: Optional[np.ndarray]) -> np.ndarray:
+        """||x||² - 2 q·x des lignes (toutes si None) dans une représentation"""
+        matrice, normes, echelles = self._representations[quantification]
+        if quantification == 'int8':
+            # q·(échelles ⊙ codes) = (q ⊙ échelles)·codes
+            q = q * echelles
+        if lignes is None and matrice.dtype == np.float32:
+            return normes - 2 * (matrice @ q)
+        # Lecture et conversion par blocs: jamais de copie float32 de toute
+        # la matrice ni de toute une partition
+        produits = np.empty(len(matrice) if lignes is None else len(lignes), dtype=np.float32)
+        for debut, selection in self._blocs(lignes, len(matrice)):
+            bloc = np.asarray(matrice[selection], dtype=np.float32)
+            produits[debut:debut + len(bloc)] = bloc @ q
+        return (normes if lignes is None else normes[lignes]) - 2 * produits
+
+    @staticmethod
+    def _blocs(lignes: Optional[np.ndarray], n_lignes: int):
+        """
+        Blocs d'au plus TAILLE_BLOC lignes à lire: (position du bloc dans le
+        résultat, tranche de la matrice ou indices des lignes)
+        """
+        if lignes is None:
+            for debut in range(0, n_lignes, TAILLE_BLOC):
+                yield debut, slice(debut, min(debut + TAILLE_BLOC, n_lignes))
+            return
+        bornes = _tranches(lignes)
+        if bornes is None:
+            for debut in range(0, len(lignes), TAILLE_BLOC):
+                yield debut, lignes[debut:debut + TAILLE_BLOC]
+            return
+        for a, b in zip(bornes[:-1], bornes[1:]):
+            decalage = int(lignes[a]) - a
+            for debut in range(a, b, TAILLE_BLOC):
+                yield debut, slice(decalage + debut, decalage + min(debut + TAILLE_BLOC, b))
+
+    def _hamming(self, q: np.ndarray, lignes: Optional[np.ndarray]) -> np.ndarray:
+        """Distance de Hamming entre les signes de q et les codes binaires des lignes"""
+        codes, _, centre = self._representations['binaire']
+        code_q = _signes(q - centre, codes.shape[1]).view(np.uint64)
+        distances = np.empty(len(codes) if lignes is None else len(lignes), dtype=np.int32)
+        for debut, selection in self._blocs(lignes, len(codes)):
+            bloc = np.ascontiguousarray(codes[selection]).view(np.uint64)
+            distances[debut:debut + len(bloc)] = _compter_bits(np.bitwise_xor(bloc, code_q))
+        return distances
+
+    def texte(self, ligne: int) -> str:
+        debut, fin = self.positions[ligne]
+        return bytes(self.textes[debut:fin]).decode('utf-8')
+
+    def passage(self, ligne: int, distance: float) -> Dict:
+        """Passage au format de rechercher() (id, texte, source, chunk_id, distance)"""
+        chunk_id = int(self.chunk_ids[ligne])
+        return {
+            'id': str(self.ids[ligne]),
+            'texte': self.texte(ligne),
+            'source': self.sources[self.indices_sources[ligne]],
+            'chunk_id': chunk_id if chunk_id >= 0 else None,
+            'distance': float(distance),
+        }
+
+    def passages(self, question_embedding: np.ndarray, k: int, filtres: Optional[Dict] = None) -> List[Dict]:
+        """Les k passages les plus proches, au format de rechercher()"""
+        lignes, distances = self.rechercher(question_embedding, k, filtres)
+        return [self.passage(ligne, distance) for ligne, distance in zip(lignes, distances)]
+
+    def _ligne(self, identifiant: str) -> Optional[int]:
+        """Ligne d'un id (None s'il est absent de l'index)"""
+        if self._rangs is None:
+            self._rangs = {str(identifiant): rang for rang, identifiant in enumerate(self.ids)}
+        return self._rangs.get(identifiant)
+
+    def filtrer_ids(self, ids: List[str], filtres: Optional[Dict]) -> List[str]:
+        """Ids connus de l'index qui correspondent aux filtres, dans le même ordre"""
+        selection = self.lignes_filtrees(filtres)
+        lignes = [self._ligne(identifiant) for identifiant in ids]
+        if selection is None:
+            return [identifiant for identifiant, ligne in zip(ids, lignes) if ligne is not None]
+        gardes = np.isin([-1 if ligne is None else ligne for ligne in lignes], selection)
+        return [identifiant for identifiant, garde in zip(ids, gardes) if garde]
+
+    def chunks_par_ids(self, ids: List[str]) -> List[Dict]:
+        """
+        Chunks des ids connus de l'index (id, texte, source, chunk_id, page,
+        categorie, type_document, langue, origine)
+        """
+        chunks = []
+        for identifiant in ids:
+            ligne = self._ligne(identifiant)
+            if ligne is None:
+                continue
+            chunk = self.passage(ligne, 0.0)
+            del chunk['distance']
+            page = int(self.pages[ligne])
+            chunk['page'] = page if page >= 0 else None
+            for champ in CHAMPS_DOCUMENT:
+                chunk[champ] = self.valeurs[champ][self.codes[champ][ligne]] or None
+            chunks.append(chunk)
+        return chunks
+
+    def passages_par_ids(self, ids: List[str], question_embedding: np.ndarray) -> List[Dict]:
+        """Passages des ids connus de l'index, avec leur distance à la question"""
+        q = np.asarray(question_embedding, dtype=np.float32)
+        resultats = []
+        for identifiant in ids:
+            ligne = self._ligne(identifiant)
+            if ligne is None:
+                continue
+            vecteur = np.asarray(self.embeddings[ligne])
+            resultats.append(self.passage(ligne, float(np.sum((q - vecteur) ** 2))))
+        return resultats
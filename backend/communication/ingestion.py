@@ -0,0 +1,545 @@
+"""
+Pipeline d'ingestion parallèle des documents
+Extraction multi-processus page par page, embeddings par gros lots, écriture groupée dans ChromaDB
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import PyPDF2
+
+try:
+    from .metriques import registre as registre_metriques
+    from . import metadonnees
+except ImportError:
+    # Exécution directe (python agent_ia.py)
+    from metriques import registre as registre_metriques
+    import metadonnees
+
+# Extensions prises en charge par l'ingestion
+EXTENSIONS_PDF = ['.pdf']
+EXTENSIONS_TEXTE = ['.txt', '.md']
+
+# Extraction PDF: PyPDF2 par défaut, PyMuPDF (plus rapide, licence AGPL)
+# seulement sur demande explicite
+BACKENDS_PDF = ('auto', 'pymupdf', 'pypdf2')
+BACKEND_PDF_DEFAUT = os.getenv("RAG_EXTRACTION_PDF", "pypdf2")
+
+# Pages extraites par tâche, et taille à partir de laquelle un PDF est
+# extrait par plusieurs processus
+PAGES_PAR_PLAGE = int(os.getenv("RAG_PDF_PAGES_PAR_PLAGE", "16"))
+SEUIL_PAGES_PARALLELE = int(os.getenv("RAG_PDF_PAGES_PARALLELE", "64"))
+
+
+def _pymupdf():
+    """Module PyMuPDF (importé sous le nom fitz avant la version 1.24)"""
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    return pymupdf
+
+
+def backend_pdf(backend: Optional[str] = None) -> str:
+    """
+    Backend d'extraction PDF effectif
+
+    Args:
+        backend: 'pymupdf', 'pypdf2' ou 'auto' (défaut: RAG_EXTRACTION_PDF, sinon
+                 'pypdf2'): 'auto' choisit PyMuPDF s'il est installé, PyPDF2 sinon
+
+    Raises:
+        ValueError: Backend inconnu
+    """
+    backend = (backend or BACKEND_PDF_DEFAUT).lower()
+    if backend not in BACKENDS_PDF:
+        raise ValueError(f"Backend d'extraction PDF inconnu: {backend} (attendu: {', '.join(BACKENDS_PDF)})")
+    if backend == 'pypdf2':
+        return backend
+    try:
+        _pymupdf()
+        return 'pymupdf'
+    except ImportError:
+        if backend == 'pymupdf':
+            print("⚠️  PyMuPDF non installé (pip install pymupdf), extraction avec PyPDF2")
+        return 'pypdf2'
+
+
+def nombre_pages_pdf(chemin_pdf: str, backend: Optional[str] = None) -> int:
+    """Nombre de pages d'un fichier PDF"""
+    if backend_pdf(backend) == 'pymupdf':
+        with _pymupdf().open(chemin_pdf) as document:
+            return document.page_count
+    with open(chemin_pdf, 'rb') as fichier:
+        return len(PyPDF2.PdfReader(fichier).pages)
+
+
+def extraire_pages_pdf(chemin_pdf: str, debut: int, fin: int,
+                       backend: Optional[str] = None) -> List[Tuple[int, str]]:
+    """
+    Extrait le texte des pages [debut, fin[ d'un PDF (exécutée dans un
+    processus de travail pour les gros documents)
+
+    Le fichier est rouvert à chaque plage: seules les pages de la plage
+    sont chargées en mémoire.
+
+    Returns:
+        Liste de (numéro de page à partir de 1, texte)
+    """
+    if backend_pdf(backend) == 'pymupdf':
+        with _pymupdf().open(chemin_pdf) as document:
+            return [(i + 1, document.load_page(i).get_text()) for i in range(debut, fin)]
+    with open(chemin_pdf, 'rb') as fichier:
+        lecteur = PyPDF2.PdfReader(fichier)
+        return [(i + 1, lecteur.pages[i].extract_text() or "") for i in range(debut, fin)]
+
+
+def iterer_pages_pdf(chemin_pdf: str, backend: Optional[str] = None,
+                     n_workers: int = 1) -> Iterator[Tuple[int, str]]:
+    """
+    Parcourt les pages d'un PDF dans l'ordre, sans charger tout le document
+
+    Les pages sont extraites par plages de PAGES_PAR_PLAGE. Au-delà de
+    SEUIL_PAGES_PARALLELE pages et avec n_workers > 1, les plages sont
+    extraites en parallèle par un pool de processus; au plus 2 * n_workers
+    plages sont en cours à la fois, la mémoire reste donc bornée quelle que
+    soit la taille du document.
+
+    Args:
+        chemin_pdf: Fichier PDF
+        backend: Backend d'extraction (voir backend_pdf)
+        n_workers: Processus d'extraction pour les gros documents
+
+    Yields:
+        Tuple (numéro de page à partir de 1, texte de la page)
+    """
+    backend = backend_pdf(backend)
+    nb_pages = nombre_pages_pdf(chemin_pdf, backend)
+    plages = [(debut, min(debut + PAGES_PAR_PLAGE, nb_pages))
+              for debut in range(0, nb_pages, PAGES_PAR_PLAGE)]
+
+    if n_workers <= 1 or nb_pages < SEUIL_PAGES_PARALLELE:
+        for debut, fin in plages:
+            yield from extraire_pages_pdf(chemin_pdf, debut, fin, backend)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        restantes = iter(plages)
+        en_cours = deque(
+            pool.submit(extraire_pages_pdf, chemin_pdf, debut, fin, backend)
+            for debut, fin in islice(restantes, 2 * n_workers)
+        )
+        while en_cours:
+            pages = en_cours.popleft().result()
+            suivante = next(restantes, None)
+            if suivante is not None:
+                en_cours.append(pool.submit(extraire_pages_pdf, chemin_pdf, *suivante, backend))
+            yield from pages
+
+
+def lire_pdf(chemin_pdf: str) -> str:
+    """Extrait le texte d'un fichier PDF"""
+    return "".join(texte + "\n" for _, texte in iterer_pages_pdf(chemin_pdf))
+
+
+def lire_txt(chemin_txt: str) -> str:
+    """Lit un fichier texte"""
+    with open(chemin_txt, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def decouper_texte(texte: str, taille_chunk=500, overlap=50) -> List[str]:
+    """
+    Découpe le texte en chunks (morceaux) pour de meilleurs embeddings
+
+    Args:
+        texte: Texte à découper
+        taille_chunk: Nombre de caractères par chunk
+        overlap: Chevauchement entre chunks
+    """
+    chunks = []
+    debut = 0
+
+    while debut < len(texte):
+        fin = debut + taille_chunk
+        chunk = texte[debut:fin]
+
+        # Essayer de couper à la fin d'une phrase
+        if fin < len(texte):
+            dernier_point = chunk.rfind('.')
+            if dernier_point > taille_chunk * 0.5:
+                chunk = chunk[:dernier_point + 1]
+                fin = debut + dernier_point + 1
+
+        chunks.append(chunk.strip())
+        debut = fin - overlap
+
+    return chunks
+
+
+def decouper_pages(pages: Iterable[Tuple[int, str]], taille_chunk=500,
+                   overlap=50) -> Iterator[Tuple[str, int]]:
+    """
+    Découpage de decouper_texte appliqué au fil des pages d'un document
+
+    Produit les mêmes chunks que decouper_texte sur le texte complet (pages
+    séparées par un saut de ligne) en ne gardant en mémoire que la page
+    courante et la fin de la précédente.
+
+    Args:
+        pages: (numéro de page, texte), par exemple iterer_pages_pdf(...)
+        taille_chunk: Nombre de caractères par chunk
+        overlap: Chevauchement entre chunks
+
+    Yields:
+        Tuple (chunk, numéro de la page où il commence)
+    """
+    tampon = ""
+    origine = 0     # position du premier caractère du tampon dans le document
+    debut = 0       # position du prochain chunk dans le document
+    reperes: "deque[Tuple[int, int]]" = deque()  # (position de début, numéro) des pages
+
+    def page_de(position: int) -> int:
+        while len(reperes) > 1 and reperes[1][0] <= position:
+            reperes.popleft()
+        return reperes[0][1]
+
+    def decouper(fin_connue: bool) -> Iterator[Tuple[str, int]]:
+        nonlocal debut
+        longueur = origine + len(tampon)
+        # Tant que la fin du document n'est pas atteinte, un chunk n'est
+        # produit que si du texte le suit (même règle de coupe que decouper_texte)
+        while debut < longueur and (fin_connue or debut + taille_chunk < longueur):
+            fin = debut + taille_chunk
+            chunk = tampon[debut - origine:fin - origine]
+            if fin < longueur:
+                dernier_point = chunk.rfind('.')
+                if dernier_point > taille_chunk * 0.5:
+                    chunk = chunk[:dernier_point + 1]
+                    fin = debut + dernier_point + 1
+            yield chunk.strip(), page_de(debut)
+            debut = fin - overlap
+
+    for numero, texte in pages:
+        reperes.append((origine + len(tampon), numero))
+        tampon += texte + "\n"
+        yield from decouper(fin_connue=False)
+        # Oublier le texte déjà découpé
+        tampon = tampon[debut - origine:]
+        origine = debut
+
+    yield from decouper(fin_connue=True)
+
+
+def iterer_chunks(chemin: str, taille_chunk=500, overlap=50, n_workers: int = 1,
+                  decoupeur=None) -> Iterator[Tuple[str, Optional[int]]]:
+    """
+    Chunks d'un fichier au fil de la lecture
+
+    Args:
+        chemin: Fichier PDF ou texte
+        taille_chunk: Nombre de caractères par chunk (découpage par caractères)
+        overlap: Chevauchement entre chunks (découpage par caractères)
+        n_workers: Processus d'extraction pour les gros PDF
+        decoupeur: DecoupeurTexte (découpage par structure et tokens);
+                   None = découpage par caractères de decouper_texte
+
+    Yields:
+        Tuple (chunk, numéro de page ou None pour un fichier texte)
+    """
+    if Path(chemin).suffix.lower() in EXTENSIONS_PDF:
+        pages = iterer_pages_pdf(chemin, n_workers=n_workers)
+        if decoupeur is not None:
+            yield from decoupeur.decouper_pages(pages)
+        else:
+            yield from decouper_pages(pages, taille_chunk, overlap)
+        return
+
+    texte = lire_txt(chemin)
+    chunks = decoupeur.decouper(texte) if decoupeur is not None else decouper_texte(texte, taille_chunk, overlap)
+    for chunk in chunks:
+        yield chunk, None
+
+
+def metadonnees_chunk(source: str, chunk_id: int, extension: str, page: Optional[int] = None,
+                      attributs: Optional[Dict] = None) -> Dict:
+    """
+    Métadonnées ChromaDB d'un chunk (la page n'est renseignée que pour les PDF)
+
+    Args:
+        source: Nom du fichier ou URL
+        chunk_id: Rang du chunk dans le document
+        extension: Valeur de la métadonnée "type" (extension ou "web")
+        page: Page du PDF
+        attributs: Métadonnées du document (metadonnees.attributs_document)
+    """
+    resultat = {"source": source, "chunk_id": chunk_id, "type": extension, **(attributs or {})}
+    if page is not None:
+        resultat["page"] = page
+    return resultat
+
+
+# Découpeur des processus de travail du pipeline (voir initialiser_processus)
+_decoupeur_processus = None
+
+
+def initialiser_processus(decoupeur):
+    """Initialisation d'un processus de travail: le découpeur (et son tokenizer) n'est transmis qu'une fois"""
+    global _decoupeur_processus
+    _decoupeur_processus = decoupeur
+
+
+def extraire_et_decouper(chemin: str, decoupeur=None) -> Tuple[str, List[str], List[Optional[int]]]:
+    """
+    Étape 1 du pipeline (exécutée dans un processus de travail):
+    lit un fichier et le découpe en chunks
+
+    Args:
+        chemin: Fichier à découper
+        decoupeur: DecoupeurTexte (défaut: celui du processus, sinon
+                   découpage par caractères)
+
+    Returns:
+        Tuple (chemin, chunks, page de chaque chunk ou None pour un fichier texte)
+    """
+    chunks, pages = [], []
+    for chunk, page in iterer_chunks(chemin, decoupeur=decoupeur or _decoupeur_processus):
+        chunks.append(chunk)
+        pages.append(page)
+    return chemin, chunks, pages
+
+
+def _extraire_et_decouper_chronometre(chemin: str) -> Tuple[Tuple[str, List[str], List[Optional[int]]], float]:
+    """extraire_et_decouper et sa durée (s), mesurée dans le processus de travail"""
+    debut = time.perf_counter()
+    resultat = extraire_et_decouper(chemin)
+    return resultat, time.perf_counter() - debut
+
+
+class PipelineIngestion:
+    """
+    Ingestion d'un dossier en trois étages qui se recouvrent:
+
+    1. un pool de processus extrait et découpe les fichiers (CPU, parallèle);
+       les gros PDF sont ensuite lus un par un, page par page, leurs plages
+       de pages étant réparties entre les processus
+    2. le thread principal regroupe les chunks de plusieurs fichiers en lots
+       de taille fixe et calcule leurs embeddings en un seul appel à encode
+    3. un thread d'écriture ajoute chaque lot à ChromaDB en un seul add
+
+    La durée de chaque étage est enregistrée dans rag_ingestion_duree_secondes.
+    """
+
+    def __init__(self, embedding_model, collection, n_workers: Optional[int] = None,
+                 taille_batch: int = 256, lots_en_attente: int = 4, index_bm25=None, decoupeur=None):
+        """
+        Args:
+            embedding_model: Modèle SentenceTransformer (ou compatible encode)
+            collection: Collection ChromaDB de destination
+            n_workers: Processus d'extraction (défaut: nombre de coeurs)
+            taille_batch: Nombre de chunks par appel à encode et à add
+            lots_en_attente: Lots embeddés pouvant attendre l'écriture
+                             (au-delà, l'étage d'embedding attend)
+            index_bm25: Index lexical à alimenter avec les mêmes chunks
+            decoupeur: DecoupeurTexte des fichiers (None = découpage par caractères)
+        """
+        self.embedding_model = embedding_model
+        self.collection = collection
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.taille_batch = taille_batch
+        self.index_bm25 = index_bm25
+        self.decoupeur = decoupeur
+        self._file_ecriture: "queue.Queue" = queue.Queue(maxsize=lots_en_attente)
+        self._erreur_ecriture: Optional[BaseException] = None
+        self._lot: Dict[str, List] = {'textes': [], 'metadatas': [], 'ids': []}
+
+    def _ecrivain(self):
+        """Étage 3: ajoute les lots à ChromaDB jusqu'à recevoir None"""
+        while True:
+            lot = self._file_ecriture.get()
+            try:
+                if lot is None:
+                    return
+                if self._erreur_ecriture is not None:
+                    continue
+                with registre_metriques.chronometrer('rag_ingestion_duree_secondes', etape='ecriture'):
+                    self.collection.add(**lot)
+                    if self.index_bm25 is not None:
+                        self.index_bm25.ajouter(lot['ids'], lot['documents'])
+                registre_metriques.incrementer('rag_ingestion_chunks_total', len(lot['ids']))
+            except Exception as e:
+                self._erreur_ecriture = e
+            finally:
+                self._file_ecriture.task_done()
+
+    def _envoyer_lot(self, textes: List[str], metadatas: List[Dict], ids: List[str]):
+        """Étage 2: embeddings d'un lot complet puis passage à l'écrivain"""
+        with registre_metriques.chronometrer('rag_ingestion_duree_secondes', etape='embedding'):
+            embeddings = self.embedding_model.encode(
+                textes, batch_size=len(textes), show_progress_bar=False
+            )
+        self._file_ecriture.put({
+            'embeddings': embeddings.tolist(),
+            'documents': textes,
+            'metadatas': metadatas,
+            'ids': ids
+        })
+
+    def _ajouter(self, chunk: str, metadata: Dict, id_chunk: str):
+        """Ajoute un chunk au lot courant et l'envoie dès qu'il est complet"""
+        self._lot['textes'].append(chunk)
+        self._lot['metadatas'].append(metadata)
+        self._lot['ids'].append(id_chunk)
+        if len(self._lot['textes']) >= self.taille_batch:
+            self._vider_lot()
+
+    def _vider_lot(self):
+        if self._lot['textes']:
+            self._envoyer_lot(self._lot['textes'], self._lot['metadatas'], self._lot['ids'])
+            self._lot = {'textes': [], 'metadatas': [], 'ids': []}
+
+    def _annuler(self, ids: List[str]):
+        """
+        Retire les chunks d'un document dont l'extraction a échoué: ceux du
+        lot courant sont écartés, les autres sont supprimés de la collection
+        et de l'index lexical une fois écrits par l'écrivain
+        """
+        a_retirer = set(ids)
+        garder = [i for i, id_chunk in enumerate(self._lot['ids']) if id_chunk not in a_retirer]
+        envoyes = len(a_retirer) - (len(self._lot['ids']) - len(garder))
+        self._lot = {cle: [valeurs[i] for i in garder] for cle, valeurs in self._lot.items()}
+        if not envoyes:
+            return
+        # Attendre que les lots déjà envoyés soient écrits avant de les supprimer
+        self._file_ecriture.join()
+        self.collection.delete(ids=ids)
+        if self.index_bm25 is not None:
+            self.index_bm25.supprimer(ids)
+
+    @staticmethod
+    def _est_gros_pdf(fichier: Path) -> bool:
+        """PDF assez long pour être lu page par page par plusieurs processus"""
+        if fichier.suffix.lower() not in EXTENSIONS_PDF:
+            return False
+        try:
+            return nombre_pages_pdf(str(fichier)) >= SEUIL_PAGES_PARALLELE
+        except Exception:
+            return False
+
+    def traiter(self, fichiers: List[Path], prefixes_ids: Optional[Dict[str, str]] = None,
+                categories: Optional[Dict[str, str]] = None) -> Dict:
+        """
+        Ingère une liste de fichiers
+
+        Args:
+            fichiers: Fichiers à ingérer
+            prefixes_ids: Préfixe des ids de chunks par chemin de fichier
+                          (défaut: nom du fichier sans extension)
+            categories: Catégorie imposée par chemin de fichier (défaut:
+                        déduite du nom et du début du document)
+
+        Returns:
+            Dict: fichiers et chunks traités, durée, débits (fichiers/s, chunks/s)
+            et nombre de chunks par fichier (chunks_par_fichier)
+        """
+        prefixes_ids = prefixes_ids or {}
+        categories = categories or {}
+        classification = metadonnees.charger_categories()
+        debut = time.perf_counter()
+        ecrivain = threading.Thread(target=self._ecrivain, name="ingestion-ecriture", daemon=True)
+        ecrivain.start()
+
+        fichiers_traites = 0
+        chunks_traites = 0
+        chunks_par_fichier: Dict[str, int] = {}
+
+        # Les gros PDF ne passent pas entiers d'un processus à l'autre
+        gros_pdf = [f for f in fichiers if self._est_gros_pdf(f)]
+        autres = [f for f in fichiers if f not in gros_pdf]
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.n_workers, initializer=initialiser_processus,
+                                     initargs=(self.decoupeur,)) as pool:
+                futures = [pool.submit(_extraire_et_decouper_chronometre, str(f)) for f in autres]
+                for future in as_completed(futures):
+                    try:
+                        (chemin, chunks, pages), duree = future.result()
+                        registre_metriques.observer('rag_ingestion_duree_secondes', duree,
+                                                    etape='extraction_decoupage')
+                    except Exception as e:
+                        print(f"    ❌ Erreur d'extraction: {e}")
+                        continue
+
+                    fichier = Path(chemin)
+                    prefixe = prefixes_ids.get(chemin, fichier.stem)
+                    attributs = metadonnees.attributs_document(
+                        fichier.name, chunks[0] if chunks else "",
+                        categorie=categories.get(chemin), categories=classification
+                    )
+                    for i, (chunk, page) in enumerate(zip(chunks, pages)):
+                        self._ajouter(chunk, metadonnees_chunk(fichier.name, i, fichier.suffix, page, attributs),
+                                      f"{prefixe}_{i}")
+
+                    fichiers_traites += 1
+                    chunks_traites += len(chunks)
+                    chunks_par_fichier[chemin] = len(chunks)
+                    print(f"  📄 {fichier.name}: {len(chunks)} chunks")
+
+            for fichier in gros_pdf:
+                chemin = str(fichier)
+                prefixe = prefixes_ids.get(chemin, fichier.stem)
+                ids_fichier = []
+                attributs = None
+                debut_fichier = time.perf_counter()
+                try:
+                    for chunk, page in iterer_chunks(chemin, n_workers=self.n_workers, decoupeur=self.decoupeur):
+                        if attributs is None:
+                            attributs = metadonnees.attributs_document(
+                                fichier.name, chunk, categorie=categories.get(chemin), categories=classification
+                            )
+                        ids_fichier.append(f"{prefixe}_{len(ids_fichier)}")
+                        self._ajouter(chunk, metadonnees_chunk(fichier.name, len(ids_fichier) - 1, fichier.suffix,
+                                                               page, attributs),
+                                      ids_fichier[-1])
+                except Exception as e:
+                    # Le document n'est pas compté comme traité: il ne sera
+                    # pas enregistré dans le manifeste, et ses chunks déjà
+                    # produits ne doivent pas rester interrogeables
+                    print(f"    ❌ Erreur d'extraction de {fichier.name}: {e}")
+                    self._annuler(ids_fichier)
+                    continue
+                nb_chunks = len(ids_fichier)
+
+                # Extraction et embedding des lots se recouvrent: durée du document entier
+                registre_metriques.observer('rag_ingestion_duree_secondes', time.perf_counter() - debut_fichier,
+                                            etape='extraction_decoupage')
+                fichiers_traites += 1
+                chunks_traites += nb_chunks
+                chunks_par_fichier[chemin] = nb_chunks
+                print(f"  📚 {fichier.name}: {nb_chunks} chunks (extraction par pages)")
+
+            # Dernier lot incomplet
+            self._vider_lot()
+        finally:
+            self._file_ecriture.put(None)
+            ecrivain.join()
+
+        if self._erreur_ecriture is not None:
+            raise self._erreur_ecriture
+
+        duree = time.perf_counter() - debut
+        return {
+            'fichiers': fichiers_traites,
+            'chunks': chunks_traites,
+            'duree': duree,
+            'fichiers_par_s': fichiers_traites / duree if duree else 0.0,
+            'chunks_par_s': chunks_traites / duree if duree else 0.0,
+            'chunks_par_fichier': chunks_par_fichier,
+        }
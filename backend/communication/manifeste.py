@@ -0,0 +1,116 @@
+"""
+Manifeste d'ingestion pour la réindexation incrémentale
+Associe chaque document (fichier ou URL) à l'empreinte de son contenu et à ses chunks
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+
+def empreinte_octets(contenu: bytes) -> str:
+    """Empreinte SHA-256 d'un contenu binaire"""
+    return hashlib.sha256(contenu).hexdigest()
+
+
+def empreinte_fichier(chemin: Path) -> str:
+    """Empreinte SHA-256 du contenu d'un fichier (lu par blocs)"""
+    h = hashlib.sha256()
+    with open(chemin, 'rb') as f:
+        for bloc in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloc)
+    return h.hexdigest()
+
+
+def empreinte_texte(texte: str) -> str:
+    """Empreinte SHA-256 d'un texte"""
+    return empreinte_octets(texte.encode('utf-8'))
+
+
+def prefixe_ids(base: str, cle: str) -> str:
+    """
+    Préfixe des ids de chunks d'un document
+
+    Le suffixe dérivé de la clé évite les collisions entre documents de même
+    nom (X.pdf et X.txt, plusieurs URLs d'un même site).
+    """
+    return f"{base}_{hashlib.sha1(cle.encode('utf-8')).hexdigest()[:8]}"
+
+
+class ManifesteIngestion:
+    """
+    Fichier JSON stocké à côté de la base ChromaDB:
+
+    {
+        "documents": {
+            "fichier:pdf/Acte de naissance.txt": {
+                "empreinte": "<sha256 du contenu>",
+                "prefixe_ids": "Acte de naissance_1a2b3c4d",
+                "nb_chunks": 12,
+                "parametres": {"modele": "...", "taille_chunk": 500, "overlap": 50},
+                "date": "2025-01-01T00:00:00"
+            }
+        }
+    }
+
+    Un document est à jour si son empreinte et les paramètres d'indexation
+    (modèle d'embeddings, découpage) n'ont pas changé.
+    """
+
+    NOM_FICHIER = "manifeste_ingestion.json"
+
+    def __init__(self, dossier_base: str):
+        """
+        Args:
+            dossier_base: Dossier de la base ChromaDB
+        """
+        self.chemin = Path(dossier_base) / self.NOM_FICHIER
+        self.documents: Dict[str, Dict] = {}
+        if self.chemin.exists():
+            with open(self.chemin, 'r', encoding='utf-8') as f:
+                self.documents = json.load(f).get('documents', {})
+
+    def est_a_jour(self, cle: str, empreinte: str, parametres: Dict) -> bool:
+        """True si le document est déjà indexé avec ce contenu et ces paramètres"""
+        entree = self.documents.get(cle)
+        return (
+            entree is not None
+            and entree['empreinte'] == empreinte
+            and entree['parametres'] == parametres
+        )
+
+    def ids(self, cle: str) -> Optional[List[str]]:
+        """Ids des chunks indexés pour ce document, ou None s'il est inconnu"""
+        entree = self.documents.get(cle)
+        if entree is None:
+            return None
+        return [f"{entree['prefixe_ids']}_{i}" for i in range(entree['nb_chunks'])]
+
+    def enregistrer(self, cle: str, empreinte: str, prefixe: str, nb_chunks: int, parametres: Dict):
+        """Enregistre (ou remplace) l'entrée d'un document indexé"""
+        self.documents[cle] = {
+            'empreinte': empreinte,
+            'prefixe_ids': prefixe,
+            'nb_chunks': nb_chunks,
+            'parametres': parametres,
+            'date': datetime.now().isoformat(timespec='seconds'),
+        }
+
+    def supprimer(self, cle: str):
+        """Retire un document du manifeste"""
+        self.documents.pop(cle, None)
+
+    def cles(self, prefixe: str = "") -> Set[str]:
+        """Clés des documents connus commençant par ce préfixe"""
+        return {cle for cle in self.documents if cle.startswith(prefixe)}
+
+    def sauvegarder(self):
+        """Écrit le manifeste sur disque (écriture atomique)"""
+        self.chemin.parent.mkdir(parents=True, exist_ok=True)
+        temporaire = self.chemin.with_suffix('.tmp')
+        with open(temporaire, 'w', encoding='utf-8') as f:
+            json.dump({'documents': self.documents}, f, ensure_ascii=False, indent=1)
+        os.replace(temporaire, self.chemin)
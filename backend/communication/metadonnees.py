@@ -0,0 +1,233 @@
+"""
+Métadonnées des chunks et filtres de recherche
+Catégorie, type de document, langue et origine déduits à l'ingestion;
+filtres des requêtes traduits en clause "where" ChromaDB
+"""
+
+import json
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# Version des métadonnées calculées à l'ingestion: l'incrémenter force la
+# réindexation (elle fait partie des paramètres d'indexation)
+VERSION_METADONNEES = 1
+
+# Métadonnées communes aux chunks d'un document (attributs_document)
+CHAMPS_DOCUMENT = ('categorie', 'type_document', 'langue', 'origine')
+
+# Champs acceptés dans "filtres" (métadonnées des chunks)
+CHAMPS_TEXTE = ('source',) + CHAMPS_DOCUMENT
+CHAMPS_FILTRES = CHAMPS_TEXTE + ('page',)
+
+# Origines d'un chunk
+ORIGINES = ('fichier', 'web')
+
+# Catégories par défaut et mots-clés (sans accents, en minuscules) cherchés
+# dans le nom du document puis dans son début; RAG_CATEGORIES désigne un
+# fichier JSON {categorie: [mots-clés]} qui les remplace
+CATEGORIES_DEFAUT = {
+    'etat_civil': ['naissance', 'mariage', 'deces', 'divorce', 'etat civil', 'celibat',
+                   'changement de nom', 'suppletif', 'vie et de charge'],
+    'identite_voyage': ['passeport', 'carte nationale', 'identite', 'visa', 'titre de sejour',
+                        'consulaire', 'nationalite', 'residence', 'hebergement', 'demenagement'],
+    'justice': ['casier judiciaire', 'condamnation', 'justice', 'banditisme', 'torture',
+                'huissier', 'bonne vie', 'corruption', 'procuration', 'legalisation'],
+    'fiscalite': ['impot', 'fiscal', 'nif', 'ifu', 'loi de finance', 'douane', 'taxe'],
+    'travail': ['travail', 'cnss', 'cnamu', 'amu', 'pension', 'non-indemnisation'],
+    'fonction_publique': ['fonction publique', 'concours', 'agents publics', 'fonctionnaire',
+                          'carriere', 'classement indiciaire'],
+    'entreprise': ['commerce', 'rccm', 'artisan', 'commercialisation', 'association', 'sonabel', 'onea'],
+    'foncier_urbanisme': ['terrain', 'permis de construire', 'construction', 'non-cession', 'propriete'],
+    'transport': ['carte grise', 'permis de conduire', 'visite technique', 'automobile'],
+    'education': ['diplome', 'scolaire', 'enseignement'],
+    'sante': ['sante', 'medical', 'hospitaliere', 'veterinaire', 'pesticides', 'vegetaux'],
+    'communication': ['telecommunication', 'communications electroniques', 'communication'],
+    'collectivites': ['collectivites', 'territoriale', 'ministere', 'administration'],
+    'droits_humains': ['droits humains', 'femme', 'discrimination', 'defenseurs'],
+}
+CATEGORIE_INCONNUE = 'autre'
+
+# Caractères du début du document examinés pour la catégorie et la langue
+_DEBUT_TEXTE = 2000
+
+# Type de document d'après le début de son nom (sans accents, en minuscules)
+_TYPES_PAR_NOM = (
+    (re.compile(r"^\W*(?:decret|arrete)"), 'decret_arrete'),
+    (re.compile(r"^\W*convention\b"), 'convention'),
+    (re.compile(r"^\W*(?:loi|code)\b|\bportant\b"), 'loi'),
+)
+
+# Mots outils des langues reconnues
+_MOTS_LANGUES = {
+    'fr': {'le', 'la', 'les', 'des', 'du', 'et', 'est', 'pour', 'dans', 'une', 'que', 'qui', 'au', 'aux', 'par', 'sur'},
+    'en': {'the', 'and', 'of', 'to', 'is', 'for', 'in', 'that', 'with', 'on', 'are', 'be', 'this', 'by'},
+}
+_MOTS = re.compile(r"[a-zà-ÿ]+")
+
+
+def _normaliser(texte: str) -> str:
+    """Minuscules sans accents (comparaison des mots-clés)"""
+    decompose = unicodedata.normalize('NFKD', texte.lower())
+    return "".join(c for c in decompose if not unicodedata.combining(c)).replace('_', ' ').replace('’', "'")
+
+
+def charger_categories(chemin: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Catégories et mots-clés de la classification des documents
+
+    Args:
+        chemin: Fichier JSON {categorie: [mots-clés]} (défaut: RAG_CATEGORIES,
+                sinon CATEGORIES_DEFAUT)
+    """
+    chemin = chemin or os.getenv("RAG_CATEGORIES")
+    if not chemin:
+        return CATEGORIES_DEFAUT
+    with open(chemin, encoding='utf-8') as f:
+        categories = json.load(f)
+    return {categorie: [_normaliser(mot) for mot in mots] for categorie, mots in categories.items()}
+
+
+@lru_cache(maxsize=None)
+def _motif(mot: str) -> "re.Pattern":
+    """Mot-clé en début de mot ('impot' trouve 'impots', 'nif' ne trouve pas 'signifie')"""
+    return re.compile(r"\b" + re.escape(mot))
+
+
+def categorie_document(nom: str, texte: str = "", categories: Optional[Dict[str, List[str]]] = None) -> str:
+    """
+    Catégorie d'un document: celle dont le plus de mots-clés apparaissent
+    dans son nom, puis, à égalité, dans le début de son texte
+
+    Returns:
+        str: catégorie, ou CATEGORIE_INCONNUE si aucun mot-clé n'apparaît
+    """
+    nom, texte = _normaliser(nom), _normaliser(texte[:_DEBUT_TEXTE])
+    meilleure, meilleur_score = CATEGORIE_INCONNUE, (0, 0)
+    for categorie, mots in (categories or charger_categories()).items():
+        score = (sum(bool(_motif(mot).search(nom)) for mot in mots),
+                 sum(bool(_motif(mot).search(texte)) for mot in mots))
+        if score > meilleur_score:
+            meilleure, meilleur_score = categorie, score
+    return meilleure
+
+
+def type_document(nom: str, origine: str = 'fichier') -> str:
+    """
+    Nature d'un document d'après son nom: 'loi' (lois et codes),
+    'decret_arrete', 'convention', 'fiche' (fiches de procédure .txt/.md),
+    'document' (autres PDF) ou 'page_web'
+    """
+    if origine == 'web':
+        return 'page_web'
+    nom_normalise = _normaliser(nom)
+    for motif, nature in _TYPES_PAR_NOM:
+        if motif.search(nom_normalise):
+            return nature
+    return 'document' if nom_normalise.endswith('.pdf') else 'fiche'
+
+
+def langue_texte(texte: str) -> str:
+    """Langue d'un texte ('fr' ou 'en') d'après ses mots outils, 'inconnue' s'il n'en a pas"""
+    comptes = dict.fromkeys(_MOTS_LANGUES, 0)
+    for mot in _MOTS.findall(texte[:_DEBUT_TEXTE].lower()):
+        for langue, mots in _MOTS_LANGUES.items():
+            comptes[langue] += mot in mots
+    langue = max(comptes, key=comptes.get)
+    return langue if comptes[langue] else 'inconnue'
+
+
+def attributs_document(nom: str, texte: str = "", origine: str = 'fichier',
+                       categorie: Optional[str] = None,
+                       categories: Optional[Dict[str, List[str]]] = None) -> Dict[str, str]:
+    """
+    Métadonnées communes aux chunks d'un document
+
+    Args:
+        nom: Nom du fichier ou URL
+        texte: Début du texte (premier chunk)
+        origine: 'fichier' ou 'web'
+        categorie: Catégorie imposée (sous-dossier du document), sinon déduite
+        categories: Classification à utiliser (défaut: charger_categories())
+
+    Returns:
+        Dict: categorie, type_document, langue, origine
+    """
+    return {
+        'categorie': categorie or categorie_document(nom, texte, categories),
+        'type_document': type_document(nom, origine),
+        'langue': langue_texte(texte),
+        'origine': origine,
+    }
+
+
+def normaliser_filtres(filtres) -> Dict:
+    """
+    Valide les filtres d'une requête et les met sous forme canonique
+
+    Chaque champ de CHAMPS_TEXTE prend une valeur ou une liste de valeurs
+    (l'une d'elles suffit); "page" prend un numéro, une liste de numéros ou
+    {"min": a, "max": b}. Les champs se combinent par un ET.
+
+    Args:
+        filtres: Dict reçu du client (None = pas de filtre)
+
+    Returns:
+        Dict: {champ: [valeurs]} et éventuellement {'page': {'min', 'max'}}
+        ({} sans filtre)
+
+    Raises:
+        ValueError: champ inconnu ou valeur invalide
+    """
+    if not filtres:
+        return {}
+    if not isinstance(filtres, dict):
+        raise ValueError('Le champ "filtres" doit être un objet')
+    inconnus = set(filtres) - set(CHAMPS_FILTRES)
+    if inconnus:
+        raise ValueError(f"Filtre inconnu: {', '.join(sorted(inconnus))} (attendu: {', '.join(CHAMPS_FILTRES)})")
+
+    def est_page(valeur) -> bool:
+        return isinstance(valeur, int) and not isinstance(valeur, bool) and valeur >= 0
+
+    normalises = {}
+    for champ, valeur in filtres.items():
+        if champ == 'page' and isinstance(valeur, dict):
+            bornes = {cle: valeur[cle] for cle in ('min', 'max') if valeur.get(cle) is not None}
+            if set(valeur) - {'min', 'max'} or not bornes or not all(est_page(v) for v in bornes.values()):
+                raise ValueError('Le filtre "page" attend {"min": n, "max": m} avec des entiers positifs')
+            normalises[champ] = bornes
+            continue
+        valeurs = valeur if isinstance(valeur, list) else [valeur]
+        valide = est_page if champ == 'page' else (lambda v: isinstance(v, str) and v != "")
+        if not valeurs or not all(valide(v) for v in valeurs):
+            attendu = "un numéro de page ou une liste de numéros" if champ == 'page' \
+                else "une chaîne non vide ou une liste de chaînes"
+            raise ValueError(f'Le filtre "{champ}" attend {attendu}')
+        normalises[champ] = list(dict.fromkeys(valeurs))
+    return normalises
+
+
+def clause_where(filtres: Dict) -> Optional[Dict]:
+    """
+    Clause "where" ChromaDB équivalente à des filtres (voir normaliser_filtres)
+
+    Returns:
+        Dict ou None sans filtre
+    """
+    conditions = []
+    for champ, valeurs in normaliser_filtres(filtres).items():
+        if isinstance(valeurs, dict):
+            if 'min' in valeurs:
+                conditions.append({champ: {'$gte': valeurs['min']}})
+            if 'max' in valeurs:
+                conditions.append({champ: {'$lte': valeurs['max']}})
+        elif len(valeurs) == 1:
+            conditions.append({champ: valeurs[0]})
+        else:
+            conditions.append({champ: {'$in': valeurs}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
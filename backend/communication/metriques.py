@@ -0,0 +1,149 @@
+"""
+Métriques de latence au format Prometheus
+Histogrammes par étape (requêtes et ingestion), compteurs et export texte pour /api/metrics/
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Bornes des histogrammes (s): de la milliseconde (BM25, construction du
+# prompt) à la minute (génération sur CPU)
+BORNES_DEFAUT = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Familles exportées, avec leur type et leur description
+FAMILLES = {
+    'rag_etape_duree_secondes': (
+        'histogram', "Durée de chaque étape d'une question (parsing, embedding, recherche, prompt, file, LLM)"),
+    'rag_requete_duree_secondes': (
+        'histogram', "Durée de traitement d'une requête HTTP par endpoint"),
+    'rag_requetes_total': (
+        'counter', "Requêtes HTTP par endpoint et code de statut"),
+    'rag_ingestion_duree_secondes': (
+        'histogram', "Durée des étapes d'ingestion (extraction et découpage par document, embedding et écriture par lot)"),
+    'rag_ingestion_chunks_total': (
+        'counter', "Chunks indexés"),
+}
+
+Etiquettes = Tuple[Tuple[str, str], ...]
+
+
+def _etiquettes(etiquettes: Dict[str, str]) -> Etiquettes:
+    return tuple(sorted((cle, str(valeur)) for cle, valeur in etiquettes.items()))
+
+
+def _format_etiquettes(etiquettes: Iterable[Tuple[str, str]]) -> str:
+    paires = [f'{cle}="{valeur}"'.replace("\n", " ") for cle, valeur in etiquettes]
+    return "{" + ",".join(paires) + "}" if paires else ""
+
+
+def _format_nombre(valeur: float) -> str:
+    if valeur == float("inf"):
+        return "+Inf"
+    return repr(float(valeur)) if isinstance(valeur, float) else str(valeur)
+
+
+class _Histogramme:
+    """Comptes par borne (non cumulés), somme et nombre d'observations"""
+
+    __slots__ = ('comptes', 'somme', 'nombre')
+
+    def __init__(self, n_bornes: int):
+        self.comptes = [0] * (n_bornes + 1)
+        self.somme = 0.0
+        self.nombre = 0
+
+
+class RegistreMetriques:
+    """
+    Histogrammes et compteurs étiquetés, exportés au format texte de Prometheus
+
+    Une observation coûte une recherche dichotomique et trois additions
+    sous un verrou: elle peut rester sur le chemin de chaque requête.
+    """
+
+    def __init__(self, bornes: Tuple[float, ...] = BORNES_DEFAUT):
+        self.bornes = tuple(bornes)
+        self._verrou = threading.Lock()
+        self._histogrammes: Dict[str, Dict[Etiquettes, _Histogramme]] = {}
+        self._compteurs: Dict[str, Dict[Etiquettes, float]] = {}
+
+    def observer(self, nom: str, secondes: float, **etiquettes):
+        """Ajoute une durée (s) à l'histogramme `nom`"""
+        cle = _etiquettes(etiquettes)
+        classe = bisect_left(self.bornes, secondes)
+        with self._verrou:
+            serie = self._histogrammes.setdefault(nom, {})
+            histogramme = serie.get(cle)
+            if histogramme is None:
+                histogramme = serie[cle] = _Histogramme(len(self.bornes))
+            histogramme.comptes[classe] += 1
+            histogramme.somme += secondes
+            histogramme.nombre += 1
+
+    def incrementer(self, nom: str, valeur: float = 1, **etiquettes):
+        """Ajoute `valeur` au compteur `nom`"""
+        cle = _etiquettes(etiquettes)
+        with self._verrou:
+            serie = self._compteurs.setdefault(nom, {})
+            serie[cle] = serie.get(cle, 0) + valeur
+
+    @contextmanager
+    def chronometrer(self, nom: str, **etiquettes):
+        """Observe la durée du bloc dans l'histogramme `nom`"""
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observer(nom, time.perf_counter() - debut, **etiquettes)
+
+    def exporter(self, jauges: Optional[List[Tuple[str, str, str, float]]] = None) -> str:
+        """
+        Texte au format d'exposition de Prometheus (version 0.0.4)
+
+        Args:
+            jauges: Valeurs instantanées ajoutées à l'export,
+                    en tuples (nom, type, description, valeur)
+        """
+        with self._verrou:
+            histogrammes = {
+                nom: {cle: (list(h.comptes), h.somme, h.nombre) for cle, h in serie.items()}
+                for nom, serie in self._histogrammes.items()
+            }
+            compteurs = {nom: dict(serie) for nom, serie in self._compteurs.items()}
+
+        lignes = []
+
+        def entete(nom: str, type_defaut: str):
+            type_metrique, aide = FAMILLES.get(nom, (type_defaut, nom))
+            lignes.append(f"# HELP {nom} {aide}")
+            lignes.append(f"# TYPE {nom} {type_metrique}")
+
+        for nom in sorted(histogrammes):
+            entete(nom, 'histogram')
+            for cle, (comptes, somme, nombre) in sorted(histogrammes[nom].items()):
+                cumul = 0
+                for borne, compte in zip(self.bornes + (float("inf"),), comptes):
+                    cumul += compte
+                    lignes.append(f"{nom}_bucket{_format_etiquettes(cle + (('le', _format_nombre(borne)),))} {cumul}")
+                lignes.append(f"{nom}_sum{_format_etiquettes(cle)} {_format_nombre(somme)}")
+                lignes.append(f"{nom}_count{_format_etiquettes(cle)} {nombre}")
+
+        for nom in sorted(compteurs):
+            entete(nom, 'counter')
+            for cle, valeur in sorted(compteurs[nom].items()):
+                lignes.append(f"{nom}{_format_etiquettes(cle)} {_format_nombre(valeur)}")
+
+        for nom, type_metrique, aide, valeur in jauges or []:
+            lignes.append(f"# HELP {nom} {aide}")
+            lignes.append(f"# TYPE {nom} {type_metrique}")
+            lignes.append(f"{nom} {_format_nombre(valeur)}")
+
+        return "\n".join(lignes) + "\n"
+
+
+# Registre du processus, partagé par les vues, le système RAG et l'ingestion
+registre = RegistreMetriques()
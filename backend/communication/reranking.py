@@ -0,0 +1,124 @@
+"""
+Ré-ordonnancement des passages par un cross-encoder multilingue
+Score chaque paire (question, passage) et ne garde que les meilleurs, dans
+un budget de latence
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Petit cross-encoder multilingue (MiniLM 12 couches, entraîné sur mMARCO)
+MODELE_RERANKING_DEFAUT = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+class ReordonnanceurPassages:
+    """
+    Ré-ordonne les candidats de la recherche avec un cross-encoder
+
+    Les paires sont scorées par lots, dans l'ordre de la première étape.
+    Si le budget de latence est atteint, les candidats restants ne sont pas
+    scorés et gardent leur rang initial derrière les passages scorés; si
+    l'historique montre que même un lot ne tient pas dans le budget, le
+    ré-ordonnancement est ignoré.
+    """
+
+    def __init__(self, model_name: str = MODELE_RERANKING_DEFAUT, device: Optional[str] = None,
+                 budget_ms: float = 300, taille_lot: int = 8, longueur_max: int = 512):
+        """
+        Args:
+            model_name: Nom ou chemin du modèle CrossEncoder
+            device: Périphérique ('cpu', 'cuda'...), défaut: choix automatique
+            budget_ms: Temps maximal consacré au scoring d'une question (ms)
+            taille_lot: Paires scorées par appel au modèle
+            longueur_max: Longueur maximale (tokens) d'une paire
+        """
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device=device, max_length=longueur_max)
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.taille_lot = taille_lot
+
+        # Moyenne glissante du coût d'une paire, pour tronquer avant de dépasser
+        self._ms_par_paire: Optional[float] = None
+        self._verrou = threading.Lock()
+        self._compteurs = {'questions': 0, 'tronquees': 0, 'ignorees': 0, 'paires': 0}
+
+    def _paires_dans_budget(self, n_candidats: int, budget_ms: float) -> int:
+        """Nombre de candidats que le budget permet de scorer d'après l'historique"""
+        if self._ms_par_paire is None:
+            return n_candidats
+        return min(n_candidats, int(budget_ms / self._ms_par_paire))
+
+    def reordonner(self, question: str, passages: List[Dict], k: int,
+                   budget_ms: Optional[float] = None) -> Tuple[List[Dict], Dict]:
+        """
+        Retourne les k meilleurs passages selon le cross-encoder
+
+        Args:
+            question: Question de l'utilisateur
+            passages: Candidats de la première étape (dans leur ordre)
+            k: Nombre de passages à garder
+            budget_ms: Budget de latence (défaut: celui du constructeur)
+
+        Returns:
+            Tuple (passages retenus, statistiques de l'étape)
+        """
+        if not passages:
+            return [], {'candidats': 0, 'scores': 0, 'duree_ms': 0.0, 'ignore': True}
+
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        debut = time.perf_counter()
+
+        n_max = self._paires_dans_budget(len(passages), budget_ms)
+        if n_max < min(self.taille_lot, len(passages)):
+            with self._verrou:
+                self._compteurs['questions'] += 1
+                self._compteurs['ignorees'] += 1
+                # Oublier peu à peu un pic de latence pour réessayer plus tard
+                self._ms_par_paire *= 0.9
+            return passages[:k], {'candidats': len(passages), 'scores': 0, 'duree_ms': 0.0, 'ignore': True}
+
+        scores: List[float] = []
+        for i in range(0, n_max, self.taille_lot):
+            lot = passages[i:min(i + self.taille_lot, n_max)]
+            scores.extend(float(s) for s in self.model.predict(
+                [(question, p['texte']) for p in lot],
+                batch_size=self.taille_lot,
+                show_progress_bar=False
+            ))
+            if (time.perf_counter() - debut) * 1000 >= budget_ms:
+                break
+
+        duree_ms = (time.perf_counter() - debut) * 1000
+        n_scores = len(scores)
+
+        scores_passages = [dict(p, score_reranking=s) for p, s in zip(passages, scores)]
+        scores_passages.sort(key=lambda p: p['score_reranking'], reverse=True)
+        retenus = (scores_passages + passages[n_scores:])[:k]
+
+        with self._verrou:
+            cout = duree_ms / n_scores
+            self._ms_par_paire = cout if self._ms_par_paire is None else 0.8 * self._ms_par_paire + 0.2 * cout
+            self._compteurs['questions'] += 1
+            self._compteurs['paires'] += n_scores
+            if n_scores < len(passages):
+                self._compteurs['tronquees'] += 1
+
+        return retenus, {
+            'candidats': len(passages),
+            'scores': n_scores,
+            'duree_ms': duree_ms,
+            'ignore': False,
+        }
+
+    def stats(self) -> Dict:
+        """Compteurs cumulés (questions, tronquées, ignorées, paires scorées)"""
+        with self._verrou:
+            return {
+                **self._compteurs,
+                'modele': self.model_name,
+                'budget_ms': self.budget_ms,
+                'ms_par_paire': self._ms_par_paire,
+            }
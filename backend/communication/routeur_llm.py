@@ -0,0 +1,352 @@
+"""
+Routage des générations entre plusieurs serveurs Ollama
+Répartition vers le serveur le moins chargé, exclusion temporaire et bascule en cas d'erreur
+"""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set
+
+import httpx
+import ollama
+
+logger = logging.getLogger(__name__)
+
+
+def erreur_serveur(erreur: BaseException) -> bool:
+    """
+    Erreur imputable au serveur (connexion, timeout, réponse 5xx ou erreur
+    signalée dans le flux), qui justifie son exclusion et une bascule
+
+    Les erreurs du client (modèle absent, requête invalide: 4xx, RequestError)
+    se reproduiraient sur tous les serveurs et sont propagées telles quelles.
+    """
+    if isinstance(erreur, ollama.ResponseError):
+        return erreur.status_code < 0 or erreur.status_code >= 500
+    return isinstance(erreur, (ConnectionError, TimeoutError, httpx.TransportError))
+
+
+class ServeursIndisponibles(Exception):
+    """Aucun serveur Ollama n'a pu traiter la requête (à renvoyer en 503 avec Retry-After)"""
+
+    statut_http = 503
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ServeurOllama:
+    """État d'un serveur Ollama: requêtes en vol, latence récente, santé"""
+
+    def __init__(self, hote: Optional[str], timeout: Optional[float]):
+        self.hote = hote
+        self.timeout = timeout
+        self.client = ollama.Client(host=hote, timeout=timeout)
+        self._clients_async = weakref.WeakKeyDictionary()
+
+        self.en_vol = 0
+        self.latence: Optional[float] = None  # moyenne glissante (s)
+        self.requetes = 0
+        self.echecs = 0
+        self.echecs_consecutifs = 0
+        self.exclu_jusqua = 0.0
+
+    @property
+    def nom(self) -> str:
+        return self.hote or "local"
+
+    def client_async(self) -> ollama.AsyncClient:
+        """Client asynchrone associé à la boucle courante"""
+        boucle = asyncio.get_running_loop()
+        client = self._clients_async.get(boucle)
+        if client is None:
+            client = ollama.AsyncClient(host=self.hote, timeout=self.timeout)
+            self._clients_async[boucle] = client
+        return client
+
+    def disponible(self, maintenant: float) -> bool:
+        return self.exclu_jusqua <= maintenant
+
+    def cout(self) -> float:
+        """Attente estimée d'une nouvelle requête (serveur jamais mesuré: 0)"""
+        return (self.en_vol + 1) * (self.latence or 0.0)
+
+
+class RouteurLLM:
+    """
+    Envoie chaque génération au serveur Ollama sain le moins chargé
+
+    Le choix se fait sur l'attente estimée (requêtes en vol x latence
+    récente), puis sur le nombre de requêtes en vol. Un serveur en erreur
+    (connexion refusée, timeout, réponse 5xx...) est exclu pendant
+    `delai_exclusion` secondes, doublé à chaque échec consécutif, et la
+    requête est rejouée sur le serveur suivant. Si tous les serveurs sont
+    exclus, ils sont tout de même essayés, du plus tôt réhabilité au plus tard.
+
+    Avec `concurrence`, un serveur ne reçoit jamais plus de `concurrence`
+    requêtes simultanées: seuls les serveurs ayant une place libre sont
+    candidats, et une requête dont tous les serveurs restants sont occupés
+    attend qu'une place s'y libère (au plus `attente_place` secondes). Le
+    contrôle d'admission, dimensionné à concurrence x nombre de serveurs,
+    garantit qu'une requête admise trouve toujours une place au premier essai.
+
+    Si aucun serveur n'a pu répondre (tous en échec, ou aucune place libérée
+    à temps), ServeursIndisponibles est levée, chaînée à la dernière erreur.
+    Les autres erreurs (4xx, requête invalide) sont propagées sans bascule
+    ni exclusion (voir erreur_serveur).
+    """
+
+    def __init__(self, hotes: List[Optional[str]], timeout: Optional[float] = 120,
+                 delai_exclusion: float = 10, delai_exclusion_max: float = 120,
+                 concurrence: Optional[int] = None, attente_place: float = 20):
+        """
+        Args:
+            hotes: URLs des serveurs Ollama (None = serveur local par défaut)
+            timeout: Timeout HTTP d'une requête (s)
+            delai_exclusion: Exclusion d'un serveur après un échec (s)
+            delai_exclusion_max: Exclusion maximale après des échecs répétés (s)
+            concurrence: Requêtes simultanées maximales par serveur (None = illimité)
+            attente_place: Attente maximale d'une place libre sur un serveur (s)
+        """
+        if not hotes:
+            hotes = [None]
+        self.serveurs = [ServeurOllama(hote, timeout) for hote in hotes]
+        self.delai_exclusion = delai_exclusion
+        self.delai_exclusion_max = delai_exclusion_max
+        self.concurrence = concurrence
+        self.attente_place = attente_place
+        self._verrou = threading.Lock()
+        self._place_liberee = threading.Condition(self._verrou)
+        # Attentes de place du chemin asynchrone (rares: bascule sous charge)
+        self._executeur_attente = ThreadPoolExecutor(thread_name_prefix="routeur-attente")
+
+    @staticmethod
+    def hotes_depuis_env(valeur: Optional[str], defaut: Optional[str] = None) -> List[Optional[str]]:
+        """Liste d'hôtes à partir d'une variable "http://a:11434,http://b:11434" """
+        hotes = [hote.strip() for hote in (valeur or "").split(",") if hote.strip()]
+        return hotes or [defaut]
+
+    def _ordre(self, essayes: Set[ServeurOllama]) -> List[ServeurOllama]:
+        """Serveurs pas encore essayés, dans l'ordre d'essai (appelé sous le verrou)"""
+        maintenant = time.monotonic()
+        restants = [s for s in self.serveurs if s not in essayes]
+        sains = [s for s in restants if s.disponible(maintenant)]
+        exclus = [s for s in restants if not s.disponible(maintenant)]
+        sains.sort(key=lambda s: (s.cout(), s.en_vol))
+        exclus.sort(key=lambda s: s.exclu_jusqua)
+        return sains + exclus
+
+    def _retry_after(self) -> int:
+        """Secondes avant la réhabilitation du premier serveur exclu (au moins 1)"""
+        maintenant = time.monotonic()
+        with self._verrou:
+            attente = min(serveur.exclu_jusqua for serveur in self.serveurs) - maintenant
+        return max(1, math.ceil(attente))
+
+    def _indisponibles(self, derniere_erreur: Optional[Exception]) -> ServeursIndisponibles:
+        return ServeursIndisponibles(
+            f"Aucun serveur Ollama n'a pu générer la réponse: {derniere_erreur}", self._retry_after()
+        )
+
+    def _prendre(self, essayes: Set[ServeurOllama], fin_attente: float) -> Optional[ServeurOllama]:
+        """
+        Réserve une place sur le meilleur serveur pas encore essayé, en
+        attendant qu'une place se libère si tous sont occupés
+
+        Returns:
+            Le serveur réservé, ou None s'il ne reste aucun serveur à essayer
+
+        Raises:
+            ServeursIndisponibles: aucune place libérée avant fin_attente
+        """
+        with self._place_liberee:
+            while True:
+                restants = self._ordre(essayes)
+                if not restants:
+                    return None
+                for serveur in restants:
+                    if self.concurrence is None or serveur.en_vol < self.concurrence:
+                        serveur.en_vol += 1
+                        serveur.requetes += 1
+                        return serveur
+                delai = fin_attente - time.monotonic()
+                if delai <= 0:
+                    raise ServeursIndisponibles(
+                        f"Aucune place libre sur les serveurs Ollama après {self.attente_place:.0f}s",
+                        max(1, math.ceil(min(s.latence or 1.0 for s in restants)))
+                    )
+                self._place_liberee.wait(delai)
+
+    async def _aprendre(self, essayes: Set[ServeurOllama], fin_attente: float) -> Optional[ServeurOllama]:
+        """Version asynchrone de _prendre(): l'attente éventuelle se fait hors de la boucle"""
+        try:
+            # Cas courant (toujours au premier essai): une place est libre
+            return self._prendre(essayes, 0.0)
+        except ServeursIndisponibles:
+            pass
+        reservation = self._executeur_attente.submit(self._prendre, set(essayes), fin_attente)
+        try:
+            return await asyncio.shield(asyncio.wrap_future(reservation))
+        except asyncio.CancelledError:
+            # Requête annulée pendant l'attente: rendre la place obtenue ensuite
+            def rendre(futur):
+                if not futur.cancelled() and futur.exception() is None and futur.result() is not None:
+                    self._abandon(futur.result())
+            reservation.add_done_callback(rendre)
+            raise
+
+    def _abandon(self, serveur: ServeurOllama):
+        """Fin d'une requête en erreur client: ni succès ni échec du serveur"""
+        with self._verrou:
+            serveur.en_vol -= 1
+            self._place_liberee.notify()
+
+    def _fin(self, serveur: ServeurOllama, duree: Optional[float]):
+        """Fin d'une requête: duree=None signale un échec"""
+        with self._verrou:
+            serveur.en_vol -= 1
+            self._place_liberee.notify()
+            if duree is None:
+                serveur.echecs += 1
+                serveur.echecs_consecutifs += 1
+                delai = min(self.delai_exclusion * 2 ** (serveur.echecs_consecutifs - 1),
+                            self.delai_exclusion_max)
+                serveur.exclu_jusqua = time.monotonic() + delai
+            else:
+                serveur.echecs_consecutifs = 0
+                serveur.exclu_jusqua = 0.0
+                serveur.latence = duree if serveur.latence is None else 0.8 * serveur.latence + 0.2 * duree
+
+    def executer(self, appel: Callable[[ollama.Client], Any]) -> Any:
+        """
+        Exécute appel(client) sur le meilleur serveur, puis sur les suivants
+        en cas d'erreur
+
+        Raises:
+            ServeursIndisponibles si tous les serveurs ont échoué (chaînée à
+            la dernière erreur), ou immédiatement une erreur client (voir
+            erreur_serveur)
+        """
+        derniere_erreur: Optional[Exception] = None
+        essayes: Set[ServeurOllama] = set()
+        fin_attente = time.monotonic() + self.attente_place
+        while True:
+            serveur = self._prendre(essayes, fin_attente)
+            if serveur is None:
+                break
+            essayes.add(serveur)
+            debut = time.monotonic()
+            try:
+                resultat = appel(serveur.client)
+            except Exception as e:
+                if not erreur_serveur(e):
+                    self._abandon(serveur)
+                    raise
+                self._fin(serveur, None)
+                logger.warning("⚠️  Serveur Ollama %s en échec: %s", serveur.nom, e)
+                derniere_erreur = e
+                continue
+            self._fin(serveur, time.monotonic() - debut)
+            return resultat
+        raise self._indisponibles(derniere_erreur) from derniere_erreur
+
+    def executer_flux(self, appel: Callable[[ollama.Client], Iterator]) -> Iterator:
+        """
+        Comme executer(), pour une génération en streaming
+
+        La bascule n'est possible que tant qu'aucun morceau n'a été reçu; une
+        erreur au milieu du flux est propagée à l'appelant.
+        """
+        derniere_erreur: Optional[Exception] = None
+        essayes: Set[ServeurOllama] = set()
+        fin_attente = time.monotonic() + self.attente_place
+        while True:
+            serveur = self._prendre(essayes, fin_attente)
+            if serveur is None:
+                break
+            essayes.add(serveur)
+            debut = time.monotonic()
+            try:
+                flux = iter(appel(serveur.client))
+                premier = next(flux)
+            except StopIteration:
+                self._fin(serveur, time.monotonic() - debut)
+                return
+            except Exception as e:
+                if not erreur_serveur(e):
+                    self._abandon(serveur)
+                    raise
+                self._fin(serveur, None)
+                logger.warning("⚠️  Serveur Ollama %s en échec: %s", serveur.nom, e)
+                derniere_erreur = e
+                continue
+
+            try:
+                yield premier
+                yield from flux
+            except GeneratorExit:
+                # Flux abandonné par l'appelant (client déconnecté): pas un
+                # échec, mais la réponse HTTP doit être fermée pour qu'Ollama
+                # arrête de générer
+                try:
+                    fermer = getattr(flux, 'close', None)
+                    if fermer is not None:
+                        fermer()
+                finally:
+                    self._fin(serveur, time.monotonic() - debut)
+                raise
+            except Exception as e:
+                if erreur_serveur(e):
+                    self._fin(serveur, None)
+                else:
+                    self._abandon(serveur)
+                raise
+            self._fin(serveur, time.monotonic() - debut)
+            return
+        raise self._indisponibles(derniere_erreur) from derniere_erreur
+
+    async def aexecuter(self, appel: Callable[[ollama.AsyncClient], Awaitable]) -> Any:
+        """Version asynchrone de executer(): appel(client) retourne un awaitable"""
+        derniere_erreur: Optional[Exception] = None
+        essayes: Set[ServeurOllama] = set()
+        fin_attente = time.monotonic() + self.attente_place
+        while True:
+            serveur = await self._aprendre(essayes, fin_attente)
+            if serveur is None:
+                break
+            essayes.add(serveur)
+            debut = time.monotonic()
+            try:
+                resultat = await appel(serveur.client_async())
+            except Exception as e:
+                if not erreur_serveur(e):
+                    self._abandon(serveur)
+                    raise
+                self._fin(serveur, None)
+                logger.warning("⚠️  Serveur Ollama %s en échec: %s", serveur.nom, e)
+                derniere_erreur = e
+                continue
+            self._fin(serveur, time.monotonic() - debut)
+            return resultat
+        raise self._indisponibles(derniere_erreur) from derniere_erreur
+
+    def stats(self) -> List[Dict]:
+        """État de chaque serveur (en vol, latence, échecs, exclusion)"""
+        maintenant = time.monotonic()
+        with self._verrou:
+            return [{
+                'hote': serveur.nom,
+                'en_vol': serveur.en_vol,
+                'latence_ms': serveur.latence * 1000 if serveur.latence is not None else None,
+                'concurrence_max': self.concurrence,
+                'requetes': serveur.requetes,
+                'echecs': serveur.echecs,
+                'disponible': serveur.disponible(maintenant),
+                'exclu_pendant_s': max(0.0, serveur.exclu_jusqua - maintenant),
+            } for serveur in self.serveurs]
@@ -0,0 +1,82 @@
+"""
+Métriques de génération renvoyées par Ollama
+Chargement du modèle, évaluation du prompt et génération, par requête et cumulées
+"""
+
+import threading
+from typing import Dict, Optional
+
+# Au-delà de ce temps de chargement, le modèle a été (re)chargé en mémoire
+SEUIL_CHARGEMENT_FROID_MS = 500
+
+
+def _ms(nanosecondes: Optional[int]) -> float:
+    return (nanosecondes or 0) / 1e6
+
+
+class SuiviOllama:
+    """
+    Agrège les durées renvoyées par Ollama à la fin de chaque génération
+    (load_duration, prompt_eval_duration, eval_duration...)
+
+    Un chargement à froid signale un modèle déchargé entre deux requêtes
+    (keep_alive trop court); un nombre de tokens de prompt évalués inférieur
+    à la taille du prompt signale un préfixe réutilisé depuis le cache KV.
+    """
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._totaux = {
+            'requetes': 0,
+            'chargements_a_froid': 0,
+            'chargement_ms': 0.0,
+            'tokens_prompt_evalues': 0,
+            'evaluation_prompt_ms': 0.0,
+            'tokens_generes': 0,
+            'generation_ms': 0.0,
+            'duree_totale_ms': 0.0,
+        }
+
+    def enregistrer(self, reponse) -> Dict:
+        """
+        Relève les métriques d'une réponse Ollama (ou du dernier morceau d'un flux)
+
+        Returns:
+            Dict des métriques de la requête (durées en ms)
+        """
+        metriques = {
+            'duree_totale_ms': _ms(reponse.get('total_duration')),
+            'chargement_ms': _ms(reponse.get('load_duration')),
+            'tokens_prompt_evalues': reponse.get('prompt_eval_count') or 0,
+            'evaluation_prompt_ms': _ms(reponse.get('prompt_eval_duration')),
+            'tokens_generes': reponse.get('eval_count') or 0,
+            'generation_ms': _ms(reponse.get('eval_duration')),
+        }
+        metriques['chargement_a_froid'] = metriques['chargement_ms'] > SEUIL_CHARGEMENT_FROID_MS
+        metriques['tokens_par_s'] = (
+            metriques['tokens_generes'] / (metriques['generation_ms'] / 1000)
+            if metriques['generation_ms'] else 0.0
+        )
+
+        with self._verrou:
+            self._totaux['requetes'] += 1
+            self._totaux['chargements_a_froid'] += int(metriques['chargement_a_froid'])
+            for cle in ('chargement_ms', 'tokens_prompt_evalues', 'evaluation_prompt_ms',
+                        'tokens_generes', 'generation_ms', 'duree_totale_ms'):
+                self._totaux[cle] += metriques[cle]
+        return metriques
+
+    def stats(self) -> Dict:
+        """Totaux et moyennes par requête"""
+        with self._verrou:
+            totaux = dict(self._totaux)
+        n = totaux['requetes'] or 1
+        return {
+            **totaux,
+            'chargement_moyen_ms': totaux['chargement_ms'] / n,
+            'tokens_prompt_evalues_moyen': totaux['tokens_prompt_evalues'] / n,
+            'evaluation_prompt_moyenne_ms': totaux['evaluation_prompt_ms'] / n,
+            'generation_moyenne_ms': totaux['generation_ms'] / n,
+            'tokens_par_s': (totaux['tokens_generes'] / (totaux['generation_ms'] / 1000)
+                             if totaux['generation_ms'] else 0.0),
+        }
@@ -0,0 +1,115 @@
+"""
+Instance partagée du système RAG, chargée à la demande ou en arrière-plan
+Les commandes de gestion (migrate, check, shell...) ne chargent jamais le modèle
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from .agent_ia import RAGDocumentProcessor
+
+# Chemin absolu vers la base de données ChromaDB
+# Obtenir le chemin du fichier actuel et remonter à la racine du projet
+db_path_dev = Path(__file__).resolve().parent.parent.parent / "chroma_db"
+db_path = os.getenv("DB_PATH", default=str(db_path_dev))
+
+_rag_system: Optional[RAGDocumentProcessor] = None
+_verrou = threading.Lock()
+_etat = {
+    'statut': 'non_demarre',   # non_demarre | chargement | pret | erreur
+    'modele_charge': False,
+    'collection_chargee': False,
+    'llm_prechauffe': False,
+    'erreur': None,
+    'debut': None,
+    'duree_chargement': None,
+}
+
+
+def _suivre_etape(etape: str):
+    """Appelé par RAGDocumentProcessor au fil de son initialisation"""
+    if etape == 'modele':
+        _etat['modele_charge'] = True
+    elif etape == 'collection':
+        _etat['collection_chargee'] = True
+
+
+def rag_system_si_pret() -> Optional[RAGDocumentProcessor]:
+    """Retourne le système RAG s'il est déjà chargé, sans jamais bloquer"""
+    return _rag_system
+
+
+def obtenir_rag_system() -> RAGDocumentProcessor:
+    """
+    Retourne le système RAG, en le chargeant au premier appel
+
+    Si le chargement est en cours dans un autre thread (préchauffage),
+    l'appel attend sa fin au lieu de charger un second modèle.
+    """
+    global _rag_system
+    if _rag_system is not None:
+        return _rag_system
+
+    with _verrou:
+        if _rag_system is None:
+            print("🚀 Initialisation du système RAG...")
+            print(f"📂 Chemin de la base de données: {db_path}")
+            _etat.update(statut='chargement', erreur=None, debut=time.time())
+            try:
+                _rag_system = RAGDocumentProcessor(
+                    db_path=str(db_path),
+                    ollama_host=os.getenv("OLLAMA_HOST"),
+                    suivi=_suivre_etape
+                )
+            except Exception as e:
+                _etat.update(statut='erreur', erreur=str(e))
+                raise
+            _etat.update(statut='pret', duree_chargement=time.time() - _etat['debut'])
+            print("✅ Système RAG prêt\n")
+    return _rag_system
+
+
+def prechauffer():
+    """
+    Lance le chargement du système RAG dans un thread d'arrière-plan
+
+    Appelé par les points d'entrée WSGI/ASGI (runserver, uvicorn...): le
+    serveur accepte les connexions immédiatement et /api/health/ indique
+    quand le modèle et la collection sont prêts. Désactivé par
+    RAG_PRECHARGEMENT=0 (chargement à la première question).
+
+    Le modèle de génération est ensuite chargé dans Ollama (sauf avec
+    RAG_PRECHAUFFAGE_LLM=0) pour que la première question ne paie pas le
+    démarrage à froid.
+    """
+    if os.getenv("RAG_PRECHARGEMENT", "1") == "0" or _rag_system is not None:
+        return
+
+    def charger():
+        try:
+            rag_system = obtenir_rag_system()
+        except Exception as e:
+            print(f"❌ Échec du chargement du système RAG: {e}")
+            return
+
+        if os.getenv("RAG_PRECHAUFFAGE_LLM", "1") == "0":
+            return
+        try:
+            rag_system.prechauffer_llm()
+            _etat['llm_prechauffe'] = True
+        except Exception as e:
+            print(f"⚠️  Préchauffage du modèle de génération impossible: {e}")
+
+    threading.Thread(target=charger, name="prechauffage-rag", daemon=True).start()
+
+
+def etat() -> Dict:
+    """État de chargement du système RAG (pour l'endpoint de disponibilité)"""
+    resultat = dict(_etat)
+    resultat['pret'] = _rag_system is not None
+    if _rag_system is not None:
+        resultat['nb_chunks'] = _rag_system.collection.count()
+    return resultat
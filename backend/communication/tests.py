@@ -1,3 +1,1509 @@
+"""
+Tests unitaires des briques déterministes du système RAG
+
+Aucun test ne charge de modèle ni ne démarre ChromaDB ou Ollama: les
+embeddings sont des vecteurs à graine fixe ou viennent de modèles factices.
+
+    python manage.py test communication
+"""
+
+import copy
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
 from django.test import TestCase
 
-# Create your tests here.
+from . import systeme_rag, views
+from .agent_ia import RAGDocumentProcessor
+from .admission import AttenteDepassee, ControleAdmission, FileSaturee
+from .batch_embeddings import BatcheurEmbeddings
+from .cache_semantique import CacheSemantique
+from .contexte import CompteurTokens, emballer_contexte
+from .crawler import CrawlerWeb
+from .decoupage import DecoupeurTexte
+from .index_bm25 import IndexBM25, fusion_rrf
+from .index_memoire import IndexMemoire, completer_quantifications, exporter_collection
+from .ingestion import PipelineIngestion
+from .manifeste import ManifesteIngestion, prefixe_ids
+from .metadonnees import clause_where, normaliser_filtres
+from .metriques import RegistreMetriques
+from .reranking import ReordonnanceurPassages
+from .routeur_llm import RouteurLLM, ServeursIndisponibles
+
+RACINE_DEPOT = Path(__file__).resolve().parents[2]
+
+
+def _vecteur(*composantes) -> np.ndarray:
+    return np.array(composantes, dtype=np.float32)
+
+
+class CacheSemantiqueTests(TestCase):
+    """Cache sémantique des réponses (user-003)"""
+
+    def test_hit_au_dessus_du_seuil_et_meme_contexte(self):
+        cache = CacheSemantique(seuil_similarite=0.95)
+        cache.ajouter(_vecteur(1, 0), ['a_0', 'a_1'], {'reponse': 'R'})
+
+        proche = _vecteur(1, 0.2)  # cosinus ~0.98
+        self.assertEqual(cache.rechercher(proche, ['a_0', 'a_1']), {'reponse': 'R'})
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_miss_sous_le_seuil(self):
+        cache = CacheSemantique(seuil_similarite=0.95)
+        cache.ajouter(_vecteur(1, 0), ['a_0'], {'reponse': 'R'})
+
+        eloigne = _vecteur(1, 0.5)  # cosinus ~0.89
+        self.assertIsNone(cache.rechercher(eloigne, ['a_0']))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_miss_si_le_contexte_differe(self):
+        cache = CacheSemantique(seuil_similarite=0.95)
+        cache.ajouter(_vecteur(1, 0), ['a_0', 'a_1'], {'reponse': 'R'})
+
+        self.assertIsNone(cache.rechercher(_vecteur(1, 0), ['a_1', 'a_0']))
+        self.assertIsNone(cache.rechercher(_vecteur(1, 0), ['b_0']))
+
+    def test_eviction_lru(self):
+        cache = CacheSemantique(seuil_similarite=0.99, taille_max=2)
+        cache.ajouter(_vecteur(1, 0), ['a'], {'reponse': 'A'})
+        cache.ajouter(_vecteur(0, 1), ['b'], {'reponse': 'B'})
+        # Lire A le rend plus récent que B: c'est B qui sort
+        self.assertIsNotNone(cache.rechercher(_vecteur(1, 0), ['a']))
+        cache.ajouter(_vecteur(1, 1), ['c'], {'reponse': 'C'})
+
+        self.assertEqual(cache.stats()['taille'], 2)
+        self.assertIsNotNone(cache.rechercher(_vecteur(1, 0), ['a']))
+        self.assertIsNone(cache.rechercher(_vecteur(0, 1), ['b']))
+        self.assertIsNotNone(cache.rechercher(_vecteur(1, 1), ['c']))
+
+    def test_expiration_ttl(self):
+        cache = CacheSemantique(ttl=60)
+        with mock.patch('communication.cache_semantique.time.time', return_value=1000.0):
+            cache.ajouter(_vecteur(1, 0), ['a'], {'reponse': 'A'})
+        with mock.patch('communication.cache_semantique.time.time', return_value=1059.0):
+            self.assertIsNotNone(cache.rechercher(_vecteur(1, 0), ['a']))
+        with mock.patch('communication.cache_semantique.time.time', return_value=1061.0):
+            self.assertIsNone(cache.rechercher(_vecteur(1, 0), ['a']))
+        self.assertEqual(cache.stats()['taille'], 0)
+
+    def test_taille_nulle_desactive_le_cache(self):
+        cache = CacheSemantique(taille_max=0)
+        cache.ajouter(_vecteur(1, 0), ['a'], {'reponse': 'A'})
+        self.assertIsNone(cache.rechercher(_vecteur(1, 0), ['a']))
+
+    def test_invalidation(self):
+        cache = CacheSemantique()
+        cache.ajouter(_vecteur(1, 0), ['a'], {'reponse': 'A'})
+        cache.invalider()
+        self.assertIsNone(cache.rechercher(_vecteur(1, 0), ['a']))
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+
+class _ModeleEmbeddingsFactice:
+    """encode() d'un SentenceTransformer: vecteurs nuls, taille des lots relevée"""
+
+    def __init__(self):
+        self.lots = []
+
+    def encode(self, textes, batch_size=32, show_progress_bar=False):
+        self.lots.append(len(textes))
+        return np.zeros((len(textes), 4), dtype=np.float32)
+
+
+class _CollectionIngestion:
+    """add()/delete() d'une collection ChromaDB, en mémoire"""
+
+    def __init__(self, erreur=None):
+        self.erreur = erreur
+        self.ajouts = []
+        self.ids = set()
+
+    def add(self, embeddings, documents, metadatas, ids):
+        if self.erreur is not None:
+            raise self.erreur
+        self.ajouts.append(list(ids))
+        self.ids.update(ids)
+
+    def delete(self, ids):
+        self.ids.difference_update(ids)
+
+
+class PipelineIngestionTests(TestCase):
+    """Ingestion parallèle en pipeline (user-004)"""
+
+    def setUp(self):
+        self.dossier = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dossier, ignore_errors=True)
+        self.fichiers = []
+        for nom, sujet in (('passeport.txt', "passeport"), ('cni.txt', "carte d'identité"), ('casier.md', "casier")):
+            chemin = self.dossier / nom
+            chemin.write_text(" ".join(
+                f"La demande de {sujet} numéro {i} se fait auprès du service compétent." for i in range(30)
+            ), encoding='utf-8')
+            self.fichiers.append(chemin)
+
+    def test_chunks_ecrits_par_lots_de_taille_fixe(self):
+        modele, collection = _ModeleEmbeddingsFactice(), _CollectionIngestion()
+        stats = PipelineIngestion(modele, collection, n_workers=2, taille_batch=4).traiter(self.fichiers)
+
+        self.assertEqual(stats['fichiers'], 3)
+        self.assertEqual(len(collection.ids), stats['chunks'])
+        self.assertTrue(all(taille == 4 for taille in modele.lots[:-1]))
+        self.assertLessEqual(modele.lots[-1], 4)
+        self.assertEqual([len(ids) for ids in collection.ajouts], modele.lots)
+        for fichier in self.fichiers:
+            ids = {i for i in collection.ids if i.startswith(fichier.stem + "_")}
+            self.assertEqual(ids, {f"{fichier.stem}_{n}" for n in range(len(ids))})
+
+    def test_fichier_illisible_ignore(self):
+        casse = self.dossier / "casse.pdf"
+        casse.write_bytes(b"pas un pdf")
+        collection = _CollectionIngestion()
+        stats = PipelineIngestion(_ModeleEmbeddingsFactice(), collection, n_workers=2,
+                                  taille_batch=4).traiter(self.fichiers + [casse])
+
+        self.assertEqual(stats['fichiers'], 3)
+        self.assertFalse(any(i.startswith("casse_") for i in collection.ids))
+
+    def test_erreur_d_ecriture_remontee(self):
+        pipeline = PipelineIngestion(_ModeleEmbeddingsFactice(), _CollectionIngestion(RuntimeError("disque plein")),
+                                     n_workers=1, taille_batch=4)
+        with self.assertRaisesMessage(RuntimeError, "disque plein"):
+            pipeline.traiter(self.fichiers)
+
+    def test_gros_pdf_en_echec_retire_de_la_collection(self):
+        from . import ingestion
+        iterer_chunks = ingestion.iterer_chunks
+
+        def iterer(chemin, *args, **kwargs):
+            # Les processus d'extraction héritent du patch: les autres fichiers sont lus normalement
+            if not chemin.endswith(".pdf"):
+                yield from iterer_chunks(chemin, *args, **kwargs)
+                return
+            for i in range(5):
+                yield f"Page {i + 1} du registre.", i + 1
+            raise ValueError("page illisible")
+
+        gros = self.dossier / "registre.pdf"
+        gros.write_bytes(b"%PDF-1.4")
+        index, collection = IndexBM25(), _CollectionIngestion()
+        pipeline = PipelineIngestion(_ModeleEmbeddingsFactice(), collection, n_workers=1, taille_batch=2,
+                                     index_bm25=index)
+        with mock.patch.object(PipelineIngestion, '_est_gros_pdf', side_effect=lambda f: f.suffix == ".pdf"), \
+                mock.patch.object(ingestion, 'iterer_chunks', side_effect=iterer):
+            stats = pipeline.traiter([self.fichiers[0], gros])
+
+        # Lots déjà écrits supprimés, fin du document écartée du lot courant
+        self.assertEqual(stats['fichiers'], 1)
+        self.assertFalse(any(i.startswith("registre_") for i in collection.ids))
+        self.assertFalse(any(i.startswith("registre_") for i in index.longueurs))
+        self.assertEqual(len(collection.ids), stats['chunks'])
+        self.assertEqual(index.rechercher("registre"), [])
+
+    def test_pymupdf_sur_demande_seulement(self):
+        from . import ingestion
+        # PyMuPDF (AGPL) installé: jamais choisi sans RAG_EXTRACTION_PDF explicite
+        with mock.patch.object(ingestion, '_pymupdf'):
+            self.assertEqual(ingestion.backend_pdf(), 'pypdf2')
+            self.assertEqual(ingestion.backend_pdf('pymupdf'), 'pymupdf')
+            self.assertEqual(ingestion.backend_pdf('auto'), 'pymupdf')
+
+
+class ManifesteTests(TestCase):
+    """Manifeste de la réindexation incrémentale (user-005)"""
+
+    PARAMETRES = {'modele': 'm', 'max_tokens': 126}
+
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier, ignore_errors=True)
+
+    def test_document_inchange_ignore(self):
+        manifeste = ManifesteIngestion(self.dossier)
+        manifeste.enregistrer('fichier:pdf/a.txt', 'e1', 'a_1234', 3, self.PARAMETRES)
+
+        self.assertTrue(manifeste.est_a_jour('fichier:pdf/a.txt', 'e1', dict(self.PARAMETRES)))
+        self.assertFalse(manifeste.est_a_jour('fichier:pdf/a.txt', 'e2', self.PARAMETRES))
+        self.assertFalse(manifeste.est_a_jour('fichier:pdf/a.txt', 'e1', {**self.PARAMETRES, 'max_tokens': 64}))
+        self.assertFalse(manifeste.est_a_jour('fichier:pdf/b.txt', 'e1', self.PARAMETRES))
+
+    def test_document_modifie_remplace(self):
+        manifeste = ManifesteIngestion(self.dossier)
+        manifeste.enregistrer('fichier:pdf/a.txt', 'e1', 'a_1234', 3, self.PARAMETRES)
+        self.assertEqual(manifeste.ids('fichier:pdf/a.txt'), ['a_1234_0', 'a_1234_1', 'a_1234_2'])
+
+        manifeste.enregistrer('fichier:pdf/a.txt', 'e2', 'a_1234', 1, self.PARAMETRES)
+        self.assertEqual(manifeste.ids('fichier:pdf/a.txt'), ['a_1234_0'])
+        self.assertTrue(manifeste.est_a_jour('fichier:pdf/a.txt', 'e2', self.PARAMETRES))
+
+    def test_document_supprime(self):
+        manifeste = ManifesteIngestion(self.dossier)
+        manifeste.enregistrer('fichier:pdf/a.txt', 'e1', 'a_1', 1, self.PARAMETRES)
+        manifeste.enregistrer('fichier:pdf/b.txt', 'e2', 'b_1', 1, self.PARAMETRES)
+        manifeste.enregistrer('url:https://exemple.bf/', 'e3', 'web_1', 1, self.PARAMETRES)
+
+        # Orphelins: documents du dossier qui n'ont pas été revus
+        orphelins = manifeste.cles('fichier:pdf/') - {'fichier:pdf/a.txt'}
+        self.assertEqual(orphelins, {'fichier:pdf/b.txt'})
+        manifeste.supprimer('fichier:pdf/b.txt')
+        self.assertIsNone(manifeste.ids('fichier:pdf/b.txt'))
+        self.assertEqual(manifeste.cles(), {'fichier:pdf/a.txt', 'url:https://exemple.bf/'})
+
+    def test_sauvegarde_et_rechargement(self):
+        manifeste = ManifesteIngestion(self.dossier)
+        manifeste.enregistrer('fichier:pdf/a.txt', 'e1', 'a_1', 2, self.PARAMETRES)
+        manifeste.sauvegarder()
+
+        recharge = ManifesteIngestion(self.dossier)
+        self.assertTrue(recharge.est_a_jour('fichier:pdf/a.txt', 'e1', self.PARAMETRES))
+        self.assertEqual(recharge.ids('fichier:pdf/a.txt'), ['a_1_0', 'a_1_1'])
+
+    def test_prefixes_distincts_pour_des_noms_identiques(self):
+        self.assertNotEqual(prefixe_ids('X', 'fichier:pdf/X.pdf'), prefixe_ids('X', 'fichier:pdf/X.txt'))
+        self.assertEqual(prefixe_ids('X', 'fichier:pdf/X.pdf'), prefixe_ids('X', 'fichier:pdf/X.pdf'))
+
+
+class _ModeleQuestionsFactice:
+    """encode() qui relève les lots et renvoie [longueur du texte, rang dans le lot]"""
+
+    def __init__(self, erreur=None):
+        self.erreur = erreur
+        self.lots = []
+
+    def encode(self, textes, batch_size=32, show_progress_bar=False):
+        self.lots.append(list(textes))
+        if self.erreur is not None:
+            raise self.erreur
+        return np.array([[len(texte), rang] for rang, texte in enumerate(textes)], dtype=np.float32)
+
+
+class BatcheurEmbeddingsTests(TestCase):
+    """Micro-batching des embeddings de questions (user-006)"""
+
+    @staticmethod
+    def _encoder_ensemble(batcheur, textes):
+        """Encode les textes depuis des threads démarrés en même temps"""
+        depart = threading.Barrier(len(textes))
+        resultats = {}
+
+        def encoder(texte):
+            depart.wait()
+            try:
+                resultats[texte] = batcheur.encoder(texte)
+            except Exception as e:
+                resultats[texte] = e
+
+        threads = [threading.Thread(target=encoder, args=(texte,)) for texte in textes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return resultats
+
+    def test_questions_simultanees_regroupees(self):
+        modele = _ModeleQuestionsFactice()
+        batcheur = BatcheurEmbeddings(modele, attente_max_ms=200)
+        textes = ["q" * n for n in range(1, 9)]
+        resultats = self._encoder_ensemble(batcheur, textes)
+
+        # Chaque appelant reçoit le vecteur de sa propre question
+        for texte in textes:
+            self.assertEqual(resultats[texte][0], len(texte))
+        self.assertLess(len(modele.lots), len(textes))
+        self.assertEqual(sorted(t for lot in modele.lots for t in lot), sorted(textes))
+        # Les compteurs sont mis à jour juste après la remise des vecteurs
+        limite = time.monotonic() + 1
+        while batcheur.stats()['questions'] < len(textes) and time.monotonic() < limite:
+            time.sleep(0.005)
+        self.assertEqual(batcheur.stats()['lots'], len(modele.lots))
+
+    def test_taille_maximale_des_lots(self):
+        modele = _ModeleQuestionsFactice()
+        batcheur = BatcheurEmbeddings(modele, attente_max_ms=200, taille_max_batch=3)
+        self._encoder_ensemble(batcheur, ["q" * n for n in range(1, 8)])
+
+        self.assertTrue(all(len(lot) <= 3 for lot in modele.lots))
+        self.assertEqual(sum(len(lot) for lot in modele.lots), 7)
+
+    def test_erreur_transmise_a_chaque_appelant(self):
+        batcheur = BatcheurEmbeddings(_ModeleQuestionsFactice(RuntimeError("modèle indisponible")),
+                                      attente_max_ms=50)
+        resultats = self._encoder_ensemble(batcheur, ["a", "bb", "ccc"])
+
+        for resultat in resultats.values():
+            self.assertIsInstance(resultat, RuntimeError)
+        # Le thread du batcheur continue après une erreur
+        batcheur.embedding_model = _ModeleQuestionsFactice()
+        self.assertEqual(batcheur.encoder("dddd")[0], 4)
+
+
+class _ServeurWebFactice(ThreadingHTTPServer):
+    """Serveur HTTP local: robots.txt configurable, pages relevées avec leur heure d'arrivée"""
+
+    def __init__(self, robots: str):
+        self.robots = robots
+        self.requetes = []
+
+        serveur = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                serveur.requetes.append((self.path, time.monotonic()))
+                if self.path == "/robots.txt":
+                    contenu = serveur.robots.encode()
+                    type_contenu = "text/plain"
+                else:
+                    contenu = f"<html><body><script>x()</script><p>Page {self.path}</p></body></html>".encode()
+                    type_contenu = "text/html"
+                self.send_response(200)
+                self.send_header("Content-Type", type_contenu)
+                self.send_header("Content-Length", str(len(contenu)))
+                self.end_headers()
+                self.wfile.write(contenu)
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.daemon_threads = True
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def arreter(self):
+        self.shutdown()
+        self.server_close()
+
+
+class CrawlerWebTests(TestCase):
+    """Crawler: robots.txt et politesse par hôte (user-009)"""
+
+    def _serveur(self, robots: str) -> _ServeurWebFactice:
+        serveur = _ServeurWebFactice(robots)
+        self.addCleanup(serveur.arreter)
+        return serveur
+
+    def test_robots_txt_respecte_et_lu_une_fois(self):
+        serveur = self._serveur("User-agent: *\nDisallow: /prive\n")
+        crawler = CrawlerWeb(delai_par_hote=0)
+        self.addCleanup(crawler.fermer)
+        urls = [f"{serveur.url}/page1", f"{serveur.url}/prive/dossier", f"{serveur.url}/page2"]
+        resultats = dict(crawler.crawler(urls))
+
+        self.assertEqual(resultats[f"{serveur.url}/page1"], "Page /page1")
+        self.assertEqual(resultats[f"{serveur.url}/prive/dossier"], "")
+        chemins = [chemin for chemin, _ in serveur.requetes]
+        self.assertEqual(chemins.count("/robots.txt"), 1)
+        self.assertNotIn("/prive/dossier", chemins)
+        self.assertFalse(crawler.autorise(f"{serveur.url}/prive/autre"))
+
+    def test_delai_entre_deux_requetes_vers_un_hote(self):
+        serveur = self._serveur("User-agent: *\nAllow: /\n")
+        crawler = CrawlerWeb(delai_par_hote=0.3)
+        self.addCleanup(crawler.fermer)
+        list(crawler.crawler([f"{serveur.url}/page1", f"{serveur.url}/page2"]))
+
+        instants = [instant for _, instant in serveur.requetes]
+        self.assertEqual(len(instants), 3)  # robots.txt puis les deux pages
+        for precedent, suivant in zip(instants, instants[1:]):
+            self.assertGreaterEqual(suivant - precedent, 0.29)
+
+    def test_crawl_delay_de_robots_txt(self):
+        serveur = self._serveur("User-agent: *\nCrawl-delay: 1\n")
+        crawler = CrawlerWeb(delai_par_hote=0)
+        self.addCleanup(crawler.fermer)
+        list(crawler.crawler([f"{serveur.url}/page1", f"{serveur.url}/page2"]))
+
+        (_, premiere), (_, seconde) = serveur.requetes[1:]
+        self.assertGreaterEqual(seconde - premiere, 0.99)
+
+    def test_hotes_differents_en_parallele(self):
+        serveurs = [self._serveur("User-agent: *\nAllow: /\n") for _ in range(2)]
+        crawler = CrawlerWeb(delai_par_hote=0.3)
+        self.addCleanup(crawler.fermer)
+        debut = time.monotonic()
+        list(crawler.crawler([f"{serveur.url}/page{n}" for n in (1, 2) for serveur in serveurs]))
+
+        # Deux délais par hôte, tenus en même temps sur les deux hôtes
+        self.assertLess(time.monotonic() - debut, 1.1)
+
+
+class IndexBM25Tests(TestCase):
+    """Index lexical BM25 et fusion RRF (user-010)"""
+
+    TEXTES = {
+        'loi_12': "Article 12 : le délai de recours est de deux mois.",
+        'loi_13': "Article 13 : la demande est déposée au greffe du tribunal.",
+        'passeport_0': "Le passeport biométrique est délivré par la DGPN.",
+        'cni_0': "La carte nationale d'identité burkinabè (CNIB) est délivrée en 72 heures.",
+    }
+
+    def _index(self) -> IndexBM25:
+        index = IndexBM25()
+        index.ajouter(list(self.TEXTES), list(self.TEXTES.values()))
+        return index
+
+    def test_termes_exacts_sans_accents_ni_mots_vides(self):
+        index = self._index()
+
+        self.assertEqual(index.rechercher("article 12", k=1)[0][0], 'loi_12')
+        self.assertEqual(index.rechercher("CNIB", k=1)[0][0], 'cni_0')
+        self.assertEqual(index.rechercher("delai", k=1)[0][0], 'loi_12')
+        self.assertEqual(index.rechercher("le la les de", k=5), [])
+
+    def test_remplacement_et_suppression(self):
+        index = self._index()
+        index.ajouter(['loi_12'], ["Article 12 : abrogé."])
+        self.assertEqual(index.rechercher("recours"), [])
+        self.assertEqual(len(index), 4)
+
+        index.supprimer(['loi_12', 'inconnu'])
+        self.assertEqual(index.rechercher("article 12", k=5)[0][0], 'loi_13')
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.longueur_totale, sum(index.longueurs.values()))
+
+    def test_sauvegarde_et_chargement(self):
+        dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dossier, ignore_errors=True)
+        index = self._index()
+        index.sauvegarder(dossier)
+
+        recharge = IndexBM25.charger(dossier)
+        self.assertEqual(len(recharge), len(index))
+        for question in ("article 12", "passeport", "délivrée en 72 heures"):
+            self.assertEqual(recharge.rechercher(question), index.rechercher(question))
+        self.assertEqual(len(IndexBM25.charger(str(Path(dossier) / "absent"))), 0)
+
+    def test_fusion_rrf(self):
+        fusion = fusion_rrf([['a', 'b', 'c'], ['b', 'c', 'd']], k=60)
+
+        self.assertEqual([identifiant for identifiant, _ in fusion], ['b', 'c', 'a', 'd'])
+        self.assertAlmostEqual(dict(fusion)['b'], 1 / 62 + 1 / 61)
+        self.assertAlmostEqual(dict(fusion)['d'], 1 / 63)
+
+
+class _CrossEncoderFactice:
+    """
+    CrossEncoder dont le score est la longueur du passage et dont chaque
+    paire avance une horloge simulée de DUREE_PAIRE secondes
+    """
+
+    DUREE_PAIRE = 0.1
+
+    def __init__(self, model_name, device=None, max_length=512):
+        self.horloge = 0.0
+
+    def predict(self, paires, batch_size=32, show_progress_bar=False):
+        self.horloge += self.DUREE_PAIRE * len(paires)
+        return [float(len(passage)) for _, passage in paires]
+
+
+class ReordonnanceurPassagesTests(TestCase):
+    """Ré-ordonnancement dans un budget de latence (user-011)"""
+
+    def setUp(self):
+        modules = mock.patch.dict(sys.modules, {'sentence_transformers': mock.Mock(CrossEncoder=_CrossEncoderFactice)})
+        modules.start()
+        self.addCleanup(modules.stop)
+
+    def _reordonnanceur(self, **kwargs) -> ReordonnanceurPassages:
+        reordonnanceur = ReordonnanceurPassages("factice", **kwargs)
+        horloge = mock.patch('communication.reranking.time.perf_counter', side_effect=lambda: reordonnanceur.model.horloge)
+        horloge.start()
+        self.addCleanup(horloge.stop)
+        return reordonnanceur
+
+    @staticmethod
+    def _passages(n: int):
+        # Le passage i a une longueur i + 1: l'ordre du modèle est l'inverse de la première étape
+        return [{'id': f"p{i}", 'texte': "x" * (i + 1)} for i in range(n)]
+
+    def test_tri_par_score(self):
+        reordonnanceur = self._reordonnanceur(budget_ms=10_000, taille_lot=2)
+        retenus, stats = reordonnanceur.reordonner("question", self._passages(5), k=3)
+
+        self.assertEqual([p['id'] for p in retenus], ['p4', 'p3', 'p2'])
+        self.assertEqual(retenus[0]['score_reranking'], 5.0)
+        self.assertEqual(stats['scores'], 5)
+        self.assertFalse(stats['ignore'])
+
+    def test_budget_atteint_candidats_restants_a_leur_rang(self):
+        reordonnanceur = self._reordonnanceur(budget_ms=300, taille_lot=2)
+        retenus, stats = reordonnanceur.reordonner("question", self._passages(10), k=6)
+
+        # Deux lots de deux paires (400 ms): les suivants gardent leur rang
+        self.assertEqual(stats['scores'], 4)
+        self.assertEqual([p['id'] for p in retenus], ['p3', 'p2', 'p1', 'p0', 'p4', 'p5'])
+        self.assertNotIn('score_reranking', retenus[4])
+        self.assertEqual(reordonnanceur.stats()['tronquees'], 1)
+        self.assertAlmostEqual(reordonnanceur.stats()['ms_par_paire'], 100.0)
+
+    def test_ignore_si_un_lot_depasse_le_budget(self):
+        reordonnanceur = self._reordonnanceur(budget_ms=300, taille_lot=2)
+        reordonnanceur.reordonner("question", self._passages(10), k=6)
+
+        # 100 ms par paire d'après l'historique: un lot de deux ne tient pas en 150 ms
+        passages = self._passages(10)
+        retenus, stats = reordonnanceur.reordonner("question", passages, k=3, budget_ms=150)
+        self.assertTrue(stats['ignore'])
+        self.assertEqual(retenus, passages[:3])
+        self.assertEqual(reordonnanceur.stats()['ignorees'], 1)
+        self.assertLess(reordonnanceur.stats()['ms_par_paire'], 100.0)
+
+
+class EmballerContexteTests(TestCase):
+    """Assemblage du contexte dans un budget de tokens (user-012)"""
+
+    def setUp(self):
+        # Un token par caractère (+1): comptes faciles à prévoir
+        self.compteur = CompteurTokens(None, caracteres_par_token=1.0)
+
+    @staticmethod
+    def _passage(identifiant, texte, source='doc', chunk_id=None):
+        return {'id': identifiant, 'texte': texte, 'source': source, 'chunk_id': chunk_id, 'distance': 0.1}
+
+    def test_doublons_et_passages_contenus_retires(self):
+        passages = [
+            self._passage('a', "Le passeport est délivré en dix jours ouvrables.", 'p1'),
+            self._passage('b', "le  passeport est délivré", 'p2'),
+            self._passage('c', "Le passeport est délivré en dix jours ouvrables.", 'p3'),
+        ]
+        blocs, stats = emballer_contexte(passages, 10_000, self.compteur)
+
+        self.assertEqual([bloc['id'] for bloc in blocs], ['a'])
+        self.assertEqual(stats['doublons'], 2)
+
+    def test_chunks_adjacents_fusionnes_sans_repeter_le_chevauchement(self):
+        commun = "pièces justificatives requises."
+        passages = [
+            self._passage('d_1', "Le dossier comprend les " + commun, chunk_id=1),
+            self._passage('d_0', "La demande se fait en mairie.", chunk_id=0),
+            self._passage('d_2', commun + " Le délai est de trois jours.", chunk_id=2),
+        ]
+        blocs, stats = emballer_contexte(passages, 10_000, self.compteur, overlap=100)
+
+        self.assertEqual(stats['blocs'], 1)
+        self.assertEqual(blocs[0]['ids'], ['d_0', 'd_1', 'd_2'])
+        self.assertEqual(blocs[0]['texte'].count(commun), 1)
+        self.assertTrue(blocs[0]['texte'].startswith("La demande se fait en mairie."))
+
+    def test_budget_respecte_par_pertinence(self):
+        passages = [
+            self._passage('a', "x" * 60, 'p1'),
+            self._passage('b', "y" * 60, 'p2'),
+            self._passage('c', "z" * 10, 'p3'),
+        ]
+        blocs, stats = emballer_contexte(passages, 120, self.compteur)
+
+        # Le deuxième bloc ne tient plus, le troisième (plus court) oui
+        self.assertEqual([bloc['id'] for bloc in blocs], ['a', 'c'])
+        self.assertLessEqual(stats['tokens_contexte'], 120)
+
+    def test_premier_bloc_tronque_s_il_depasse_seul_le_budget(self):
+        blocs, stats = emballer_contexte([self._passage('a', "x" * 500)], 100, self.compteur)
+
+        self.assertEqual(len(blocs), 1)
+        self.assertTrue(blocs[0]['tronque'])
+        self.assertLess(len(blocs[0]['texte']), 100)
+        self.assertEqual(stats['tokens_contexte'], 100)
+
+
+class ContextesUtilisesTests(TestCase):
+    """Contextes d'une réponse générée, avec ou sans cache (user-012)"""
+
+    PASSAGES = [
+        {'id': 'd_1', 'texte': "Le dossier comprend l'acte de naissance.", 'source': 'd.txt', 'chunk_id': 1,
+         'distance': 0.1},
+        {'id': 'e_5', 'texte': "La carte d'identité coûte 2500 FCFA.", 'source': 'e.txt', 'chunk_id': 5,
+         'distance': 0.2},
+        {'id': 'd_0', 'texte': "La demande se fait en mairie.", 'source': 'd.txt', 'chunk_id': 0,
+         'distance': 0.3},
+    ]
+
+    def _systeme(self):
+        """Système RAG réduit aux attributs du chemin de génération, Ollama simulé"""
+        systeme = RAGDocumentProcessor.__new__(RAGDocumentProcessor)
+        systeme.cache_reponses = CacheSemantique()
+        systeme.generations_partagees = None
+        systeme.controle_admission = ControleAdmission(capacite=1)
+        systeme.routeur_llm = mock.Mock()
+        systeme.routeur_llm.executer.return_value = {'response': "En mairie."}
+        systeme.mode_generation = 'generate'
+        systeme.llm_model = 'llama3.2:3b'
+        systeme.metriques = RegistreMetriques()
+        systeme.compteur_tokens = CompteurTokens(None, caracteres_par_token=1.0)
+        systeme.budget_tokens_prompt = 10_000
+        systeme.decoupeur = mock.Mock(chevauchement_max=100)
+        systeme._noter_metriques_ollama = mock.Mock(return_value={})
+        return systeme
+
+    def test_meme_forme_avec_et_sans_cache(self):
+        systeme = self._systeme()
+        embedding = _vecteur(1, 0)
+        genere = systeme._repondre("Où faire la demande ?", embedding, [dict(p) for p in self.PASSAGES], {})
+        en_cache = systeme._repondre("Où faire la demande ?", embedding, [dict(p) for p in self.PASSAGES], {})
+
+        self.assertTrue(en_cache['depuis_cache'])
+        self.assertEqual(systeme.routeur_llm.executer.call_count, 1)
+        # Passages retrouvés, non fusionnés, dans leur ordre de pertinence
+        for resultat in (genere, en_cache):
+            self.assertEqual(resultat['contextes_utilises'], self.PASSAGES)
+            self.assertEqual(resultat['blocs'], [['d_0', 'd_1'], ['e_5']])
+
+    def test_passages_hors_du_prompt_exclus(self):
+        systeme = self._systeme()
+        # Budget pour le premier bloc seulement (instructions comprises)
+        systeme.budget_tokens_prompt = len(systeme.construire_prompt("q", [])) + 1 + 110
+        resultat = systeme._repondre("q", _vecteur(1, 0), [dict(p) for p in self.PASSAGES], {})
+
+        self.assertEqual([c['id'] for c in resultat['contextes_utilises']], ['d_1', 'd_0'])
+        self.assertEqual(resultat['blocs'], [['d_0', 'd_1']])
+        self.assertEqual(resultat['sources'], ['d.txt'])
+
+
+class RouteurLLMTests(TestCase):
+    """Routage et bascule entre serveurs Ollama (user-014)"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        sys.path.insert(0, str(RACINE_DEPOT))
+        import stub_ollama_server
+        cls.en_panne = stub_ollama_server.demarrer(0, latence=0.0, taux_erreur=1.0)
+        cls.sain = stub_ollama_server.demarrer(0, latence=0.0, tokens_par_s=1000, nb_tokens=3)
+
+    @classmethod
+    def tearDownClass(cls):
+        for serveur in (cls.en_panne, cls.sain):
+            serveur.shutdown()
+            serveur.server_close()
+        sys.path.remove(str(RACINE_DEPOT))
+        super().tearDownClass()
+
+    @staticmethod
+    def _url(serveur) -> str:
+        return f"http://127.0.0.1:{serveur.server_address[1]}"
+
+    @staticmethod
+    def _question(client):
+        return client.chat(model='mistral:latest', messages=[{'role': 'user', 'content': 'Bonjour'}],
+                           stream=False)
+
+    def _avertissements(self):
+        """Chaque serveur en échec est signalé"""
+        return self.assertLogs('communication.routeur_llm', level='WARNING')
+
+    def test_bascule_sur_le_serveur_suivant_et_exclusion(self):
+        routeur = RouteurLLM([self._url(self.en_panne), self._url(self.sain)], timeout=10)
+        with self._avertissements():
+            reponse = routeur.executer(self._question)
+
+        self.assertTrue(reponse.message.content)
+        en_panne, sain = routeur.stats()
+        self.assertEqual(en_panne['echecs'], 1)
+        self.assertFalse(en_panne['disponible'])
+        self.assertTrue(sain['disponible'])
+        self.assertEqual(sain['requetes'], 1)
+
+        # Serveur exclu: la requête suivante va directement au serveur sain
+        routeur.executer(self._question)
+        self.assertEqual(routeur.stats()[0]['requetes'], 1)
+
+    def test_bascule_en_streaming_avant_le_premier_morceau(self):
+        routeur = RouteurLLM([self._url(self.en_panne), self._url(self.sain)], timeout=10)
+        with self._avertissements():
+            morceaux = list(routeur.executer_flux(
+                lambda client: client.chat(model='mistral:latest', messages=[{'role': 'user', 'content': 'x'}],
+                                           stream=True)
+            ))
+        self.assertTrue(morceaux[-1].done)
+        self.assertEqual([serveur['en_vol'] for serveur in routeur.stats()], [0, 0])
+
+    def test_tous_les_serveurs_en_echec(self):
+        import ollama
+        routeur = RouteurLLM([self._url(self.en_panne)], timeout=10)
+        with self._avertissements(), self.assertRaises(ServeursIndisponibles) as erreur:
+            routeur.executer(self._question)
+
+        self.assertEqual(erreur.exception.statut_http, 503)
+        self.assertGreaterEqual(erreur.exception.retry_after, 1)
+        self.assertIsInstance(erreur.exception.__cause__, ollama.ResponseError)
+        self.assertEqual(routeur.stats()[0]['en_vol'], 0)
+
+    def test_echec_de_tous_les_serveurs_en_503(self):
+        routeur = RouteurLLM([self._url(self.en_panne)], timeout=10)
+        systeme = mock.Mock()
+        systeme.generer_reponse.side_effect = lambda *args, **kwargs: routeur.executer(self._question)
+        with self._avertissements(), mock.patch.object(views, 'obtenir_rag_system', return_value=systeme):
+            reponse = self.client.post('/api/question/', data=json.dumps({'question': 'Bonjour'}),
+                                       content_type='application/json')
+
+        self.assertEqual(reponse.status_code, 503)
+        self.assertFalse(reponse.json()['success'])
+        self.assertGreaterEqual(int(reponse['Retry-After']), 1)
+
+    def test_aucune_place_libre(self):
+        routeur = RouteurLLM(['http://a'], concurrence=1, attente_place=0.05)
+        routeur.serveurs[0].en_vol = 1
+        with self.assertRaises(ServeursIndisponibles):
+            routeur.executer(lambda client: None)
+        self.assertEqual(routeur.stats()[0]['requetes'], 0)
+
+    def test_erreur_client_propagee_sans_exclusion(self):
+        import ollama
+        routeur = RouteurLLM([self._url(self.sain), self._url(self.en_panne)], timeout=10)
+        # Le faux serveur répond 404 hors de /api/chat et /api/generate
+        with self.assertRaises(ollama.ResponseError) as erreur:
+            routeur.executer(lambda client: client.embed(model='mistral:latest', input='x'))
+
+        self.assertEqual(erreur.exception.status_code, 404)
+        self.assertTrue(all(serveur['disponible'] and serveur['echecs'] == 0 for serveur in routeur.stats()))
+        self.assertEqual(routeur.stats()[1]['requetes'], 0)
+
+    def test_flux_abandonne_libere_le_serveur(self):
+        routeur = RouteurLLM([self._url(self.sain)], timeout=10)
+        flux = routeur.executer_flux(
+            lambda client: client.chat(model='mistral:latest', messages=[{'role': 'user', 'content': 'x'}],
+                                       stream=True)
+        )
+        next(flux)
+        self.assertEqual(routeur.stats()[0]['en_vol'], 1)
+        flux.close()
+
+        self.assertEqual(routeur.stats()[0]['en_vol'], 0)
+        self.assertEqual(routeur.stats()[0]['echecs'], 0)
+
+    def test_concurrence_par_serveur(self):
+        routeur = RouteurLLM(['http://a', 'http://b'], concurrence=1, attente_place=1)
+        routeur.serveurs[0].latence = 0.001
+        routeur.serveurs[1].latence = 10.0
+        occupes = []
+        verrou = threading.Lock()
+        pic = {}
+
+        def appel(client):
+            with verrou:
+                occupes.append(client)
+                pic[client] = max(pic.get(client, 0), occupes.count(client))
+            time.sleep(0.05)
+            with verrou:
+                occupes.remove(client)
+
+        threads = [threading.Thread(target=routeur.executer, args=(appel,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Le serveur rapide n'a jamais reçu deux requêtes à la fois
+        self.assertEqual(sorted(pic.values()), [1, 1])
+
+
+class ControleAdmissionTests(TestCase):
+    """Contrôle d'admission de la génération (user-015)"""
+
+    def test_file_pleine_refusee_en_429(self):
+        controle = ControleAdmission(capacite=1, taille_file=0, attente_max=5)
+        with controle.admettre():
+            with self.assertRaises(FileSaturee) as refus:
+                with controle.admettre():
+                    pass
+            controle_stats = controle.stats()
+        self.assertEqual(refus.exception.statut_http, 429)
+        self.assertGreaterEqual(refus.exception.retry_after, 1)
+        self.assertEqual(controle_stats['refusees'], 1)
+
+    def test_refuser_si_saturee_sans_reserver(self):
+        controle = ControleAdmission(capacite=1, taille_file=0)
+        controle.refuser_si_saturee()
+        with controle.admettre():
+            with self.assertRaises(FileSaturee):
+                controle.refuser_si_saturee()
+        self.assertEqual(controle.stats()['en_cours'], 0)
+
+    def test_attente_depassee_en_503(self):
+        controle = ControleAdmission(capacite=1, taille_file=4, attente_max=0.05)
+        with controle.admettre():
+            with self.assertRaises(AttenteDepassee) as refus:
+                with controle.admettre():
+                    pass
+        self.assertEqual(refus.exception.statut_http, 503)
+        self.assertEqual(controle.stats()['expirees'], 1)
+        self.assertEqual(controle.stats()['en_file'], 0)
+
+    def test_retry_after_estime_sur_la_duree_des_generations(self):
+        controle = ControleAdmission(capacite=1, taille_file=0, attente_max=60)
+        with mock.patch('communication.admission.time.monotonic', side_effect=[0.0, 0.0, 0.0, 4.0]):
+            with controle.admettre():
+                pass
+        with controle.admettre():
+            with self.assertRaises(FileSaturee) as refus:
+                controle.refuser_si_saturee()
+        # Une génération de 4 s, aucune requête en file, une place
+        self.assertEqual(refus.exception.retry_after, 4)
+
+    def test_place_transmise_dans_l_ordre_d_arrivee(self):
+        controle = ControleAdmission(capacite=1, taille_file=4, attente_max=5)
+        ordre = []
+
+        def requete(nom):
+            with controle.admettre():
+                ordre.append(nom)
+
+        with controle.admettre():
+            threads = []
+            for nom in ('a', 'b', 'c'):
+                thread = threading.Thread(target=requete, args=(nom,))
+                thread.start()
+                threads.append(thread)
+                while controle.stats()['en_file'] < len(threads):
+                    time.sleep(0.005)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(ordre, ['a', 'b', 'c'])
+        self.assertEqual(controle.stats()['en_cours'], 0)
+
+    def test_reponse_retry_after(self):
+        reponse = views._reponse_refus(FileSaturee("File de génération pleine", 7))
+        self.assertEqual(reponse.status_code, 429)
+        self.assertEqual(reponse['Retry-After'], '7')
+        self.assertEqual(json.loads(reponse.content)['retry_after'], 7)
+
+
+class DecoupeurTexteTests(TestCase):
+    """Découpage par structure (user-017)"""
+
+    TEXTE = (
+        "TITRE I : DISPOSITIONS GÉNÉRALES\n\n"
+        "Article 1 : La présente loi fixe les règles relatives à la délivrance des actes de naissance. "
+        "Elle s'applique à tout le territoire.\n\n"
+        "Article 2 : La demande est adressée au centre d'état civil du lieu de naissance. "
+        "Elle est accompagnée des pièces justificatives.\n\n"
+        "Article 3 : Le délai de délivrance est de trois jours ouvrables. "
+        "Le retrait se fait sur présentation d'une pièce d'identité."
+    )
+
+    def test_un_chunk_commence_a_chaque_article(self):
+        chunks = DecoupeurTexte(max_tokens=40, overlap_tokens=8).decouper(self.TEXTE)
+
+        articles = [chunk for chunk in chunks if chunk.startswith("Article")]
+        self.assertEqual([chunk.split(" :")[0] for chunk in articles], ["Article 1", "Article 2", "Article 3"])
+        for chunk in articles:
+            self.assertEqual(chunk.count("Article"), 1)
+
+    def test_articles_entiers_regroupes_quand_ils_tiennent(self):
+        chunks = DecoupeurTexte(max_tokens=200, overlap_tokens=8).decouper(self.TEXTE)
+
+        self.assertEqual(len(chunks), 1)
+        self.assertIn("Article 3", chunks[0])
+
+    def test_article_long_coupe_entre_phrases_avec_chevauchement(self):
+        phrases = [f"La condition numéro {i} doit être remplie par le demandeur." for i in range(12)]
+        texte = "Article 5 : " + " ".join(phrases) + "\n\nArticle 6 : Dispositions finales."
+        decoupeur = DecoupeurTexte(max_tokens=50, overlap_tokens=20)
+        chunks = decoupeur.decouper(texte)
+
+        self.assertGreater(len(chunks), 2)
+        self.assertTrue(all(n <= decoupeur.max_tokens for n in decoupeur.compter(chunks)))
+        # Coupures entre deux phrases, jamais au milieu
+        for chunk in chunks:
+            self.assertTrue(chunk.endswith("."), chunk)
+        # Le chunk suivant reprend la dernière phrase du précédent
+        derniere_phrase = chunks[0].split(". ")[-1]
+        self.assertIn(derniere_phrase, chunks[1])
+        # Un article court rejoint la fin du précédent sans être coupé
+        self.assertTrue(chunks[-1].endswith("demandeur.\nArticle 6 : Dispositions finales."))
+        self.assertEqual(sum("Article 6" in chunk for chunk in chunks), 1)
+
+    def test_chevauchement_max_suit_le_ratio_de_l_estimation(self):
+        self.assertEqual(DecoupeurTexte(overlap_tokens=24, caracteres_par_token=4.0).chevauchement_max, 192)
+        self.assertEqual(DecoupeurTexte(overlap_tokens=24, caracteres_par_token=3.0).chevauchement_max, 144)
+
+
+class MetriquesTests(TestCase):
+    """Histogrammes de latence et export Prometheus (user-020)"""
+
+    def test_histogramme_cumule(self):
+        registre = RegistreMetriques(bornes=(0.1, 1.0))
+        for duree in (0.05, 0.5, 2.0):
+            registre.observer('rag_etape_duree_secondes', duree, etape='llm')
+        lignes = registre.exporter().splitlines()
+
+        self.assertTrue(lignes[0].startswith("# HELP rag_etape_duree_secondes "))
+        self.assertEqual(lignes[1], "# TYPE rag_etape_duree_secondes histogram")
+        self.assertEqual(lignes[2:], [
+            'rag_etape_duree_secondes_bucket{etape="llm",le="0.1"} 1',
+            'rag_etape_duree_secondes_bucket{etape="llm",le="1.0"} 2',
+            'rag_etape_duree_secondes_bucket{etape="llm",le="+Inf"} 3',
+            'rag_etape_duree_secondes_sum{etape="llm"} 2.55',
+            'rag_etape_duree_secondes_count{etape="llm"} 3',
+        ])
+
+    def test_compteurs_et_jauges(self):
+        registre = RegistreMetriques()
+        registre.incrementer('rag_requetes_total', endpoint='question', statut=200)
+        registre.incrementer('rag_requetes_total', endpoint='question', statut=200)
+        registre.incrementer('rag_requetes_total', endpoint='recherche', statut=400)
+        texte = registre.exporter([('rag_chunks', 'gauge', "Chunks dans la collection", 42)])
+
+        self.assertEqual(texte.count("# TYPE rag_requetes_total counter"), 1)
+        self.assertIn('rag_requetes_total{endpoint="question",statut="200"} 2\n', texte)
+        self.assertIn('rag_requetes_total{endpoint="recherche",statut="400"} 1\n', texte)
+        self.assertIn("# TYPE rag_chunks gauge\nrag_chunks 42\n", texte)
+
+    def test_endpoint_sans_systeme_charge(self):
+        self.client.post('/api/question/', data=b'{pas du json', content_type='application/json')
+        with mock.patch.object(systeme_rag, 'rag_system_si_pret', return_value=None):
+            reponse = self.client.get('/api/metrics/')
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        texte = reponse.content.decode()
+        self.assertIn('rag_requetes_total{endpoint="question",statut="400"}', texte)
+        self.assertIn('rag_requete_duree_secondes_count{endpoint="question"}', texte)
+        self.assertNotIn("rag_chunks", texte)
+
+    @staticmethod
+    def _systeme_charge():
+        systeme = mock.Mock()
+        systeme.controle_admission = ControleAdmission(capacite=2)
+        systeme.cache_reponses = CacheSemantique()
+        systeme.collection.count.return_value = 42
+        systeme.batcheur_embeddings = None
+        systeme.reordonnanceur = None
+        return systeme
+
+    def _exporter(self, systeme) -> str:
+        with mock.patch.object(systeme_rag, 'rag_system_si_pret', return_value=systeme):
+            return self.client.get('/api/metrics/').content.decode()
+
+    def test_jauges_du_systeme_charge(self):
+        texte = self._exporter(self._systeme_charge())
+
+        self.assertIn("# TYPE rag_generations_en_cours gauge\nrag_generations_en_cours 0\n", texte)
+        self.assertIn("rag_cache_hits_total 0\n", texte)
+        self.assertIn("rag_chunks 42\n", texte)
+
+    def test_jauges_du_micro_batching(self):
+        systeme = self._systeme_charge()
+        self.assertNotIn("rag_embeddings_lots_total", self._exporter(systeme))
+
+        systeme.batcheur_embeddings = mock.Mock()
+        systeme.batcheur_embeddings.stats.return_value = {'lots': 3, 'questions': 12, 'taille_moyenne_lot': 4.0}
+        texte = self._exporter(systeme)
+        self.assertIn("# TYPE rag_embeddings_lots_total counter\nrag_embeddings_lots_total 3\n", texte)
+        self.assertIn("rag_embeddings_questions_total 12\n", texte)
+        self.assertIn("rag_embeddings_taille_moyenne_lot 4.0\n", texte)
+
+    def test_jauges_du_reordonnancement(self):
+        systeme = self._systeme_charge()
+        systeme.reordonnanceur = mock.Mock()
+        systeme.reordonnanceur.stats.return_value = {
+            'questions': 5, 'tronquees': 1, 'ignorees': 2, 'paires': 40, 'modele': 'm', 'budget_ms': 300,
+            'ms_par_paire': None,
+        }
+        texte = self._exporter(systeme)
+        self.assertIn("rag_reranking_tronquees_total 1\n", texte)
+        self.assertIn("rag_reranking_paires_total 40\n", texte)
+        self.assertNotIn("rag_reranking_secondes_par_paire", texte)
+
+        systeme.reordonnanceur.stats.return_value['ms_par_paire'] = 12.5
+        self.assertIn("rag_reranking_secondes_par_paire 0.0125\n", self._exporter(systeme))
+
+
+class _CollectionExport:
+    """Interface count()/get() de ChromaDB sur des tableaux en mémoire"""
+
+    def __init__(self, embeddings, metadatas):
+        self.embeddings = embeddings
+        self.metadatas = metadatas
+
+    def count(self) -> int:
+        return len(self.embeddings)
+
+    def get(self, include=None, limit=None, offset=0):
+        fin = min(len(self.embeddings), offset + limit)
+        return {
+            'ids': [f"c_{i}" for i in range(offset, fin)],
+            'embeddings': self.embeddings[offset:fin],
+            'documents': [f"texte {i}" for i in range(offset, fin)],
+            'metadatas': self.metadatas[offset:fin],
+        }
+
+
+class IndexMemoireTests(TestCase):
+    """Index en mémoire comparé à une recherche exhaustive numpy (user-021, 022, 025)"""
+
+    N, DIMENSION, K = 2000, 64, 10
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        generateur = np.random.default_rng(0)
+        cls.embeddings = generateur.standard_normal((cls.N, cls.DIMENSION)).astype(np.float32)
+        cls.embeddings /= np.linalg.norm(cls.embeddings, axis=1, keepdims=True)
+        # Source "petit.pdf": 5% des chunks, plus petite que 2 listes IVF sur 16
+        sources = np.where(np.arange(cls.N) % 20 == 0, 'petit.pdf',
+                           np.where(np.arange(cls.N) % 2 == 0, 'grand.pdf', 'moyen.pdf'))
+        cls.metadatas = [
+            {'source': str(source), 'chunk_id': i, 'page': i % 50,
+             'categorie': 'justice' if i % 3 == 0 else 'etat_civil', 'type_document': 'loi',
+             'langue': 'fr', 'origine': 'fichier'}
+            for i, source in enumerate(sources)
+        ]
+        cls.questions = generateur.standard_normal((20, cls.DIMENSION)).astype(np.float32)
+
+        cls.dossier = Path(tempfile.mkdtemp())
+        collection = _CollectionExport(cls.embeddings, cls.metadatas)
+        exporter_collection(collection, str(cls.dossier / "exact"))
+        completer_quantifications(str(cls.dossier / "exact"), ['float16', 'int8', 'binaire'])
+        exporter_collection(collection, str(cls.dossier / "ivf"), n_listes=16)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dossier, ignore_errors=True)
+        super().tearDownClass()
+
+    def _attendus(self, q, lignes=None):
+        """Ids des K plus proches par force brute (parmi les lignes données)"""
+        lignes = np.arange(self.N) if lignes is None else np.asarray(lignes)
+        distances = ((self.embeddings[lignes] - q) ** 2).sum(axis=1)
+        return [f"c_{i}" for i in lignes[np.argsort(distances, kind='stable')[:self.K]]]
+
+    def _ids(self, index, q, filtres=None):
+        return [passage['id'] for passage in index.passages(q, self.K, filtres)]
+
+    def _rappel(self, index, filtres=None, lignes=None) -> float:
+        trouves = [len(set(self._ids(index, q, filtres)) & set(self._attendus(q, lignes))) for q in self.questions]
+        return sum(trouves) / (self.K * len(self.questions))
+
+    def test_recherche_exacte(self):
+        index = IndexMemoire(str(self.dossier / "exact"))
+        for q in self.questions:
+            passages = index.passages(q, self.K)
+            self.assertEqual([p['id'] for p in passages], self._attendus(q))
+            attendue = float(((self.embeddings[int(passages[0]['id'][2:])] - q) ** 2).sum())
+            self.assertAlmostEqual(passages[0]['distance'], attendue, places=3)
+
+    def test_ivf_toutes_listes_equivaut_a_l_exact(self):
+        index = IndexMemoire(str(self.dossier / "ivf"), n_sondes=16)
+        for q in self.questions:
+            self.assertEqual(self._ids(index, q), self._attendus(q))
+
+    def test_ivf_partiel(self):
+        index = IndexMemoire(str(self.dossier / "ivf"), n_sondes=4)
+        self.assertGreater(self._rappel(index), 0.3)
+
+    def test_quantifications(self):
+        for quantification, rappel_min in (('float16', 0.99), ('int8', 0.9), ('binaire', 0.7)):
+            with self.subTest(quantification=quantification):
+                index = IndexMemoire(str(self.dossier / "exact"), quantification=quantification,
+                                     facteur_rescoring=20)
+                self.assertGreaterEqual(self._rappel(index), rappel_min)
+
+    def test_recherche_filtree(self):
+        index = IndexMemoire(str(self.dossier / "exact"))
+        for filtres in (
+            {'source': 'moyen.pdf'},
+            {'source': ['petit.pdf', 'grand.pdf']},
+            {'categorie': 'justice', 'page': {'min': 10, 'max': 20}},
+            {'page': [0, 1, 2]},
+        ):
+            lignes = [i for i, metadata in enumerate(self.metadatas) if self._correspond(metadata, filtres)]
+            with self.subTest(filtres=filtres):
+                for q in self.questions[:5]:
+                    self.assertEqual(self._ids(index, q, filtres), self._attendus(q, lignes))
+
+    def test_filtre_sans_resultat(self):
+        index = IndexMemoire(str(self.dossier / "exact"))
+        self.assertEqual(index.passages(self.questions[0], self.K, {'source': 'absent.pdf'}), [])
+
+    def test_petite_partition_exacte_en_ivf(self):
+        # Partition plus petite que les listes sondées: parcourue entière
+        index = IndexMemoire(str(self.dossier / "ivf"), n_sondes=2)
+        lignes = [i for i, metadata in enumerate(self.metadatas) if metadata['source'] == 'petit.pdf']
+        for q in self.questions:
+            self.assertEqual(self._ids(index, q, {'source': 'petit.pdf'}), self._attendus(q, lignes))
+
+    @staticmethod
+    def _correspond(metadata, filtres) -> bool:
+        for champ, valeurs in normaliser_filtres(filtres).items():
+            valeur = metadata.get(champ)
+            if isinstance(valeurs, dict):
+                if valeur < valeurs.get('min', 0) or valeur > valeurs.get('max', valeur):
+                    return False
+            elif valeur not in valeurs:
+                return False
+        return True
+
+
+class LotQuestionsTests(TestCase):
+    """Questions par lot en NDJSON (user-023)"""
+
+    EVENEMENTS = [
+        {'type': 'debut', 'questions': 2, 'questions_uniques': 2, 'recherche_ms': 1.5},
+        {'type': 'resultat', 'index': 1, 'question': "Délai du passeport ?", 'success': True,
+         'reponse': "Dix jours.", 'sources': ['a.txt'], 'contextes': [{'id': 'a_0', 'distance': 0.12}],
+         'nouveaux_contextes': [{'id': 'a_0', 'texte': "Le passeport est délivré en dix jours.", 'source': 'a.txt',
+                                 'chunk_id': 0}],
+         'depuis_cache': False, 'tokens_prompt': 180, 'generation_partagee': False},
+        {'type': 'resultat', 'index': 0, 'question': "Prix de la CNIB ?", 'success': False,
+         'message': "Génération impossible"},
+        {'type': 'fin', 'duree': 0.4, 'reponses': 1, 'erreurs': 1, 'depuis_cache': 0},
+    ]
+
+    def _poster(self, corps, systeme=None):
+        systeme = systeme or mock.Mock()
+        if not systeme.generer_reponses_lot.side_effect:
+            systeme.generer_reponses_lot.return_value = iter(copy.deepcopy(self.EVENEMENTS))
+        donnees = corps if isinstance(corps, bytes) else json.dumps(corps).encode()
+        with mock.patch.object(views, 'obtenir_rag_system', return_value=systeme):
+            reponse = self.client.post('/api/question/lot/', data=donnees, content_type='application/json')
+            lignes = [json.loads(ligne) for ligne in b"".join(reponse.streaming_content).splitlines()] \
+                if reponse.streaming else None
+        return reponse, lignes
+
+    def test_resultats_en_ndjson(self):
+        systeme = mock.Mock()
+        reponse, lignes = self._poster({'questions': [" Prix de la CNIB ? ", "Délai du passeport ?"]}, systeme)
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(lignes, self.EVENEMENTS)
+        self.assertEqual(systeme.generer_reponses_lot.call_args.args[0], ["Prix de la CNIB ?", "Délai du passeport ?"])
+
+    def test_lot_invalide(self):
+        for corps in ({}, {'questions': []}, {'questions': 'une question'}, {'questions': ['ok', '']},
+                      {'questions': ['ok', 3]},
+                      {'questions': ['q'] * (views.N_QUESTIONS_LOT_MAX + 1)}):
+            with self.subTest(corps=corps):
+                reponse, _ = self._poster(corps)
+                self.assertEqual(reponse.status_code, 400)
+                self.assertFalse(reponse.json()['success'])
+
+    def test_question_invalide_designee_par_son_index(self):
+        # Mêmes règles et mêmes messages que /api/question/, question par question
+        for question, message in ((3, 'Le champ "question" doit être une chaîne'),
+                                  ('   ', 'La question ne peut pas être vide')):
+            with self.subTest(question=question):
+                reponse, _ = self._poster({'questions': ['ok', question]})
+                self.assertEqual(reponse.status_code, 400)
+                self.assertEqual(reponse.json()['message'], f'Question 1: {message}')
+
+    def test_file_pleine_refusee_avant_le_flux(self):
+        systeme = mock.Mock()
+        systeme.controle_admission.refuser_si_saturee.side_effect = FileSaturee("File de génération pleine", 5)
+        reponse, _ = self._poster({'questions': ["ok"]}, systeme)
+
+        self.assertEqual(reponse.status_code, 429)
+        self.assertEqual(reponse['Retry-After'], '5')
+        systeme.generer_reponses_lot.assert_not_called()
+
+    def test_contextes_ids_sans_texte(self):
+        _, lignes = self._poster({'questions': ["a", "b"], 'contextes': 'ids'})
+        self.assertNotIn('nouveaux_contextes', lignes[1])
+        self.assertEqual(lignes[1]['contextes'], [{'id': 'a_0', 'distance': 0.12}])
+
+        _, lignes = self._poster({'questions': ["a", "b"], 'contextes': 'aucun'})
+        self.assertNotIn('contextes', lignes[1])
+
+        _, lignes = self._poster({'questions': ["a", "b"], 'troncature': 14})
+        self.assertEqual(lignes[1]['nouveaux_contextes'][0]['texte'], "Le passeport e")
+        self.assertTrue(lignes[1]['nouveaux_contextes'][0]['tronque'])
+
+    def test_corps_invalides_en_400_json(self):
+        for corps in (b'{pas du json', b'\xff', b'[]', b'"question"', b'3'):
+            with self.subTest(corps=corps):
+                reponse, _ = self._poster(corps)
+                self.assertEqual(reponse.status_code, 400)
+                self.assertFalse(reponse.json()['success'])
+
+    def test_systeme_indisponible_en_500_json(self):
+        with mock.patch.object(views, 'obtenir_rag_system', side_effect=RuntimeError("chargement impossible")):
+            reponse = self.client.post('/api/question/lot/', data=json.dumps({'questions': ['ok']}),
+                                       content_type='application/json')
+        self.assertEqual(reponse.status_code, 500)
+        self.assertIn("chargement impossible", reponse.json()['message'])
+
+
+class RechercheVuesTests(TestCase):
+    """Mode recherche, taille des contextes et lecture des chunks (user-024)"""
+
+    PASSAGES = [
+        {'id': 'a_0', 'texte': "Le passeport est délivré en dix jours.", 'source': 'a.txt', 'chunk_id': 0,
+         'distance': 0.12},
+        {'id': 'b_3', 'texte': "La carte d'identité coûte 2500 FCFA.", 'source': 'b.txt', 'chunk_id': 3,
+         'distance': 0.34},
+    ]
+
+    def _poster(self, url, corps):
+        return self.client.post(url, data=json.dumps(corps), content_type='application/json')
+
+    def _systeme(self):
+        systeme = mock.Mock()
+        systeme.rechercher.return_value = [dict(passage) for passage in self.PASSAGES]
+        return systeme
+
+    def test_mode_recherche_sans_generation(self):
+        systeme = self._systeme()
+        with mock.patch.object(views, 'obtenir_rag_system', return_value=systeme):
+            reponse = self._poster('/api/question/', {'question': 'passeport', 'mode': 'recherche',
+                                                      'n_resultats': 2})
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual([r['id'] for r in reponse.json()['resultats']], ['a_0', 'b_3'])
+        systeme.generer_reponse.assert_not_called()
+
+    def test_contextes_ids_et_troncature(self):
+        with mock.patch.object(views, 'obtenir_rag_system', return_value=self._systeme()):
+            ids = self._poster('/api/recherche/', {'question': 'passeport', 'contextes': 'ids'}).json()
+            tronques = self._poster('/api/recherche/', {'question': 'passeport', 'troncature': 10}).json()
+
+        self.assertEqual(ids['resultats'][0], {'id': 'a_0', 'source': 'a.txt', 'chunk_id': 0, 'distance': 0.12})
+        self.assertEqual(tronques['resultats'][0]['texte'], "Le passepo")
+        self.assertTrue(tronques['resultats'][0]['tronque'])
+        self.assertNotIn('tronque', tronques['resultats'][1] if len(self.PASSAGES[1]['texte']) <= 10 else {})
+
+    def test_options_invalides(self):
+        with mock.patch.object(views, 'obtenir_rag_system', side_effect=AssertionError("non appelé")):
+            for corps in ({'question': 'ok', 'mode': 'inconnu'},
+                          {'question': 'ok', 'contextes': 'tout'},
+                          {'question': 'ok', 'troncature': -1},
+                          {'question': 'ok', 'troncature': True}):
+                with self.subTest(corps=corps):
+                    self.assertEqual(self._poster('/api/question/', corps).status_code, 400)
+
+    def test_n_resultats_plafonne(self):
+        systeme = self._systeme()
+        with mock.patch.object(views, 'obtenir_rag_system', return_value=systeme):
+            self._poster('/api/recherche/', {'question': 'passeport', 'n_resultats': 10_000})
+        self.assertEqual(systeme.rechercher.call_args.kwargs['n_resultats'], views.N_RESULTATS_MAX)
+
+    def test_chunks_par_ids(self):
+        systeme = mock.Mock()
+        systeme.obtenir_chunks.return_value = [dict(self.PASSAGES[0])]
+        with mock.patch.object(views, 'obtenir_rag_system', return_value=systeme):
+            self.assertEqual(self.client.get('/api/chunks/').status_code, 400)
+            reponse = self.client.get('/api/chunks/?ids=a_0,inconnu&ids=a_0')
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.json()['introuvables'], ['inconnu'])
+        systeme.obtenir_chunks.assert_called_once_with(['a_0', 'inconnu'])
+
+    def test_filtres_transmis_a_la_recherche(self):
+        systeme = self._systeme()
+        with mock.patch.object(views, 'obtenir_rag_system', return_value=systeme):
+            reponse = self._poster('/api/recherche/', {'question': 'passeport', 'filtres': {'source': 'a.txt'}})
+            invalide = self._poster('/api/recherche/', {'question': 'passeport', 'filtres': {'auteur': 'x'}})
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(systeme.rechercher.call_args.kwargs['filtres'], {'source': ['a.txt']})
+        self.assertEqual(invalide.status_code, 400)
+        self.assertEqual(systeme.rechercher.call_count, 1)
+
+
+class FiltresMetadonneesTests(TestCase):
+    """Filtres de recherche par métadonnées (user-025)"""
+
+    def test_forme_canonique(self):
+        self.assertEqual(normaliser_filtres(None), {})
+        self.assertEqual(normaliser_filtres({}), {})
+        self.assertEqual(
+            normaliser_filtres({'categorie': 'justice', 'source': ['a.pdf', 'b.pdf', 'a.pdf'], 'page': 3}),
+            {'categorie': ['justice'], 'source': ['a.pdf', 'b.pdf'], 'page': [3]}
+        )
+        self.assertEqual(normaliser_filtres({'page': {'min': 2, 'max': None}}), {'page': {'min': 2}})
+
+    def test_filtres_invalides(self):
+        for filtres in (
+            ['categorie'],
+            {'auteur': 'x'},
+            {'categorie': ''},
+            {'categorie': []},
+            {'categorie': 3},
+            {'page': -1},
+            {'page': True},
+            {'page': 'trois'},
+            {'page': {}},
+            {'page': {'min': 1, 'pas': 2}},
+            {'page': {'min': 'un'}},
+        ):
+            with self.subTest(filtres=filtres), self.assertRaises(ValueError):
+                normaliser_filtres(filtres)
+
+    def test_clause_where(self):
+        self.assertIsNone(clause_where(None))
+        self.assertEqual(clause_where({'categorie': 'justice'}), {'categorie': 'justice'})
+        self.assertEqual(clause_where({'langue': ['fr', 'en']}), {'langue': {'$in': ['fr', 'en']}})
+        self.assertEqual(
+            clause_where({'origine': 'web', 'page': {'min': 2, 'max': 5}}),
+            {'$and': [{'origine': 'web'}, {'page': {'$gte': 2}}, {'page': {'$lte': 5}}]}
+        )
+
+
+class StreamSSETests(TestCase):
+    """Réponse en Server-Sent Events (user-001)"""
+
+    EVENEMENTS = [
+        {'type': 'sources', 'sources': ['a.txt'],
+         'contextes_utilises': [{'id': 'a_0', 'texte': "Le passeport est délivré en dix jours.", 'source': 'a.txt',
+                                 'chunk_id': 0, 'distance': 0.12}]},
+        {'type': 'token', 'contenu': "Dix"},
+        {'type': 'token', 'contenu': " jours."},
+        {'type': 'fin', 'duree': 0.5, 'premier_token': 0.1},
+    ]
+
+    def _flux(self, corps, systeme=None):
+        """Réponse et événements (nom, données) du flux"""
+        systeme = systeme or mock.Mock()
+        systeme.generer_reponse_stream.return_value = iter(copy.deepcopy(self.EVENEMENTS))
+        with mock.patch.object(views, 'obtenir_rag_system', return_value=systeme):
+            reponse = self.client.post('/api/question/stream/', data=json.dumps(corps),
+                                       content_type='application/json')
+            if not reponse.streaming:
+                return reponse, None
+            texte = b"".join(reponse.streaming_content).decode()
+        evenements = []
+        for bloc in texte.split("\n\n")[:-1]:
+            ligne_evenement, ligne_donnees = bloc.split("\n")
+            self.assertTrue(ligne_evenement.startswith("event: ") and ligne_donnees.startswith("data: "))
+            evenements.append((ligne_evenement[7:], json.loads(ligne_donnees[6:])))
+        return reponse, evenements
+
+    def test_sources_puis_tokens_puis_fin(self):
+        reponse, evenements = self._flux({'question': "Délai du passeport ?"})
+
+        self.assertEqual(reponse['Content-Type'], 'text/event-stream')
+        self.assertEqual(reponse['Cache-Control'], 'no-cache')
+        self.assertEqual(reponse['X-Accel-Buffering'], 'no')
+        self.assertEqual([nom for nom, _ in evenements], ['sources', 'token', 'token', 'fin'])
+        self.assertEqual([donnees for _, donnees in evenements], self.EVENEMENTS)
+
+    def test_format_des_contextes_de_l_evenement_sources(self):
+        _, evenements = self._flux({'question': "Délai ?", 'contextes': 'ids'})
+        self.assertEqual(evenements[0][1]['contextes_utilises'],
+                         [{'id': 'a_0', 'source': 'a.txt', 'chunk_id': 0, 'distance': 0.12}])
+
+        _, evenements = self._flux({'question': "Délai ?", 'contextes': 'aucun'})
+        self.assertNotIn('contextes_utilises', evenements[0][1])
+        self.assertEqual(evenements[0][1]['sources'], ['a.txt'])
+
+    def test_file_pleine_refusee_avant_le_flux(self):
+        systeme = mock.Mock()
+        systeme.controle_admission.refuser_si_saturee.side_effect = FileSaturee("File de génération pleine", 3)
+        reponse, _ = self._flux({'question': "Délai ?"}, systeme)
+
+        self.assertEqual(reponse.status_code, 429)
+        self.assertEqual(reponse['Retry-After'], '3')
+        systeme.generer_reponse_stream.assert_not_called()
+
+
+class ValidationQuestionTests(TestCase):
+    """Validation du corps des endpoints de question (user-001)"""
+
+    URLS = ('/api/question/', '/api/question/stream/', '/api/question/async/', '/api/recherche/')
+
+    def _poster(self, url, corps):
+        donnees = corps if isinstance(corps, bytes) else json.dumps(corps).encode()
+        return self.client.post(url, data=donnees, content_type='application/json')
+
+    def test_corps_invalides_en_400_json(self):
+        with mock.patch.object(views, 'obtenir_rag_system', side_effect=AssertionError("non appelé")):
+            for url in self.URLS:
+                for corps in (b'{pas du json', b'\xff', [], "question", 3):
+                    with self.subTest(url=url, corps=corps):
+                        reponse = self._poster(url, corps)
+                        self.assertEqual(reponse.status_code, 400)
+                        self.assertFalse(reponse.json()['success'])
+
+    def test_question_invalide(self):
+        with mock.patch.object(views, 'obtenir_rag_system', side_effect=AssertionError("non appelé")):
+            for url in self.URLS:
+                for corps in ({}, {'question': '   '}, {'question': 3}, {'question': ['a']},
+                              {'question': 'ok', 'filtres': 'justice'}):
+                    with self.subTest(url=url, corps=corps):
+                        reponse = self._poster(url, corps)
+                        self.assertEqual(reponse.status_code, 400)
+                        self.assertIn('message', reponse.json())
+
+    def test_systeme_indisponible_en_500_json(self):
+        with mock.patch.object(views, 'obtenir_rag_system', side_effect=RuntimeError("chargement impossible")), \
+                mock.patch.object(systeme_rag, 'rag_system_si_pret', return_value=None):
+            for url in self.URLS:
+                with self.subTest(url=url):
+                    reponse = self._poster(url, {'question': 'ok'})
+                    self.assertEqual(reponse.status_code, 500)
+                    self.assertIn("chargement impossible", reponse.json()['message'])
+
+
+class QuestionAsyncTests(TestCase):
+    """Endpoint asynchrone pour les déploiements ASGI (user-002)"""
+
+    PASSAGES = [
+        {'id': 'a_0', 'texte': "Le passeport est délivré en dix jours.", 'source': 'a.txt', 'chunk_id': 0,
+         'distance': 0.12},
+    ]
+
+    def _systeme(self):
+        systeme = mock.Mock()
+        systeme.agenerer_reponse = mock.AsyncMock(return_value={
+            'reponse': "Dix jours.", 'sources': ['a.txt'], 'contextes_utilises': copy.deepcopy(self.PASSAGES),
+            'tokens_prompt': 180,
+        })
+        systeme.arechercher = mock.AsyncMock(return_value=copy.deepcopy(self.PASSAGES))
+        return systeme
+
+    def _poster(self, corps, systeme, pret=True):
+        with mock.patch.object(systeme_rag, 'rag_system_si_pret', return_value=systeme if pret else None), \
+                mock.patch.object(views, 'obtenir_rag_system', return_value=systeme) as obtenir:
+            reponse = self.client.post('/api/question/async/', data=json.dumps(corps),
+                                       content_type='application/json')
+        return reponse, obtenir
+
+    def test_generation(self):
+        systeme = self._systeme()
+        reponse, obtenir = self._poster({'question': " Délai du passeport ? ", 'n_resultats': 2}, systeme)
+
+        self.assertEqual(reponse.status_code, 200)
+        donnees = reponse.json()
+        self.assertTrue(donnees['success'])
+        self.assertEqual(donnees['reponse'], "Dix jours.")
+        self.assertEqual(donnees['contextes'], self.PASSAGES)
+        self.assertEqual(donnees['tokens_prompt'], 180)
+        systeme.agenerer_reponse.assert_awaited_once()
+        self.assertEqual(systeme.agenerer_reponse.call_args.args[0], "Délai du passeport ?")
+        self.assertEqual(systeme.agenerer_reponse.call_args.kwargs['n_contextes'], 2)
+        obtenir.assert_not_called()
+
+    def test_systeme_charge_hors_de_la_boucle(self):
+        systeme = self._systeme()
+        reponse, obtenir = self._poster({'question': "Délai ?"}, systeme, pret=False)
+
+        self.assertEqual(reponse.status_code, 200)
+        obtenir.assert_called_once_with()
+
+    def test_mode_recherche(self):
+        systeme = self._systeme()
+        reponse, _ = self._poster({'question': "Délai ?", 'mode': 'recherche', 'contextes': 'ids'}, systeme)
+
+        self.assertEqual(reponse.json()['resultats'], [{'id': 'a_0', 'source': 'a.txt', 'chunk_id': 0,
+                                                        'distance': 0.12}])
+        systeme.agenerer_reponse.assert_not_awaited()
+
+    def test_refus_d_admission(self):
+        systeme = self._systeme()
+        systeme.agenerer_reponse.side_effect = AttenteDepassee("Attente d'une place de génération dépassée", 8)
+        reponse, _ = self._poster({'question': "Délai ?"}, systeme)
+
+        self.assertEqual(reponse.status_code, 503)
+        self.assertEqual(reponse['Retry-After'], '8')
+        self.assertFalse(reponse.json()['success'])
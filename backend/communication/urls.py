@@ -14,4 +14,40 @@ urlpatterns = [
     # POST /api/question/
     path('question/', views.poser_question, name='poser_question'),
     
+    # Endpoint de streaming (Server-Sent Events)
+    # POST /api/question/stream/
+    path('question/stream/', views.poser_question_stream, name='poser_question_stream'),
+    
+    # Traitement par lot (NDJSON)
+    # POST /api/question/lot/
+    path('question/lot/', views.poser_questions_lot, name='poser_questions_lot'),
+    
+    # Endpoint asynchrone (à servir avec un serveur ASGI)
+    # POST /api/question/async/
+    path('question/async/', views.poser_question_async, name='poser_question_async'),
+    
+    # Recherche seule (passages, sans génération)
+    # POST /api/recherche/
+    path('recherche/', views.rechercher_passages, name='rechercher_passages'),
+    
+    # Texte des chunks par id
+    # GET /api/chunks/?ids=id1,id2
+    path('chunks/', views.obtenir_chunks, name='obtenir_chunks'),
+    
+    # Compteurs du cache sémantique des réponses
+    # GET /api/cache/
+    path('cache/', views.statistiques_cache, name='statistiques_cache'),
+    
+    # Métriques de génération d'Ollama (chargement, évaluation du prompt)
+    # GET /api/ollama/
+    path('ollama/', views.statistiques_ollama, name='statistiques_ollama'),
+    
+    # Disponibilité du système RAG (modèle et collection chargés)
+    # GET /api/health/
+    path('health/', views.health, name='health'),
+    
+    # Histogrammes de latence par étape (format Prometheus)
+    # GET /api/metrics/
+    path('metrics/', views.metrics, name='metrics'),
+    
 ]
@@ -3,36 +3,280 @@ Endpoints API pour le système RAG
 Gère les requêtes de questions et retourne les réponses
 """
 
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
+import asyncio
+import functools
 import json
-import sys
+import logging
 import os
-from pathlib import Path
-from .agent_ia import RAGDocumentProcessor
+import time
+from typing import Union
+from asgiref.sync import sync_to_async
+from . import systeme_rag
+from .systeme_rag import obtenir_rag_system
+from .admission import RefusAdmission
+from .routeur_llm import ServeursIndisponibles
+from .metadonnees import normaliser_filtres
+from .metriques import registre as registre_metriques
 
+logger = logging.getLogger(__name__)
 
-# Initialiser le système RAG une seule fois avec le chemin absolu vers la base de données
-print("🚀 Initialisation du système RAG...")
+# Plafond de n_resultats accepté des clients (le prompt reste de toute façon
+# limité par RAG_BUDGET_TOKENS_PROMPT)
+N_RESULTATS_MAX = int(os.getenv("RAG_N_RESULTATS_MAX", "10"))
 
-# Chemin absolu vers la base de données ChromaDB
-# Obtenir le chemin du fichier actuel et remonter à la racine du projet
-db_path_dev = Path(__file__).resolve().parent.parent.parent / "chroma_db"
-db_path = os.getenv("DB_PATH", default=str(db_path_dev))
-print(f"📂 Chemin de la base de données: {db_path}")
+# Questions acceptées par requête sur /api/question/lot/
+N_QUESTIONS_LOT_MAX = int(os.getenv("RAG_LOT_TAILLE_MAX", "1000"))
 
-rag_system = RAGDocumentProcessor(
-    db_path=str(db_path),
-    ollama_host=os.getenv("OLLAMA_HOST")
-)
-print("✅ Système RAG prêt\n")
+# Ids acceptés par requête sur /api/chunks/
+N_CHUNKS_MAX = int(os.getenv("RAG_CHUNKS_MAX", "100"))
+
+# Modes de /api/question/ et formats des contextes renvoyés
+MODES = ('generation', 'recherche')
+FORMATS_CONTEXTES = ('complets', 'ids', 'aucun')
+
+
+def _mesurer_requete(endpoint: str):
+    """
+    Décorateur de vue (synchrone ou asynchrone): durée de traitement et
+    nombre de requêtes par code de statut, étiquetés par endpoint
+    
+    Pour une réponse en streaming, la durée s'arrête à l'envoi des en-têtes.
+    """
+    def noter(debut: float, statut: int):
+        registre_metriques.observer('rag_requete_duree_secondes', time.perf_counter() - debut, endpoint=endpoint)
+        registre_metriques.incrementer('rag_requetes_total', endpoint=endpoint, statut=statut)
+    
+    def decorateur(vue):
+        if asyncio.iscoroutinefunction(vue):
+            @functools.wraps(vue)
+            async def vue_mesuree(request, *args, **kwargs):
+                debut = time.perf_counter()
+                statut = 500
+                try:
+                    response = await vue(request, *args, **kwargs)
+                    statut = response.status_code
+                    return response
+                finally:
+                    noter(debut, statut)
+        else:
+            @functools.wraps(vue)
+            def vue_mesuree(request, *args, **kwargs):
+                debut = time.perf_counter()
+                statut = 500
+                try:
+                    response = vue(request, *args, **kwargs)
+                    statut = response.status_code
+                    return response
+                finally:
+                    noter(debut, statut)
+        return vue_mesuree
+    return decorateur
+
+
+def _lire_presentation(data: dict):
+    """
+    Lit les options de taille de la réponse communes aux endpoints de question
+    
+    - "mode": "generation" (défaut) ou "recherche" (passages seuls, sans LLM)
+    - "contextes": "complets" (défaut), "ids" (sans le texte, à lire sur
+      /api/chunks/) ou "aucun"
+    - "troncature": nombre maximal de caractères du texte de chaque contexte
+    
+    Returns:
+        Tuple (presentation, erreur): erreur est une JsonResponse 400 ou None
+    """
+    presentation = {
+        'mode': data.get('mode', 'generation'),
+        'contextes': data.get('contextes', 'complets'),
+        'troncature': data.get('troncature'),
+    }
+    if presentation['mode'] not in MODES:
+        return None, JsonResponse({
+            'success': False,
+            'message': f'Mode inconnu (attendu: {", ".join(MODES)})'
+        }, status=400)
+    if presentation['contextes'] not in FORMATS_CONTEXTES:
+        return None, JsonResponse({
+            'success': False,
+            'message': f'Format de contextes inconnu (attendu: {", ".join(FORMATS_CONTEXTES)})'
+        }, status=400)
+    troncature = presentation['troncature']
+    if troncature is not None and (not isinstance(troncature, int) or isinstance(troncature, bool) or troncature < 0):
+        return None, JsonResponse({
+            'success': False,
+            'message': 'La troncature doit être un entier positif'
+        }, status=400)
+    return presentation, None
+
+
+def _lire_filtres(data: dict):
+    """
+    Lit le champ optionnel "filtres" (restriction des passages par
+    métadonnées, voir metadonnees.normaliser_filtres)
+    
+    Returns:
+        Tuple (filtres, erreur): erreur est une JsonResponse 400 ou None
+    """
+    try:
+        return normaliser_filtres(data.get('filtres')), None
+    except ValueError as e:
+        return None, JsonResponse({
+            'success': False,
+            'message': str(e)
+        }, status=400)
+
+
+def _presenter_contextes(passages: list, presentation: dict) -> list:
+    """
+    Contextes de la réponse au format demandé (voir _lire_presentation)
+    
+    Au format "ids", chaque contexte garde son id, sa source, son numéro de
+    chunk et sa distance; un texte tronqué porte "tronque": true.
+    """
+    if presentation['contextes'] == 'ids':
+        return [
+            {cle: passage[cle] for cle in ('id', 'source', 'chunk_id', 'distance', 'score_reranking')
+             if cle in passage}
+            for passage in passages
+        ]
+    troncature = presentation['troncature']
+    if troncature is None:
+        return passages
+    contextes = []
+    for passage in passages:
+        if len(passage['texte']) > troncature:
+            passage = {**passage, 'texte': passage['texte'][:troncature], 'tronque': True}
+        contextes.append(passage)
+    return contextes
+
+
+def _reponse_recherche(question: str, passages: list, timings, presentation: dict) -> JsonResponse:
+    """
+    Réponse du mode recherche: les passages retrouvés, sans génération
+    ("aucun" équivaut ici à "ids")
+    """
+    if presentation['contextes'] == 'aucun':
+        presentation = {**presentation, 'contextes': 'ids'}
+    donnees = {
+        'success': True,
+        'question': question,
+        'resultats': _presenter_contextes(passages, presentation)
+    }
+    if timings is not None:
+        donnees['timings'] = timings
+    return JsonResponse(donnees, status=200)
+
+
+def _lire_corps(request):
+    """
+    Décode le corps JSON d'une requête, qui doit être un objet
+    
+    Returns:
+        Tuple (data, erreur): erreur est une JsonResponse 400 ou None
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return None, JsonResponse({
+            'success': False,
+            'message': 'Format JSON invalide'
+        }, status=400)
+    if not isinstance(data, dict):
+        return None, JsonResponse({
+            'success': False,
+            'message': 'Le corps de la requête doit être un objet JSON'
+        }, status=400)
+    return data, None
+
+
+def _valider_question(question):
+    """
+    Valide une question reçue d'un client
+    
+    Returns:
+        Tuple (question, erreur): la question sans espaces superflus, ou le
+        message d'erreur si ce n'est pas une chaîne non vide
+    """
+    if not isinstance(question, str):
+        return None, 'Le champ "question" doit être une chaîne'
+    question = question.strip()
+    if not question:
+        return None, 'La question ne peut pas être vide'
+    return question, None
+
+
+def _lire_n_resultats(data: dict) -> int:
+    """Nombre de passages demandé (défaut: 3), plafonné à N_RESULTATS_MAX"""
+    n_resultats = data.get('n_resultats', 3)
+    if not isinstance(n_resultats, int) or n_resultats < 1:
+        n_resultats = 3
+    return min(n_resultats, N_RESULTATS_MAX)
+
+
+def _lire_question(request):
+    """
+    Lit et valide le corps JSON commun aux endpoints de question
+    
+    Le champ optionnel "timings": true demande la durée de chaque étape
+    dans la réponse; "mode", "contextes" et "troncature" règlent le contenu
+    et la taille de la réponse (voir _lire_presentation); "filtres"
+    restreint les passages (voir _lire_filtres).
+    
+    Returns:
+        Tuple (question, n_resultats, timings, presentation, filtres, erreur):
+        timings est un Dict à compléter (durées en ms) si le client l'a
+        demandé, sinon None; erreur est une JsonResponse 400 à renvoyer
+        telle quelle, ou None si la requête est valide
+    """
+    debut = time.perf_counter()
+    data, erreur = _lire_corps(request)
+    if erreur:
+        return None, None, None, None, None, erreur
+    
+    question, message = _valider_question(data.get('question', ''))
+    if message:
+        return None, None, None, None, None, JsonResponse({
+            'success': False,
+            'message': message
+        }, status=400)
+    
+    presentation, erreur = _lire_presentation(data)
+    if erreur:
+        return None, None, None, None, None, erreur
+    
+    filtres, erreur = _lire_filtres(data)
+    if erreur:
+        return None, None, None, None, None, erreur
+    
+    n_resultats = _lire_n_resultats(data)
+    
+    duree = time.perf_counter() - debut
+    registre_metriques.observer('rag_etape_duree_secondes', duree, etape='parsing_json')
+    timings = {'parsing_json_ms': duree * 1000} if data.get('timings') is True else None
+    
+    return question, n_resultats, timings, presentation, filtres, None
+
+
+def _reponse_refus(refus: Union[RefusAdmission, ServeursIndisponibles]) -> JsonResponse:
+    """
+    Réponse 429/503 avec Retry-After quand la file de génération est saturée
+    ou qu'aucun serveur Ollama n'a pu répondre
+    """
+    logger.info("🚦 Requête refusée: %s", refus)
+    return JsonResponse({
+        'success': False,
+        'message': str(refus),
+        'retry_after': refus.retry_after
+    }, status=refus.statut_http, headers={'Retry-After': str(refus.retry_after)})
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@_mesurer_requete('question')
 def poser_question(request):
-    print("Request received at poser_question")
     """
     Endpoint pour poser une question au système RAG
     
@@ -42,68 +286,580 @@ def poser_question(request):
     Corps de la requête (JSON):
     {
         "question": "Votre question ici",
-        "n_resultats": 3  (optionnel, défaut: 3)
+        "n_resultats": 3,         (optionnel, défaut: 3)
+        "timings": true,          (optionnel: durée de chaque étape dans la réponse)
+        "mode": "recherche",      (optionnel: passages seuls, sans génération,
+                                   comme /api/recherche/)
+        "contextes": "ids",       (optionnel: "complets" par défaut, "ids" sans
+                                   le texte des passages, "aucun")
+        "troncature": 200,        (optionnel: caractères max par passage)
+        "filtres": {"categorie": ["etat_civil", "justice"], "page": {"min": 10}}
+                                  (optionnel: seulement les passages dont les
+                                   métadonnées correspondent; champs source,
+                                   categorie, type_document, langue, origine
+                                   et page)
     }
     
     Réponse (JSON):
     {
         "success": true/false,
         "question": "Votre question",
-        "resultats": [
+        "reponse": "Réponse générée",
+        "sources": ["Nom du document ou URL"],
+        "contextes": [
             {
+                "id": "...",
                 "texte": "Passage pertinent",
                 "source": "Nom du document ou URL",
                 "distance": 0.1234
             }
         ],
+        "blocs": [["...", "..."]],  (ids des passages réunis en un même bloc du
+                                   prompt: chunks adjacents d'un document)
+        "timings": {"parsing_json_ms": 0.1, "embedding_ms": 12.4, ...,
+                    "total_ms": 2400.0}  (si demandé)
         "message": "Message d'erreur si applicable"
     }
+    
+    En mode "recherche", la réponse contient "resultats" (les passages)
+    au lieu de "reponse", "sources" et "contextes".
+    
+    Si la file de génération est pleine (429), si l'attente d'une place
+    dépasse le délai ou si aucun serveur Ollama n'a pu répondre (503), la
+    réponse porte success false et un en-tête Retry-After.
     """
     try:
-        # Récupérer les données JSON de la requête
-        data = json.loads(request.body)
-        question = data.get('question', '').strip()
-        n_resultats = data.get('n_resultats', 3)
+        # Récupérer et valider les données JSON de la requête
+        question, n_resultats, timings, presentation, filtres, erreur = _lire_question(request)
+        if erreur:
+            return erreur
         
-        # Valider la question
-        if not question:
-            return JsonResponse({
-                'success': False,
-                'message': 'La question ne peut pas être vide'
-            }, status=400)
+        rag_system = obtenir_rag_system()
         
-        # Valider n_resultats
-        if not isinstance(n_resultats, int) or n_resultats < 1:
-            n_resultats = 3
+        # Passages seuls: ni prompt ni Ollama
+        if presentation['mode'] == 'recherche':
+            passages = rag_system.rechercher(question, n_resultats=n_resultats, timings=timings, filtres=filtres)
+            return _reponse_recherche(question, passages, timings, presentation)
         
         # Générer une réponse complète avec Ollama
-        print(f"🔍 Recherche pour: {question}")
-        print(f"📊 Nombre de chunks dans la base: {rag_system.collection.count()}")
+        logger.debug("🔍 Recherche pour: %s", question)
         
         # Utiliser generer_reponse au lieu de rechercher
-        resultat = rag_system.generer_reponse(question, n_contextes=n_resultats)
+        resultat = rag_system.generer_reponse(question, n_contextes=n_resultats, timings=timings, filtres=filtres)
         
-        print(f"✅ Réponse générée avec {len(resultat.get('sources', []))} source(s)")
+        logger.debug("✅ Réponse générée avec %d source(s)", len(resultat.get('sources', [])))
         
         # Formater la réponse
-        return JsonResponse({
+        donnees = {
             'success': True,
             'question': question,
             'reponse': resultat['reponse'],
             'sources': resultat['sources'],
-            'contextes': resultat.get('contextes_utilises', [])
-        }, status=200)
+            'contextes': _presenter_contextes(resultat.get('contextes_utilises', []), presentation),
+            'blocs': resultat.get('blocs', []),
+            'depuis_cache': resultat.get('depuis_cache', False),
+            'tokens_prompt': resultat.get('tokens_prompt'),
+            'metriques_ollama': resultat.get('metriques_ollama'),
+            'attente_file': resultat.get('attente_file'),
+            'generation_partagee': resultat.get('generation_partagee', False)
+        }
+        if presentation['contextes'] == 'aucun':
+            del donnees['contextes']
+            del donnees['blocs']
+        if timings is not None:
+            donnees['timings'] = timings
+        return JsonResponse(donnees, status=200)
         
-    except json.JSONDecodeError:
+    except (RefusAdmission, ServeursIndisponibles) as e:
+        return _reponse_refus(e)
+    except Exception as e:
+        logger.error("❌ Erreur: %s", e)
         return JsonResponse({
             'success': False,
-            'message': 'Format JSON invalide'
+            'message': f'Erreur serveur: {str(e)}'
+        }, status=500)
+
+
+def _evenement_sse(evenement: dict) -> str:
+    """Formate un événement de generer_reponse_stream au format Server-Sent Events"""
+    donnees = json.dumps(evenement, ensure_ascii=False)
+    return f"event: {evenement['type']}\ndata: {donnees}\n\n"
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@_mesurer_requete('question_stream')
+def poser_question_stream(request):
+    """
+    Endpoint de streaming: renvoie les sources puis les tokens de la réponse
+    au fur et à mesure de leur génération (Server-Sent Events)
+    
+    Méthode: POST
+    URL: /api/question/stream/
+    
+    Corps de la requête (JSON): identique à /api/question/ ("contextes" et
+    "troncature" s'appliquent à l'événement "sources"; pas de mode recherche)
+    
+    Réponse (text/event-stream):
+        event: sources
+        data: {"type": "sources", "sources": [...], "contextes_utilises": [...], "blocs": [[...]]}
+        
+        event: token
+        data: {"type": "token", "contenu": "..."}
+        
+        event: fin
+        data: {"type": "fin", "duree": 4.2, "premier_token": 0.8}
+    
+    Avec "timings": true, l'événement "fin" porte aussi la durée de chaque étape.
+    
+    En cas d'erreur pendant la génération, un événement "erreur" remplace "fin".
+    Si la file de génération est pleine, la réponse est un 429 avec
+    Retry-After; si l'attente d'une place dépasse le délai ou si aucun
+    serveur Ollama n'a pu répondre, l'événement "erreur" porte un champ
+    retry_after.
+    """
+    question, n_resultats, timings, presentation, filtres, erreur = _lire_question(request)
+    if erreur:
+        return erreur
+    
+    logger.debug("🔍 Recherche (stream) pour: %s", question)
+    
+    try:
+        rag_system = obtenir_rag_system()
+        # Refuser avant d'ouvrir le flux si la file de génération est déjà pleine
+        rag_system.controle_admission.refuser_si_saturee()
+    except RefusAdmission as e:
+        return _reponse_refus(e)
+    except Exception as e:
+        logger.error("❌ Erreur: %s", e)
+        return JsonResponse({
+            'success': False,
+            'message': f'Erreur serveur: {str(e)}'
+        }, status=500)
+    
+    def presenter(evenement: dict) -> dict:
+        if evenement['type'] == 'sources':
+            if presentation['contextes'] == 'aucun':
+                evenement.pop('contextes_utilises')
+                evenement.pop('blocs', None)
+            else:
+                evenement['contextes_utilises'] = _presenter_contextes(evenement['contextes_utilises'], presentation)
+        return evenement
+    
+    evenements = rag_system.generer_reponse_stream(question, n_contextes=n_resultats, timings=timings,
+                                                   filtres=filtres)
+    response = StreamingHttpResponse(
+        (_evenement_sse(presenter(evenement)) for evenement in evenements),
+        content_type='text/event-stream'
+    )
+    # Empêcher la mise en cache et le buffering par les proxies (nginx)
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@_mesurer_requete('question_lot')
+def poser_questions_lot(request):
+    """
+    Endpoint de traitement par lot: plusieurs questions en une requête,
+    résultats renvoyés en NDJSON (une ligne JSON par événement) au fur et à
+    mesure que les générations se terminent
+    
+    Méthode: POST
+    URL: /api/question/lot/
+    
+    Corps de la requête (JSON):
+    {
+        "questions": ["Question 1", "Question 2", ...],
+        "n_resultats": 3,    (optionnel, défaut: 3)
+        "parallelisme": 2,   (optionnel: générations simultanées, plafonné
+                              à la capacité du contrôle d'admission)
+        "contextes": "ids",  (optionnel: "complets" par défaut, "ids" ou
+                              "aucun", voir /api/question/)
+        "troncature": 200,   (optionnel: caractères max par passage)
+        "filtres": {...}     (optionnel: communs à toutes les questions,
+                              voir /api/question/)
+    }
+    
+    Réponse (application/x-ndjson):
+        {"type": "debut", "questions": 2, "questions_uniques": 2, "recherche_ms": 41.2}
+        {"type": "resultat", "index": 1, "question": "Question 2", "success": true,
+         "reponse": "...", "sources": [...], "contextes": [{"id": "...", "distance": 0.41}],
+         "nouveaux_contextes": [{"id": "...", "texte": "...", "source": "...", "chunk_id": 3}], ...}
+        {"type": "resultat", "index": 0, ...}
+        {"type": "fin", "duree": 12.4, "reponses": 2, "erreurs": 0, "depuis_cache": 0}
+    
+    Les résultats arrivent dans l'ordre de fin des générations ("index"
+    donne la position de la question). Le texte d'un passage n'est envoyé
+    qu'une fois dans le flux, à sa première utilisation. Si la file de
+    génération est déjà pleine, la réponse est un 429 avec Retry-After.
+    """
+    data, erreur = _lire_corps(request)
+    if erreur:
+        return erreur
+    
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions:
+        return JsonResponse({
+            'success': False,
+            'message': 'Le champ "questions" doit être une liste non vide'
         }, status=400)
+    if len(questions) > N_QUESTIONS_LOT_MAX:
+        return JsonResponse({
+            'success': False,
+            'message': f'Au plus {N_QUESTIONS_LOT_MAX} questions par lot'
+        }, status=400)
+    for index, question in enumerate(questions):
+        questions[index], message = _valider_question(question)
+        if message:
+            return JsonResponse({
+                'success': False,
+                'message': f'Question {index}: {message}'
+            }, status=400)
+    
+    presentation, erreur = _lire_presentation(data)
+    if erreur:
+        return erreur
+    filtres, erreur = _lire_filtres(data)
+    if erreur:
+        return erreur
+    
+    n_resultats = _lire_n_resultats(data)
+    parallelisme = data.get('parallelisme')
+    if not isinstance(parallelisme, int) or parallelisme < 1:
+        parallelisme = None
+    
+    logger.debug("📦 Lot de %d questions", len(questions))
+    
+    try:
+        rag_system = obtenir_rag_system()
+        # Refuser avant d'ouvrir le flux si la file de génération est déjà pleine
+        rag_system.controle_admission.refuser_si_saturee()
+    except RefusAdmission as e:
+        return _reponse_refus(e)
+    except Exception as e:
+        logger.error("❌ Erreur: %s", e)
+        return JsonResponse({
+            'success': False,
+            'message': f'Erreur serveur: {str(e)}'
+        }, status=500)
+    
+    def presenter(evenement: dict) -> dict:
+        if evenement['type'] == 'resultat' and evenement['success']:
+            if presentation['contextes'] == 'complets':
+                evenement['nouveaux_contextes'] = _presenter_contextes(evenement['nouveaux_contextes'], presentation)
+            else:
+                del evenement['nouveaux_contextes']
+                if presentation['contextes'] == 'aucun':
+                    del evenement['contextes']
+                    evenement.pop('blocs', None)
+        return evenement
+    
+    evenements = rag_system.generer_reponses_lot(questions, n_contextes=n_resultats, parallelisme=parallelisme,
+                                                 filtres=filtres)
+    response = StreamingHttpResponse(
+        (json.dumps(presenter(evenement), ensure_ascii=False) + "\n" for evenement in evenements),
+        content_type='application/x-ndjson'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@_mesurer_requete('question_async')
+async def poser_question_async(request):
+    """
+    Version asynchrone de /api/question/ (mêmes requête et réponse)
+    
+    Méthode: POST
+    URL: /api/question/async/
+    
+    Sous un serveur ASGI (uvicorn), la requête ne bloque aucun thread pendant
+    la génération Ollama: un seul processus peut servir des centaines de
+    questions simultanées. L'embedding et ChromaDB passent par un pool de
+    threads borné (RAG_MAX_WORKERS).
+    """
+    try:
+        question, n_resultats, timings, presentation, filtres, erreur = _lire_question(request)
+        if erreur:
+            return erreur
+        
+        # Ne pas bloquer la boucle si le système est encore en chargement
+        rag_system = systeme_rag.rag_system_si_pret()
+        if rag_system is None:
+            rag_system = await sync_to_async(obtenir_rag_system, thread_sensitive=False)()
+        
+        if presentation['mode'] == 'recherche':
+            passages = await rag_system.arechercher(question, n_resultats=n_resultats, timings=timings,
+                                                    filtres=filtres)
+            return _reponse_recherche(question, passages, timings, presentation)
+        
+        resultat = await rag_system.agenerer_reponse(question, n_contextes=n_resultats, timings=timings,
+                                                     filtres=filtres)
+        
+        donnees = {
+            'success': True,
+            'question': question,
+            'reponse': resultat['reponse'],
+            'sources': resultat['sources'],
+            'contextes': _presenter_contextes(resultat.get('contextes_utilises', []), presentation),
+            'blocs': resultat.get('blocs', []),
+            'depuis_cache': resultat.get('depuis_cache', False),
+            'tokens_prompt': resultat.get('tokens_prompt'),
+            'metriques_ollama': resultat.get('metriques_ollama'),
+            'attente_file': resultat.get('attente_file'),
+            'generation_partagee': resultat.get('generation_partagee', False)
+        }
+        if presentation['contextes'] == 'aucun':
+            del donnees['contextes']
+            del donnees['blocs']
+        if timings is not None:
+            donnees['timings'] = timings
+        return JsonResponse(donnees, status=200)
+        
+    except (RefusAdmission, ServeursIndisponibles) as e:
+        return _reponse_refus(e)
+    except Exception as e:
+        logger.error("❌ Erreur: %s", e)
+        return JsonResponse({
+            'success': False,
+            'message': f'Erreur serveur: {str(e)}'
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@_mesurer_requete('recherche')
+def rechercher_passages(request):
+    """
+    Recherche seule: les passages les plus pertinents, sans génération
+    (quelques dizaines de ms au lieu de plusieurs secondes)
+    
+    Méthode: POST
+    URL: /api/recherche/
+    
+    Corps de la requête (JSON): identique à /api/question/ ("mode" est ignoré)
+    
+    Réponse (JSON):
+    {
+        "success": true,
+        "question": "Votre question",
+        "resultats": [
+            {
+                "id": "...",
+                "texte": "Passage pertinent",   (absent avec "contextes": "ids")
+                "source": "Nom du document ou URL",
+                "chunk_id": 3,
+                "distance": 0.1234
+            }
+        ],
+        "timings": {...}  (si demandé)
+    }
+    """
+    try:
+        question, n_resultats, timings, presentation, filtres, erreur = _lire_question(request)
+        if erreur:
+            return erreur
+        
+        passages = obtenir_rag_system().rechercher(question, n_resultats=n_resultats, timings=timings,
+                                                   filtres=filtres)
+        return _reponse_recherche(question, passages, timings, presentation)
+        
     except Exception as e:
-        print(f"❌ Erreur: {e}")
+        logger.error("❌ Erreur: %s", e)
         return JsonResponse({
             'success': False,
             'message': f'Erreur serveur: {str(e)}'
         }, status=500)
 
 
+@require_http_methods(["GET"])
+@_mesurer_requete('chunks')
+def obtenir_chunks(request):
+    """
+    Texte et métadonnées de chunks par id, pour les clients qui n'ont
+    demandé que les ids des passages ("contextes": "ids")
+    
+    Méthode: GET
+    URL: /api/chunks/?ids=id1,id2  (ou ?ids=id1&ids=id2)
+    
+    Réponse (JSON):
+    {
+        "success": true,
+        "chunks": [{"id": "id1", "texte": "...", "source": "...", "chunk_id": 3, "page": 12}],
+        "introuvables": ["id2"]
+    }
+    """
+    ids = [identifiant.strip() for valeur in request.GET.getlist('ids')
+           for identifiant in valeur.split(',') if identifiant.strip()]
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return JsonResponse({
+            'success': False,
+            'message': 'Le paramètre "ids" est requis'
+        }, status=400)
+    if len(ids) > N_CHUNKS_MAX:
+        return JsonResponse({
+            'success': False,
+            'message': f'Au plus {N_CHUNKS_MAX} ids par requête'
+        }, status=400)
+    
+    chunks = obtenir_rag_system().obtenir_chunks(ids)
+    trouves = {chunk['id'] for chunk in chunks}
+    return JsonResponse({
+        'success': True,
+        'chunks': chunks,
+        'introuvables': [identifiant for identifiant in ids if identifiant not in trouves]
+    })
+
+
+@require_http_methods(["GET"])
+def statistiques_cache(request):
+    """
+    Compteurs du cache sémantique des réponses
+    
+    Méthode: GET
+    URL: /api/cache/
+    
+    Réponse (JSON):
+    {
+        "success": true,
+        "cache": {"hits": 12, "misses": 30, "taux_hit": 0.29, "taille": 30,
+                  "taille_max": 1000, "invalidations": 0}
+    }
+    """
+    return JsonResponse({
+        'success': True,
+        'cache': obtenir_rag_system().cache_reponses.stats()
+    })
+
+
+@require_http_methods(["GET"])
+def statistiques_ollama(request):
+    """
+    Métriques de génération relevées dans les réponses d'Ollama et état
+    de chaque serveur du routeur
+    
+    Méthode: GET
+    URL: /api/ollama/
+    
+    Réponse (JSON):
+    {
+        "success": true,
+        "ollama": {"requetes": 42, "chargements_a_froid": 1,
+                   "evaluation_prompt_moyenne_ms": 850.2, "tokens_par_s": 28.4, ...},
+        "serveurs": [{"hote": "http://gpu1:11434", "en_vol": 2, "latence_ms": 4200.0,
+                      "requetes": 30, "echecs": 0, "disponible": true, ...}],
+        "mode_generation": "chat",
+        "keep_alive": "30m"
+    }
+    """
+    rag_system = obtenir_rag_system()
+    return JsonResponse({
+        'success': True,
+        'ollama': rag_system.suivi_ollama.stats(),
+        'serveurs': rag_system.routeur_llm.stats(),
+        'admission': rag_system.controle_admission.stats(),
+        'mode_generation': rag_system.mode_generation,
+        'keep_alive': rag_system.keep_alive
+    })
+
+
+@require_http_methods(["GET"])
+def health(request):
+    """
+    Disponibilité du système RAG (sonde de readiness)
+    
+    Méthode: GET
+    URL: /api/health/
+    
+    Ne déclenche jamais le chargement: répond 200 quand le modèle
+    d'embeddings et la collection sont chargés, 503 sinon.
+    
+    Réponse (JSON):
+    {
+        "status": "pret",          (non_demarre | chargement | pret | erreur)
+        "pret": true,
+        "modele_charge": true,
+        "collection_chargee": true,
+        "nb_chunks": 8598,
+        "duree_chargement": 7.3,
+        "erreur": null
+    }
+    """
+    etat = systeme_rag.etat()
+    etat['status'] = etat.pop('statut')
+    etat.pop('debut', None)
+    return JsonResponse(etat, status=200 if etat['pret'] else 503)
+
+
+@require_http_methods(["GET"])
+def metrics(request):
+    """
+    Histogrammes de latence et compteurs au format texte de Prometheus
+    
+    Méthode: GET
+    URL: /api/metrics/
+    
+    Familles exportées:
+        rag_etape_duree_secondes{etape=...}       parsing_json, embedding,
+            recherche_vectorielle, bm25, reranking, construction_prompt,
+            attente_file, llm, premier_token, llm_chargement,
+            llm_evaluation_prompt, llm_generation
+        rag_requete_duree_secondes{endpoint=...}  durée par endpoint
+        rag_requetes_total{endpoint=..., statut=...}
+        rag_ingestion_duree_secondes{etape=...}   extraction_decoupage,
+            embedding, ecriture
+        rag_ingestion_chunks_total
+    
+    Une fois le système chargé, s'y ajoutent l'état de la file de génération,
+    les compteurs du cache, ceux du micro-batching des embeddings et du
+    ré-ordonnancement (s'ils sont activés) et le nombre de chunks. Ne
+    déclenche jamais le chargement.
+    """
+    jauges = []
+    rag_system = systeme_rag.rag_system_si_pret()
+    if rag_system is not None:
+        admission = rag_system.controle_admission.stats()
+        cache = rag_system.cache_reponses.stats()
+        jauges = [
+            ('rag_generations_en_cours', 'gauge', "Générations Ollama en cours", admission['en_cours']),
+            ('rag_generations_en_file', 'gauge', "Requêtes en attente d'une place de génération", admission['en_file']),
+            ('rag_generations_refusees_total', 'counter', "Requêtes refusées (file pleine)", admission['refusees']),
+            ('rag_generations_expirees_total', 'counter', "Requêtes abandonnées après l'attente maximale",
+             admission['expirees']),
+            ('rag_cache_hits_total', 'counter', "Réponses servies par le cache sémantique", cache['hits']),
+            ('rag_cache_misses_total', 'counter', "Questions absentes du cache sémantique", cache['misses']),
+            ('rag_chunks', 'gauge', "Chunks dans la collection", rag_system.collection.count()),
+        ]
+        if rag_system.batcheur_embeddings is not None:
+            batch = rag_system.batcheur_embeddings.stats()
+            jauges += [
+                ('rag_embeddings_lots_total', 'counter', "Lots d'embeddings de questions calculés", batch['lots']),
+                ('rag_embeddings_questions_total', 'counter', "Questions embeddées par micro-batching",
+                 batch['questions']),
+                ('rag_embeddings_taille_moyenne_lot', 'gauge', "Questions par lot d'embeddings (moyenne)",
+                 batch['taille_moyenne_lot']),
+            ]
+        if rag_system.reordonnanceur is not None:
+            reranking = rag_system.reordonnanceur.stats()
+            jauges += [
+                ('rag_reranking_questions_total', 'counter', "Questions passées au ré-ordonnancement",
+                 reranking['questions']),
+                ('rag_reranking_tronquees_total', 'counter',
+                 "Ré-ordonnancements limités à une partie des candidats par le budget", reranking['tronquees']),
+                ('rag_reranking_ignorees_total', 'counter', "Ré-ordonnancements ignorés faute de budget",
+                 reranking['ignorees']),
+                ('rag_reranking_paires_total', 'counter', "Paires (question, passage) scorées", reranking['paires']),
+            ]
+            if reranking['ms_par_paire'] is not None:
+                jauges.append(('rag_reranking_secondes_par_paire', 'gauge', "Coût estimé d'une paire scorée",
+                               reranking['ms_par_paire'] / 1000))
+    return HttpResponse(
+        registre_metriques.exporter(jauges),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
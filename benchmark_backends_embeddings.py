@@ -0,0 +1,134 @@
+"""
+Benchmark des backends d'embeddings: PyTorch fp32, ONNX Runtime, ONNX int8
+Vérifie la parité de retrieval (recall@k contre fp32) et mesure latence et débit
+
+Le corpus est reconstitué à partir du dossier pdf/ avec le même découpage
+que l'ingestion; chaque backend encode le corpus et les questions, puis on
+compare ses top-k à ceux du backend PyTorch fp32 (référence).
+
+Usage:
+    pip install "sentence-transformers[onnx]"
+    python benchmark_backends_embeddings.py
+    python benchmark_backends_embeddings.py --max-chunks 5000 --k 3 5 10
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+from communication import ingestion  # noqa: E402
+from communication.decoupage import DecoupeurTexte, charger_tokenizer  # noqa: E402
+from communication.embeddings import BACKENDS_EMBEDDINGS, charger_modele_embeddings  # noqa: E402
+from test_rag_system import TEST_DATASET  # noqa: E402
+
+MODELE = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+DOSSIER_PDF = Path(__file__).resolve().parent / "pdf"
+
+
+def charger_corpus(dossier: Path, max_chunks: int, decoupeur: DecoupeurTexte) -> List[str]:
+    """Découpe les documents du dossier comme l'ingestion (échantillon régulier)"""
+    chunks: List[str] = []
+    extensions = ingestion.EXTENSIONS_PDF + ingestion.EXTENSIONS_TEXTE
+    for fichier in sorted(dossier.rglob('*')):
+        if fichier.is_file() and fichier.suffix.lower() in extensions:
+            try:
+                chunks.extend(ingestion.extraire_et_decouper(str(fichier), decoupeur)[1])
+            except Exception as e:
+                print(f"  ⚠️  {fichier.name}: {e}")
+    if len(chunks) > max_chunks:
+        pas = len(chunks) / max_chunks
+        chunks = [chunks[int(i * pas)] for i in range(max_chunks)]
+    return chunks
+
+
+def top_k(embeddings_corpus: np.ndarray, embeddings_questions: np.ndarray, k: int) -> np.ndarray:
+    """Indices des k chunks les plus proches (cosinus) pour chaque question"""
+    corpus = embeddings_corpus / np.linalg.norm(embeddings_corpus, axis=1, keepdims=True)
+    questions = embeddings_questions / np.linalg.norm(embeddings_questions, axis=1, keepdims=True)
+    scores = questions @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parité et performance des backends d'embeddings")
+    parser.add_argument("--modele", default=MODELE)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS_EMBEDDINGS))
+    parser.add_argument("--max-chunks", type=int, default=3000)
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--quantification", default="avx2")
+    parser.add_argument("--sortie", default="rapport_backends_embeddings.json")
+    args = parser.parse_args()
+
+    print(f"📂 Découpage du corpus: {DOSSIER_PDF}")
+    corpus = charger_corpus(DOSSIER_PDF, args.max_chunks, DecoupeurTexte(charger_tokenizer(args.modele)))
+    questions = [cas["question"] for cas in TEST_DATASET]
+    print(f"✂️  {len(corpus)} chunks, {len(questions)} questions")
+
+    k_max = max(args.k)
+    resultats: Dict[str, Dict] = {}
+    reference = None
+
+    for backend in args.backends:
+        print(f"\n⚙️  Backend: {backend}")
+        modele = charger_modele_embeddings(args.modele, backend=backend, device="cpu",
+                                           quantification=args.quantification)
+        modele.encode(questions[:2])  # préchauffage
+
+        debut = time.perf_counter()
+        emb_corpus = np.asarray(modele.encode(corpus, batch_size=64, show_progress_bar=False))
+        duree_corpus = time.perf_counter() - debut
+
+        latences = []
+        emb_questions = []
+        for question in questions * 5:
+            debut = time.perf_counter()
+            emb_questions.append(modele.encode([question])[0])
+            latences.append(time.perf_counter() - debut)
+        emb_questions = np.asarray(emb_questions[:len(questions)])
+        latences.sort()
+
+        classement = top_k(emb_corpus, emb_questions, k_max)
+        if reference is None:
+            reference = classement
+
+        recall = {}
+        for k in args.k:
+            recouvrements = [
+                len(set(classement[i, :k]) & set(reference[i, :k])) / k
+                for i in range(len(questions))
+            ]
+            recall[f"recall@{k}"] = statistics.mean(recouvrements)
+
+        resultats[backend] = {
+            "debit_corpus_chunks_s": len(corpus) / duree_corpus,
+            "latence_question_p50_ms": latences[len(latences) // 2] * 1000,
+            "latence_question_p95_ms": latences[int(len(latences) * 0.95)] * 1000,
+            **recall,
+        }
+        r = resultats[backend]
+        print(f"  🚀 Corpus: {r['debit_corpus_chunks_s']:.1f} chunks/s")
+        print(f"  ⏱️  Question: p50 {r['latence_question_p50_ms']:.1f} ms, p95 {r['latence_question_p95_ms']:.1f} ms")
+        print("  🎯 " + ", ".join(f"{cle}={valeur:.3f}" for cle, valeur in recall.items()))
+
+    print(f"\n📊 Référence de parité: {args.backends[0]}")
+    with open(args.sortie, "w", encoding="utf-8") as f:
+        json.dump({
+            "date": datetime.now().isoformat(),
+            "modele": args.modele,
+            "reference": args.backends[0],
+            "nb_chunks": len(corpus),
+            "resultats": resultats,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"✅ Rapport sauvegardé dans: {args.sortie}")
+
+
+if __name__ == "__main__":
+    main()
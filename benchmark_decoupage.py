@@ -0,0 +1,164 @@
+"""
+Benchmark du découpage des documents
+Compare l'ancien découpage par caractères (decouper_texte, 500 caractères,
+chevauchement de 50) au découpage par structure et tokens (DecoupeurTexte):
+- nombre de chunks, taille en tokens, chunks tronqués par le modèle
+  d'embeddings (plus longs que sa longueur maximale) et chunks minuscules
+- débit du découpage (Mo de texte par seconde, extraction exclue)
+- précision du retrieval sur les questions de test_rag_system.py: sources
+  pertinentes et mots-clés attendus présents dans les k premiers chunks
+
+Le retrieval est évalué hors ChromaDB (similarité cosinus exacte sur les
+embeddings du corpus), sans appel à Ollama.
+
+Usage:
+    python benchmark_decoupage.py
+    python benchmark_decoupage.py --k 3 5 --sans-retrieval
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+from communication import ingestion  # noqa: E402
+from communication.decoupage import DecoupeurTexte, charger_tokenizer  # noqa: E402
+from test_rag_system import TEST_DATASET, RAGTester  # noqa: E402
+
+MODELE = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+DOSSIER_PDF = Path(__file__).resolve().parent / "pdf"
+
+
+def percentile(valeurs: List[float], p: float) -> float:
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(p * len(valeurs)))] if valeurs else 0.0
+
+
+def charger_textes(dossier: Path) -> List[Tuple[str, str]]:
+    """(nom du fichier, texte) pour chaque document du dossier"""
+    textes = []
+    for fichier in sorted(dossier.rglob('*')):
+        suffixe = fichier.suffix.lower()
+        if not fichier.is_file() or suffixe not in ingestion.EXTENSIONS_PDF + ingestion.EXTENSIONS_TEXTE:
+            continue
+        try:
+            texte = ingestion.lire_pdf(str(fichier)) if suffixe in ingestion.EXTENSIONS_PDF \
+                else ingestion.lire_txt(str(fichier))
+            textes.append((fichier.name, texte))
+        except Exception as e:
+            print(f"  ⚠️  {fichier.name}: {e}")
+    return textes
+
+
+def decouper_corpus(textes: List[Tuple[str, str]], decouper) -> Tuple[List[Dict], float]:
+    """Chunks {'source', 'texte'} du corpus et durée du découpage (s)"""
+    chunks = []
+    debut = time.perf_counter()
+    for source, texte in textes:
+        chunks.extend({'source': source, 'texte': chunk} for chunk in decouper(texte))
+    return chunks, time.perf_counter() - debut
+
+
+def statistiques_chunks(chunks: List[Dict], decoupeur: DecoupeurTexte, taille_texte: int,
+                        duree: float, limite: int) -> Dict:
+    """Nombre, taille en tokens et débit d'un découpage"""
+    tokens = decoupeur.compter([c['texte'] for c in chunks])
+    return {
+        "chunks": len(chunks),
+        "tokens_moyen": statistics.mean(tokens) if tokens else 0.0,
+        "tokens_p50": percentile(tokens, 0.50),
+        "tokens_p95": percentile(tokens, 0.95),
+        "tokens_max": max(tokens, default=0),
+        "chunks_tronques": sum(t > limite for t in tokens),
+        "chunks_minuscules": sum(t < 20 for t in tokens),
+        "debit_mo_s": taille_texte / 1e6 / duree if duree else 0.0,
+    }
+
+
+def evaluer_retrieval(modele, chunks: List[Dict], ks: List[int]) -> Dict:
+    """Précision des sources et couverture des mots-clés dans les k premiers chunks"""
+    evaluateur = RAGTester(api_url="")
+    corpus = np.asarray(modele.encode([c['texte'] for c in chunks], batch_size=64, show_progress_bar=False))
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    questions = np.asarray(modele.encode([cas["question"] for cas in TEST_DATASET], show_progress_bar=False))
+    questions = questions / np.linalg.norm(questions, axis=1, keepdims=True)
+    classement = np.argsort(-(questions @ corpus.T), axis=1)
+
+    resultats = {}
+    for k in ks:
+        precisions, couvertures = [], []
+        for cas, indices in zip(TEST_DATASET, classement[:, :k]):
+            trouves = [chunks[i] for i in indices]
+            precisions.append(evaluateur.evaluer_precision_retrieval(trouves, cas["sources_pertinentes"]))
+            texte = " ".join(c['texte'] for c in trouves).lower()
+            mots = cas["mots_cles_attendus"]
+            couvertures.append(sum(mot.lower() in texte for mot in mots) / len(mots))
+        resultats[f"precision_sources@{k}"] = statistics.mean(precisions) * 100
+        resultats[f"couverture_mots_cles@{k}"] = statistics.mean(couvertures) * 100
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Découpage par caractères contre découpage par structure et tokens")
+    parser.add_argument("--modele", default=MODELE)
+    parser.add_argument("--dossier", default=str(DOSSIER_PDF))
+    parser.add_argument("--max-tokens", type=int, default=126, help="Longueur maximale du modèle hors tokens spéciaux")
+    parser.add_argument("--overlap-tokens", type=int, default=24)
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5])
+    parser.add_argument("--sans-retrieval", action="store_true", help="Ne pas charger le modèle d'embeddings")
+    parser.add_argument("--sortie", default="rapport_decoupage.json")
+    args = parser.parse_args()
+
+    print(f"📂 Lecture du corpus: {args.dossier}")
+    textes = charger_textes(Path(args.dossier))
+    taille_texte = sum(len(texte.encode("utf-8")) for _, texte in textes)
+    print(f"📄 {len(textes)} documents, {taille_texte / 1e6:.1f} Mo de texte")
+
+    decoupeur = DecoupeurTexte(charger_tokenizer(args.modele), max_tokens=args.max_tokens,
+                               overlap_tokens=args.overlap_tokens)
+    decoupeur.decouper("Préchauffage. " * 50)
+    decoupages = {
+        "caracteres": lambda texte: ingestion.decouper_texte(texte, 500, 50),
+        "structure": decoupeur.decouper,
+    }
+
+    modele = None
+    if not args.sans_retrieval:
+        from communication.embeddings import charger_modele_embeddings
+        modele = charger_modele_embeddings(args.modele, device="cpu")
+
+    resultats: Dict[str, Dict] = {}
+    for nom, decouper in decoupages.items():
+        print(f"\n✂️  Découpage: {nom}")
+        chunks, duree = decouper_corpus(textes, decouper)
+        r = statistiques_chunks(chunks, decoupeur, taille_texte, duree, args.max_tokens)
+        print(f"  📦 {r['chunks']} chunks, {r['tokens_moyen']:.0f} tokens en moyenne "
+              f"(p95 {r['tokens_p95']:.0f}, max {r['tokens_max']})")
+        print(f"  ✂️  {r['chunks_tronques']} tronqués par le modèle, {r['chunks_minuscules']} de moins de 20 tokens")
+        print(f"  🚀 Débit: {r['debit_mo_s']:.2f} Mo/s")
+        if modele is not None:
+            r.update(evaluer_retrieval(modele, chunks, args.k))
+            print("  🎯 " + ", ".join(f"{cle}={valeur:.1f}%" for cle, valeur in r.items() if "@" in cle))
+        resultats[nom] = r
+
+    with open(args.sortie, "w", encoding="utf-8") as f:
+        json.dump({
+            "date": datetime.now().isoformat(),
+            "modele": args.modele,
+            "tokens_exacts": decoupeur.exact,
+            "documents": len(textes),
+            "taille_texte_octets": taille_texte,
+            "resultats": resultats,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Rapport sauvegardé dans: {args.sortie}")
+
+
+if __name__ == "__main__":
+    main()
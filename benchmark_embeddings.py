@@ -0,0 +1,104 @@
+"""
+Benchmark des embeddings de questions: appels individuels contre micro-batching
+Mesure le débit (questions/s) et les latences p50/p99 sous charge concurrente
+
+Usage:
+    python benchmark_embeddings.py
+    python benchmark_embeddings.py --concurrence 1 8 32 64 --questions 2000
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+from communication.batch_embeddings import BatcheurEmbeddings  # noqa: E402
+from test_rag_system import TEST_DATASET  # noqa: E402
+
+MODELE = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+
+
+def percentile(valeurs: List[float], p: float) -> float:
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(p * len(valeurs)))] if valeurs else 0.0
+
+
+def mesurer(encoder: Callable[[str], object], questions: List[str], concurrence: int) -> Dict:
+    """Encode toutes les questions avec `concurrence` threads appelants"""
+    def une_question(question: str) -> float:
+        debut = time.perf_counter()
+        encoder(question)
+        return time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrence) as pool:
+        latences = list(pool.map(une_question, questions))
+    duree = time.perf_counter() - debut
+
+    return {
+        "concurrence": concurrence,
+        "questions": len(questions),
+        "debit_q_s": len(questions) / duree,
+        "latence_moyenne_ms": statistics.mean(latences) * 1000,
+        "latence_p50_ms": percentile(latences, 0.50) * 1000,
+        "latence_p99_ms": percentile(latences, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du micro-batching des embeddings")
+    parser.add_argument("--modele", default=MODELE)
+    parser.add_argument("--concurrence", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--questions", type=int, default=1000)
+    parser.add_argument("--attente-ms", type=float, default=2.0)
+    parser.add_argument("--taille-max", type=int, default=32)
+    parser.add_argument("--sortie", default="rapport_benchmark_embeddings.json")
+    args = parser.parse_args()
+
+    print(f"📥 Chargement du modèle: {args.modele}")
+    modele = SentenceTransformer(args.modele)
+    batcheur = BatcheurEmbeddings(modele, attente_max_ms=args.attente_ms, taille_max_batch=args.taille_max)
+
+    base = [cas["question"] for cas in TEST_DATASET]
+    questions = [f"{base[i % len(base)]} ({i})" for i in range(args.questions)]
+
+    # Préchauffage
+    modele.encode(base)
+
+    modes = {
+        "sans_batching": lambda q: modele.encode([q])[0],
+        "avec_batching": batcheur.encoder,
+    }
+    rapport: Dict[str, List[Dict]] = {nom: [] for nom in modes}
+
+    for concurrence in args.concurrence:
+        print(f"\n👥 Concurrence: {concurrence}")
+        for nom, encoder in modes.items():
+            mesure = mesurer(encoder, questions, concurrence)
+            rapport[nom].append(mesure)
+            print(f"  {nom:<14} {mesure['debit_q_s']:8.1f} q/s | "
+                  f"p50 {mesure['latence_p50_ms']:7.1f} ms | p99 {mesure['latence_p99_ms']:7.1f} ms")
+
+    print(f"\n📦 Lots: {batcheur.stats()}")
+
+    with open(args.sortie, "w", encoding="utf-8") as f:
+        json.dump({
+            "date": datetime.now().isoformat(),
+            "modele": args.modele,
+            "attente_ms": args.attente_ms,
+            "taille_max": args.taille_max,
+            "resultats": rapport,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Rapport sauvegardé dans: {args.sortie}")
+
+
+if __name__ == "__main__":
+    main()
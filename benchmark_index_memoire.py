@@ -0,0 +1,398 @@
+"""
+Benchmark de l'index vectoriel en mémoire face à ChromaDB
+Compare, sur la base ChromaDB locale et sans modèle d'embeddings:
+- la latence p50/p95/p99 d'une recherche des k plus proches voisins
+  (requête ChromaDB, index exact en float32, float16, int8 et binaire
+  re-scoré, index IVF pour plusieurs n_sondes)
+- le recall@k des index approchés, quantifiés et du HNSW de ChromaDB face
+  à la recherche exacte en float32
+- la mémoire par million de chunks de chaque représentation
+- les recherches filtrées (source, catégorie...): latence avec les
+  partitions de l'index et la clause "where" de ChromaDB, et part des
+  résultats d'une recherche non filtrée qui sortent du filtre
+- la mémoire de chaque worker (processus séparés, comme sous gunicorn):
+  RSS, part privée (RssAnon), part projetée depuis les fichiers (RssFile,
+  partagée par le cache de pages) et PSS (RSS répartie entre les processus
+  qui partagent les pages, la mesure pertinente pour dimensionner)
+
+Les requêtes sont des embeddings de la base tirés au hasard, bruités: pas
+besoin du modèle d'embeddings ni d'Ollama.
+
+Usage:
+    python benchmark_index_memoire.py
+    python benchmark_index_memoire.py --workers 8 --ivf-listes 1024 --ivf-sondes 8 16 32 64
+    python benchmark_index_memoire.py --quantifications int8 binaire --facteurs-rescoring 10 50 --rescoring int8
+    python benchmark_index_memoire.py --sans-chroma   # export existant uniquement
+    python benchmark_index_memoire.py --filtres categorie type_document
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+from communication.index_memoire import (  # noqa: E402
+    IndexMemoire, completer_quantifications, exporter_collection, octets_par_chunk
+)
+from communication.metadonnees import CHAMPS_DOCUMENT, CHAMPS_TEXTE, clause_where  # noqa: E402
+
+DB_PATH = Path(__file__).resolve().parent / "chroma_db"
+NOM_COLLECTION = "documents_administratifs"
+
+
+def percentile(valeurs: List[float], p: float) -> float:
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(p * len(valeurs)))] if valeurs else 0.0
+
+
+def resume_latences(valeurs: List[float]) -> Dict:
+    return {
+        'p50': percentile(valeurs, 0.50),
+        'p95': percentile(valeurs, 0.95),
+        'p99': percentile(valeurs, 0.99),
+        'moyenne': statistics.mean(valeurs) if valeurs else 0.0,
+    }
+
+
+def memoire_processus() -> Dict:
+    """RSS du processus courant en Mo (Linux: /proc, ailleurs: pic de RSS)"""
+    memoire = {}
+    try:
+        with open("/proc/self/status") as f:
+            for ligne in f:
+                cle, _, valeur = ligne.partition(":")
+                if cle in ('VmRSS', 'RssAnon', 'RssFile', 'RssShmem'):
+                    memoire[cle] = int(valeur.split()[0]) / 1024
+        with open("/proc/self/smaps_rollup") as f:
+            for ligne in f:
+                if ligne.startswith("Pss:"):
+                    memoire['Pss'] = int(ligne.split()[1]) / 1024
+    except OSError:
+        # ru_maxrss: Ko sous Linux, octets sous macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        memoire['VmRSS'] = maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return memoire
+
+
+def ouvrir_collection(db_path: str):
+    import chromadb
+    return chromadb.PersistentClient(path=db_path).get_or_create_collection(name=NOM_COLLECTION)
+
+
+def moteur(nom: str, parametres: Dict):
+    """Fonction (question_embedding, filtres) -> ids des k plus proches voisins"""
+    k = parametres['k']
+    if nom == 'chroma':
+        collection = ouvrir_collection(parametres['db_path'])
+        return lambda q, filtres=None: collection.query(query_embeddings=[q.tolist()], n_results=k,
+                                                        where=clause_where(filtres), include=['distances'])['ids'][0]
+    index = IndexMemoire(
+        parametres['dossier'],
+        n_sondes=parametres.get('n_sondes', 0),
+        quantification=parametres.get('quantification', 'float32'),
+        rescoring=parametres.get('rescoring', 'float32'),
+        facteur_rescoring=parametres.get('facteur_rescoring', 10)
+    )
+    return lambda q, filtres=None: [str(index.ids[ligne]) for ligne in index.rechercher(q, k, filtres)[0]]
+
+
+def mesurer(recherche, requetes: np.ndarray, repetitions: int, filtres=None):
+    """Latences (ms) et résultats de la dernière répétition (filtres: un par requête)"""
+    latences, resultats = [], []
+    for _ in range(repetitions):
+        resultats = []
+        for i, q in enumerate(requetes):
+            debut = time.perf_counter()
+            resultats.append(recherche(q) if filtres is None else recherche(q, filtres[i]))
+            latences.append((time.perf_counter() - debut) * 1000)
+    return latences, resultats
+
+
+def worker(nom: str, parametres: Dict, chemin_requetes: str, repetitions: int, depart) -> Dict:
+    """Un worker: charge le moteur, répond aux requêtes et mesure sa mémoire"""
+    avant = memoire_processus()
+    recherche = moteur(nom, parametres)
+    requetes = np.load(chemin_requetes)
+    depart.wait()  # tous les workers cherchent en même temps
+    latences, _ = mesurer(recherche, requetes, repetitions)
+    return {'latence_ms': resume_latences(latences), 'memoire_avant_mo': avant, 'memoire_mo': memoire_processus()}
+
+
+def mesurer_workers(nom: str, parametres: Dict, chemin_requetes: str, n_workers: int, repetitions: int) -> Dict:
+    """Lance n_workers processus séparés (spawn, comme des workers indépendants)"""
+    contexte = multiprocessing.get_context("spawn")
+    with contexte.Manager() as gestionnaire:
+        depart = gestionnaire.Barrier(n_workers)
+        with contexte.Pool(n_workers) as pool:
+            resultats = pool.starmap(worker, [(nom, parametres, chemin_requetes, repetitions, depart)] * n_workers)
+    memoires = [r['memoire_mo'] for r in resultats]
+    return {
+        'workers': resultats,
+        'rss_moyen_mo': statistics.mean(m.get('VmRSS', 0.0) for m in memoires),
+        'prive_total_mo': sum(m.get('RssAnon', 0.0) for m in memoires),
+        'pss_total_mo': sum(m.get('Pss', 0.0) for m in memoires),
+        'latence_p50_ms': statistics.mean(r['latence_ms']['p50'] for r in resultats),
+        'latence_p99_ms': max(r['latence_ms']['p99'] for r in resultats),
+    }
+
+
+def recall(resultats: List[List[str]], reference: List[List[str]]) -> float:
+    return statistics.mean(len(set(r) & set(ref)) / max(1, len(ref)) for r, ref in zip(resultats, reference))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence, recall et mémoire par worker: index en mémoire contre ChromaDB")
+    parser.add_argument("--db-path", default=str(DB_PATH))
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--requetes", type=int, default=200)
+    parser.add_argument("--bruit", type=float, default=0.1, help="Bruit relatif ajouté aux embeddings tirés")
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--ivf-listes", type=int, default=0,
+                        help="Listes IVF (défaut: ~4·√n chunks, 0 avec --sans-ivf)")
+    parser.add_argument("--ivf-sondes", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--sans-ivf", action="store_true")
+    parser.add_argument("--quantifications", nargs="*", default=["float16", "int8", "binaire"],
+                        choices=["float16", "int8", "binaire"])
+    parser.add_argument("--rescoring", default="float32", choices=["float32", "float16", "int8"],
+                        help="Représentation du re-scoring des candidats binaires")
+    parser.add_argument("--facteurs-rescoring", type=int, nargs="+", default=[4, 10, 20],
+                        help="Candidats binaires re-scorés par résultat")
+    parser.add_argument("--sans-chroma", action="store_true",
+                        help="Sans ChromaDB: réutilise l'export <db-path>/index_memoire "
+                             "(les représentations quantifiées manquantes y sont ajoutées)")
+    parser.add_argument("--filtres", nargs="*", default=["source", "categorie"], choices=CHAMPS_TEXTE,
+                        help="Champs des recherches filtrées (valeur du chunk d'où vient chaque requête)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--graine", type=int, default=42)
+    parser.add_argument("--sortie", default="rapport_index_memoire.json")
+    args = parser.parse_args()
+
+    dossier_travail = Path(tempfile.mkdtemp(prefix="benchmark_index_"))
+    try:
+        executer(args, dossier_travail)
+    finally:
+        shutil.rmtree(dossier_travail, ignore_errors=True)
+
+
+def executer(args, dossier_travail: Path):
+    dossier_exact = IndexMemoire.dossier_de(args.db_path)
+    dossier_ivf = dossier_travail / "ivf"
+
+    collection = None
+    if args.sans_chroma:
+        if not (dossier_exact / "index.json").exists():
+            print(f"❌ Pas d'export dans {dossier_exact}: lancer le backend avec RAG_MOTEUR_RECHERCHE=memoire")
+            return
+    else:
+        collection = ouvrir_collection(args.db_path)
+        if not collection.count():
+            print("❌ La base est vide: lancer d'abord l'ingestion (python backend/communication/agent_ia.py)")
+            return
+        print(f"🧮 Export exact de {collection.count()} chunks...")
+        dossier_exact = dossier_travail / "exact"
+        debut = time.perf_counter()
+        exporter_collection(collection, dossier_exact)
+        print(f"   ⏱️  {time.perf_counter() - debut:.1f}s")
+
+    quantifications = list(args.quantifications)
+    if 'binaire' in quantifications:
+        quantifications.append(args.rescoring)
+    if completer_quantifications(dossier_exact, quantifications):
+        print(f"🧮 Quantification: {', '.join(args.quantifications)}")
+
+    exact = IndexMemoire(dossier_exact)
+    n = len(exact)
+    dimension = exact.description['dimension']
+    listes = 0 if args.sans_ivf else (args.ivf_listes or max(1, int(4 * np.sqrt(n))))
+    if listes:
+        source = collection
+        if source is None:
+            # Sans ChromaDB: ré-exporter l'index exact comme une collection
+            source = _CollectionDepuisIndex(exact)
+        print(f"🧮 Export IVF ({listes} listes)...")
+        debut = time.perf_counter()
+        exporter_collection(source, dossier_ivf, n_listes=listes)
+        print(f"   ⏱️  {time.perf_counter() - debut:.1f}s")
+
+    # Requêtes: embeddings de la base tirés au hasard et bruités
+    hasard = random.Random(args.graine)
+    bruit = np.random.default_rng(args.graine)
+    lignes = hasard.sample(range(n), min(args.requetes, n))
+    lignes = sorted(lignes)
+    requetes = np.asarray(exact.embeddings[lignes], dtype=np.float32)
+    echelle = float(np.mean(np.linalg.norm(requetes, axis=1))) / np.sqrt(requetes.shape[1])
+    requetes += bruit.standard_normal(requetes.shape).astype(np.float32) * args.bruit * echelle
+    chemin_requetes = str(dossier_travail / "requetes.npy")
+    np.save(chemin_requetes, requetes)
+
+    moteurs = {'exact': ('memoire', {'dossier': str(dossier_exact), 'k': args.k})}
+    for quantification in args.quantifications:
+        parametres = {'dossier': str(dossier_exact), 'quantification': quantification, 'k': args.k}
+        if quantification != 'binaire':
+            moteurs[quantification] = ('memoire', parametres)
+            continue
+        for facteur in args.facteurs_rescoring:
+            moteurs[f'binaire_x{facteur}'] = ('memoire', dict(parametres, rescoring=args.rescoring,
+                                                              facteur_rescoring=facteur))
+    for n_sondes in (args.ivf_sondes if listes else []):
+        if n_sondes <= listes:
+            moteurs[f'ivf_{n_sondes}'] = ('memoire', {'dossier': str(dossier_ivf), 'n_sondes': n_sondes, 'k': args.k})
+    if collection is not None:
+        moteurs['chroma'] = ('chroma', {'db_path': args.db_path, 'k': args.k})
+
+    print(f"\n⏱️  Latence sur {len(requetes)} requêtes (k={args.k}, {args.repetitions} répétitions)")
+    resultats: Dict[str, Dict] = {}
+    reference = None
+    for nom, (type_moteur, parametres) in moteurs.items():
+        recherche = moteur(type_moteur, parametres)
+        recherche(requetes[0])  # préchauffage
+        latences, trouves = mesurer(recherche, requetes, args.repetitions)
+        if reference is None:
+            reference = trouves
+        resultats[nom] = {'latence_ms': resume_latences(latences), f'recall@{args.k}': recall(trouves, reference)}
+        l = resultats[nom]['latence_ms']
+        print(f"  {nom:>12}: p50 {l['p50']:.2f} ms, p95 {l['p95']:.2f} ms, p99 {l['p99']:.2f} ms, "
+              f"recall@{args.k} {resultats[nom][f'recall@{args.k}']:.3f}")
+
+    filtrees = {}
+    if args.filtres:
+        print(f"\n🔎 Recherches filtrées (valeur du chunk d'où vient chaque requête)")
+    for champ in args.filtres:
+        filtrees[champ] = mesurer_filtres(champ, exact, lignes, requetes, moteurs, reference, args)
+
+    print(f"\n🧠 Mémoire de {args.workers} workers")
+    fichiers_mesures = set()
+    for nom, (type_moteur, parametres) in moteurs.items():
+        fichiers = (parametres.get('dossier'), parametres.get('quantification'))
+        if fichiers in fichiers_mesures:
+            continue  # mêmes fichiers pour tous les n_sondes et facteurs de re-scoring
+        fichiers_mesures.add(fichiers)
+        resultats[nom]['workers'] = mesurer_workers(nom=type_moteur, parametres=parametres,
+                                                    chemin_requetes=chemin_requetes,
+                                                    n_workers=args.workers, repetitions=args.repetitions)
+        w = resultats[nom]['workers']
+        print(f"  {nom:>12}: RSS moyen {w['rss_moyen_mo']:.0f} Mo, privé total {w['prive_total_mo']:.0f} Mo, "
+              f"PSS total {w['pss_total_mo']:.0f} Mo, p50 {w['latence_p50_ms']:.2f} ms en concurrence")
+
+    # Vecteurs et normes; le binaire lit en plus les lignes re-scorées
+    memoire_par_million = {
+        quantification: octets_par_chunk(quantification, dimension) * 1_000_000 / 1024 / 1024
+        for quantification in ['float32'] + list(args.quantifications)
+    }
+    print(f"\n📦 Mémoire des vecteurs par million de chunks (dimension {dimension})")
+    for quantification, taille in memoire_par_million.items():
+        print(f"  {quantification:>12}: {taille:.0f} Mo")
+
+    with open(args.sortie, "w", encoding="utf-8") as f:
+        json.dump({
+            "date": datetime.now().isoformat(),
+            "configuration": {
+                "nb_chunks": n,
+                "dimension": dimension,
+                "taille_matrice_mo": exact.embeddings.nbytes / 1024 / 1024,
+                "memoire_par_million_mo": memoire_par_million,
+                "rescoring": args.rescoring,
+                "k": args.k,
+                "requetes": len(requetes),
+                "bruit": args.bruit,
+                "ivf_listes": listes,
+                "workers": args.workers,
+                "graine": args.graine,
+                "cpus": os.cpu_count(),
+            },
+            "moteurs": resultats,
+            "recherches_filtrees": filtrees,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Rapport sauvegardé dans: {args.sortie}")
+
+
+def mesurer_filtres(champ: str, exact: IndexMemoire, lignes: List[int], requetes: np.ndarray,
+                    moteurs: Dict, reference: List[List[str]], args) -> Dict:
+    """
+    Latence et recall des moteurs exact, IVF et ChromaDB quand chaque requête
+    est restreinte à la valeur de `champ` de son chunk d'origine, et part des
+    résultats non filtrés (reference) qui sortent de ce filtre
+    """
+    codes = exact.indices_sources if champ == 'source' else exact.codes[champ]
+    valeurs = [exact.valeurs[champ][codes[ligne]] for ligne in lignes]
+    gardees = [i for i, valeur in enumerate(valeurs) if valeur]
+    if not gardees:
+        print(f"  {champ:>12}: pas de valeur dans l'export (base indexée avant les métadonnées)")
+        return {}
+    requetes = requetes[gardees]
+    filtres = [{champ: valeurs[i]} for i in gardees]
+
+    # Résultats non filtrés hors du filtre de leur requête
+    hors_filtre = []
+    for i, filtre in zip(gardees, filtres):
+        dans_filtre = exact.filtrer_ids(reference[i], filtre)
+        hors_filtre.append(1 - len(dans_filtre) / max(1, len(reference[i])))
+    taille = statistics.mean(len(exact.lignes_filtrees(filtre)) for filtre in filtres) / len(exact)
+
+    resultats = {'requetes': len(gardees), 'taille_partition_moyenne': taille,
+                 'hors_filtre_sans_filtre': statistics.mean(hors_filtre), 'moteurs': {}}
+    print(f"  {champ:>12}: partition moyenne {taille:.1%} des chunks, "
+          f"{resultats['hors_filtre_sans_filtre']:.1%} des résultats non filtrés hors du filtre")
+    reference_filtree = None
+    for nom, (type_moteur, parametres) in moteurs.items():
+        if nom != 'exact' and nom != 'chroma' and not nom.startswith('ivf_'):
+            continue
+        recherche = moteur(type_moteur, parametres)
+        recherche(requetes[0], filtres[0])  # préchauffage
+        latences, trouves = mesurer(recherche, requetes, args.repetitions, filtres)
+        if reference_filtree is None:
+            reference_filtree = trouves
+        resultats['moteurs'][nom] = {'latence_ms': resume_latences(latences),
+                                     f'recall@{args.k}': recall(trouves, reference_filtree)}
+        l = resultats['moteurs'][nom]['latence_ms']
+        print(f"  {nom:>12}: p50 {l['p50']:.2f} ms, p95 {l['p95']:.2f} ms, "
+              f"recall@{args.k} {resultats['moteurs'][nom][f'recall@{args.k}']:.3f}")
+    return resultats
+
+
+class _CollectionDepuisIndex:
+    """Interface count()/get() de ChromaDB au-dessus d'un export (pour --sans-chroma)"""
+
+    def __init__(self, index: IndexMemoire):
+        self.index = index
+
+    def count(self) -> int:
+        return len(self.index)
+
+    def get(self, include=None, limit=None, offset=0):
+        lignes = range(offset, min(len(self.index), offset + limit))
+        return {
+            'ids': [str(self.index.ids[i]) for i in lignes],
+            'embeddings': np.asarray(self.index.embeddings[offset:offset + len(lignes)]),
+            'documents': [self.index.texte(i) for i in lignes],
+            'metadatas': [self._metadata(i) for i in lignes],
+        }
+
+    def _metadata(self, ligne: int) -> Dict:
+        metadata = {'source': self.index.sources[self.index.indices_sources[ligne]]}
+        if self.index.chunk_ids[ligne] >= 0:
+            metadata['chunk_id'] = int(self.index.chunk_ids[ligne])
+        if self.index.pages[ligne] >= 0:
+            metadata['page'] = int(self.index.pages[ligne])
+        for champ in CHAMPS_DOCUMENT:
+            valeur = self.index.valeurs[champ][self.index.codes[champ][ligne]]
+            if valeur:
+                metadata[champ] = valeur
+        return metadata
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark du ré-ordonnancement par cross-encoder
+Compare, sur les questions de test_rag_system.py, la précision du retrieval
+et la taille du prompt entre:
+- la recherche seule avec N passages (configuration actuelle)
+- la recherche de C candidats ré-ordonnés par le cross-encoder, K passages gardés
+
+Aucun appel à Ollama: seuls la recherche et la construction du prompt sont
+exécutées, sur la base ChromaDB locale.
+
+Usage:
+    python benchmark_reranking.py
+    python benchmark_reranking.py --n-base 5 --k 3 --candidats 30 --budget-ms 300
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+from communication.agent_ia import RAGDocumentProcessor  # noqa: E402
+from communication.reranking import MODELE_RERANKING_DEFAUT, ReordonnanceurPassages  # noqa: E402
+from test_rag_system import TEST_DATASET, RAGTester  # noqa: E402
+
+DB_PATH = Path(__file__).resolve().parent / "chroma_db"
+
+
+def percentile(valeurs: List[float], p: float) -> float:
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(p * len(valeurs)))] if valeurs else 0.0
+
+
+def evaluer(rag: RAGDocumentProcessor, n_resultats: int) -> Dict:
+    """Précision du retrieval, taille du prompt et latence de recherche par question"""
+    evaluateur = RAGTester(api_url="", n_resultats=n_resultats)
+    precisions, tailles, latences = [], [], []
+
+    for cas in TEST_DATASET:
+        debut = time.perf_counter()
+        passages = rag.rechercher(cas["question"], n_resultats=n_resultats)
+        latences.append(time.perf_counter() - debut)
+
+        precisions.append(evaluateur.evaluer_precision_retrieval(passages, cas["sources_pertinentes"]))
+        tailles.append(len(rag.construire_prompt(cas["question"], passages)))
+
+    return {
+        "passages": n_resultats,
+        "precision_retrieval": statistics.mean(precisions) * 100,
+        "taille_prompt_moyenne": statistics.mean(tailles),
+        "latence_recherche_p50_ms": percentile(latences, 0.50) * 1000,
+        "latence_recherche_p95_ms": percentile(latences, 0.95) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Précision et taille du prompt avec et sans ré-ordonnancement")
+    parser.add_argument("--db-path", default=str(DB_PATH))
+    parser.add_argument("--modele", default=MODELE_RERANKING_DEFAUT)
+    parser.add_argument("--n-base", type=int, default=5, help="Passages sans ré-ordonnancement")
+    parser.add_argument("--k", type=int, default=3, help="Passages gardés après ré-ordonnancement")
+    parser.add_argument("--candidats", type=int, default=30)
+    parser.add_argument("--budget-ms", type=float, default=300)
+    parser.add_argument("--sortie", default="rapport_reranking.json")
+    args = parser.parse_args()
+
+    rag = RAGDocumentProcessor(db_path=args.db_path, reranking=False, cache_taille=0)
+
+    print(f"\n📏 Sans ré-ordonnancement ({args.n_base} passages)")
+    base = evaluer(rag, args.n_base)
+
+    print(f"\n📥 Chargement du cross-encoder: {args.modele}")
+    rag.reordonnanceur = ReordonnanceurPassages(args.modele, budget_ms=args.budget_ms)
+    rag.reranking_candidats = args.candidats
+    rag.rechercher(TEST_DATASET[0]["question"], n_resultats=args.k)  # préchauffage
+
+    print(f"🔁 Avec ré-ordonnancement ({args.candidats} candidats → {args.k} passages)")
+    reranking = evaluer(rag, args.k)
+    reranking["stats"] = rag.reordonnanceur.stats()
+
+    reduction = 1 - reranking["taille_prompt_moyenne"] / base["taille_prompt_moyenne"]
+
+    print("\n" + "=" * 80)
+    for nom, r in (("Sans ré-ordonnancement", base), ("Avec ré-ordonnancement", reranking)):
+        print(f"{nom}:")
+        print(f"  🎯 Précision retrieval: {r['precision_retrieval']:.1f}%")
+        print(f"  📝 Taille moyenne du prompt: {r['taille_prompt_moyenne']:.0f} caractères")
+        print(f"  ⏱️  Recherche: p50 {r['latence_recherche_p50_ms']:.1f} ms, p95 {r['latence_recherche_p95_ms']:.1f} ms")
+    print(f"\n📉 Réduction du prompt: {reduction * 100:.1f}%")
+
+    with open(args.sortie, "w", encoding="utf-8") as f:
+        json.dump({
+            "date": datetime.now().isoformat(),
+            "modele": args.modele,
+            "sans_reranking": base,
+            "avec_reranking": reranking,
+            "reduction_prompt": reduction,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"✅ Rapport sauvegardé dans: {args.sortie}")
+
+
+if __name__ == "__main__":
+    main()
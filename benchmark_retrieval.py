@@ -0,0 +1,223 @@
+"""
+Benchmark hors ligne du retrieval
+Appelle directement rechercher() sur la base ChromaDB locale (ni HTTP, ni
+Ollama) et mesure la qualité et la latence de la recherche:
+- recall@k (plafonné: pertinents trouvés / min(k, pertinents dans la
+  base)), MRR et nDCG@k
+- latence p50/p95/p99 de chaque étape (embedding, recherche vectorielle,
+  fusion BM25, ré-ordonnancement) et de la recherche complète
+
+Deux jeux de requêtes:
+- les questions de test_rag_system.py, étiquetées par leurs sources
+  pertinentes (un passage est pertinent si le nom de sa source contient
+  l'une d'elles)
+- des requêtes générées à partir de chunks tirés au hasard dans la base
+  (un extrait de 8 à 16 mots): le chunk d'origine est le seul pertinent,
+  son document compte pour le recall au niveau document
+
+Le rapport JSON permet de comparer deux index, découpages ou modèles
+d'embeddings (lancer le script avant et après le changement).
+
+Usage:
+    python benchmark_retrieval.py
+    python benchmark_retrieval.py --requetes-generees 500 --k 1 3 5 10 --sans-hybride
+    python benchmark_retrieval.py --reranking --sortie rapport_retrieval_reranking.json
+"""
+
+import argparse
+import json
+import math
+import random
+import statistics
+import sys
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+from communication.agent_ia import RAGDocumentProcessor  # noqa: E402
+from test_rag_system import TEST_DATASET  # noqa: E402
+
+DB_PATH = Path(__file__).resolve().parent / "chroma_db"
+ETAPES = ('embedding_ms', 'recherche_vectorielle_ms', 'bm25_ms', 'reranking_ms', 'total_ms')
+
+
+def percentile(valeurs: List[float], p: float) -> float:
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(p * len(valeurs)))] if valeurs else 0.0
+
+
+def compter_chunks_par_source(rag: RAGDocumentProcessor, taille_page: int = 5000) -> Counter:
+    """Nombre de chunks de chaque source de la base (pour le nDCG idéal)"""
+    sources = Counter()
+    offset = 0
+    while True:
+        page = rag.collection.get(include=['metadatas'], limit=taille_page, offset=offset)
+        if not page['ids']:
+            return sources
+        sources.update(metadata['source'] for metadata in page['metadatas'])
+        offset += len(page['ids'])
+
+
+def generer_requetes(rag: RAGDocumentProcessor, n: int, graine: int) -> List[Dict]:
+    """Requêtes extraites de chunks tirés au hasard (chunk d'origine = réponse attendue)"""
+    total = rag.collection.count()
+    if not total or not n:
+        return []
+    hasard = random.Random(graine)
+    requetes = []
+    for offset in hasard.sample(range(total), min(n * 2, total)):
+        chunk = rag.collection.get(include=['documents', 'metadatas'], limit=1, offset=offset)
+        mots = chunk['documents'][0].split()
+        if len(mots) < 20:
+            continue
+        longueur = hasard.randint(8, 16)
+        debut = hasard.randrange(0, len(mots) - longueur)
+        requetes.append({
+            'question': " ".join(mots[debut:debut + longueur]),
+            'id': chunk['ids'][0],
+            'source': chunk['metadatas'][0]['source'],
+        })
+        if len(requetes) >= n:
+            break
+    return requetes
+
+
+def dcg(pertinences: List[int]) -> float:
+    return sum(p / math.log2(rang + 2) for rang, p in enumerate(pertinences))
+
+
+def evaluer(rag: RAGDocumentProcessor, requetes: List[Dict], ks: List[int],
+            pertinent: Callable[[Dict, Dict], bool], nb_pertinents: Callable[[Dict], int],
+            trouve_document: Callable[[Dict, List[Dict]], float], repetitions: int) -> Dict:
+    """
+    Qualité et latence du retrieval sur un jeu de requêtes
+
+    Args:
+        pertinent: (requête, passage) -> le passage est-il pertinent
+        nb_pertinents: requête -> nombre de passages pertinents dans la base
+        trouve_document: (requête, passages) -> part des documents attendus trouvés
+        repetitions: Passages de mesure de la latence
+    """
+    k_max = max(ks)
+    recalls = {k: [] for k in ks}
+    recalls_document = {k: [] for k in ks}
+    ndcgs = {k: [] for k in ks}
+    rangs_reciproques = []
+    latences = {etape: [] for etape in ETAPES}
+
+    for requete in requetes:
+        for _ in range(repetitions):
+            timings: Dict = {}
+            passages = rag.rechercher(requete['question'], n_resultats=k_max, timings=timings)
+            for etape in ETAPES:
+                latences[etape].append(timings.get(etape, 0.0))
+
+        pertinences = [int(pertinent(requete, p)) for p in passages]
+        total_pertinents = max(1, nb_pertinents(requete))
+        premier = next((rang for rang, p in enumerate(pertinences) if p), None)
+        rangs_reciproques.append(1 / (premier + 1) if premier is not None else 0.0)
+        for k in ks:
+            recalls[k].append(sum(pertinences[:k]) / min(k, total_pertinents))
+            recalls_document[k].append(trouve_document(requete, passages[:k]))
+            ideal = dcg([1] * min(k, total_pertinents))
+            ndcgs[k].append(dcg(pertinences[:k]) / ideal)
+
+    resultat = {'requetes': len(requetes), 'mrr': statistics.mean(rangs_reciproques) if requetes else 0.0}
+    for k in ks:
+        resultat[f'recall@{k}'] = statistics.mean(recalls[k]) if requetes else 0.0
+        resultat[f'recall_document@{k}'] = statistics.mean(recalls_document[k]) if requetes else 0.0
+        resultat[f'ndcg@{k}'] = statistics.mean(ndcgs[k]) if requetes else 0.0
+    resultat['latence_ms'] = {
+        etape: {
+            'p50': percentile(valeurs, 0.50),
+            'p95': percentile(valeurs, 0.95),
+            'p99': percentile(valeurs, 0.99),
+            'moyenne': statistics.mean(valeurs) if valeurs else 0.0,
+        } for etape, valeurs in latences.items()
+    }
+    return resultat
+
+
+def afficher(nom: str, resultat: Dict, ks: List[int]):
+    print(f"\n📊 {nom} ({resultat['requetes']} requêtes)")
+    print(f"  🎯 MRR: {resultat['mrr']:.3f}")
+    for k in ks:
+        print(f"  🎯 k={k}: recall {resultat[f'recall@{k}']:.3f}, "
+              f"recall document {resultat[f'recall_document@{k}']:.3f}, nDCG {resultat[f'ndcg@{k}']:.3f}")
+    for etape, l in resultat['latence_ms'].items():
+        if l['p99'] > 0:
+            print(f"  ⏱️  {etape[:-3]}: p50 {l['p50']:.1f} ms, p95 {l['p95']:.1f} ms, p99 {l['p99']:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k, MRR, nDCG et latences du retrieval, sans LLM")
+    parser.add_argument("--db-path", default=str(DB_PATH))
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--requetes-generees", type=int, default=200)
+    parser.add_argument("--graine", type=int, default=42)
+    parser.add_argument("--repetitions", type=int, default=3, help="Mesures de latence par requête")
+    parser.add_argument("--sans-hybride", action="store_true", help="Recherche vectorielle seule")
+    parser.add_argument("--reranking", action="store_true", help="Activer le ré-ordonnancement")
+    parser.add_argument("--sortie", default="rapport_retrieval.json")
+    args = parser.parse_args()
+    ks = sorted(set(args.k))
+
+    # Ni cache ni micro-batching: chaque requête mesure la recherche complète
+    rag = RAGDocumentProcessor(db_path=args.db_path, cache_taille=0, batch_taille_max=1,
+                               recherche_hybride=not args.sans_hybride, reranking=args.reranking)
+    if not rag.collection.count():
+        print("❌ La base est vide: lancer d'abord l'ingestion (python backend/communication/agent_ia.py)")
+        return
+    rag.rechercher(TEST_DATASET[0]["question"], n_resultats=max(ks))  # préchauffage
+
+    chunks_par_source = compter_chunks_par_source(rag)
+
+    def source_attendue(cas: Dict, source: str) -> bool:
+        return any(etiquette.lower() in source.lower() for etiquette in cas["sources_pertinentes"])
+
+    print("\n🧪 Questions de test_rag_system.py")
+    questions = evaluer(
+        rag, TEST_DATASET, ks,
+        pertinent=lambda cas, p: source_attendue(cas, p['source']),
+        nb_pertinents=lambda cas: sum(n for source, n in chunks_par_source.items() if source_attendue(cas, source)),
+        trouve_document=lambda cas, passages: sum(
+            any(e.lower() in p['source'].lower() for p in passages) for e in cas["sources_pertinentes"]
+        ) / len(cas["sources_pertinentes"]),
+        repetitions=args.repetitions,
+    )
+    afficher("Questions étiquetées", questions, ks)
+
+    print(f"\n🧪 Génération de {args.requetes_generees} requêtes à partir de la base")
+    requetes = generer_requetes(rag, args.requetes_generees, args.graine)
+    generees = evaluer(
+        rag, requetes, ks,
+        pertinent=lambda requete, p: p['id'] == requete['id'],
+        nb_pertinents=lambda requete: 1,
+        trouve_document=lambda requete, passages: float(any(p['source'] == requete['source'] for p in passages)),
+        repetitions=args.repetitions,
+    )
+    afficher("Requêtes générées (chunk d'origine)", generees, ks)
+
+    with open(args.sortie, "w", encoding="utf-8") as f:
+        json.dump({
+            "date": datetime.now().isoformat(),
+            "configuration": {
+                "modele": rag.model_name,
+                "backend_embeddings": rag.embedding_backend,
+                "indexation": rag.parametres_indexation,
+                "recherche_hybride": not args.sans_hybride,
+                "reranking": args.reranking,
+                "nb_chunks": rag.collection.count(),
+                "graine": args.graine,
+                "repetitions": args.repetitions,
+            },
+            "questions_test": questions,
+            "requetes_generees": generees,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Rapport sauvegardé dans: {args.sortie}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Faux serveur Ollama pour les tests de routage et de charge
+Imite /api/chat, /api/generate (avec ou sans streaming NDJSON), /api/tags et /api/version
+avec une latence, un débit de tokens et un taux d'erreurs réglables
+
+Usage:
+    python stub_ollama_server.py --port 11501
+    python stub_ollama_server.py --port 11502 --latence 0.5 --tokens-par-s 20 --taux-erreur 0.2
+
+    # Backend Django réparti sur deux faux serveurs
+    OLLAMA_HOSTS=http://localhost:11501,http://localhost:11502 python manage.py runserver
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+REPONSE = ("D'après les documents fournis, la demande se fait auprès du service compétent "
+           "avec les pièces justificatives requises. [Source: document]").split(" ")
+
+
+class EtatServeur:
+    """Réglages et compteurs du faux serveur"""
+
+    def __init__(self, latence: float, tokens_par_s: float, taux_erreur: float, nb_tokens: int):
+        self.latence = latence
+        self.tokens_par_s = tokens_par_s
+        self.taux_erreur = taux_erreur
+        self.nb_tokens = nb_tokens
+        self.verrou = threading.Lock()
+        self.en_vol = 0
+        self.requetes = 0
+        self.erreurs = 0
+        self.modeles_charges = set()
+
+
+def creer_handler(etat: EtatServeur):
+    class HandlerOllama(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, code: int, donnees: Dict):
+            corps = json.dumps(donnees).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corps)))
+            self.end_headers()
+            self.wfile.write(corps)
+
+        def do_GET(self):
+            if self.path == "/api/version":
+                self._json(200, {"version": "0.0.0-stub"})
+            elif self.path == "/api/tags":
+                self._json(200, {"models": [{"name": m, "model": m} for m in sorted(etat.modeles_charges)]})
+            elif self.path == "/stats":
+                with etat.verrou:
+                    self._json(200, {"en_vol": etat.en_vol, "requetes": etat.requetes, "erreurs": etat.erreurs})
+            else:
+                self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path not in ("/api/chat", "/api/generate"):
+                self._json(404, {"error": "not found"})
+                return
+
+            longueur = int(self.headers.get("Content-Length", 0))
+            requete = json.loads(self.rfile.read(longueur) or b"{}")
+
+            with etat.verrou:
+                etat.requetes += 1
+                etat.en_vol += 1
+                erreur = random.random() < etat.taux_erreur
+                if erreur:
+                    etat.erreurs += 1
+            try:
+                if erreur:
+                    self._json(503, {"error": "stub: erreur simulée"})
+                    return
+                self._generer(requete)
+            except (BrokenPipeError, ConnectionResetError):
+                # Client parti (timeout côté backend pendant un test de charge)
+                self.close_connection = True
+            finally:
+                with etat.verrou:
+                    etat.en_vol -= 1
+
+        def _generer(self, requete: Dict):
+            debut = time.perf_counter_ns()
+            modele = requete.get("model", "mistral:latest")
+            chat = self.path == "/api/chat"
+
+            # Premier appel pour un modèle: simuler un chargement
+            chargement = 0.0
+            if modele not in etat.modeles_charges:
+                chargement = 1.0
+                etat.modeles_charges.add(modele)
+            time.sleep(chargement + etat.latence)
+
+            options = requete.get("options") or {}
+            nb_tokens = min(etat.nb_tokens, options.get("num_predict") or etat.nb_tokens)
+            if chat:
+                prompt = " ".join(m.get("content", "") for m in requete.get("messages", []))
+            else:
+                prompt = requete.get("prompt", "")
+            prompt_eval_ns = int(etat.latence * 1e9)
+
+            def morceau(texte: str, fini: bool) -> Dict:
+                donnees = {
+                    "model": modele,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "done": fini,
+                }
+                if chat:
+                    donnees["message"] = {"role": "assistant", "content": texte}
+                else:
+                    donnees["response"] = texte
+                if fini:
+                    donnees.update({
+                        "done_reason": "stop",
+                        "total_duration": time.perf_counter_ns() - debut,
+                        "load_duration": int(chargement * 1e9),
+                        "prompt_eval_count": len(prompt.split()),
+                        "prompt_eval_duration": prompt_eval_ns,
+                        "eval_count": nb_tokens,
+                        "eval_duration": int(nb_tokens / etat.tokens_par_s * 1e9),
+                    })
+                return donnees
+
+            mots = [REPONSE[i % len(REPONSE)] + " " for i in range(nb_tokens)]
+
+            if not requete.get("stream", True):
+                time.sleep(nb_tokens / etat.tokens_par_s)
+                self._json(200, morceau("".join(mots), True))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def envoyer(donnees: Dict):
+                ligne = (json.dumps(donnees) + "\n").encode()
+                self.wfile.write(f"{len(ligne):x}\r\n".encode() + ligne + b"\r\n")
+                self.wfile.flush()
+
+            for mot in mots:
+                time.sleep(1 / etat.tokens_par_s)
+                envoyer(morceau(mot, False))
+            envoyer(morceau("", True))
+            self.wfile.write(b"0\r\n\r\n")
+
+    return HandlerOllama
+
+
+def demarrer(port: int, latence: float = 0.2, tokens_par_s: float = 50, taux_erreur: float = 0.0,
+             nb_tokens: int = 40, hote: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Démarre un faux serveur dans un thread et le retourne (serveur.shutdown() pour l'arrêter)"""
+    etat = EtatServeur(latence, tokens_par_s, taux_erreur, nb_tokens)
+    serveur = ThreadingHTTPServer((hote, port), creer_handler(etat))
+    serveur.daemon_threads = True
+    serveur.etat = etat
+    threading.Thread(target=serveur.serve_forever, daemon=True).start()
+    return serveur
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux serveur Ollama (tests de routage et de charge)")
+    parser.add_argument("--hote", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11501)
+    parser.add_argument("--latence", type=float, default=0.2, help="Évaluation du prompt simulée (s)")
+    parser.add_argument("--tokens-par-s", type=float, default=50)
+    parser.add_argument("--nb-tokens", type=int, default=40, help="Tokens générés par réponse")
+    parser.add_argument("--taux-erreur", type=float, default=0.0, help="Proportion de réponses 503")
+    args = parser.parse_args()
+
+    serveur = demarrer(args.port, args.latence, args.tokens_par_s, args.taux_erreur, args.nb_tokens, args.hote)
+    print(f"🧪 Faux serveur Ollama sur http://{args.hote}:{args.port} "
+          f"(latence {args.latence}s, {args.tokens_par_s} tokens/s, erreurs {args.taux_erreur * 100:.0f}%)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        serveur.shutdown()
+
+
+if __name__ == "__main__":
+    main()
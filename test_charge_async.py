@@ -0,0 +1,132 @@
+"""
+Test de charge: vue synchrone /api/question/ contre vue asynchrone /api/question/async/
+Mesure le débit (requêtes/s) et la latence à différents niveaux de concurrence
+
+Le backend doit être servi par un serveur ASGI pour que la vue asynchrone
+libère le processus pendant la génération Ollama:
+
+    cd backend
+    uvicorn backend_ia.asgi:application --port 8000 --workers 1
+
+Usage:
+    python test_charge_async.py
+    python test_charge_async.py --concurrence 1 10 50 100 --requetes 200
+"""
+
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = "http://localhost:8000/api"
+ENDPOINTS = {
+    "sync": "/question/",
+    "async": "/question/async/",
+}
+QUESTIONS = [
+    "Comment obtenir un passeport ?",
+    "Comment obtenir un acte de naissance ?",
+    "Quelles sont les démarches pour obtenir une CNIB ?",
+    "Comment obtenir un certificat de résidence ?",
+    "Quelles sont les conditions pour obtenir un permis de travail ?",
+]
+
+
+def mesurer_niveau(url: str, concurrence: int, nb_requetes: int, timeout: float) -> Dict:
+    """
+    Envoie nb_requetes requêtes avec `concurrence` clients simultanés
+
+    Returns:
+        Dict: débit, latences et nombre d'erreurs pour ce niveau
+    """
+    session = requests.Session()
+    adaptateur = HTTPAdapter(pool_connections=1, pool_maxsize=concurrence)
+    session.mount("http://", adaptateur)
+
+    def une_requete(i: int):
+        debut = time.perf_counter()
+        try:
+            response = session.post(
+                url,
+                json={"question": QUESTIONS[i % len(QUESTIONS)], "n_resultats": 3},
+                timeout=timeout
+            )
+            ok = response.status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        return ok, time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrence) as pool:
+        resultats = list(pool.map(une_requete, range(nb_requetes)))
+    duree = time.perf_counter() - debut
+    session.close()
+
+    latences = sorted(l for ok, l in resultats if ok)
+    erreurs = sum(1 for ok, _ in resultats if not ok)
+
+    def percentile(p: float) -> float:
+        if not latences:
+            return 0.0
+        return latences[min(len(latences) - 1, int(p * len(latences)))]
+
+    return {
+        "concurrence": concurrence,
+        "requetes": nb_requetes,
+        "erreurs": erreurs,
+        "duree_s": duree,
+        "debit_req_s": (nb_requetes - erreurs) / duree if duree else 0.0,
+        "latence_moyenne_s": statistics.mean(latences) if latences else 0.0,
+        "latence_p50_s": percentile(0.50),
+        "latence_p99_s": percentile(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge sync vs async")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--concurrence", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--requetes", type=int, default=100,
+                        help="Nombre de requêtes par niveau de concurrence")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--sortie", default="rapport_charge_async.json")
+    args = parser.parse_args()
+
+    print("🤖 Test de charge - vue synchrone contre vue asynchrone")
+    print("=" * 80)
+
+    rapport: Dict[str, List[Dict]] = {}
+    for nom, chemin in ENDPOINTS.items():
+        url = args.base_url.rstrip("/") + chemin
+        print(f"\n🌐 {nom}: {url}")
+        rapport[nom] = []
+        for concurrence in args.concurrence:
+            mesure = mesurer_niveau(url, concurrence, max(args.requetes, concurrence), args.timeout)
+            rapport[nom].append(mesure)
+            print(f"  👥 {concurrence:>4} clients | {mesure['debit_req_s']:7.2f} req/s | "
+                  f"p50 {mesure['latence_p50_s']:6.2f}s | p99 {mesure['latence_p99_s']:6.2f}s | "
+                  f"erreurs {mesure['erreurs']}")
+
+    print(f"\n📊 COMPARAISON DU DÉBIT (async / sync)")
+    print(f"{'─' * 80}")
+    for sync, async_ in zip(rapport["sync"], rapport["async"]):
+        ratio = async_["debit_req_s"] / sync["debit_req_s"] if sync["debit_req_s"] else float("inf")
+        print(f"  {sync['concurrence']:>4} clients: x{ratio:.2f}")
+
+    with open(args.sortie, "w", encoding="utf-8") as f:
+        json.dump({
+            "date": datetime.now().isoformat(),
+            "base_url": args.base_url,
+            "resultats": rapport
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Rapport sauvegardé dans: {args.sortie}")
+
+
+if __name__ == "__main__":
+    main()
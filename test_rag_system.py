@@ -1,19 +1,51 @@
 """
 Script de test et évaluation du système RAG
 Teste 20 questions avec métriques de performance
+
+Mode test de charge (--charge): plusieurs clients simultanés pendant une
+durée donnée, avec montée en charge progressive et, au choix, boucle fermée
+(chaque client renvoie une question dès la réponse reçue) ou boucle ouverte
+(arrivées à débit fixe, indépendantes des réponses). Rapport: débit,
+histogramme et percentiles des latences, temps jusqu'au premier octet,
+taux d'erreurs et de timeouts.
+
+Mode lot (--lot): les 20 questions partent en une requête sur
+/api/question/lot/ et les résultats sont lus au fil du flux NDJSON.
+
+Usage:
+    python test_rag_system.py
+    python test_rag_system.py --lot
+    python test_rag_system.py --charge --concurrence 20 --montee 10 --duree 60
+    python test_rag_system.py --charge --debit 5 --concurrence 100 --api-url http://localhost:8000/api/question/stream/
+
+    # Tester le retrieval et la couche web sans LLM: faux serveur Ollama
+    # dans ce processus, puis backend démarré dessus dans un autre terminal
+    python test_rag_system.py --charge --stub-ollama 11501 --concurrence 50
+    OLLAMA_HOST=http://localhost:11501 RAG_CACHE_TAILLE=0 python manage.py runserver
 """
 
+import argparse
+import random
+import threading
 import requests
 import time
 import json
-from typing import List, Dict, Tuple
+import itertools
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 import statistics
 
+from requests.adapters import HTTPAdapter
+
 # Configuration
 API_URL = "http://localhost:8000/api/question/"
 N_RESULTATS = 3
 
+# Bornes supérieures (ms) des classes de l'histogramme des latences
+HISTOGRAMME_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
 # Dataset de test : 20 questions avec réponses attendues
 # Basé sur les procédures administratives réelles au Burkina Faso
 TEST_DATASET = [
@@ -160,6 +192,31 @@ TEST_DATASET = [
 ]
 
 
+def resume_latences(valeurs: List[float]) -> Dict:
+    """Percentiles p50/p90/p99, moyenne et maximum d'une liste de durées (ms)"""
+    valeurs = sorted(valeurs)
+
+    def percentile(p: float) -> float:
+        return valeurs[min(len(valeurs) - 1, int(p * len(valeurs)))] if valeurs else 0.0
+
+    return {
+        "p50": percentile(0.50),
+        "p90": percentile(0.90),
+        "p99": percentile(0.99),
+        "moyenne": statistics.mean(valeurs) if valeurs else 0.0,
+        "max": valeurs[-1] if valeurs else 0.0,
+    }
+
+
+def histogramme(valeurs: List[float], bornes: List[float] = HISTOGRAMME_MS) -> List[Dict]:
+    """Nombre de durées (ms) par classe: ]borne précédente, borne], la dernière classe est ouverte"""
+    comptes = [0] * (len(bornes) + 1)
+    for valeur in valeurs:
+        comptes[next((i for i, borne in enumerate(bornes) if valeur <= borne), len(bornes))] += 1
+    return [{"jusqu_a_ms": borne, "nombre": nombre}
+            for borne, nombre in zip(list(bornes) + [None], comptes)]
+
+
 class RAGTester:
     """Classe pour tester et évaluer le système RAG"""
     
@@ -198,6 +255,56 @@ class RAGTester:
             elapsed_time = time.time() - start_time
             return {"success": False, "error": str(e)}, elapsed_time
     
+    def poser_questions_lot(self, questions: List[str]) -> List[Tuple[Dict, float]]:
+        """
+        Pose toutes les questions en une requête sur l'endpoint de lot
+        (/api/question/lot/, réponse NDJSON)
+        
+        Returns:
+            List[Tuple[Dict, float]]: (réponse au format de /api/question/,
+            temps depuis l'envoi du lot en secondes) pour chaque question
+        """
+        url_lot = self.api_url.rstrip('/') + '/lot/'
+        start_time = time.time()
+        resultats: List[Tuple[Dict, float]] = [
+            ({"success": False, "error": "Pas de résultat dans le flux"}, 0.0) for _ in questions
+        ]
+        
+        try:
+            response = requests.post(
+                url_lot,
+                json={"questions": questions, "n_resultats": self.n_resultats},
+                stream=True,
+                timeout=300  # entre deux lignes du flux: une génération au plus
+            )
+            if response.status_code != 200:
+                erreur = {"success": False, "error": f"Status {response.status_code}"}
+                return [(erreur, time.time() - start_time) for _ in questions]
+            
+            # Texte des passages, envoyé une seule fois dans le flux
+            passages = {}
+            for ligne in response.iter_lines(decode_unicode=True):
+                if not ligne:
+                    continue
+                evenement = json.loads(ligne)
+                if evenement['type'] != 'resultat':
+                    continue
+                elapsed_time = time.time() - start_time
+                if not evenement['success']:
+                    resultats[evenement['index']] = (
+                        {"success": False, "error": evenement.get('message')}, elapsed_time
+                    )
+                    continue
+                passages.update((c['id'], c) for c in evenement['nouveaux_contextes'])
+                evenement['contextes'] = [{**passages[c['id']], **c} for c in evenement['contextes']]
+                resultats[evenement['index']] = (evenement, elapsed_time)
+                
+        except Exception as e:
+            elapsed_time = time.time() - start_time
+            return [({"success": False, "error": str(e)}, elapsed_time) for _ in questions]
+        
+        return resultats
+    
     def evaluer_precision_retrieval(self, sources_obtenues: List, sources_pertinentes: List[str]) -> float:
         """
         Évalue la précision du retrieval
@@ -253,10 +360,14 @@ class RAGTester:
         
         return min(score, 5.0)
     
-    def tester_question(self, test_case: Dict) -> Dict:
+    def tester_question(self, test_case: Dict, reponse_lot: Optional[Tuple[Dict, float]] = None) -> Dict:
         """
         Teste une question et retourne les métriques
         
+        Args:
+            test_case: Cas de TEST_DATASET
+            reponse_lot: Réponse et temps déjà obtenus par poser_questions_lot
+        
         Returns:
             Dict: Résultats du test avec métriques
         """
@@ -266,7 +377,10 @@ class RAGTester:
         print(f"{'='*80}")
         
         # Poser la question
-        reponse, temps_reponse = self.poser_question(test_case['question'])
+        if reponse_lot is not None:
+            reponse, temps_reponse = reponse_lot
+        else:
+            reponse, temps_reponse = self.poser_question(test_case['question'])
         
         if not reponse.get('success', False):
             print(f"❌ ERREUR: {reponse.get('error', 'Erreur inconnue')}")
@@ -325,10 +439,15 @@ class RAGTester:
             "nb_sources": len(sources)
         }
     
-    def executer_tests(self, dataset: List[Dict]) -> List[Dict]:
+    def executer_tests(self, dataset: List[Dict], lot: bool = False) -> List[Dict]:
         """
         Exécute tous les tests du dataset
         
+        Args:
+            dataset: Cas de test
+            lot: Poser toutes les questions en une requête (/api/question/lot/);
+                 temps_reponse est alors le temps écoulé depuis l'envoi du lot
+        
         Returns:
             List[Dict]: Liste des résultats
         """
@@ -342,6 +461,13 @@ class RAGTester:
         
         resultats = []
         
+        if lot:
+            reponses = self.poser_questions_lot([test_case['question'] for test_case in dataset])
+            for test_case, reponse_lot in zip(dataset, reponses):
+                resultats.append(self.tester_question(test_case, reponse_lot))
+            self.resultats = resultats
+            return resultats
+        
         for test_case in dataset:
             resultat = self.tester_question(test_case)
             resultats.append(resultat)
@@ -517,10 +643,311 @@ class RAGTester:
             json.dump(rapport, f, ensure_ascii=False, indent=2)
         
         print(f"✅ Rapport sauvegardé dans: {fichier}")
+    
+    def requete_chronometree(self, session: requests.Session, question: str, timeout: float) -> Dict:
+        """
+        Envoie une question en lisant la réponse au fil de l'eau
+        
+        Sur l'endpoint de streaming (text/event-stream), le premier octet
+        arrive avec l'événement "sources" (fin du retrieval) et un événement
+        "erreur" compte comme un échec.
+        
+        Returns:
+            Dict: statut HTTP, succès, timeout, temps jusqu'au premier octet,
+            jusqu'au premier token (streaming) et latence totale (ms)
+        """
+        resultat = {"statut": None, "succes": False, "timeout": False,
+                    "ttfb_ms": None, "premier_token_ms": None, "latence_ms": None}
+        debut = time.perf_counter()
+        try:
+            with session.post(self.api_url, json={"question": question, "n_resultats": self.n_resultats},
+                              timeout=timeout, stream=True) as response:
+                resultat["statut"] = response.status_code
+                sse = response.headers.get("Content-Type", "").startswith("text/event-stream")
+                # read1 rend les octets dès leur arrivée (iter_content attend
+                # la fin d'une réponse sans Content-Length ni chunks)
+                lire = getattr(response.raw, "read1", None)
+                morceaux = iter(lambda: lire(8192), b"") if lire else response.iter_content(chunk_size=1)
+                corps = []
+                for morceau in morceaux:
+                    instant = (time.perf_counter() - debut) * 1000
+                    if resultat["ttfb_ms"] is None:
+                        resultat["ttfb_ms"] = instant
+                    if sse and resultat["premier_token_ms"] is None and b"event: token" in morceau:
+                        resultat["premier_token_ms"] = instant
+                    corps.append(morceau)
+                    if time.perf_counter() - debut > timeout:
+                        raise requests.exceptions.ReadTimeout("Durée totale dépassée")
+            corps = b"".join(corps)
+            if response.status_code != 200:
+                resultat["succes"] = False
+            elif sse:
+                resultat["succes"] = b"event: fin" in corps and b"event: erreur" not in corps
+            else:
+                resultat["succes"] = json.loads(corps).get("success", False)
+        except requests.exceptions.Timeout:
+            resultat["timeout"] = True
+        except (requests.exceptions.RequestException, ValueError) as e:
+            resultat["erreur"] = str(e)
+        resultat["latence_ms"] = (time.perf_counter() - debut) * 1000
+        return resultat
+    
+    def tester_charge(self, questions: List[str], concurrence: int = 10, duree: float = 30.0,
+                      montee: float = 0.0, debit: Optional[float] = None, timeout: float = 30.0,
+                      graine: int = 42) -> Dict:
+        """
+        Test de charge: envoie des questions pendant `duree` secondes
+        
+        Boucle fermée (debit=None): `concurrence` clients démarrent un par un
+        pendant `montee` secondes, puis chacun renvoie une question dès la
+        réponse reçue.
+        Boucle ouverte (debit en requêtes/s): arrivées de Poisson dont le
+        débit croît linéairement pendant `montee` secondes, servies par au
+        plus `concurrence` clients. La latence est comptée depuis l'instant
+        d'arrivée prévu, attente d'un client libre comprise, pour ne pas
+        masquer la saturation du serveur.
+        
+        Les percentiles et le débit ne portent que sur les requêtes parties
+        après la montée en charge (régime établi).
+        
+        Args:
+            questions: Questions envoyées à tour de rôle
+            concurrence: Clients simultanés (requêtes en vol au maximum)
+            duree: Durée totale du test, montée comprise (s)
+            montee: Durée de la montée en charge (s)
+            debit: Débit d'arrivée en boucle ouverte (requêtes/s)
+            timeout: Délai maximal d'une requête (s)
+            graine: Graine du tirage des arrivées
+        
+        Returns:
+            Dict: Rapport du test de charge
+        """
+        print(f"\n{'#'*80}")
+        print(f"{'TEST DE CHARGE - SYSTÈME RAG':^80}")
+        print(f"{'#'*80}")
+        print(f"\nAPI URL: {self.api_url}")
+        if debit:
+            print(f"Boucle ouverte: {debit} requêtes/s, {concurrence} clients au maximum")
+        else:
+            print(f"Boucle fermée: {concurrence} clients")
+        print(f"Durée: {duree}s dont {montee}s de montée en charge, timeout {timeout}s")
+        
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=concurrence))
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=concurrence))
+        verrou = threading.Lock()
+        mesures: List[Dict] = []
+        compteur = itertools.count()
+        
+        def envoyer(prevu: float):
+            with verrou:
+                question = questions[next(compteur) % len(questions)]
+            attente_client = (time.perf_counter() - prevu) * 1000
+            resultat = self.requete_chronometree(session, question, timeout)
+            resultat["depart_s"] = prevu - debut
+            resultat["attente_client_ms"] = attente_client
+            resultat["latence_ms"] += attente_client
+            if resultat["ttfb_ms"] is not None:
+                resultat["ttfb_ms"] += attente_client
+            with verrou:
+                mesures.append(resultat)
+        
+        debut = time.perf_counter()
+        fin = debut + duree
+        
+        if debit:
+            hasard = random.Random(graine)
+            with ThreadPoolExecutor(max_workers=concurrence) as pool:
+                # Processus de Poisson d'intensité debit * min(1, t / montee):
+                # arrivées d'intensité 1 ramenées au temps réel par
+                # l'inverse de l'intensité cumulée
+                cumul = 0.0
+                while True:
+                    cumul += hasard.expovariate(1.0)
+                    if cumul < debit * montee / 2:
+                        prevu = debut + (2 * montee * cumul / debit) ** 0.5
+                    else:
+                        prevu = debut + montee + (cumul - debit * montee / 2) / debit
+                    if prevu >= fin:
+                        break
+                    pause = prevu - time.perf_counter()
+                    if pause > 0:
+                        time.sleep(pause)
+                    pool.submit(envoyer, prevu)
+        else:
+            def client(rang: int):
+                depart = debut + (montee * rang / concurrence)
+                pause = depart - time.perf_counter()
+                if pause > 0:
+                    time.sleep(pause)
+                while time.perf_counter() < fin:
+                    envoyer(time.perf_counter())
+            
+            clients = [threading.Thread(target=client, args=(rang,), daemon=True) for rang in range(concurrence)]
+            for thread in clients:
+                thread.start()
+            for thread in clients:
+                thread.join()
+        
+        duree_reelle = time.perf_counter() - debut
+        session.close()
+        self.resultats_charge = mesures
+        rapport = self.generer_rapport_charge(mesures, montee, duree_reelle)
+        rapport["configuration"] = {
+            "api_url": self.api_url,
+            "mode": "boucle_ouverte" if debit else "boucle_fermee",
+            "concurrence": concurrence,
+            "debit_cible": debit,
+            "duree_s": duree,
+            "montee_s": montee,
+            "timeout_s": timeout,
+            "n_resultats": self.n_resultats,
+        }
+        return rapport
+    
+    def generer_rapport_charge(self, mesures: List[Dict], montee: float, duree: float) -> Dict:
+        """
+        Statistiques d'un test de charge
+        
+        Returns:
+            Dict: compteurs (toutes requêtes), débit, percentiles et
+            histogramme des latences (régime établi)
+        """
+        etablies = [m for m in mesures if m["depart_s"] >= montee] or mesures
+        reussies = [m for m in etablies if m["succes"]]
+        total = len(mesures)
+        duree_etablie = max(duree - montee, 1e-9) if etablies is not mesures else max(duree, 1e-9)
+        latences = [m["latence_ms"] for m in reussies]
+        return {
+            "requetes": total,
+            "reussies": sum(m["succes"] for m in mesures),
+            "erreurs": sum(not m["succes"] and not m["timeout"] for m in mesures),
+            "timeouts": sum(m["timeout"] for m in mesures),
+            "refusees": sum(m["statut"] in (429, 503) for m in mesures),
+            "taux_erreur": sum(not m["succes"] and not m["timeout"] for m in mesures) / total * 100 if total else 0.0,
+            "taux_timeout": sum(m["timeout"] for m in mesures) / total * 100 if total else 0.0,
+            "statuts_http": {str(statut): n for statut, n in Counter(m["statut"] for m in mesures).items()},
+            "regime_etabli": {
+                "requetes": len(etablies),
+                "debit_req_s": len(reussies) / duree_etablie,
+                "latence_ms": resume_latences(latences),
+                "ttfb_ms": resume_latences([m["ttfb_ms"] for m in reussies if m["ttfb_ms"] is not None]),
+                "premier_token_ms": resume_latences(
+                    [m["premier_token_ms"] for m in reussies if m["premier_token_ms"] is not None]),
+                "attente_client_ms": resume_latences([m["attente_client_ms"] for m in etablies]),
+                "histogramme_latence": histogramme(latences),
+            },
+            "duree_s": duree,
+        }
+    
+    def afficher_rapport_charge(self, rapport: Dict):
+        """Affiche le rapport d'un test de charge"""
+        regime = rapport["regime_etabli"]
+        print(f"\n📊 RÉSUMÉ DE LA CHARGE")
+        print(f"{'─'*80}")
+        print(f"  Requêtes:         {rapport['requetes']} en {rapport['duree_s']:.1f}s")
+        print(f"  Réussies:         {rapport['reussies']} ✅")
+        print(f"  Erreurs:          {rapport['erreurs']} ({rapport['taux_erreur']:.1f}%) ❌, "
+              f"dont {rapport['refusees']} refusées (429/503)")
+        print(f"  Timeouts:         {rapport['timeouts']} ({rapport['taux_timeout']:.1f}%) ⏳")
+        print(f"  Statuts HTTP:     {rapport['statuts_http']}")
+        print(f"  Débit établi:     {regime['debit_req_s']:.2f} req/s")
+        
+        print(f"\n⏱️  LATENCES EN RÉGIME ÉTABLI ({regime['requetes']} requêtes)")
+        print(f"{'─'*80}")
+        for nom, cle in (("Réponse complète", "latence_ms"), ("Premier octet", "ttfb_ms"),
+                         ("Premier token", "premier_token_ms"), ("Attente client", "attente_client_ms")):
+            l = regime[cle]
+            if l["max"] > 0:
+                print(f"  {nom:<17} p50 {l['p50']:8.0f} ms | p90 {l['p90']:8.0f} ms | "
+                      f"p99 {l['p99']:8.0f} ms | max {l['max']:8.0f} ms")
+        
+        print(f"\n📈 HISTOGRAMME DES LATENCES")
+        print(f"{'─'*80}")
+        classes = regime["histogramme_latence"]
+        plus_grande = max((c["nombre"] for c in classes), default=0) or 1
+        for classe in classes:
+            borne = f"≤ {classe['jusqu_a_ms']} ms" if classe["jusqu_a_ms"] is not None else "au-delà"
+            print(f"  {borne:>12} | {'█' * round(40 * classe['nombre'] / plus_grande):<40} {classe['nombre']}")
+        print(f"\n{'#'*80}\n")
+
+
+def attendre_backend(url_sante: str, delai: float) -> bool:
+    """Interroge /api/health/ jusqu'à ce que le backend soit prêt (ou le délai écoulé)"""
+    limite = time.time() + delai
+    while time.time() < limite:
+        try:
+            if requests.get(url_sante, timeout=5).status_code == 200:
+                return True
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(1)
+    return False
+
+
+def main_charge(args):
+    """Test de charge (option --charge)"""
+    print("🤖 Test de charge du système RAG - Agent IA")
+    print("="*80)
+    
+    if args.stub_ollama:
+        import stub_ollama_server
+        stub_ollama_server.demarrer(args.stub_ollama, latence=args.stub_latence,
+                                    tokens_par_s=args.stub_tokens_par_s)
+        print(f"🧪 Faux serveur Ollama sur http://localhost:{args.stub_ollama}")
+        print("💡 Démarrer le backend dessus dans un autre terminal:")
+        print(f"   OLLAMA_HOST=http://localhost:{args.stub_ollama} RAG_CACHE_TAILLE=0 python manage.py runserver")
+    
+    url_sante = args.api_url.split("/api/")[0] + "/api/health/"
+    print(f"\n🔍 Attente du backend ({url_sante})...")
+    if not attendre_backend(url_sante, args.attente_backend):
+        print(f"❌ Backend indisponible après {args.attente_backend:.0f}s")
+        return
+    print("✅ Backend prêt")
+    
+    tester = RAGTester(api_url=args.api_url, n_resultats=args.n_resultats)
+    rapport = tester.tester_charge(
+        [cas["question"] for cas in TEST_DATASET],
+        concurrence=args.concurrence,
+        duree=args.duree,
+        montee=args.montee,
+        debit=args.debit,
+        timeout=args.timeout,
+        graine=args.graine
+    )
+    tester.afficher_rapport_charge(rapport)
+    
+    rapport["date"] = datetime.now().isoformat()
+    with open(args.sortie, 'w', encoding='utf-8') as f:
+        json.dump(rapport, f, ensure_ascii=False, indent=2)
+    print(f"✅ Rapport sauvegardé dans: {args.sortie}")
 
 
 def main():
     """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Évaluation et test de charge du système RAG")
+    parser.add_argument("--api-url", default=API_URL)
+    parser.add_argument("--n-resultats", type=int, default=N_RESULTATS)
+    parser.add_argument("--charge", action="store_true", help="Test de charge au lieu de l'évaluation")
+    parser.add_argument("--lot", action="store_true", help="Évaluation en une requête sur /api/question/lot/")
+    parser.add_argument("--concurrence", type=int, default=10, help="Clients simultanés")
+    parser.add_argument("--duree", type=float, default=30, help="Durée du test, montée comprise (s)")
+    parser.add_argument("--montee", type=float, default=0, help="Montée en charge (s)")
+    parser.add_argument("--debit", type=float, help="Boucle ouverte: arrivées par seconde")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--graine", type=int, default=42)
+    parser.add_argument("--stub-ollama", type=int, metavar="PORT", help="Démarrer un faux serveur Ollama sur ce port")
+    parser.add_argument("--stub-latence", type=float, default=0.2)
+    parser.add_argument("--stub-tokens-par-s", type=float, default=50)
+    parser.add_argument("--attente-backend", type=float, default=300,
+                        help="Attente maximale de /api/health/ avant le test de charge (s)")
+    parser.add_argument("--sortie", default="rapport_charge_rag.json")
+    args = parser.parse_args()
+    
+    if args.charge:
+        main_charge(args)
+        return
+    
     print("🤖 Test du système RAG - Agent IA")
     print("="*80)
     
@@ -529,7 +956,7 @@ def main():
     try:
         # Tester avec une requête simple
         response = requests.post(
-            "http://localhost:8000/api/question/",
+            args.api_url,
             json={"question": "test", "n_resultats": 1},
             timeout=5
         )
@@ -549,10 +976,10 @@ def main():
             return
     
     # Créer le testeur
-    tester = RAGTester(api_url=API_URL, n_resultats=N_RESULTATS)
+    tester = RAGTester(api_url=args.api_url, n_resultats=args.n_resultats)
     
     # Exécuter les tests
-    resultats = tester.executer_tests(TEST_DATASET)
+    resultats = tester.executer_tests(TEST_DATASET, lot=args.lot)
     
     # Afficher le rapport
     tester.afficher_rapport()